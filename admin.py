@@ -9,7 +9,8 @@ from google.cloud import bigquery
 from datetime import datetime
 import json
 
-from utils import verify_token, TokenData, get_bigquery_client
+from utils import verify_token, TokenData, get_bigquery_client, execute_bigquery_query_async, get_user_access
+from goals_store import DEFAULT_GOALS, goals_store
 
 # Router para admin
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
@@ -461,37 +462,17 @@ async def save_monthly_goal(
 ):
     """Endpoint para salvar meta do mês"""
     
-    client = get_bigquery_client()
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
-        )
-    
     try:
         # Buscar informações do usuário para verificar permissões
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
+        user_access = await get_user_access(token.email)
         
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
+        user_tablename, _ = user_access
         
         # Verificar permissões para acessar a tabela solicitada
         if user_tablename == 'all':
@@ -508,31 +489,12 @@ async def save_monthly_goal(
             tablename = request.table_name
             print(f"🔒 Usuário com acesso limitado salvando meta para tabela: {tablename}")
 
-        # Buscar metas existentes
-        goals_query = f"""
-        SELECT goals
-        FROM `mymetric-hub-shopify.dbt_config.user_goals`
-        WHERE username = '{tablename}'
-        LIMIT 1
-        """
-        
-        goals_result = client.query(goals_query)
-        goals_data = list(goals_result.result())
+        # Buscar metas existentes (cache de metas)
+        goals = await goals_store.get(tablename)
         
         # Inicializar metas se não existirem
-        if not goals_data:
+        if goals is None:
             goals = {}
-        else:
-            goals = goals_data[0].goals
-            # Se goals for string JSON, converter para dict
-            if isinstance(goals, str):
-                try:
-                    goals = json.loads(goals)
-                except:
-                    goals = {}
-            # Se goals for None, inicializar como dict vazio
-            if goals is None:
-                goals = {}
         
         # Atualizar meta do mês específico
         # Usar o formato existente: metas_mensais
@@ -588,8 +550,13 @@ async def save_monthly_goal(
         
         print(f"Executando query para salvar meta do mês: {query}")
         
-        # Executar query
-        client.query(query)
+        # Executar query e atualizar o cache de metas (todos os workers)
+        try:
+            await execute_bigquery_query_async(query)
+        except Exception:
+            goals_store.invalidate(tablename)
+            raise
+        goals_store.put(tablename, goals)
         
         return {
             "message": f"Meta do mês {request.month} salva com sucesso",
@@ -599,6 +566,8 @@ async def save_monthly_goal(
             "goal_value": request.goal_value
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao salvar meta do mês: {e}")
         raise HTTPException(
@@ -613,37 +582,17 @@ async def load_goals(
 ):
     """Endpoint para carregar metas do usuário"""
     
-    client = get_bigquery_client()
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
-        )
-    
     try:
         # Buscar informações do usuário para verificar permissões
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
+        user_access = await get_user_access(token.email)
         
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
+        user_tablename, _ = user_access
         
         # Verificar permissões para acessar a tabela solicitada
         if user_tablename == 'all':
@@ -660,56 +609,21 @@ async def load_goals(
             tablename = request.table_name
             print(f"🔒 Usuário com acesso limitado carregando metas da tabela: {tablename}")
 
-        # Query para buscar metas do usuário
-        goals_query = f"""
-        SELECT goals
-        FROM `mymetric-hub-shopify.dbt_config.user_goals`
-        WHERE username = '{tablename}'
-        LIMIT 1
-        """
-        
-        print(f"Executando query de metas: {goals_query}")
+        # Metas do cliente (cache de metas, atualizado pelas escritas)
+        goals = await goals_store.get(tablename)
         
-        # Executar query
-        goals_result = client.query(goals_query)
-        goals_data = list(goals_result.result())
-        
-        if not goals_data:
+        if goals is None:
             # Se não encontrar metas, retornar metas padrão
-            default_goals = {
-                "revenue_goal": 100000.0,
-                "orders_goal": 1000,
-                "conversion_rate_goal": 5.0,
-                "roas_goal": 8.0,
-                "new_customers_goal": 100
-            }
-            
             return LoadGoalsResponse(
                 success=True,
                 message="Metas padrão aplicadas (nenhuma meta configurada encontrada)",
-                goals=default_goals,
+                goals=DEFAULT_GOALS.copy(),
                 username=tablename
             )
         
-        # Processar metas encontradas
-        goals = goals_data[0].goals
-        
-        # Se goals for string JSON, converter para dict
-        if isinstance(goals, str):
-            try:
-                goals = json.loads(goals)
-            except json.JSONDecodeError:
-                goals = {}
-        
-        # Se goals for None ou vazio, usar metas padrão
+        # Se goals for vazio, usar metas padrão
         if not goals:
-            goals = {
-                "revenue_goal": 100000.0,
-                "orders_goal": 1000,
-                "conversion_rate_goal": 5.0,
-                "roas_goal": 8.0,
-                "new_customers_goal": 100
-            }
+            goals = DEFAULT_GOALS.copy()
         
         return LoadGoalsResponse(
             success=True,
@@ -734,37 +648,17 @@ async def delete_goal(
 ):
     """Endpoint para deletar uma meta específica"""
     
-    client = get_bigquery_client()
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
-        )
-    
     try:
         # Buscar informações do usuário para verificar permissões
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
+        user_access = await get_user_access(token.email)
         
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
+        user_tablename, _ = user_access
         
         # Verificar permissões para acessar a tabela solicitada
         if user_tablename == 'all':
@@ -781,33 +675,8 @@ async def delete_goal(
             tablename = request.table_name
             print(f"🔒 Usuário com acesso limitado deletando meta da tabela: {tablename}")
 
-        # Buscar metas existentes
-        goals_query = f"""
-        SELECT goals
-        FROM `mymetric-hub-shopify.dbt_config.user_goals`
-        WHERE username = '{tablename}'
-        LIMIT 1
-        """
-        
-        goals_result = client.query(goals_query)
-        goals_data = list(goals_result.result())
-        
-        if not goals_data:
-            return DeleteGoalResponse(
-                success=False,
-                message="Nenhuma meta encontrada para deletar",
-                deleted_goal=None
-            )
-        
-        # Processar metas encontradas
-        goals = goals_data[0].goals
-        
-        # Se goals for string JSON, converter para dict
-        if isinstance(goals, str):
-            try:
-                goals = json.loads(goals)
-            except json.JSONDecodeError:
-                goals = {}
+        # Buscar metas existentes (cache de metas)
+        goals = await goals_store.get(tablename)
         
         if not goals:
             return DeleteGoalResponse(
@@ -883,8 +752,13 @@ async def delete_goal(
         
         print(f"🗑️ Executando deleção de meta: {update_query}")
         
-        # Executar query de atualização
-        client.query(update_query)
+        # Executar query de atualização e atualizar o cache de metas (todos os workers)
+        try:
+            await execute_bigquery_query_async(update_query)
+        except Exception:
+            goals_store.invalidate(tablename)
+            raise
+        goals_store.put(tablename, goals)
         
         return DeleteGoalResponse(
             success=True,
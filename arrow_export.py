@@ -0,0 +1,188 @@
+"""
+Download binário (Apache Arrow IPC ou Parquet) dos endpoints de dados em massa
+
+`/metrics/orders` e `/metrics/leads_orders` aceitam `format=arrow` ou `format=parquet`,
+no corpo, na query string (`?format=parquet`) ou pelo header `Accept`
+(`application/vnd.apache.arrow.stream`, `application/vnd.apache.parquet`).
+
+A tabela Arrow é montada direto das colunas em cache, sem criar objetos por linha:
+as colunas numéricas de `EncodedRows` viram arrays Arrow sobre o mesmo buffer e as
+colunas codificadas por dicionário viram `DictionaryArray` (códigos + valores
+distintos), que o pandas lê como `category`. O sumário e o total de linhas vão nos
+metadados do schema (`mymetric.summary`, `mymetric.total_rows`).
+
+- arrow: stream IPC enviado em lotes de `ARROW_BATCH_ROWS` linhas (o GZipMiddleware
+  comprime o stream);
+- parquet: arquivo único comprimido com snappy (sem gzip por cima).
+
+Requer o pacote `pyarrow`, importado só quando um download é pedido.
+"""
+
+import io
+import os
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+
+from compact_rows import EncodedRows, column_schema, rows_to_columns
+from fast_response import encode_json
+
+ARROW_BATCH_ROWS = int(os.getenv('ARROW_BATCH_ROWS', '65536'))
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+# Formato -> media types aceitos no header Accept (o primeiro é o da resposta)
+DOWNLOAD_MEDIA_TYPES = {
+    'arrow': (ARROW_MEDIA_TYPE,),
+    'parquet': (PARQUET_MEDIA_TYPE, 'application/x-parquet', 'application/parquet'),
+}
+DOWNLOAD_FORMATS = tuple(DOWNLOAD_MEDIA_TYPES)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401 - registra pyarrow.compute
+        import pyarrow.parquet  # noqa: F401 - registra pyarrow.parquet
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="O download em arrow/parquet requer o pacote 'pyarrow' (pip install pyarrow)"
+        )
+    return pyarrow
+
+
+def requested_download_format(http_request: Optional[Request]) -> Optional[str]:
+    """Formato pedido na query string (`format`) ou no header Accept; None se nenhum"""
+    if http_request is None:
+        return None
+    query_format = http_request.query_params.get('format')
+    if query_format:
+        return query_format
+    for item in http_request.headers.get('accept', '').split(','):
+        media_type = item.split(';')[0].strip().lower()
+        for download_format, media_types in DOWNLOAD_MEDIA_TYPES.items():
+            if media_type in media_types:
+                return download_format
+    return None
+
+
+def _arrow_types(pa) -> Dict[str, Any]:
+    return {'string': pa.string(), 'integer': pa.int64(), 'number': pa.float64(), 'boolean': pa.bool_()}
+
+
+# Typecode do array.array -> tipo Arrow do mesmo buffer
+_BUFFER_TYPES = {'d': 'float64', 'q': 'int64', 'H': 'uint16', 'I': 'uint32'}
+
+
+def _from_buffer(pa, values: array):
+    """Array Arrow sem nulos sobre o buffer de um array.array (sem cópia)"""
+    return pa.Array.from_buffers(getattr(pa, _BUFFER_TYPES[values.typecode])(), len(values), [None, pa.py_buffer(values)])
+
+
+def _column_array(pa, values: Sequence[Any], arrow_type):
+    if isinstance(values, array) and values.typecode in _BUFFER_TYPES:
+        column = _from_buffer(pa, values)
+    else:
+        column = pa.array(values, type=arrow_type)
+    return column if column.type == arrow_type else column.cast(arrow_type)
+
+
+def _dictionary_array(pa, codes: array, dictionary: List[Any], arrow_type):
+    """DictionaryArray a partir dos códigos e valores distintos de uma coluna codificada"""
+    indices = _from_buffer(pa, codes)
+    mask = None
+    if None in dictionary:
+        # Códigos que apontam para None viram nulos na coluna
+        mask = pa.compute.equal(indices, pa.scalar(dictionary.index(None), type=indices.type))
+    return pa.DictionaryArray.from_arrays(indices, pa.array(dictionary, type=arrow_type), mask=mask)
+
+
+def _with_metadata(table, summary: Optional[Dict[str, Any]], total_rows: Optional[int]):
+    metadata = {}
+    if summary is not None:
+        metadata['mymetric.summary'] = encode_json(summary)
+    if total_rows is not None:
+        metadata['mymetric.total_rows'] = str(total_rows)
+    return table.replace_schema_metadata(metadata) if metadata else table
+
+
+def encoded_rows_table(encoded: EncodedRows, positions: Sequence[int], summary: Optional[Dict[str, Any]] = None, total_rows: Optional[int] = None):
+    """Tabela Arrow com as linhas `positions` de um EncodedRows"""
+    pa = _pyarrow()
+    types = _arrow_types(pa)
+    arrays = []
+    for field in column_schema(encoded.row_class):
+        arrow_type = types.get(field['type'], pa.string())
+        values = encoded.columns[field['name']]
+        dictionary = encoded.dictionaries.get(field['name'])
+        if dictionary is not None:
+            arrays.append(_dictionary_array(pa, values, dictionary, arrow_type))
+        else:
+            arrays.append(_column_array(pa, values, arrow_type))
+    table = pa.Table.from_arrays(arrays, names=list(encoded.names))
+
+    if isinstance(positions, range) and positions.step == 1:
+        table = table.slice(positions.start, len(positions))
+    else:
+        table = table.take(_from_buffer(pa, array('I', positions)))
+    return _with_metadata(table, summary, total_rows)
+
+
+def rows_table(rows: Sequence[Any], row_class: type, summary: Optional[Dict[str, Any]] = None, total_rows: Optional[int] = None):
+    """Tabela Arrow de uma lista de linhas compactas"""
+    pa = _pyarrow()
+    types = _arrow_types(pa)
+    columns = rows_to_columns(rows, row_class)
+    schema = pa.schema([
+        pa.field(field['name'], types.get(field['type'], pa.string()), nullable=field['nullable'])
+        for field in column_schema(row_class)
+    ])
+    return _with_metadata(pa.Table.from_pydict(columns, schema=schema), summary, total_rows)
+
+
+def _drain(buffer: io.BytesIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _arrow_stream(table) -> Iterator[bytes]:
+    pa = _pyarrow()
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=ARROW_BATCH_ROWS):
+            writer.write_batch(batch)
+            yield _drain(buffer)
+    # Marcador de fim do stream
+    yield _drain(buffer)
+
+
+def table_response(table, download_format: str, filename: str) -> Response:
+    """Resposta com a tabela em Arrow IPC (stream) ou Parquet, como anexo"""
+    pa = _pyarrow()
+    # Lotes com dicionários diferentes não podem ser escritos no mesmo stream IPC
+    table = table.unify_dictionaries()
+
+    if download_format == 'arrow':
+        return StreamingResponse(
+            _arrow_stream(table),
+            media_type=ARROW_MEDIA_TYPE,
+            headers={'Content-Disposition': f'attachment; filename="{filename}.arrow"'}
+        )
+
+    sink = pa.BufferOutputStream()
+    pa.parquet.write_table(table, sink, compression='snappy')
+    return Response(
+        content=sink.getvalue().to_pybytes(),
+        media_type=PARQUET_MEDIA_TYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.parquet"',
+            # Parquet já vem comprimido: Content-Encoding explícito faz o GZipMiddleware não recomprimir
+            'Content-Encoding': 'identity'
+        }
+    )
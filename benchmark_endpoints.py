@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline dos endpoints de métricas
+
+Roda os endpoints em processo contra o cliente BigQuery falso (DuckDB, ver
+`bigquery_fake.py`) e mede separadamente cada etapa do caminho de resposta,
+com result sets sintéticos de 1k, 10k e 100k linhas:
+
+- conversion:    linhas do BigQuery -> linhas compactas (`_convert_*_rows`; no basic-data
+                 e no detailed-data, montagem e reagrupamento do cubo de eventos)
+- summary:       cálculo do sumário (`_calculate_*_summary`)
+- row_dicts:     `row.dict()` das linhas entregues ao modelo de resposta
+- response:      construção do modelo de resposta
+- validation:    model_dump + revalidação do response_model feitas pelo FastAPI
+- serialization: serialização do response_model para tipos JSON
+- json_encoding: renderização do JSONResponse
+- gzip:          compressão no mesmo nível do GZipMiddleware
+- peak_memory:   pico de memória (tracemalloc) do caminho completo, em passada separada
+
+Em seguida compara, com 10k e 50k linhas, o caminho padrão do FastAPI (validação,
+serialização e JSONResponse) com o caminho rápido dos endpoints que retornam
+`trusted_response` (ver `fast_response.py`), conferindo que o JSON gerado é o mesmo,
+e a página em objetos por linha com `format=columnar` nos endpoints que o aceitam.
+
+Também executa cada handler de ponta a ponta (cache frio e quente) com os dados
+naturais do banco falso.
+
+Os resultados são salvos em JSON para comparação com um baseline:
+
+    python benchmark_endpoints.py --output bench_main.json
+    # ... alterações em metrics.py ...
+    python benchmark_endpoints.py --output bench_branch.json --baseline bench_main.json
+
+Requer o pacote `duckdb`.
+"""
+
+import argparse
+import asyncio
+import gc
+import gzip
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from google.cloud import bigquery
+from fastapi.responses import JSONResponse
+from fastapi.routing import _prepare_response_content
+
+from bigquery_fake import FakeBigQueryClient, ADMIN_EMAIL
+from compact_rows import rows_to_dicts
+from fast_response import TrustedContent, orjson, trusted_response
+from event_cube import EventCube, build_event_cube_query
+from utils import set_bigquery_client, TokenData
+import cache_manager
+import metrics
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+FAST_PATH_SIZES = [10000, 50000]
+# Endpoints com `format=columnar`
+COLUMNAR_ENDPOINTS = ('orders', 'detailed-data', 'leads_orders', 'ads-creatives-results')
+GZIP_LEVEL = 9  # Mesmo nível padrão do GZipMiddleware do Starlette
+TENANT = 'constance'
+PROJECT = 'mymetric-hub-shopify'
+
+STAGES = ['conversion', 'summary', 'row_dicts', 'response', 'validation', 'serialization', 'json_encoding', 'gzip']
+
+
+class EndpointSpec:
+    """Descreve como reproduzir as etapas de um endpoint fora do handler"""
+
+    def __init__(
+        self,
+        path: str,
+        query: Callable[[str, str], str],
+        convert: Callable[[list], list],
+        summarize: Callable[[list], Any],
+        respond: Callable[[list, Any, Callable], Any],
+        request: Callable[[str, str], Any],
+        handler: Callable,
+        job_config: Optional[Callable[[str, str], Any]] = None,
+        method: str = 'POST',
+        trusted: bool = True,
+    ):
+        self.path = path
+        self.query = query
+        self.convert = convert
+        self.summarize = summarize
+        self.respond = respond
+        self.request = request
+        self.handler = handler
+        self.job_config = job_config
+        self.method = method
+        # O handler retorna trusted_response (sem revalidação do response_model)
+        self.trusted = trusted
+
+
+def _date_condition(start_date: str, end_date: str) -> str:
+    return f"event_date between '{start_date}' and '{end_date}'"
+
+
+def _leads_job_config(start_date: str, end_date: str):
+    return bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("start_date", "STRING", start_date),
+            bigquery.ScalarQueryParameter("end_date", "STRING", end_date),
+        ]
+    )
+
+
+ENDPOINTS: Dict[str, EndpointSpec] = {
+    'basic-data': EndpointSpec(
+        path='/metrics/basic-data',
+        query=lambda s, e: build_event_cube_query(PROJECT, TENANT, 'purchase', s, e),
+        convert=lambda rows: metrics._basic_data_rows_from_cube(EventCube(rows), TENANT),
+        summarize=metrics._calculate_basic_data_summary,
+        respond=lambda data, summary, build: build(
+            metrics.BasicDataResponse,
+            data=data, total_rows=len(data), summary=summary,
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 1}
+        ),
+        request=lambda s, e: metrics.BasicDataRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_basic_data,
+    ),
+    'daily-metrics': EndpointSpec(
+        path='/metrics/daily-metrics',
+        query=lambda s, e: metrics._build_daily_metrics_query(PROJECT, TENANT, _date_condition(s, e)),
+        convert=metrics._convert_daily_metrics_rows,
+        summarize=metrics._calculate_daily_metrics_summary,
+        respond=lambda data, summary, build: build(
+            metrics.DailyMetricsResponse,
+            data=data, total_rows=len(data), summary=summary,
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 1}
+        ),
+        request=lambda s, e: metrics.DailyMetricsRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_daily_metrics,
+    ),
+    'orders': EndpointSpec(
+        path='/metrics/orders',
+        query=lambda s, e: metrics._build_orders_query(PROJECT, TENANT, s, e),
+        convert=metrics._convert_orders_rows,
+        summarize=metrics._calculate_orders_summary,
+        # Página com todas as linhas (limit = tamanho do result set) para medir o pior caso
+        respond=lambda data, summary, build: build(
+            metrics.OrdersResponse,
+            data=data, total_rows=len(data), summary=summary,
+            pagination={'limit': len(data), 'offset': 0, 'has_more': False}
+        ),
+        request=lambda s, e: metrics.OrdersRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_orders,
+    ),
+    'detailed-data': EndpointSpec(
+        path='/metrics/detailed-data',
+        query=lambda s, e: build_event_cube_query(PROJECT, TENANT, 'purchase', s, e),
+        convert=lambda rows: metrics._detailed_data_rows_from_cube(EventCube(rows)),
+        summarize=metrics._calculate_detailed_data_summary,
+        # A página do detailed-data é limitada a 50000 linhas pelo endpoint
+        respond=lambda data, summary, build: build(
+            metrics.DetailedDataResponse,
+            data=data[:50000], total_rows=len(data), summary=summary,
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 4},
+            pagination={'limit': 50000, 'offset': 0, 'order_by': 'Pedidos', 'has_more': len(data) > 50000}
+        ),
+        request=lambda s, e: metrics.DetailedDataRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_detailed_data,
+    ),
+    'ads-campaigns-results': EndpointSpec(
+        path='/metrics/ads-campaigns-results',
+        query=lambda s, e: metrics._build_ads_campaigns_results_query(PROJECT, TENANT, s, e),
+        convert=metrics._convert_ads_campaigns_results_rows,
+        summarize=metrics._calculate_ads_campaigns_results_summary,
+        respond=lambda data, summary, build: build(
+            metrics.AdsCampaignsResultsResponse,
+            data=data, total_rows=len(data), summary=summary,
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 168}
+        ),
+        request=lambda s, e: metrics.AdsCampaignsResultsRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_ads_campaigns_results,
+    ),
+    'ads-creatives-results': EndpointSpec(
+        path='/metrics/ads-creatives-results',
+        query=lambda s, e: metrics._build_ads_creatives_results_query(PROJECT, TENANT, s, e),
+        convert=metrics._convert_ads_creatives_results_rows,
+        summarize=metrics._calculate_ads_creatives_results_summary,
+        respond=lambda data, summary, build: build(
+            metrics.AdsCreativesResultsResponse,
+            data=data, total_rows=len(data), summary=summary,
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 168}
+        ),
+        request=lambda s, e: metrics.AdsCreativesResultsRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_ads_creatives_results,
+    ),
+    'realtime': EndpointSpec(
+        path='/metrics/realtime',
+        query=lambda s, e: metrics._build_realtime_query(PROJECT, TENANT),
+        convert=metrics._convert_realtime_rows,
+        summarize=metrics._calculate_realtime_summary,
+        respond=lambda data, summary, build: build(
+            metrics.RealtimeResponse,
+            data=data, total_rows=len(data), summary=summary,
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 0.25}
+        ),
+        request=lambda s, e: metrics.RealtimeRequest(table_name=TENANT),
+        handler=metrics.get_realtime_purchases,
+    ),
+    'leads_orders': EndpointSpec(
+        path='/metrics/leads_orders',
+        query=lambda s, e: metrics._build_leads_orders_query(f"{PROJECT}.dbt_join.{TENANT}_leads_orders_"),
+        job_config=_leads_job_config,
+        convert=metrics._convert_leads_orders_rows,
+        summarize=metrics._calculate_leads_orders_summary,
+        respond=lambda data, summary, build: build(
+            metrics.LeadsOrdersResponse,
+            summary=summary, data=data, total_rows=len(data), total_records=len(data),
+            cache_info={'source': 'database', 'cached_at': datetime.now().isoformat(), 'ttl_hours': 168},
+            pagination={'limit': len(data), 'offset': 0, 'has_more': False}
+        ),
+        request=lambda s, e: metrics.LeadsOrdersRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.get_leads_orders,
+    ),
+    'shipping-calc-analytics': EndpointSpec(
+        path='/metrics/shipping-calc-analytics',
+        query=lambda s, e: metrics._build_shipping_calc_query(PROJECT, TENANT, s, e),
+        convert=metrics._convert_shipping_calc_rows,
+        summarize=metrics._calculate_shipping_calc_summary,
+        respond=lambda data, summary, build: build(
+            metrics.ShippingCalcAnalyticsResponse,
+            summary=summary, data=data, total_rows=len(data)
+        ),
+        request=lambda s, e: metrics.ShippingCalcAnalyticsRequest(start_date=s, end_date=e, table_name=TENANT),
+        handler=metrics.shipping_calc_analytics_post,
+        trusted=False,
+    ),
+}
+
+
+def _response_field(path: str, method: str = 'POST'):
+    """Busca o response_field registrado pelo FastAPI para a rota"""
+    for route in metrics.metrics_router.routes:
+        if getattr(route, 'path', None) == path and method in getattr(route, 'methods', set()):
+            return route.response_field
+    raise KeyError(f"Rota não encontrada: {method} {path}")
+
+
+def _validated(model, **content):
+    """Modelo de resposta construído com validação (caminho padrão do FastAPI)"""
+    return model(**content)
+
+
+def _encode_response(response_field, response) -> bytes:
+    """Corpo da resposta como a rota geraria: direto para trusted_response,
+    validação + serialização + JSONResponse para modelos"""
+    if isinstance(response, TrustedContent):
+        return response.response().body
+    value = _validate_response(response_field, response)
+    return JSONResponse(content=response_field.serialize(value, by_alias=True)).body
+
+
+def _validate_response(response_field, response):
+    """Reproduz o serialize_response do FastAPI: model_dump seguido da revalidação"""
+    content = _prepare_response_content(response, exclude_unset=False)
+    value, errors = response_field.validate(content, {}, loc=("response",))
+    if errors:
+        raise ValueError(f"Resposta inválida: {errors}")
+    return value
+
+
+def _synthetic_rows(base_rows: list, size: int) -> list:
+    """Repete as linhas reais do banco falso até atingir `size` linhas"""
+    if not base_rows:
+        return []
+    repeats = size // len(base_rows) + 1
+    return (base_rows * repeats)[:size]
+
+
+def _gzip(body: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with gzip.GzipFile(mode="wb", fileobj=buffer, compresslevel=GZIP_LEVEL) as gzip_file:
+        gzip_file.write(body)
+    return buffer.getvalue()
+
+
+def _run_pipeline(spec: EndpointSpec, rows: list, response_field, timings: Optional[Dict[str, List[float]]] = None) -> Dict[str, int]:
+    """Executa todas as etapas em sequência, registrando o tempo de cada uma"""
+
+    def timed(stage, fn):
+        started = time.perf_counter()
+        result = fn()
+        if timings is not None:
+            timings[stage].append(time.perf_counter() - started)
+        return result
+
+    data = timed('conversion', lambda: spec.convert(rows))
+    summary = timed('summary', lambda: spec.summarize(data))
+    rows_dicts = timed('row_dicts', lambda: rows_to_dicts(data))
+    response = timed('response', lambda: spec.respond(rows_dicts, summary, _validated))
+    value = timed('validation', lambda: _validate_response(response_field, response))
+    content = timed('serialization', lambda: response_field.serialize(value, by_alias=True))
+    body = timed('json_encoding', lambda: JSONResponse(content=content).body)
+    compressed = timed('gzip', lambda: _gzip(body))
+    return {'json_bytes': len(body), 'gzip_bytes': len(compressed)}
+
+
+def _measure_peak_memory(spec: EndpointSpec, rows: list, response_field) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _run_pipeline(spec, rows, response_field)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    return {
+        'median_ms': round(statistics.median(values) * 1000, 3),
+        'min_ms': round(min(values) * 1000, 3),
+        'max_ms': round(max(values) * 1000, 3),
+    }
+
+
+def bench_stages(client: FakeBigQueryClient, names: List[str], sizes: List[int], repeat: int, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Mede cada etapa por endpoint e tamanho de result set"""
+    results: Dict[str, Any] = {}
+
+    for name in names:
+        spec = ENDPOINTS[name]
+        job_config = spec.job_config(start_date, end_date) if spec.job_config else None
+        started = time.perf_counter()
+        base_rows = list(client.query(spec.query(start_date, end_date), job_config=job_config).result())
+        query_seconds = time.perf_counter() - started
+        response_field = _response_field(spec.path, spec.method)
+
+        print(f"\n📊 {name}: {len(base_rows)} linhas base do banco falso ({query_seconds * 1000:.1f}ms)")
+        results[name] = {'base_rows': len(base_rows), 'fake_query_ms': round(query_seconds * 1000, 3), 'sizes': {}}
+
+        if not base_rows:
+            print("   ⚠️ Nenhuma linha retornada, endpoint ignorado")
+            continue
+
+        for size in sizes:
+            rows = _synthetic_rows(base_rows, size)
+            timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+            sizes_info: Dict[str, int] = {}
+            for _ in range(repeat):
+                sizes_info = _run_pipeline(spec, rows, response_field, timings)
+            peak_memory = _measure_peak_memory(spec, rows, response_field)
+
+            stage_stats = {stage: _stats(values) for stage, values in timings.items()}
+            total_ms = round(sum(stat['median_ms'] for stat in stage_stats.values()), 3)
+            results[name]['sizes'][str(size)] = {
+                'stages': stage_stats,
+                'total_ms': total_ms,
+                'peak_memory_mb': round(peak_memory / (1024 * 1024), 3),
+                **sizes_info,
+            }
+
+            breakdown = ' | '.join(f"{stage} {stage_stats[stage]['median_ms']:.1f}" for stage in STAGES)
+            print(f"   {size:>7} linhas: total {total_ms:8.1f}ms | pico {peak_memory / (1024 * 1024):7.1f}MB | {breakdown}")
+
+    return results
+
+
+def bench_fast_path(client: FakeBigQueryClient, names: List[str], sizes: List[int], repeat: int, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Compara, da construção da resposta até o JSON, o caminho padrão do FastAPI
+    (modelo validado, revalidação, serialização, JSONResponse) com trusted_response
+    codificada direto pela FastJSONResponse, e confere que os dois JSONs são iguais"""
+    results: Dict[str, Any] = {}
+
+    print(f"\n⚡ Caminho rápido (trusted_response + {'orjson' if orjson else 'json'}) x caminho padrão")
+    for name in names:
+        spec = ENDPOINTS[name]
+        if not spec.trusted:
+            continue
+        job_config = spec.job_config(start_date, end_date) if spec.job_config else None
+        base_rows = list(client.query(spec.query(start_date, end_date), job_config=job_config).result())
+        if not base_rows:
+            continue
+        response_field = _response_field(spec.path, spec.method)
+        results[name] = {}
+
+        for size in sizes:
+            data = spec.convert(_synthetic_rows(base_rows, size))
+            summary = spec.summarize(data)
+            rows_dicts = rows_to_dicts(data)
+            standard: List[float] = []
+            trusted: List[float] = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                standard_body = _encode_response(response_field, spec.respond(rows_dicts, summary, _validated))
+                standard.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                trusted_body = _encode_response(response_field, spec.respond(rows_dicts, summary, trusted_response))
+                trusted.append(time.perf_counter() - started)
+
+            # cached_at muda entre as chamadas; o resto do conteúdo tem que ser igual
+            standard_content, trusted_content = json.loads(standard_body), json.loads(trusted_body)
+            for content in (standard_content, trusted_content):
+                (content.get('cache_info') or {}).pop('cached_at', None)
+            standard_ms = statistics.median(standard) * 1000
+            trusted_ms = statistics.median(trusted) * 1000
+            results[name][str(size)] = {
+                'standard_ms': round(standard_ms, 3),
+                'trusted_ms': round(trusted_ms, 3),
+                'saved_ms': round(standard_ms - trusted_ms, 3),
+                'speedup': round(standard_ms / trusted_ms, 2) if trusted_ms else None,
+                'standard_bytes': len(standard_body),
+                'trusted_bytes': len(trusted_body),
+                'same_content': standard_content == trusted_content,
+            }
+            marker = '' if standard_content == trusted_content else ' ❌ conteúdo diferente'
+            print(f"   {name:<24} {size:>7} linhas: padrão {standard_ms:8.1f}ms | rápido {trusted_ms:8.1f}ms | "
+                  f"economia {standard_ms - trusted_ms:8.1f}ms ({standard_ms / trusted_ms if trusted_ms else 0:.1f}x){marker}")
+
+    return results
+
+
+def _columnar_response(spec: EndpointSpec, data: list, summary: Any) -> Any:
+    """Resposta com format=columnar: as mesmas linhas da página, um array por coluna"""
+    # trusted_response não valida: `data` recebe as linhas compactas da página e vira colunas
+    response = spec.respond(data, summary, trusted_response)
+    response['data'] = metrics._page_data(response['data'], type(data[0]), 'columnar')
+    return response
+
+
+def bench_columnar(client: FakeBigQueryClient, names: List[str], sizes: List[int], repeat: int, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Compara a página em objetos por linha (`format=rows`) com `format=columnar`:
+    tempo da montagem dos dados até o JSON, bytes do JSON e bytes com gzip"""
+    results: Dict[str, Any] = {}
+
+    print("\n🧱 Formato colunar x objetos por linha")
+    for name in names:
+        if name not in COLUMNAR_ENDPOINTS:
+            continue
+        spec = ENDPOINTS[name]
+        job_config = spec.job_config(start_date, end_date) if spec.job_config else None
+        base_rows = list(client.query(spec.query(start_date, end_date), job_config=job_config).result())
+        if not base_rows:
+            continue
+        results[name] = {}
+
+        for size in sizes:
+            data = spec.convert(_synthetic_rows(base_rows, size))
+            summary = spec.summarize(data)
+            rows_timings: List[float] = []
+            columnar_timings: List[float] = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows_body = spec.respond(rows_to_dicts(data), summary, trusted_response).response().body
+                rows_timings.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                columnar_body = _columnar_response(spec, data, summary).response().body
+                columnar_timings.append(time.perf_counter() - started)
+
+            rows_ms = statistics.median(rows_timings) * 1000
+            columnar_ms = statistics.median(columnar_timings) * 1000
+            results[name][str(size)] = {
+                'rows_ms': round(rows_ms, 3),
+                'columnar_ms': round(columnar_ms, 3),
+                'rows_bytes': len(rows_body),
+                'columnar_bytes': len(columnar_body),
+                'rows_gzip_bytes': len(_gzip(rows_body)),
+                'columnar_gzip_bytes': len(_gzip(columnar_body)),
+            }
+            result = results[name][str(size)]
+            print(f"   {name:<24} {size:>7} linhas: linhas {rows_ms:8.1f}ms {len(rows_body) / 1e6:7.2f}MB | "
+                  f"colunar {columnar_ms:8.1f}ms {len(columnar_body) / 1e6:7.2f}MB | "
+                  f"gzip {result['rows_gzip_bytes'] / 1e6:.2f}MB -> {result['columnar_gzip_bytes'] / 1e6:.2f}MB")
+
+    return results
+
+
+async def bench_end_to_end(names: List[str], repeat: int, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Executa os handlers em processo (cache frio e quente) contra o banco falso"""
+    token = TokenData(email=ADMIN_EMAIL)
+    results: Dict[str, Any] = {}
+
+    print("\n🔁 Ponta a ponta (handlers em processo)")
+    for name in names:
+        spec = ENDPOINTS[name]
+        response_field = _response_field(spec.path, spec.method)
+        cold: List[float] = []
+        warm: List[float] = []
+
+        for _ in range(repeat):
+            for cache in _all_caches():
+                cache.flush()
+            for bucket in (cold, warm):
+                started = time.perf_counter()
+                response = await spec.handler(spec.request(start_date, end_date), token)
+                _encode_response(response_field, response)
+                bucket.append(time.perf_counter() - started)
+
+        results[name] = {'cold': _stats(cold), 'warm': _stats(warm)}
+        print(f"   {name:<24} frio {results[name]['cold']['median_ms']:8.1f}ms | quente {results[name]['warm']['median_ms']:8.1f}ms")
+
+    return results
+
+
+def _all_caches():
+    return [value for value in vars(cache_manager).values() if isinstance(value, cache_manager.CacheManager)]
+
+
+def compare_with_baseline(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """Imprime a variação de cada etapa em relação ao baseline e retorna o número de regressões"""
+    regressions = 0
+    print(f"\n📈 Comparação com baseline ({baseline.get('metadata', {}).get('timestamp', '?')})")
+
+    for name, endpoint in current.get('stages', {}).items():
+        base_endpoint = baseline.get('stages', {}).get(name)
+        if not base_endpoint:
+            continue
+        for size, result in endpoint['sizes'].items():
+            base_result = base_endpoint['sizes'].get(size)
+            if not base_result:
+                continue
+            changes = []
+            for metric, value, base_value in [('total', result['total_ms'], base_result['total_ms']),
+                                              ('pico_mb', result['peak_memory_mb'], base_result['peak_memory_mb'])] + [
+                (stage, result['stages'][stage]['median_ms'], base_result['stages'].get(stage, {}).get('median_ms'))
+                for stage in STAGES
+            ]:
+                if not base_value:
+                    continue
+                delta = (value - base_value) / base_value * 100
+                marker = ''
+                if delta > threshold and metric in ('total', 'pico_mb'):
+                    marker = ' ❌'
+                    regressions += 1
+                changes.append(f"{metric} {delta:+.0f}%{marker}")
+            print(f"   {name} [{size}]: " + ', '.join(changes))
+
+    if regressions:
+        print(f"\n❌ {regressions} regressões acima de {threshold:.0f}%")
+    else:
+        print(f"\n✅ Nenhuma regressão acima de {threshold:.0f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline dos endpoints de métricas")
+    parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3, help="Repetições por etapa (usa a mediana)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Escala dos dados do banco falso")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="JSON de uma execução anterior para comparação")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Variação percentual considerada regressão")
+    parser.add_argument('--fast-sizes', nargs='+', type=int, default=FAST_PATH_SIZES,
+                        help="Tamanhos da comparação caminho rápido x padrão")
+    parser.add_argument('--skip-e2e', action='store_true', help="Não executar os handlers de ponta a ponta")
+    args = parser.parse_args()
+
+    client = FakeBigQueryClient(scale=args.scale)
+    set_bigquery_client(client)
+
+    # Não sobrescrever o last_requests.json do projeto durante o benchmark
+    metrics.last_request_manager.storage_file = os.path.join(tempfile.gettempdir(), 'benchmark_last_requests.json')
+
+    end_date = date.today().isoformat()
+    start_date = (date.today() - timedelta(days=client.days)).isoformat()
+
+    results = {
+        'metadata': {
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sizes': args.sizes,
+            'repeat': args.repeat,
+            'scale': args.scale,
+            'gzip_level': GZIP_LEVEL,
+        },
+        'stages': bench_stages(client, args.endpoints, args.sizes, args.repeat, start_date, end_date),
+        'fast_path': bench_fast_path(client, args.endpoints, args.fast_sizes, args.repeat, start_date, end_date),
+        'columnar': bench_columnar(client, args.endpoints, args.fast_sizes, args.repeat, start_date, end_date),
+    }
+
+    if not args.skip_e2e:
+        results['end_to_end'] = asyncio.run(bench_end_to_end(args.endpoints, args.repeat, start_date, end_date))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados salvos em {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_with_baseline(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
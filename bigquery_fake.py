@@ -0,0 +1,674 @@
+"""
+Cliente BigQuery falso baseado em DuckDB para testes e benchmarks offline
+
+Substitui o retorno de `get_bigquery_client()` por um cliente que executa o SQL
+gerado pelos endpoints (após tradução do dialeto BigQuery) contra um banco DuckDB
+local populado com tabelas sintéticas (`*_events_long`, `*_orders_sessions`,
+`*_ads_campaigns_results`, `*_leads_orders_`, `dbt_config.users`, ...).
+
+Uso rápido:
+
+    from bigquery_fake import FakeBigQueryClient
+    from utils import set_bigquery_client
+
+    set_bigquery_client(FakeBigQueryClient(scale=0.5, latency_ms=200))
+
+Ou via variáveis de ambiente (lidas por `utils.get_bigquery_client`):
+
+    BIGQUERY_BACKEND=duckdb
+    FAKE_BIGQUERY_SCALE=1.0         # multiplicador do volume de dados sintéticos
+    FAKE_BIGQUERY_DAYS=60           # dias de histórico gerados (terminando hoje)
+    FAKE_BIGQUERY_LATENCY_MS=0      # latência fixa injetada em cada query
+    FAKE_BIGQUERY_JITTER_MS=0       # variação aleatória adicional da latência
+    FAKE_BIGQUERY_DB=:memory:       # caminho do arquivo DuckDB (opcional)
+    FAKE_BIGQUERY_TENANTS=a,b       # clientes extras além dos padrão (opcional)
+
+Requer o pacote `duckdb` (não faz parte do requirements.txt de produção).
+"""
+
+import os
+import re
+import time
+import random
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from google.cloud.bigquery.table import Row
+
+DEFAULT_PROJECT = 'mymetric-hub-shopify'
+DEFAULT_TIMEZONE = 'America/Sao_Paulo'
+
+# Clientes sintéticos padrão e o projeto onde suas tabelas ficam
+DEFAULT_TENANTS = {
+    'constance': 'mymetric-hub-shopify',
+    'coffeemais': 'mymetric-hub-shopify',
+    'havaianas': 'bq-mktbr',
+}
+
+
+def tenants_with(names) -> Dict[str, str]:
+    """Clientes padrão acrescidos de `names`, no mesmo projeto que get_project_name usaria"""
+    tenants = dict(DEFAULT_TENANTS)
+    for name in names:
+        if name and name != 'all' and name not in tenants:
+            tenants[name] = 'bq-mktbr' if name == 'havaianas' else DEFAULT_PROJECT
+    return tenants
+
+# Volume base de linhas por tabela (multiplicado por `scale`)
+BASE_ROW_COUNTS = {
+    'events_long': 50000,
+    'orders_sessions': 5000,
+    'ads_campaigns_results': 3000,
+    'ads_creatives_results': 5000,
+    'purchases_items_sessions_realtime': 2000,
+    'orders_dedup': 5000,
+    'leads_orders_': 5000,
+    'shipping_calc_analytics': 10000,
+    'experiment_impressions_results': 20000,
+    'item_scoring': 5000,
+    'product_trend': 500,
+}
+
+# Senha padrão dos usuários sintéticos ("senha123" em base64, igual ao hash_password do main)
+DEFAULT_PASSWORD_HASH = 'c2VuaGExMjM='
+ADMIN_EMAIL = 'admin@mymetric.com.br'
+
+_BACKTICK_RE = re.compile(r'`([^`]+)`')
+_CURRENT_DATE_RE = re.compile(r'current_date\s*\(\s*(?:"([^"]*)"|\'([^\']*)\')?\s*\)', re.IGNORECASE)
+_CURRENT_TIMESTAMP_RE = re.compile(r'current_timestamp\s*\(\s*\)', re.IGNORECASE)
+_MERGE_RE = re.compile(r'^(\s*)MERGE\s+(?!INTO\b)', re.IGNORECASE)
+_PARAM_RE = re.compile(r'@([A-Za-z_][A-Za-z0-9_]*)')
+# Palavras-chave do DuckDB que não podem ser usadas como alias implícito (sem AS)
+_IMPLICIT_ALIAS_RE = re.compile(r'\)\s+(cost)\b', re.IGNORECASE)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _today(timezone: str = DEFAULT_TIMEZONE) -> date:
+    return datetime.now(ZoneInfo(timezone)).date()
+
+
+def translate_sql(query: str, default_project: str = DEFAULT_PROJECT) -> str:
+    """Traduz o SQL no dialeto BigQuery usado pela API para o dialeto DuckDB"""
+
+    def _translate_code(code: str) -> str:
+        def _identifier(match):
+            parts = match.group(1).split('.')
+            if len(parts) >= 3 and parts[-2].upper() == 'INFORMATION_SCHEMA':
+                # `projeto.dataset.INFORMATION_SCHEMA.COLUMNS` -> visão filtrada do information_schema
+                project = parts[0] if len(parts) == 4 else default_project
+                dataset = parts[-3]
+                view = parts[-1].lower()
+                return (
+                    f"(SELECT * FROM information_schema.{view} "
+                    f"WHERE table_catalog = '{project}' AND table_schema = '{dataset}')"
+                )
+            if len(parts) == 3:
+                return '.'.join(_quote(part) for part in parts)
+            if len(parts) == 2:
+                return '.'.join(_quote(part) for part in [default_project] + parts)
+            return _quote(parts[0])
+
+        code = _BACKTICK_RE.sub(_identifier, code)
+
+        def _current_date(match):
+            timezone = match.group(1) or match.group(2) or 'UTC'
+            return f"DATE '{_today(timezone).isoformat()}'"
+
+        code = _CURRENT_DATE_RE.sub(_current_date, code)
+        code = _CURRENT_TIMESTAMP_RE.sub('current_localtimestamp()', code)
+        code = _PARAM_RE.sub(r'$\1', code)
+        code = _IMPLICIT_ALIAS_RE.sub(r') AS \1', code)
+        return code
+
+    # Traduzir apenas fora de literais de string ('...')
+    pieces = re.split(r"('(?:[^'\\]|\\.|'')*')", query)
+    translated = ''.join(
+        piece if index % 2 == 1 else _translate_code(piece)
+        for index, piece in enumerate(pieces)
+    )
+    return _MERGE_RE.sub(r'\1MERGE INTO ', translated)
+
+
+def _job_config_parameters(job_config) -> Dict[str, Any]:
+    """Extrai os parâmetros nomeados de um QueryJobConfig"""
+    if job_config is None:
+        return {}
+    parameters = {}
+    for parameter in getattr(job_config, 'query_parameters', None) or []:
+        parameters[parameter.name] = parameter.value
+    return parameters
+
+
+class FakeRowIterator:
+    """Iterador de linhas compatível com o RowIterator do BigQuery"""
+
+    def __init__(self, rows: List[Row]):
+        self._rows = rows
+        self._iter = iter(rows)
+        self.total_rows = len(rows)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Row:
+        return next(self._iter)
+
+
+class FakeQueryJob:
+    """Job de query já executado, com latência aplicada em `result()`"""
+
+    def __init__(self, client: 'FakeBigQueryClient', rows: List[Row], latency_seconds: float):
+        self._client = client
+        self._rows = rows
+        self._latency_seconds = latency_seconds
+        self._done = False
+
+    def result(self, *args, **kwargs) -> FakeRowIterator:
+        if not self._done:
+            if self._latency_seconds > 0:
+                time.sleep(self._latency_seconds)
+            self._done = True
+        return FakeRowIterator(self._rows)
+
+    def done(self) -> bool:
+        return self._done
+
+
+class FakeBigQueryClient:
+    """Cliente compatível com `bigquery.Client.query()` executando em DuckDB"""
+
+    def __init__(
+        self,
+        scale: float = 1.0,
+        days: int = 60,
+        tenants: Optional[Dict[str, str]] = None,
+        row_counts: Optional[Dict[str, int]] = None,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        database: str = ':memory:',
+        seed: bool = True,
+        default_project: str = DEFAULT_PROJECT,
+    ):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("O cliente BigQuery falso requer o pacote 'duckdb' (pip install duckdb)") from e
+
+        self.project = default_project
+        self.scale = scale
+        self.days = days
+        self.tenants = dict(tenants or DEFAULT_TENANTS)
+        self.row_counts = {
+            table: max(int(count * scale), 1) for table, count in BASE_ROW_COUNTS.items()
+        }
+        self.row_counts.update(row_counts or {})
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.query_log: List[Dict[str, Any]] = []
+        self._log_lock = threading.Lock()
+        self._random = random.Random(42)
+        self._conn = duckdb.connect(database)
+
+        for project in sorted(set(self.tenants.values()) | {default_project}):
+            self._ensure_catalog(project)
+
+        if seed:
+            self.seed()
+
+    @classmethod
+    def from_env(cls) -> 'FakeBigQueryClient':
+        """Cria o cliente a partir das variáveis FAKE_BIGQUERY_*"""
+        return cls(
+            scale=float(os.getenv('FAKE_BIGQUERY_SCALE', '1.0')),
+            days=int(os.getenv('FAKE_BIGQUERY_DAYS', '60')),
+            latency_ms=float(os.getenv('FAKE_BIGQUERY_LATENCY_MS', '0')),
+            jitter_ms=float(os.getenv('FAKE_BIGQUERY_JITTER_MS', '0')),
+            database=os.getenv('FAKE_BIGQUERY_DB', ':memory:'),
+            tenants=tenants_with(os.getenv('FAKE_BIGQUERY_TENANTS', '').split(',')),
+        )
+
+    # ------------------------------------------------------------------
+    # API compatível com bigquery.Client
+    # ------------------------------------------------------------------
+    def query(self, query: str, job_config=None, *args, **kwargs) -> FakeQueryJob:
+        """Executa a query traduzida no DuckDB e retorna um job já concluído"""
+        if job_config is None and args:
+            job_config = args[0]
+
+        sql = translate_sql(query, self.project)
+        parameters = _job_config_parameters(job_config)
+
+        started = time.perf_counter()
+        cursor = self._conn.cursor()
+        try:
+            if parameters:
+                cursor.execute(sql, parameters)
+            else:
+                cursor.execute(sql)
+            if cursor.description:
+                field_to_index = {column[0]: index for index, column in enumerate(cursor.description)}
+                rows = [Row(values, field_to_index) for values in cursor.fetchall()]
+            else:
+                rows = []
+        finally:
+            cursor.close()
+        elapsed = time.perf_counter() - started
+
+        latency_seconds = self._next_latency_seconds()
+        with self._log_lock:
+            self.query_log.append({
+                'query': query,
+                'parameters': parameters,
+                'rows': len(rows),
+                'execution_seconds': elapsed,
+                'latency_seconds': latency_seconds,
+                'timestamp': datetime.now().isoformat(),
+            })
+
+        return FakeQueryJob(self, rows, latency_seconds)
+
+    # ------------------------------------------------------------------
+    # Utilitários para testes e benchmarks
+    # ------------------------------------------------------------------
+    @property
+    def query_count(self) -> int:
+        return len(self.query_log)
+
+    def reset_query_log(self) -> None:
+        with self._log_lock:
+            self.query_log.clear()
+
+    def set_latency(self, latency_ms: float, jitter_ms: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def execute(self, sql: str, parameters: Optional[Dict[str, Any]] = None):
+        """Executa SQL DuckDB nativo (sem tradução) no banco sintético"""
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(sql, parameters or {})
+            return cursor.fetchall() if cursor.description else []
+        finally:
+            cursor.close()
+
+    def add_user(self, email: str, tablename: str = 'all', admin: bool = False, access_control: str = 'full') -> None:
+        """Adiciona (ou substitui) um usuário na tabela dbt_config.users"""
+        users = f'{_quote(self.project)}.dbt_config.users'
+        self.execute(f'DELETE FROM {users} WHERE email = $email', {'email': email})
+        self.execute(
+            f'INSERT INTO {users} VALUES ($email, $admin, $access_control, $tablename, $password)',
+            {
+                'email': email,
+                'admin': admin,
+                'access_control': access_control,
+                'tablename': tablename,
+                'password': DEFAULT_PASSWORD_HASH,
+            },
+        )
+
+    def _next_latency_seconds(self) -> float:
+        latency = self.latency_ms
+        if self.jitter_ms:
+            latency += self._random.uniform(0, self.jitter_ms)
+        return max(latency, 0.0) / 1000
+
+    def _ensure_catalog(self, project: str) -> None:
+        catalogs = {row[0] for row in self._conn.execute('SELECT database_name FROM duckdb_databases()').fetchall()}
+        if project not in catalogs:
+            self._conn.execute(f"ATTACH ':memory:' AS {_quote(project)}")
+        for dataset in ('dbt_config', 'dbt_join', 'dbt_aggregated', 'dbt_granular'):
+            self._conn.execute(f'CREATE SCHEMA IF NOT EXISTS {_quote(project)}.{dataset}')
+
+    # ------------------------------------------------------------------
+    # Geração de dados sintéticos
+    # ------------------------------------------------------------------
+    def seed(self) -> None:
+        """Cria e popula todas as tabelas sintéticas"""
+        started = time.perf_counter()
+        self._seed_config_tables()
+        for tenant, project in self.tenants.items():
+            self._seed_tenant(tenant, project)
+        print(
+            f"🦆 BigQuery falso populado: {len(self.tenants)} clientes, {self.days} dias, "
+            f"escala {self.scale} ({time.perf_counter() - started:.2f}s)"
+        )
+
+    def _seed_config_tables(self) -> None:
+        config = f'{_quote(self.project)}.dbt_config'
+        self._conn.execute(f"""
+            CREATE OR REPLACE TABLE {config}.users (
+                email VARCHAR, admin BOOLEAN, access_control VARCHAR, tablename VARCHAR, password VARCHAR
+            )
+        """)
+        self._conn.execute(f"""
+            CREATE OR REPLACE TABLE {config}.user_goals (
+                username VARCHAR, goals VARCHAR, created_at TIMESTAMP, updated_at TIMESTAMP
+            )
+        """)
+        self._conn.execute(f"""
+            CREATE OR REPLACE TABLE {config}.traffic_categories (
+                tablename VARCHAR, category_name VARCHAR, description VARCHAR, rules VARCHAR, created_at TIMESTAMP
+            )
+        """)
+
+        self.add_user(ADMIN_EMAIL, tablename='all', admin=True, access_control='full')
+        for tenant in self.tenants:
+            self.add_user(f'user@{tenant}.com.br', tablename=tenant, admin=False, access_control='read')
+            self._conn.execute(
+                f"INSERT INTO {config}.user_goals VALUES ($username, $goals, current_localtimestamp(), current_localtimestamp())",
+                {
+                    'username': tenant,
+                    'goals': '{"metas_mensais": {"%s": {"meta_receita_paga": 150000.0, "meta_pedidos": 1200}}}'
+                             % _today().strftime('%Y-%m'),
+                },
+            )
+
+    def _seed_tenant(self, tenant: str, project: str) -> None:
+        today = _today()
+        days = max(self.days, 1)
+        first_day = today - timedelta(days=days - 1)
+        ctx = {
+            'project': _quote(project),
+            'tenant': tenant,
+            'days': days,
+            'first_day': first_day.isoformat(),
+        }
+
+        def rows(table: str) -> int:
+            return self.row_counts.get(table, 1000)
+
+        def table(dataset: str, suffix: str) -> str:
+            return f'{ctx["project"]}.{dataset}.{_quote(tenant + "_" + suffix)}'
+
+        day_expr = f"(DATE '{ctx['first_day']}' + CAST(hash(i, 'day') % {days} AS INTEGER))"
+        ts_expr = (
+            f"(CAST({day_expr} AS TIMESTAMP) + to_seconds(CAST(hash(i, 'sec') % 86400 AS BIGINT)))"
+        )
+
+        def pick(salt: str, values: List[str]) -> str:
+            literal = '[' + ', '.join("'" + value.replace("'", "''") + "'" for value in values) + ']'
+            return f"{literal}[1 + CAST(hash(i, '{salt}') % {len(values)} AS INTEGER)]"
+
+        def rand(salt: str, modulo: int) -> str:
+            return f"CAST(hash(i, '{salt}') % {modulo} AS BIGINT)"
+
+        sources = ['google', 'facebook', 'instagram', 'direct', 'email', 'tiktok', 'bing', 'criteo']
+        mediums = ['cpc', 'organic', 'social', 'email', 'referral', '(none)', 'display']
+        clusters = ['Google Ads', 'Meta Ads', 'Orgânico', 'Direto', 'E-mail', 'Afiliados', 'Sem Categoria']
+        platforms = ['web', 'ios', 'android']
+        regions = ['SP', 'RJ', 'MG', 'RS', 'PR', 'BA', 'SC']
+        cities = ['São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Porto Alegre', 'Curitiba', 'Salvador', 'Florianópolis', 'Campinas']
+        statuses = ['paid', 'paid', 'paid', 'authorized', 'pending', 'refunded', 'cancelled']
+        channels = ['web', 'pos', 'app', 'marketplace']
+        order_types = ['one-time', 'one-time', 'one-time', 'first annual subscription', 'first montly subscription',
+                       'recurring annual subscription', 'recurring montly subscription']
+        event_names = ['session'] * 10 + ['add_to_cart'] * 3 + ['paid_media'] * 2 + ['lead', 'purchase', 'purchase',
+                                                                                     'fs_purchase', 'purchase_subscription']
+        categories = ['Sandálias', 'Chinelos', 'Tênis', 'Acessórios', 'Roupas', 'Cafés', 'Cápsulas', 'Kits']
+
+        campaign = f"'campanha_' || {rand('campaign', 60)}"
+        page = f"'https://loja.{tenant}.com.br/' || {pick('path', ['produtos', 'colecao', 'promo', 'blog', 'home'])} || '/' || {rand('page', 400)}"
+        content = f"'criativo_' || {rand('content', 40)}"
+
+        def attribution_columns(prefix: str, salt: str) -> str:
+            return f"""
+                {pick(salt + 'cluster', clusters)} AS {prefix}traffic_category,
+                {pick(salt + 'source', sources)} AS {prefix}source,
+                {pick(salt + 'medium', mediums)} AS {prefix}medium,
+                'campanha_' || {rand(salt + 'campaign', 60)} AS {prefix}campaign,
+                'criativo_' || {rand(salt + 'content', 40)} AS {prefix}content,
+                'https://loja.{tenant}.com.br/p/' || {rand(salt + 'page', 400)} AS {prefix}page_location,
+                'utm_source=' || {pick(salt + 'source', sources)} AS {prefix}page_params"""
+
+        statements = [
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'events_long')} AS
+            SELECT
+                {day_expr} AS event_date,
+                {ts_expr} AS created_at,
+                {pick('event', event_names)} AS event_name,
+                {pick('cluster', clusters)} AS traffic_category,
+                {pick('platform', platforms)} AS platform,
+                {pick('city', cities)} AS city,
+                {pick('region', regions)} AS region,
+                'BR' AS country,
+                CASE WHEN hash(i, 'nullsrc') % 20 = 0 THEN NULL ELSE {pick('source', sources)} END AS source,
+                {pick('medium', mediums)} AS medium,
+                {campaign} AS campaign,
+                {page} AS page_location,
+                {content} AS content,
+                CASE WHEN hash(i, 'coupon') % 8 = 0 THEN 'CUPOM' || {rand('coupon_code', 15)} ELSE NULL END AS discount_code,
+                round(20 + (hash(i, 'value') % 50000) / 100.0, 2) AS value,
+                {rand('clicks', 50)} AS clicks,
+                'T' || CAST(i AS VARCHAR) AS transaction_id,
+                {pick('status', statuses)} AS status,
+                round((hash(i, 'discount') % 2000) / 100.0, 2) AS total_discounts,
+                round((hash(i, 'shipping') % 3000) / 100.0, 2) AS shipping_value,
+                1 + {rand('transaction_no', 4)} AS transaction_no,
+                {pick('order_type', order_types)} AS order_type
+            FROM range({rows('events_long')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_aggregated', 'daily_metrics')} AS
+            SELECT
+                DATE '{ctx['first_day']}' + CAST(i AS INTEGER) AS event_date,
+                5000 + {rand('view', 5000)} AS view_item,
+                800 + {rand('cart', 800)} AS add_to_cart,
+                300 + {rand('checkout', 300)} AS begin_checkout,
+                200 + {rand('shipping', 200)} AS add_shipping_info,
+                150 + {rand('payment', 150)} AS add_payment_info,
+                80 + {rand('purchase', 120)} AS purchase
+            FROM range({days}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'orders_sessions')} AS
+            SELECT
+                {ts_expr} AS created_at,
+                'P' || CAST(100000 + i AS VARCHAR) AS transaction_id,
+                {pick('first_name', ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Hugo'])} AS first_name,
+                {pick('status', statuses)} AS status,
+                round(40 + (hash(i, 'value') % 60000) / 100.0, 2) AS value,
+                {pick('channel', channels)} AS source_name,
+                {attribution_columns('', 'ls')},
+                {attribution_columns('fs_', 'fs')},
+                {attribution_columns('fsm_', 'fsm')}
+            FROM range({rows('orders_sessions')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'ads_campaigns_results')} AS
+            SELECT
+                {pick('platform', ['google_ads', 'meta_ads', 'tiktok_ads'])} AS platform,
+                'campanha_' || {rand('campaign', max(rows('ads_campaigns_results') // max(days, 1), 1))} AS campaign_name,
+                {day_expr} AS date,
+                round((hash(i, 'cost') % 100000) / 100.0, 2) AS cost,
+                {rand('impressions', 50000)} AS impressions,
+                {rand('clicks', 2000)} AS clicks,
+                {rand('leads', 50)} AS leads,
+                {rand('transactions', 30)} AS transactions,
+                round((hash(i, 'revenue') % 500000) / 100.0, 2) AS revenue,
+                {rand('pixel_transactions', 30)} AS pixel_transactions,
+                round((hash(i, 'pixel_revenue') % 500000) / 100.0, 2) AS pixel_revenue,
+                {rand('first_transaction', 20)} AS first_transaction,
+                round((hash(i, 'first_revenue') % 300000) / 100.0, 2) AS first_revenue,
+                {rand('fsm_transactions', 20)} AS fsm_transactions,
+                round((hash(i, 'fsm_revenue') % 300000) / 100.0, 2) AS fsm_revenue,
+                {rand('fsm_first_transaction', 10)} AS fsm_first_transaction,
+                round((hash(i, 'fsm_first_revenue') % 200000) / 100.0, 2) AS fsm_first_revenue,
+                {rand('s1', 5)} AS first_montly_subscriptions,
+                {rand('s2', 3)} AS first_annual_subscriptions,
+                {rand('s3', 8)} AS recurring_montly_subscriptions,
+                {rand('s4', 2)} AS recurring_annual_subscriptions,
+                round((hash(i, 'r1') % 50000) / 100.0, 2) AS first_montly_revenue,
+                round((hash(i, 'r2') % 90000) / 100.0, 2) AS first_annual_revenue,
+                round((hash(i, 'r3') % 70000) / 100.0, 2) AS recurring_montly_revenue,
+                round((hash(i, 'r4') % 90000) / 100.0, 2) AS recurring_annual_revenue,
+                {rand('fs1', 5)} AS fsm_first_montly_subscriptions,
+                {rand('fs2', 3)} AS fsm_first_annual_subscriptions,
+                {rand('fs3', 8)} AS fsm_recurring_montly_subscriptions,
+                {rand('fs4', 2)} AS fsm_recurring_annual_subscriptions,
+                round((hash(i, 'fr1') % 50000) / 100.0, 2) AS fsm_first_montly_revenue,
+                round((hash(i, 'fr2') % 90000) / 100.0, 2) AS fsm_first_annual_revenue,
+                round((hash(i, 'fr3') % 70000) / 100.0, 2) AS fsm_recurring_montly_revenue,
+                round((hash(i, 'fr4') % 90000) / 100.0, 2) AS fsm_recurring_annual_revenue
+            FROM range({rows('ads_campaigns_results')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'ads_creatives_results')} AS
+            SELECT
+                {pick('platform', ['google_ads', 'meta_ads', 'tiktok_ads'])} AS platform,
+                'campanha_' || {rand('campaign', 60)} AS campaign_name,
+                1000 + {rand('adset', 300)} AS adset_id,
+                'conjunto_' || {rand('adset', 300)} AS adset_name,
+                50000 + i AS ad_id,
+                'anuncio_' || CAST(i AS VARCHAR) AS ad_name,
+                {day_expr} AS date,
+                round((hash(i, 'cost') % 50000) / 100.0, 2) AS cost,
+                {rand('impressions', 20000)} AS impressions,
+                {rand('clicks', 800)} AS clicks,
+                {rand('leads', 20)} AS leads,
+                {rand('transactions', 10)} AS transactions,
+                round((hash(i, 'revenue') % 200000) / 100.0, 2) AS revenue,
+                {rand('first_transaction', 8)} AS first_transaction,
+                round((hash(i, 'first_revenue') % 100000) / 100.0, 2) AS first_revenue,
+                {rand('fsm_transactions', 8)} AS fsm_transactions,
+                round((hash(i, 'fsm_revenue') % 100000) / 100.0, 2) AS fsm_revenue,
+                {rand('fsm_first_transaction', 4)} AS fsm_first_transaction,
+                round((hash(i, 'fsm_first_revenue') % 80000) / 100.0, 2) AS fsm_first_revenue
+            FROM range({rows('ads_creatives_results')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'purchases_items_sessions_realtime')} AS
+            SELECT
+                current_localtimestamp() - to_seconds(CAST(hash(i, 'age') % 86400 AS BIGINT)) AS event_timestamp,
+                CAST(1700000000 + {rand('session', 100000)} AS VARCHAR) AS ga_session_id,
+                'u' || CAST({rand('user', 50000)} AS VARCHAR) AS user_pseudo_id,
+                'R' || CAST(i // 3 AS VARCHAR) AS transaction_id,
+                {pick('category', categories)} AS item_category,
+                'Produto ' || CAST({rand('item', 300)} AS VARCHAR) AS item_name,
+                1 + {rand('quantity', 3)} AS quantity,
+                round(20 + (hash(i, 'revenue') % 30000) / 100.0, 2) AS item_revenue,
+                {pick('source', sources)} AS source,
+                {pick('medium', mediums)} AS medium,
+                {campaign} AS campaign,
+                {content} AS content,
+                'termo_' || CAST({rand('term', 30)} AS VARCHAR) AS term,
+                {page} AS page_location,
+                {pick('cluster', clusters)} AS traffic_category
+            FROM range({rows('purchases_items_sessions_realtime')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_granular', 'orders_dedup')} AS
+            SELECT
+                {ts_expr} AS created_at,
+                'P' || CAST(100000 + i AS VARCHAR) AS transaction_id,
+                round(40 + (hash(i, 'value') % 60000) / 100.0, 2) AS value,
+                {pick('status', statuses)} AS status
+            FROM range({rows('orders_dedup')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'leads_orders_')} AS
+            SELECT
+                CASE WHEN hash(i, 'has_lead') % 6 = 0 THEN NULL ELSE {ts_expr} END AS subscribe_timestamp,
+                {pick('name', ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe'])} || ' ' || CAST(i AS VARCHAR) AS name,
+                '+55119' || lpad(CAST({rand('phone', 100000000)} AS VARCHAR), 8, '0') AS phone,
+                'lead' || CAST({rand('email', rows('leads_orders_'))} AS VARCHAR) || '@exemplo.com.br' AS email,
+                {pick('fsm_source', sources)} AS fsm_source,
+                {pick('fsm_medium', mediums)} AS fsm_medium,
+                'campanha_' || {rand('fsm_campaign', 60)} AS fsm_campaign,
+                CASE WHEN hash(i, 'has_order') % 3 = 0 THEN 'P' || CAST(500000 + i AS VARCHAR) ELSE NULL END AS transaction_id,
+                CASE WHEN hash(i, 'has_order') % 3 = 0 THEN {ts_expr} + to_seconds(CAST(hash(i, 'delay') % 864000 AS BIGINT)) ELSE NULL END AS purchase_timestamp,
+                CASE WHEN hash(i, 'has_order') % 3 = 0 THEN round(40 + (hash(i, 'value') % 60000) / 100.0, 2) ELSE NULL END AS value,
+                {pick('source', sources)} AS source,
+                {pick('medium', mediums)} AS medium,
+                {campaign} AS campaign,
+                CASE WHEN hash(i, 'has_order') % 3 = 0 THEN {rand('delay_days', 10)} ELSE NULL END AS days_between_subscribe_and_purchase,
+                CASE WHEN hash(i, 'has_order') % 3 = 0 THEN {rand('delay_minutes', 14400)} ELSE NULL END AS minutes_between_subscribe_and_purchase
+            FROM range({rows('leads_orders_')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_aggregated', 'shipping_calc_analytics')} AS
+            SELECT
+                {day_expr} AS event_date,
+                lpad(CAST({rand('zipcode', 99999)} AS VARCHAR), 5, '0') || '-000' AS zipcode,
+                {pick('region', ['Sudeste', 'Sul', 'Nordeste', 'Norte', 'Centro-Oeste'])} AS zipcode_region,
+                'SKU' || CAST({rand('item', 800)} AS VARCHAR) AS item_id,
+                'Produto ' || CAST({rand('item', 800)} AS VARCHAR) AS item_name,
+                {pick('brand', ['Marca A', 'Marca B', 'Marca C'])} AS item_brand,
+                {pick('variant', ['P', 'M', 'G', '38', '40', '42'])} AS item_variant,
+                {pick('category', categories)} AS item_category,
+                1 + {rand('calculations', 40)} AS calculations,
+                {rand('unavailable', 3)} AS calculations_freight_unavailable,
+                {rand('transactions', 4)} AS transactions,
+                round((hash(i, 'revenue') % 80000) / 100.0, 2) AS revenue
+            FROM range({rows('shipping_calc_analytics')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_join', 'experiment_impressions_results')} AS
+            SELECT
+                {day_expr} AS event_date,
+                'exp_' || CAST({rand('experiment', 4)} AS VARCHAR) AS experiment_id,
+                'Experimento ' || CAST({rand('experiment', 4)} AS VARCHAR) AS experiment_name,
+                {pick('variant', ['control', 'variant_a', 'variant_b'])} AS experiment_variant,
+                {pick('category', ['checkout', 'pdp', 'home'])} AS category,
+                'u' || CAST({rand('user', rows('experiment_impressions_results') // 2 + 1)} AS VARCHAR) AS user_pseudo_id,
+                CAST(1700000000 + {rand('session', 1000)} AS VARCHAR) AS ga_session_id,
+                CASE WHEN hash(i, 'converted') % 25 = 0 THEN 1 ELSE 0 END AS transactions,
+                CASE WHEN hash(i, 'converted') % 25 = 0 THEN round(50 + (hash(i, 'revenue') % 40000) / 100.0, 2) ELSE 0 END AS revenue,
+                CASE WHEN hash(i, 'cart') % 6 = 0 THEN 1 ELSE 0 END AS add_to_cart,
+                CASE WHEN hash(i, 'checkout') % 10 = 0 THEN 1 ELSE 0 END AS begin_checkout,
+                CASE WHEN hash(i, 'shipping') % 14 = 0 THEN 1 ELSE 0 END AS add_shipping_info,
+                CASE WHEN hash(i, 'payment') % 18 = 0 THEN 1 ELSE 0 END AS add_payment_info
+            FROM range({rows('experiment_impressions_results')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_aggregated', 'item_scoring')} AS
+            SELECT
+                {day_expr} AS event_date,
+                'SKU' || CAST({rand('item', 800)} AS VARCHAR) AS item_id,
+                'Produto ' || CAST({rand('item', 800)} AS VARCHAR) AS item_name,
+                CAST({rand('elegible', 2)} AS BIGINT) AS elegible,
+                {rand('views', 5000)} AS item_views,
+                round((hash(i, 'size') % 1000) / 1000.0, 3) AS size_score,
+                round((hash(i, 'promo') % 1000) / 1000.0, 3) AS promo_label,
+                {rand('transactions', 40)} AS transactions,
+                round((hash(i, 'revenue') % 900000) / 100.0, 2) AS purchase_revenue
+            FROM range({rows('item_scoring')}) t(i)
+            """,
+            f"""
+            CREATE OR REPLACE TABLE {table('dbt_aggregated', 'product_trend')} AS
+            SELECT
+                'SKU' || CAST(i AS VARCHAR) AS item_id,
+                'Produto ' || CAST(i AS VARCHAR) AS item_name,
+                {rand('w1', 200)} AS purchases_week_1,
+                {rand('w2', 200)} AS purchases_week_2,
+                {rand('w3', 200)} AS purchases_week_3,
+                {rand('w4', 200)} AS purchases_week_4,
+                round((hash(i, 'p12') % 2000) / 10.0 - 100, 1) AS percent_change_w1_w2,
+                round((hash(i, 'p23') % 2000) / 10.0 - 100, 1) AS percent_change_w2_w3,
+                round((hash(i, 'p34') % 2000) / 10.0 - 100, 1) AS percent_change_w3_w4,
+                {pick('trend', ['alta', 'queda', 'estável'])} AS trend_status,
+                {pick('consistency', ['consistente', 'inconsistente'])} AS trend_consistency,
+                round((hash(i, 'b1') % 1000) / 10.0, 1) AS benchmark_week_1,
+                round((hash(i, 'b2') % 1000) / 10.0, 1) AS benchmark_week_2,
+                round((hash(i, 'b3') % 1000) / 10.0, 1) AS benchmark_week_3,
+                round((hash(i, 'b4') % 1000) / 10.0, 1) AS benchmark_week_4,
+                {rand('c1', 3000)} AS clicks_week_1,
+                {rand('c2', 3000)} AS clicks_week_2,
+                {rand('c3', 3000)} AS clicks_week_3,
+                {rand('c4', 3000)} AS clicks_week_4,
+                round((hash(i, 's1') % 1000) / 1000.0, 3) AS size_score_week_1,
+                round((hash(i, 's2') % 1000) / 1000.0, 3) AS size_score_week_2,
+                round((hash(i, 's3') % 1000) / 1000.0, 3) AS size_score_week_3,
+                round((hash(i, 's4') % 1000) / 1000.0, 3) AS size_score_week_4,
+                {pick('size_trend', ['alta', 'queda', 'estável'])} AS size_score_trend_status
+            FROM range({rows('product_trend')}) t(i)
+            """,
+        ]
+
+        for statement in statements:
+            self._conn.execute(statement)
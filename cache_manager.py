@@ -2,11 +2,24 @@
 Gerenciador de cache para dados básicos
 """
 
+import os
 import time
 import hashlib
 import json
 from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+TIMEZONE = ZoneInfo('America/Sao_Paulo')
+
+# Política de TTL pelo período da requisição:
+# - períodos que incluem hoje: no máximo CACHE_LIVE_TTL_HOURS
+# - períodos encerrados antes do horizonte (hoje - CACHE_FRESHNESS_HORIZON_DAYS):
+#   no mínimo CACHE_HISTORICAL_TTL_HOURS, já que esses dados não mudam mais
+# - demais períodos: TTL padrão do cache
+CACHE_LIVE_TTL_HOURS = float(os.getenv('CACHE_LIVE_TTL_HOURS', '1'))
+CACHE_HISTORICAL_TTL_HOURS = float(os.getenv('CACHE_HISTORICAL_TTL_HOURS', '168'))
+CACHE_FRESHNESS_HORIZON_DAYS = int(os.getenv('CACHE_FRESHNESS_HORIZON_DAYS', '3'))
 
 class CacheManager:
     """Gerenciador de cache com TTL"""
@@ -14,6 +27,31 @@ class CacheManager:
     def __init__(self, ttl_hours: int = 1):
         self.cache: Dict[str, Dict[str, Any]] = {}
         self.ttl_seconds = ttl_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        
+    def _ttl_for(self, **kwargs) -> float:
+        """TTL em segundos de acordo com o fim do período (`end_date` ou `day`)"""
+        try:
+            end = date.fromisoformat(str(kwargs.get('end_date') or kwargs.get('day')))
+        except ValueError:
+            return self.ttl_seconds
+        
+        today = datetime.now(TIMEZONE).date()
+        if end >= today:
+            return min(self.ttl_seconds, CACHE_LIVE_TTL_HOURS * 3600)
+        if end < today - timedelta(days=CACHE_FRESHNESS_HORIZON_DAYS):
+            return max(self.ttl_seconds, CACHE_HISTORICAL_TTL_HOURS * 3600)
+        return self.ttl_seconds
+        
+    def ttl_hours_for(self, **kwargs) -> float:
+        """TTL em horas aplicado à entrada desses parâmetros (ou o que seria aplicado ao gravá-la)"""
+        cache_entry = self.cache.get(self._generate_cache_key(**kwargs))
+        ttl_seconds = cache_entry['ttl_seconds'] if cache_entry else self._ttl_for(**kwargs)
+        return ttl_seconds / 3600
+        
+    def _is_valid(self, cache_entry: Dict[str, Any], current_time: float) -> bool:
+        return current_time - cache_entry['timestamp'] < cache_entry.get('ttl_seconds', self.ttl_seconds)
         
     def _generate_cache_key(self, **kwargs) -> str:
         """Gera uma chave única para o cache baseada nos parâmetros"""
@@ -31,8 +69,9 @@ class CacheManager:
             current_time = time.time()
             
             # Verificar se o cache ainda é válido
-            if current_time - cache_entry['timestamp'] < self.ttl_seconds:
+            if self._is_valid(cache_entry, current_time):
                 print(f"📦 Cache HIT para chave: {cache_key[:8]}...")
+                self.hits += 1
                 return cache_entry['data']
             else:
                 # Cache expirado, remover
@@ -40,6 +79,7 @@ class CacheManager:
                 del self.cache[cache_key]
         
         print(f"❌ Cache MISS para chave: {cache_key[:8]}...")
+        self.misses += 1
         return None
     
     def set(self, data: Dict[str, Any], **kwargs) -> None:
@@ -47,13 +87,24 @@ class CacheManager:
         cache_key = self._generate_cache_key(**kwargs)
         current_time = time.time()
         
+        ttl_seconds = self._ttl_for(**kwargs)
+        
         self.cache[cache_key] = {
             'data': data,
             'timestamp': current_time,
+            'ttl_seconds': ttl_seconds,
             'created_at': datetime.fromtimestamp(current_time).isoformat()
         }
         
-        print(f"💾 Cache SET para chave: {cache_key[:8]}...")
+        print(f"💾 Cache SET para chave: {cache_key[:8]}... (TTL: {ttl_seconds / 3600:g}h)")
+    
+    def invalidate(self, **kwargs) -> bool:
+        """Remove a entrada desses parâmetros (se existir)"""
+        cache_key = self._generate_cache_key(**kwargs)
+        removed = self.cache.pop(cache_key, None) is not None
+        if removed:
+            print(f"🗑️ Cache INVALIDADO para chave: {cache_key[:8]}...")
+        return removed
     
     def flush(self) -> Dict[str, Any]:
         """Remove todos os dados do cache e retorna estatísticas"""
@@ -80,7 +131,7 @@ class CacheManager:
         expired_keys = []
         
         for cache_key, cache_entry in list(self.cache.items()):
-            if current_time - cache_entry['timestamp'] >= self.ttl_seconds:
+            if not self._is_valid(cache_entry, current_time):
                 expired_keys.append(cache_key)
                 del self.cache[cache_key]
         
@@ -107,16 +158,21 @@ class CacheManager:
         valid_entries = 0
         
         for cache_entry in self.cache.values():
-            if current_time - cache_entry['timestamp'] >= self.ttl_seconds:
+            if not self._is_valid(cache_entry, current_time):
                 expired_entries += 1
             else:
                 valid_entries += 1
         
+        lookups = self.hits + self.misses
+        
         return {
             'total_entries': total_entries,
             'valid_entries': valid_entries,
             'expired_entries': expired_entries,
             'ttl_hours': self.ttl_seconds / 3600,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
             'cache_size_mb': self._estimate_memory_usage(),
             'timestamp': datetime.now().isoformat()
         }
@@ -124,7 +180,8 @@ class CacheManager:
     def _estimate_memory_usage(self) -> float:
         """Estima o uso de memória do cache em MB"""
         try:
-            cache_size = len(json.dumps(self.cache))
+            # Linhas compactas, cubo de eventos e modelos Pydantic via .dict(); EncodedRows via iteração
+            cache_size = len(json.dumps(self.cache, default=lambda value: value.dict() if hasattr(value, 'dict') else list(value)))
             return round(cache_size / (1024 * 1024), 2)
         except:
             return 0.0
@@ -141,6 +198,17 @@ ads_campaigns_results_cache = CacheManager(ttl_hours=168)  # 7 dias
 realtime_cache = CacheManager(ttl_hours=0.25)  # 15 minutos para dados realtime
 leads_orders_cache = CacheManager(ttl_hours=168)  # 7 dias para leads_orders
 shipping_calc_cache = CacheManager(ttl_hours=24)  # 24 horas para shipping-calc-analytics
+event_cube_cache = CacheManager(ttl_hours=1)  # Cubo de eventos compartilhado por basic-data e detailed-data
+# Histórico por dia para a atualização incremental (apenas dias fechados)
+event_cube_history_cache = CacheManager(ttl_hours=24)
+orders_history_cache = CacheManager(ttl_hours=24)
+# Receita realtime do dia por cliente (consultada a cada poucos segundos pelos wallboards)
+realtime_revenue_cache = CacheManager(ttl_hours=float(os.getenv('REALTIME_REVENUE_TTL_SECONDS', '60')) / 3600)
+# tablename/access_control por email, para os endpoints de alta frequência
+user_lookup_cache = CacheManager(ttl_hours=0.25)
+items_scoring_cache = CacheManager(ttl_hours=6)  # items-scoring (Havaianas), por cliente e filtros
+experiments_cache = CacheManager(ttl_hours=6)  # Experimentos, por cliente e período
+portfolio_cache = CacheManager(ttl_hours=1)  # Sumário de vários clientes (usuários com acesso total)
 
 # Sistema para salvar último request
 import os
@@ -0,0 +1,315 @@
+"""
+Representação compacta das linhas retornadas pelos endpoints de métricas
+
+Os endpoints com muitas linhas convertem o resultado do BigQuery em instâncias de
+dataclasses com __slots__ geradas a partir dos modelos Pydantic de resposta. Sumários,
+paginação e cache trabalham sobre essas linhas; o Pydantic só é usado na fronteira
+da API, para a página efetivamente retornada.
+
+Para os maiores datasets em cache, `EncodedRows` guarda as linhas por colunas, com as
+dimensões de texto codificadas por dicionário.
+
+Os endpoints com `format=columnar` entregam a página como um array por coluna
+(`rows_to_columns`, `EncodedRows.take_columns`) junto do schema (`column_schema`).
+"""
+
+from array import array
+from dataclasses import MISSING, make_dataclass, field, fields as dataclass_fields
+from itertools import repeat
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+
+def compact_row_class(model: Type[BaseModel]) -> type:
+    """Cria uma dataclass com __slots__ com os mesmos campos (e defaults) do modelo"""
+    names = tuple(model.model_fields)
+    fields = []
+    for name, info in model.model_fields.items():
+        if info.is_required():
+            fields.append((name, info.annotation))
+        else:
+            fields.append((name, info.annotation, field(default=info.default)))
+
+    values = attrgetter(*names)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Mesmo formato de `model.dict()`"""
+        return dict(zip(names, values(self)))
+
+    return make_dataclass(
+        f"Compact{model.__name__}",
+        fields,
+        namespace={'dict': as_dict, 'model': model},
+        slots=True,
+        kw_only=True,
+    )
+
+
+def rows_to_dicts(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Converte linhas compactas em dicts para o modelo de resposta"""
+    return [row.dict() for row in rows]
+
+
+def rows_to_columns(rows: Sequence[Any], row_class: type) -> Dict[str, List[Any]]:
+    """Converte linhas compactas em {coluna: valores}, na ordem dos campos do modelo"""
+    return {
+        item.name: list(map(attrgetter(item.name), rows))
+        for item in dataclass_fields(row_class)
+    }
+
+
+# Tipos JSON das anotações dos modelos de resposta
+_SCHEMA_TYPES = {str: 'string', int: 'integer', float: 'number', bool: 'boolean'}
+
+
+def column_schema(row_class: type) -> List[Dict[str, Any]]:
+    """Nome, tipo JSON e nulidade de cada coluna da linha compacta"""
+    schema = []
+    for item in dataclass_fields(row_class):
+        annotation = item.type
+        nullable = False
+        if get_origin(annotation) is Union:
+            args = [arg for arg in get_args(annotation) if arg is not type(None)]
+            nullable = len(args) < len(get_args(annotation))
+            annotation = args[0] if len(args) == 1 else Any
+        schema.append({'name': item.name, 'type': _SCHEMA_TYPES.get(annotation, 'any'), 'nullable': nullable})
+    return schema
+
+
+def dictionary_encode(values: Sequence[Any]) -> Tuple[array, List[Any]]:
+    """Retorna (códigos, valores distintos) de uma coluna"""
+    index: Dict[Any, int] = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    dictionary = list(index)
+    return array('H' if len(dictionary) <= 0xFFFF else 'I', codes), dictionary
+
+
+def _nulls_last(value: Any, descending: bool) -> Tuple[bool, Any]:
+    """Chave que compara nulos sem TypeError e os deixa no fim (a ordenação decrescente inverte a chave)"""
+    return (value is None) != descending, value
+
+
+def _pack(values: List[Any]) -> Sequence[Any]:
+    """Guarda colunas numéricas sem nulos em arrays tipados"""
+    if values and all(type(value) is float for value in values):
+        return array('d', values)
+    if values and all(type(value) is int for value in values):
+        try:
+            return array('q', values)
+        except OverflowError:
+            pass
+    return values
+
+
+class EncodedRows:
+    """Linhas compactas armazenadas por colunas, para datasets grandes em cache
+
+    Colunas listadas em `dictionary_fields` viram um array de códigos mais a lista de
+    valores distintos; colunas numéricas sem nulos viram arrays tipados. As linhas só
+    são materializadas na leitura (fatias da paginação ou iteração), então o objeto
+    pode substituir a lista de linhas no cache: `encoded[offset:offset + limit]`.
+
+    Filtros de igualdade (`where`) usam um índice por coluna, {valor: posições},
+    construído na primeira consulta da coluna e mantido junto do objeto em cache.
+    Ordenações (`order`) viram permutações das posições, também guardadas por chave.
+    """
+
+    __slots__ = ('row_class', 'names', 'columns', 'dictionaries', 'length', 'indexes', 'orders')
+
+    def __init__(self, rows: Sequence[Any], row_class: type, dictionary_fields: Iterable[str] = ()):
+        dictionary_fields = set(dictionary_fields)
+        self.row_class = row_class
+        self.names = tuple(item.name for item in dataclass_fields(row_class))
+        self.length = len(rows)
+        self.columns: Dict[str, Sequence[Any]] = {}
+        self.dictionaries: Dict[str, List[Any]] = {}
+        self.indexes: Dict[str, Dict[Any, array]] = {}
+        self.orders: Dict[Tuple[Tuple[str, bool], ...], array] = {}
+
+        for name in self.names:
+            values = [getattr(row, name) for row in rows]
+            if name in dictionary_fields:
+                self.columns[name], self.dictionaries[name] = dictionary_encode(values)
+            else:
+                self.columns[name] = _pack(values)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def column(self, name: str) -> List[Any]:
+        """Valores decodificados de uma coluna"""
+        dictionary = self.dictionaries.get(name)
+        if dictionary is None:
+            return list(self.columns[name])
+        return [dictionary[code] for code in self.columns[name]]
+
+    def index(self, name: str) -> Dict[Any, array]:
+        """Índice da coluna: {valor: posições das linhas, em ordem}"""
+        index = self.indexes.get(name)
+        if index is None:
+            postings: Dict[Any, List[int]] = {}
+            for position, value in enumerate(self.columns[name]):
+                postings.setdefault(value, []).append(position)
+            dictionary = self.dictionaries.get(name)
+            index = {
+                dictionary[value] if dictionary is not None else value: array('I', positions)
+                for value, positions in postings.items()
+            }
+            self.indexes[name] = index
+        return index
+
+    def where(self, filters: Dict[str, Any]) -> Sequence[int]:
+        """Posições (em ordem) das linhas com coluna == valor para todos os filtros"""
+        if not filters:
+            return range(self.length)
+
+        postings = []
+        for name, value in filters.items():
+            positions = self.index(name).get(value)
+            if positions is None:
+                return array('I')
+            postings.append((name, positions))
+
+        # Parte da lista mais curta e confere as demais colunas direto nos códigos
+        postings.sort(key=lambda posting: len(posting[1]))
+        result = postings[0][1]
+        for name, positions in postings[1:]:
+            column = self.columns[name]
+            code = column[positions[0]]
+            result = array('I', [position for position in result if column[position] == code])
+        return result
+
+    def _sort_key(self, name: str, descending: bool = False) -> Callable[[int], Any]:
+        """Chave de ordenação da coluna; nulos ficam por último nas duas direções"""
+        column = self.columns[name]
+        dictionary = self.dictionaries.get(name)
+        if dictionary is None:
+            if isinstance(column, array):
+                # Arrays tipados não têm nulos
+                return column.__getitem__
+            return lambda position: _nulls_last(column[position], descending)
+        # Colunas codificadas ordenam pela posição do valor no dicionário ordenado
+        ranks = [0] * len(dictionary)
+        codes = sorted(range(len(dictionary)), key=lambda code: _nulls_last(dictionary[code], descending))
+        for rank, code in enumerate(codes):
+            ranks[code] = rank
+        return lambda position: ranks[column[position]]
+
+    def order(self, keys: Tuple[Tuple[str, bool], ...]) -> array:
+        """Posições das linhas ordenadas por `keys` ((coluna, decrescente), ...)
+
+        A ordenação é estável: empates mantêm a ordem em que as linhas foram guardadas.
+        Nulos ficam por último, tanto na ordem crescente quanto na decrescente.
+        """
+        positions = self.orders.get(keys)
+        if positions is None:
+            order = list(range(self.length))
+            # Uma passada estável por sequência de chaves com a mesma direção, da menos
+            # para a mais significativa
+            runs: List[Tuple[List[str], bool]] = []
+            for name, descending in keys:
+                if runs and runs[-1][1] == descending:
+                    runs[-1][0].append(name)
+                else:
+                    runs.append(([name], descending))
+            for names, descending in reversed(runs):
+                sort_keys = [self._sort_key(name, descending) for name in names]
+                if len(sort_keys) == 1:
+                    order.sort(key=sort_keys[0], reverse=descending)
+                else:
+                    order.sort(key=lambda position: tuple(key(position) for key in sort_keys), reverse=descending)
+            positions = self.orders[keys] = array('I', order)
+        return positions
+
+    def group_by(self, dimensions: Sequence[str], measures: Sequence[str]) -> 'EncodedRows':
+        """Agrega as linhas por `dimensions` somando `measures` (agregação por hash nos códigos)
+
+        Nulos nas métricas são ignorados na soma. As demais colunas ficam com o default do
+        row_class (ou None, se não tiverem default). Os grupos saem na ordem da primeira linha de cada um.
+        """
+        key_columns = [self.columns[name] for name in dimensions]
+        measure_columns = [self.columns[name] for name in measures]
+        keys = zip(*key_columns) if key_columns else repeat((), self.length)
+
+        groups: Dict[Tuple[Any, ...], int] = {}
+        totals: List[List[Any]] = [[] for _ in measures]
+        for position, key in enumerate(keys):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = len(groups)
+                for column_totals in totals:
+                    column_totals.append(0)
+            for column_totals, column in zip(totals, measure_columns):
+                value = column[position]
+                if value is not None:
+                    column_totals[group] += value
+
+        dictionaries = [self.dictionaries.get(name) for name in dimensions]
+        # Colunas obrigatórias do row_class fora da agregação ficam com None
+        missing = dict.fromkeys(
+            item.name for item in dataclass_fields(self.row_class)
+            if item.default is MISSING and item.name not in dimensions and item.name not in measures
+        )
+        rows = []
+        for key, group in groups.items():
+            values = dict(missing)
+            values.update(
+                (name, dictionary[code] if dictionary is not None else code)
+                for name, dictionary, code in zip(dimensions, dictionaries, key)
+            )
+            values.update((name, column_totals[group]) for name, column_totals in zip(measures, totals))
+            rows.append(self.row_class(**values))
+        return EncodedRows(rows, self.row_class, [name for name in dimensions if name in self.dictionaries])
+
+    def sum(self, name: str, positions: Iterable[int]) -> Any:
+        """Soma de uma coluna numérica nas posições dadas"""
+        column = self.columns[name]
+        return sum(column[position] for position in positions)
+
+    def take_columns(self, positions: Sequence[int]) -> Dict[str, List[Any]]:
+        """Valores decodificados das posições dadas, por coluna, sem materializar linhas"""
+        columns = {}
+        for name in self.names:
+            column = self.columns[name]
+            values = [column[position] for position in positions]
+            dictionary = self.dictionaries.get(name)
+            if dictionary is not None:
+                values = [dictionary[code] for code in values]
+            columns[name] = values
+        return columns
+
+    def take(self, positions: Sequence[int]) -> List[Any]:
+        """Materializa as linhas das posições dadas"""
+        names = self.names
+        row_class = self.row_class
+        columns = self.take_columns(positions).values()
+        return [row_class(**dict(zip(names, values))) for values in zip(*columns)]
+
+    def _materialize(self, start: int, stop: int, step: int = 1) -> List[Any]:
+        columns = []
+        for name in self.names:
+            column = self.columns[name][start:stop:step]
+            dictionary = self.dictionaries.get(name)
+            if dictionary is not None:
+                column = [dictionary[code] for code in column]
+            columns.append(column)
+
+        names = self.names
+        row_class = self.row_class
+        return [row_class(**dict(zip(names, values))) for values in zip(*columns)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._materialize(*index.indices(self.length))
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('Índice fora do intervalo')
+        return self._materialize(index, index + 1)[0]
+
+    def __iter__(self) -> Iterator[Any]:
+        chunk_size = 1024
+        for start in range(0, self.length, chunk_size):
+            yield from self._materialize(start, min(start + chunk_size, self.length))
@@ -9,8 +9,10 @@ from google.cloud import bigquery
 from datetime import datetime, timedelta
 import os
 
-from utils import verify_token, TokenData, get_bigquery_client
-from cache_manager import basic_data_cache
+from utils import verify_token, TokenData, execute_bigquery_query_async, get_user_access
+from cache_manager import items_scoring_cache
+from compact_rows import EncodedRows, compact_row_class, rows_to_dicts
+from tenant_catalog import tenant_catalog
 
 # Router for Havaianas custom methods
 havaianas_router = APIRouter(prefix="/havaianas", tags=["havaianas"])
@@ -18,6 +20,13 @@ havaianas_router = APIRouter(prefix="/havaianas", tags=["havaianas"])
 # Pydantic models for Havaianas item scoring
 class HavaianasItemScoringRequest(BaseModel):
     table_name: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    item_id: Optional[str] = None
+    item_name: Optional[str] = None  # Busca por trecho do nome (sem diferenciar maiúsculas)
+    elegible: Optional[int] = None
+    limit: Optional[int] = 1000
+    offset: Optional[int] = 0
 
 class HavaianasItemScoringRow(BaseModel):
     event_date: Optional[str] = None
@@ -35,6 +44,83 @@ class HavaianasItemScoringResponse(BaseModel):
     total_rows: int
     summary: Dict[str, Any]
     cache_info: Optional[Dict[str, Any]] = None
+    pagination: Optional[Dict[str, Any]] = None
+
+CompactHavaianasItemScoringRow = compact_row_class(HavaianasItemScoringRow)
+ITEMS_SCORING_DICTIONARY_FIELDS = ('event_date', 'item_id', 'item_name')
+ITEMS_SCORING_MAX_LIMIT = 50000
+
+def _build_items_scoring_query(project_name: str, tablename: str, request: HavaianasItemScoringRequest):
+    """Monta a query do item scoring com os filtros do request (retorna query e job_config)"""
+    conditions = []
+    query_parameters = []
+
+    if request.start_date:
+        conditions.append("event_date >= @start_date")
+        query_parameters.append(bigquery.ScalarQueryParameter("start_date", "DATE", request.start_date))
+    if request.end_date:
+        conditions.append("event_date <= @end_date")
+        query_parameters.append(bigquery.ScalarQueryParameter("end_date", "DATE", request.end_date))
+    if request.item_id:
+        conditions.append("item_id = @item_id")
+        query_parameters.append(bigquery.ScalarQueryParameter("item_id", "STRING", request.item_id))
+    if request.item_name:
+        conditions.append("LOWER(item_name) LIKE @item_name")
+        query_parameters.append(bigquery.ScalarQueryParameter("item_name", "STRING", f"%{request.item_name.lower()}%"))
+    if request.elegible is not None:
+        conditions.append("elegible = @elegible")
+        query_parameters.append(bigquery.ScalarQueryParameter("elegible", "INT64", request.elegible))
+
+    query_parts = [
+        "SELECT",
+        "  event_date,",
+        "  item_id,",
+        "  item_name,",
+        "  elegible,",
+        "  item_views,",
+        "  size_score,",
+        "  promo_label,",
+        "  transactions,",
+        "  purchase_revenue",
+        f"FROM `{project_name}.dbt_aggregated.{tablename}_item_scoring`",
+    ]
+    if conditions:
+        query_parts.append("WHERE " + "\n  AND ".join(conditions))
+    query_parts.append("ORDER BY event_date DESC, item_id")
+
+    return "\n".join(query_parts), bigquery.QueryJobConfig(query_parameters=query_parameters)
+
+def _calculate_items_scoring_summary(data: List[Any]) -> Dict[str, Any]:
+    """Calcula as somas e médias do item scoring em uma única passada"""
+    total_views = 0
+    total_transactions = 0
+    total_revenue = 0
+    total_size_score = 0
+    total_promo_label = 0
+    elegible_items = 0
+    non_elegible_items = 0
+
+    for row in data:
+        total_views += row.item_views or 0
+        total_transactions += row.transactions or 0
+        total_revenue += row.purchase_revenue or 0
+        total_size_score += row.size_score or 0
+        total_promo_label += row.promo_label or 0
+        if row.elegible == 1:
+            elegible_items += 1
+        elif row.elegible == 0:
+            non_elegible_items += 1
+
+    return {
+        "total_records": len(data),
+        "total_views": total_views,
+        "total_transactions": total_transactions,
+        "total_revenue": total_revenue,
+        "avg_size_score": total_size_score / len(data) if data else 0,
+        "avg_promo_label": total_promo_label / len(data) if data else 0,
+        "elegible_items": elegible_items,
+        "non_elegible_items": non_elegible_items
+    }
 
 @havaianas_router.post("/items-scoring", response_model=HavaianasItemScoringResponse)
 async def havaianas_items_scoring(
@@ -43,40 +129,25 @@ async def havaianas_items_scoring(
 ):
     """
     Custom method for Havaianas client to access havaianas_item_scoring table
+
+    Filtros de data e de item vão para a query; o resultado fica em cache por cliente
+    e filtros (6h, ou menos para períodos que incluem hoje) e é paginado na resposta.
     """
-    try:
-        client = get_bigquery_client()
-        if not client:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro de conexão com o banco de dados"
-            )
+    limit = min(request.limit or 1000, ITEMS_SCORING_MAX_LIMIT)
+    offset = max(request.offset or 0, 0)
 
+    try:
         # Buscar informações do usuário para controle de acesso
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        user_access = await get_user_access(token.email)
+
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
-        
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
-        
+
+        user_tablename, access_control = user_access
+
         # Determinar qual tabela usar baseado no perfil do usuário
         if user_tablename == 'all':
             # Usuário tem acesso a todas as tabelas
@@ -92,65 +163,65 @@ async def havaianas_items_scoring(
             tablename = user_tablename
             print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
 
-        # Build the query using the determined table name
-        query_parts = [
-            "SELECT",
-            "  event_date,",
-            "  item_id,",
-            "  item_name,",
-            "  elegible,",
-            "  item_views,",
-            "  size_score,",
-            "  promo_label,",
-            "  transactions,",
-            "  purchase_revenue",
-            f"FROM `bq-mktbr.dbt_aggregated.{tablename}_item_scoring`",
-            "ORDER BY event_date DESC, item_id"
-        ]
-
-        query_parameters = []
-
-        query = "\n".join(query_parts)
-
-        # Execute the query
-        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
-        query_job = client.query(query, job_config=job_config)
-        results = list(query_job.result())
-
-        # Convert results to response format
-        data = []
-        for row in results:
-            data.append(HavaianasItemScoringRow(
-                event_date=str(row.event_date) if row.event_date else None,
-                item_id=row.item_id,
-                item_name=row.item_name,
-                elegible=row.elegible,
-                item_views=row.item_views,
-                size_score=row.size_score,
-                promo_label=row.promo_label,
-                transactions=row.transactions,
-                purchase_revenue=row.purchase_revenue
-            ))
-
-        # Calculate summary statistics
-        summary = {
-            "total_records": len(data),
-            "total_views": sum(row.item_views or 0 for row in data),
-            "total_transactions": sum(row.transactions or 0 for row in data),
-            "total_revenue": sum(row.purchase_revenue or 0 for row in data),
-            "avg_size_score": sum(row.size_score or 0 for row in data) / len(data) if data else 0,
-            "avg_promo_label": sum(row.promo_label or 0 for row in data) / len(data) if data else 0,
-            "elegible_items": sum(1 for row in data if row.elegible == 1),
-            "non_elegible_items": sum(1 for row in data if row.elegible == 0)
+        # Cache por cliente e filtros (o acesso já foi validado acima)
+        cache_params = {
+            'table_name': tablename,
+            'start_date': request.start_date,
+            'end_date': request.end_date,
+            'item_id': request.item_id,
+            'item_name': request.item_name,
+            'elegible': request.elegible
         }
 
+        cached_data = items_scoring_cache.get(**cache_params)
+        source = 'cache'
+        if not cached_data:
+            source = 'database'
+            query, job_config = _build_items_scoring_query(tenant_catalog.project_for(tablename), tablename, request)
+            results = await execute_bigquery_query_async(query, job_config)
+
+            # Convert results to response format
+            data = []
+            for row in results:
+                data.append(CompactHavaianasItemScoringRow(
+                    event_date=str(row.event_date) if row.event_date else None,
+                    item_id=row.item_id,
+                    item_name=row.item_name,
+                    elegible=row.elegible,
+                    item_views=row.item_views,
+                    size_score=row.size_score,
+                    promo_label=row.promo_label,
+                    transactions=row.transactions,
+                    purchase_revenue=row.purchase_revenue
+                ))
+
+            cached_data = {
+                'all_data': EncodedRows(data, CompactHavaianasItemScoringRow, ITEMS_SCORING_DICTIONARY_FIELDS),
+                'summary': _calculate_items_scoring_summary(data),
+                'cached_at': datetime.now().isoformat()
+            }
+            items_scoring_cache.set(cached_data, **cache_params)
+
+        all_data = cached_data['all_data']
+        page = all_data[offset:offset + limit]
+
         return HavaianasItemScoringResponse(
-            data=data,
-            total_rows=len(data),
-            summary=summary,
-            cache_info=None
+            data=rows_to_dicts(page),
+            total_rows=len(all_data),
+            summary=cached_data['summary'],
+            cache_info={
+                'source': source,
+                'cached_at': cached_data['cached_at']
+            },
+            pagination={
+                'limit': limit,
+                'offset': offset,
+                'has_more': offset + limit < len(all_data)
+            }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro no método havaianas_items_scoring: {e}")
         import traceback
@@ -158,4 +229,4 @@ async def havaianas_items_scoring(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro interno do servidor: {str(e)}"
-        ) 
\ No newline at end of file
+        )
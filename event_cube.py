@@ -0,0 +1,328 @@
+"""
+Cubo de eventos por cliente e dia, compartilhado entre basic-data e detailed-data
+
+Os dois endpoints varrem `{tablename}_events_long` no mesmo período com praticamente as
+mesmas agregações condicionais, mudando só o GROUP BY. O cubo agrega os eventos uma única
+vez na união das dimensões dos dois endpoints (data, hora, cluster, plataforma,
+localização, origem, mídia, campanha, página, conteúdo e cupom), fica em cache por
+cliente/período/modelo de atribuição e cada endpoint reagrupa localmente as dimensões
+de que precisa. Um carregamento de dashboard passa a fazer um scan em vez de três.
+
+Por baixo, o cubo é guardado por dia: os dias fechados vêm do histórico e só os dias
+abertos são consultados de novo quando o cubo do período expira (ver
+`incremental_refresh.py`).
+
+As contagens distintas de transaction_id (pedidos, pedidos pagos, novos clientes e
+assinaturas) precisam continuar somáveis entre células. As linhas de uma mesma
+transação podem cair em células diferentes (hora, página de entrada...), então cada
+transação é contada só na célula da sua primeira linha (por created_at) que atende à
+condição da medida, dentro do dia. Assim a soma de qualquer reagrupamento do cubo é
+igual ao COUNT(DISTINCT transaction_id) por dia do grupo.
+"""
+
+import asyncio
+import math
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cache_manager import event_cube_cache, event_cube_history_cache
+from compact_rows import dictionary_encode
+from incremental_refresh import load_by_day
+from utils import execute_bigquery_query_async
+
+# Dimensões do cubo (valores brutos, sem coalesce: cada endpoint aplica o seu)
+CUBE_DIMENSIONS = (
+    'event_date', 'hour', 'traffic_category', 'platform', 'city', 'region', 'country',
+    'source', 'medium', 'campaign', 'page_location', 'content', 'discount_code',
+)
+
+# Medidas inteiras (contagens); as demais são somas de valores monetários
+COUNT_MEASURES = (
+    'Cliques', 'Sessoes', 'Adicoes_ao_Carrinho', 'Leads', 'Pedidos', 'Pedidos_Pagos', 'Novos_Clientes',
+    'Pedidos_Assinatura_Anual_Inicial', 'Pedidos_Assinatura_Mensal_Inicial',
+    'Pedidos_Assinatura_Anual_Recorrente', 'Pedidos_Assinatura_Mensal_Recorrente',
+)
+
+# Tipos de pedido de assinatura -> sufixo das medidas
+SUBSCRIPTION_ORDER_TYPES = {
+    'first annual subscription': 'Assinatura_Anual_Inicial',
+    'first montly subscription': 'Assinatura_Mensal_Inicial',
+    'recurring annual subscription': 'Assinatura_Anual_Recorrente',
+    'recurring montly subscription': 'Assinatura_Mensal_Recorrente',
+}
+
+
+def _order_conditions(attribution_model: str) -> Dict[str, str]:
+    """Condição de cada medida contada por transaction_id distinto"""
+    purchase = f"event_name = '{attribution_model}'"
+    paid = f"{purchase} and status in ('paid', 'authorized')"
+    conditions = {
+        'Pedidos': purchase,
+        'Pedidos_Pagos': paid,
+        'Novos_Clientes': f"{paid} and transaction_no = 1",
+    }
+    for order_type, suffix in SUBSCRIPTION_ORDER_TYPES.items():
+        conditions[f'Pedidos_{suffix}'] = f"{purchase} and order_type = '{order_type}' and status = 'paid'"
+    return conditions
+
+
+def _first_flag(alias: str) -> str:
+    return f"first_{alias}"
+
+
+def _measure_expressions(attribution_model: str) -> List[Tuple[str, str]]:
+    """(alias, expressão) das medidas do cubo para o event_name de atribuição
+
+    As contagens de transações usam as flags `first_*` calculadas em
+    `build_event_cube_query` (primeira linha da transação no dia).
+    """
+    conditions = _order_conditions(attribution_model)
+    purchase = conditions['Pedidos']
+    paid = conditions['Pedidos_Pagos']
+    net_value = "value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0)"
+
+    def orders(alias: str) -> str:
+        return f"COUNTIF({_first_flag(alias)})"
+
+    measures = [
+        ('Investimento', "SUM(CASE WHEN event_name = 'paid_media' then value else 0 end)"),
+        ('Cliques', "SUM(CASE WHEN event_name = 'paid_media' then clicks else 0 end)"),
+        ('Sessoes', "COUNTIF(event_name = 'session')"),
+        ('Adicoes_ao_Carrinho', "COUNTIF(event_name = 'add_to_cart')"),
+        ('Leads', "COUNTIF(event_name = 'lead')"),
+        ('Pedidos', orders('Pedidos')),
+        ('Receita', f"SUM(CASE WHEN {purchase} then {net_value} ELSE 0 end)"),
+        ('Pedidos_Pagos', orders('Pedidos_Pagos')),
+        ('Receita_Paga', f"SUM(CASE WHEN {paid} THEN {net_value} ELSE 0 END)"),
+        # Receita paga sem frete/desconto (usada pelo basic-data da endogen)
+        ('Receita_Paga_Bruta', f"SUM(CASE WHEN {paid} THEN value ELSE 0 END)"),
+        ('Novos_Clientes', orders('Novos_Clientes')),
+        ('Receita_Novos_Clientes', f"SUM(CASE WHEN {conditions['Novos_Clientes']} THEN {net_value} ELSE 0 END)"),
+    ]
+    for suffix in SUBSCRIPTION_ORDER_TYPES.values():
+        subscription = conditions[f'Pedidos_{suffix}']
+        measures.append((f'Pedidos_{suffix}', orders(f'Pedidos_{suffix}')))
+        measures.append((f'Receita_{suffix}', f"SUM(CASE WHEN {subscription} THEN {net_value} ELSE 0 END)"))
+    return measures
+
+
+# Nomes das medidas (independem do modelo de atribuição)
+CUBE_MEASURES = tuple(alias for alias, _ in _measure_expressions('purchase'))
+
+
+def build_event_cube_query(project_name: str, tablename: str, attribution_model: str, start_date: str, end_date: str) -> str:
+    """Monta a query do cubo (attribution_model já convertido para event_name)"""
+    if start_date == end_date:
+        date_condition = f"event_date = '{start_date}'"
+    else:
+        date_condition = f"event_date between '{start_date}' and '{end_date}'"
+
+    measures = ",\n        ".join(f"{expression} AS {alias}" for alias, expression in _measure_expressions(attribution_model))
+    # Primeira linha (no dia) de cada transação que atende à condição da medida
+    flags = ",\n            ".join(
+        f"coalesce({condition}, false) and transaction_id is not null and row_number() over ("
+        f"partition by transaction_id, event_date, coalesce({condition}, false) order by created_at) = 1 AS {_first_flag(alias)}"
+        for alias, condition in _order_conditions(attribution_model).items()
+    )
+    return f"""
+    WITH events AS (
+        SELECT
+            *,
+            {flags}
+        FROM `{project_name}.dbt_join.{tablename}_events_long`
+        WHERE {date_condition}
+    )
+    SELECT
+        event_date,
+        extract(hour from created_at) AS hour,
+        traffic_category,
+        platform,
+        city,
+        region,
+        country,
+        source,
+        medium,
+        campaign,
+        page_location,
+        content,
+        discount_code,
+        {measures}
+    FROM events
+    GROUP BY ALL
+    """
+
+
+def _to_float(value) -> float:
+    """Converte para float tratando None/NaN como 0.0"""
+    if value is None:
+        return 0.0
+    value = float(value)
+    return value if not math.isnan(value) else 0.0
+
+
+class EventCube:
+    """Células do cubo armazenadas por colunas
+
+    Dimensões ficam codificadas por dicionário e medidas em arrays tipados, como em
+    `compact_rows.EncodedRows`.
+    """
+
+    __slots__ = ('codes', 'dictionaries', 'measures', 'length')
+
+    def __init__(self, rows: Sequence[Any]):
+        self.length = len(rows)
+        self.codes: Dict[str, array] = {}
+        self.dictionaries: Dict[str, List[Any]] = {}
+        self.measures: Dict[str, array] = {}
+
+        # Acesso por posição: getattr e Row.values() (deepcopy) são bem mais caros
+        positions = {name: index for index, name in enumerate(rows[0].keys())} if rows else {}
+
+        def column(name: str) -> List[Any]:
+            index = positions.get(name)
+            return [row[index] for row in rows] if index is not None else []
+
+        for name in CUBE_DIMENSIONS:
+            values = column(name)
+            if name == 'event_date':
+                values = [str(value) for value in values]
+            self.codes[name], self.dictionaries[name] = dictionary_encode(values)
+
+        for name in CUBE_MEASURES:
+            values = column(name)
+            if name in COUNT_MEASURES:
+                self.measures[name] = array('q', [int(value or 0) for value in values])
+            else:
+                self.measures[name] = array('d', [_to_float(value) for value in values])
+
+    def __len__(self) -> int:
+        return self.length
+
+    def total(self, measure: str) -> Any:
+        """Soma de uma medida em todo o cubo"""
+        column = self.measures.get(measure)
+        return sum(column) if column is not None else 0
+
+    def group_by(
+        self,
+        dimensions: Sequence[str],
+        normalize: Optional[Dict[str, Callable[[Any], Any]]] = None,
+    ) -> Tuple[List[Tuple[Any, ...]], Dict[str, List[Any]]]:
+        """Reagrupa o cubo nas dimensões pedidas somando todas as medidas
+
+        `normalize` mapeia dimensão -> função aplicada ao valor antes de agrupar (o
+        equivalente ao coalesce no GROUP BY das queries). Retorna as chaves dos grupos
+        e, para cada medida, a lista de totais na mesma ordem das chaves.
+        """
+        normalize = normalize or {}
+        code_columns = []
+        labels = []
+        for name in dimensions:
+            codes = self.codes[name]
+            dictionary = self.dictionaries[name]
+            function = normalize.get(name)
+            if function is not None:
+                # Valores que colapsam no mesmo valor normalizado passam a ter o mesmo código
+                remap, dictionary = dictionary_encode([function(value) for value in dictionary])
+                codes = [remap[code] for code in codes]
+            code_columns.append(codes)
+            labels.append(dictionary)
+
+        groups: Dict[Tuple[int, ...], int] = {}
+        group_ids = [groups.setdefault(key, len(groups)) for key in zip(*code_columns)]
+
+        totals: Dict[str, List[Any]] = {}
+        for name, column in self.measures.items():
+            sums = [0] * len(groups)
+            for group_id, value in zip(group_ids, column):
+                sums[group_id] += value
+            totals[name] = sums
+
+        keys = [tuple(label[code] for label, code in zip(labels, key)) for key in groups]
+        return keys, totals
+
+    @classmethod
+    def concat(cls, cubes: Sequence['EventCube']) -> 'EventCube':
+        """Junta cubos (um por dia, por exemplo) em um só, unificando os dicionários"""
+        cube = cls([])
+        cube.length = sum(len(part) for part in cubes)
+        for name in CUBE_DIMENSIONS:
+            values = []
+            for part in cubes:
+                values.extend(map(part.dictionaries[name].__getitem__, part.codes[name]))
+            cube.codes[name], cube.dictionaries[name] = dictionary_encode(values)
+        for name in CUBE_MEASURES:
+            for part in cubes:
+                cube.measures[name].extend(part.measures[name])
+        return cube
+
+    def dict(self) -> Dict[str, Any]:
+        """Representação usada na estimativa de memória do cache"""
+        return {'codes': self.codes, 'dictionaries': self.dictionaries, 'measures': self.measures}
+
+
+# Cargas em andamento, para que requisições simultâneas do mesmo dashboard
+# compartilhem um único scan em vez de disparar um por endpoint
+_loading: Dict[Tuple[str, ...], asyncio.Future] = {}
+
+
+async def _fetch_event_cube_days(project_name: str, tablename: str, attribution_model: str, start_date: str, end_date: str) -> Dict[str, EventCube]:
+    """Consulta o cubo de um intervalo contínuo e o separa por dia"""
+    query = build_event_cube_query(project_name, tablename, attribution_model, start_date, end_date)
+    print(f"🧊 Consultando cubo de eventos: {tablename} {start_date} a {end_date} ({attribution_model})")
+
+    rows = await execute_bigquery_query_async(query)
+    rows_by_day: Dict[str, List[Any]] = {}
+    for row in rows:
+        rows_by_day.setdefault(str(row.event_date), []).append(row)
+    return {day: EventCube(day_rows) for day, day_rows in rows_by_day.items()}
+
+
+async def _load_event_cube(cache_params: Dict[str, Any], project_name: str) -> EventCube:
+    tablename = cache_params['table_name']
+    attribution_model = cache_params['attribution_model']
+
+    # Dias fechados vêm do histórico por dia; só os abertos (e os ainda não vistos) são consultados
+    day_cubes = await load_by_day(
+        event_cube_history_cache,
+        {'table_name': tablename, 'attribution_model': attribution_model},
+        cache_params['start_date'],
+        cache_params['end_date'],
+        lambda start, end: _fetch_event_cube_days(project_name, tablename, attribution_model, start, end),
+        lambda: EventCube([]),
+    )
+    cube = EventCube.concat(day_cubes)
+    event_cube_cache.set(cube, **cache_params)
+
+    print(f"🧊 Cubo de eventos com {len(cube)} células")
+    return cube
+
+
+async def get_event_cube(project_name: str, tablename: str, attribution_model: str, start_date: str, end_date: str) -> EventCube:
+    """Retorna o cubo do cliente/período, do cache ou do BigQuery
+
+    O acesso à tabela deve ser validado pelo endpoint antes da chamada: o cubo é
+    compartilhado entre todos os usuários do cliente.
+    """
+    cache_params = {
+        'table_name': tablename,
+        'attribution_model': attribution_model,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+    cube = event_cube_cache.get(**cache_params)
+    if cube is not None:
+        return cube
+
+    key = (project_name, tablename, attribution_model, start_date, end_date)
+    loading = _loading.get(key)
+    if loading is None:
+        loading = asyncio.ensure_future(_load_event_cube(cache_params, project_name))
+        _loading[key] = loading
+        loading.add_done_callback(lambda _: _loading.pop(key, None))
+    else:
+        print(f"🔗 Aguardando cubo de eventos já em carregamento: {tablename} {start_date} a {end_date}")
+
+    # shield: o cancelamento de uma requisição não interrompe a carga compartilhada
+    return await asyncio.shield(loading)
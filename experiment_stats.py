@@ -0,0 +1,112 @@
+"""
+Estatísticas por variante dos experimentos (A/B)
+
+`/metrics/experiments` retorna linhas por dia, experimento, variante e categoria, e o
+frontend somava tudo para comparar variantes. Aqui as linhas em cache são agregadas
+numa única passada (`EncodedRows.group_by`) por experimento e variante, e cada
+variante é comparada com o controle: taxa de conversão (transações / sessões), lift
+e teste z de duas proporções (bicaudal).
+
+Sessões e usuários são somas das linhas diárias; um usuário ativo em vários dias (ou
+categorias) conta mais de uma vez.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from compact_rows import EncodedRows
+
+EXPERIMENT_DIMENSIONS = ('experiment_id', 'experiment_name', 'experiment_variant')
+EXPERIMENT_MEASURES = (
+    'sessions', 'users', 'transactions', 'revenue',
+    'add_to_cart', 'begin_checkout', 'add_shipping_info', 'add_payment_info'
+)
+# Nomes reconhecidos como variante de controle (sem diferenciar maiúsculas)
+CONTROL_VARIANT_NAMES = ('control', 'controle', 'original', 'baseline', 'a', '0')
+SIGNIFICANCE_LEVEL = 0.05
+
+
+def _rate(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
+
+
+def two_proportion_z_test(successes_a: int, trials_a: int, successes_b: int, trials_b: int) -> Tuple[Optional[float], Optional[float]]:
+    """(z, p-valor bicaudal) da diferença entre as proporções B e A
+
+    None sem amostra ou com proporção fora de [0, 1]: transações são uma soma de eventos
+    e podem passar das sessões distintas, caso em que o teste não se aplica.
+    """
+    if not trials_a or not trials_b:
+        return None, None
+    if not (0 <= successes_a <= trials_a and 0 <= successes_b <= trials_b):
+        return None, None
+    pooled = (successes_a + successes_b) / (trials_a + trials_b)
+    standard_error = math.sqrt(pooled * (1 - pooled) * (1 / trials_a + 1 / trials_b))
+    if not standard_error:
+        return None, None
+    z = (successes_b / trials_b - successes_a / trials_a) / standard_error
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+def _control_variant(variants: List[Any]) -> Any:
+    """Variante de controle: pelo nome, ou a primeira em ordem alfabética"""
+    for variant in variants:
+        if variant.experiment_variant.strip().lower() in CONTROL_VARIANT_NAMES:
+            return variant
+    return min(variants, key=lambda variant: variant.experiment_variant)
+
+
+def _variant_stats(variant: Any, control: Any) -> Dict[str, Any]:
+    conversion_rate = _rate(variant.transactions, variant.sessions)
+    stats = {
+        'experiment_variant': variant.experiment_variant,
+        'is_control': variant is control,
+        **{name: getattr(variant, name) for name in EXPERIMENT_MEASURES},
+        'revenue': round(variant.revenue, 2),
+        'conversion_rate': round(conversion_rate * 100, 4),
+        'add_to_cart_rate': round(_rate(variant.add_to_cart, variant.sessions) * 100, 4),
+        'revenue_per_session': round(_rate(variant.revenue, variant.sessions), 4),
+        'average_ticket': round(_rate(variant.revenue, variant.transactions), 2),
+        'lift': None,
+        'z_score': None,
+        'p_value': None,
+        'significant': False,
+    }
+    if variant is not control:
+        control_rate = _rate(control.transactions, control.sessions)
+        z, p_value = two_proportion_z_test(control.transactions, control.sessions, variant.transactions, variant.sessions)
+        stats['lift'] = round((conversion_rate / control_rate - 1) * 100, 4) if control_rate else None
+        stats['z_score'] = round(z, 4) if z is not None else None
+        stats['p_value'] = round(p_value, 6) if p_value is not None else None
+        stats['significant'] = p_value is not None and p_value < SIGNIFICANCE_LEVEL
+    return stats
+
+
+def experiment_rollups(rows: EncodedRows) -> List[Dict[str, Any]]:
+    """Totais e estatísticas por experimento e variante, ordenados por sessões"""
+    by_variant = rows.group_by(EXPERIMENT_DIMENSIONS, EXPERIMENT_MEASURES)
+
+    experiments: Dict[Tuple[str, str], List[Any]] = {}
+    for variant in by_variant:
+        experiments.setdefault((variant.experiment_id, variant.experiment_name), []).append(variant)
+
+    rollups = []
+    for (experiment_id, experiment_name), variants in experiments.items():
+        control = _control_variant(variants)
+        variants.sort(key=lambda variant: (variant is not control, variant.experiment_variant))
+        sessions = sum(variant.sessions for variant in variants)
+        transactions = sum(variant.transactions for variant in variants)
+        revenue = sum(variant.revenue for variant in variants)
+        rollups.append({
+            'experiment_id': experiment_id,
+            'experiment_name': experiment_name,
+            'control_variant': control.experiment_variant,
+            'sessions': sessions,
+            'users': sum(variant.users for variant in variants),
+            'transactions': transactions,
+            'revenue': round(revenue, 2),
+            'conversion_rate': round(_rate(transactions, sessions) * 100, 4),
+            'variants': [_variant_stats(variant, control) for variant in variants],
+        })
+    rollups.sort(key=lambda experiment: experiment['sessions'], reverse=True)
+    return rollups
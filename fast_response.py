@@ -0,0 +1,139 @@
+"""
+Resposta rápida para os endpoints com muitas linhas
+
+Quando um endpoint retorna um modelo Pydantic, o FastAPI faz model_dump, revalida o
+resultado contra o `response_model`, serializa de novo e só então gera o JSON. Os
+endpoints de métricas montam as linhas a partir das dataclasses compactas
+(`compact_rows`), que já têm os campos e tipos dos modelos de resposta, então para
+10k-50k linhas essas passadas extras custam mais do que a consulta ao cache.
+
+Esses endpoints retornam `trusted_response(Modelo, ...)`: um dict com os campos do
+modelo, na ordem do modelo, marcado como já tipado. Rotas de `TrustedResponseRoute`
+codificam esse dict direto com orjson (ou json, se o orjson não estiver instalado),
+sem passar pela validação do FastAPI. O `response_model` continua na rota para a
+documentação OpenAPI. Chamadas diretas ao handler (batch, benchmark) recebem o dict.
+
+Com `TRUSTED_RESPONSE_VALIDATION=true` o conteúdo é validado contra o modelo antes de
+ser codificado, para encontrar divergências entre conversão e modelo em desenvolvimento.
+"""
+
+import asyncio
+import functools
+import json
+import math
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Type
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson está no requirements.txt
+    orjson = None
+
+TRUSTED_RESPONSE_VALIDATION = os.getenv('TRUSTED_RESPONSE_VALIDATION', 'false').lower() == 'true'
+
+
+def _default(value: Any) -> Any:
+    """Tipos que o orjson/json não serializam sozinhos"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if hasattr(value, 'dict'):
+        # Linhas compactas (compact_rows.compact_row_class)
+        return value.dict()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+
+def _finite(value: Any) -> Any:
+    """NaN e infinito viram None, como no orjson (o json os rejeita com allow_nan=False)"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def encode_json(content: Any) -> bytes:
+    """JSON compacto em UTF-8 (orjson quando disponível)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        _finite(content), default=lambda value: _finite(_default(value)),
+        ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse codificada com orjson, sem jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+class TrustedContent(dict):
+    """Conteúdo de resposta já tipado pela conversão, com o modelo que ele segue"""
+
+    __slots__ = ('model',)
+
+    def __init__(self, model: Type[BaseModel], content: Dict[str, Any]):
+        super().__init__(content)
+        self.model = model
+
+    def __getattr__(self, name: str) -> Any:
+        # Mantém `resultado.summary` funcionando para quem chama o handler direto
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def response(self) -> FastJSONResponse:
+        if TRUSTED_RESPONSE_VALIDATION:
+            self.model.model_validate(dict(self))
+        return FastJSONResponse(content=self)
+
+
+def trusted_response(model: Type[BaseModel], **content: Any) -> TrustedContent:
+    """Monta a resposta do `model` sem validação: campos na ordem do modelo, defaults
+    preenchidos e campos fora do modelo descartados (como faria a validação)"""
+    values = {}
+    for name, info in model.model_fields.items():
+        if name in content:
+            values[name] = content[name]
+        elif not info.is_required():
+            values[name] = info.get_default(call_default_factory=True)
+    return TrustedContent(model, values)
+
+
+def _trusted_endpoint(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if isinstance(result, TrustedContent):
+            return result.response()
+        return result
+    return wrapper
+
+
+class TrustedResponseRoute(APIRoute):
+    """Rota que codifica `TrustedContent` direto, sem a revalidação do response_model
+
+    Os demais retornos seguem o caminho normal do FastAPI.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        # Handlers síncronos ficam como estão (o FastAPI os executa no threadpool)
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _trusted_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
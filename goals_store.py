@@ -0,0 +1,181 @@
+"""
+Metas dos clientes (`dbt_config.user_goals`) em cache, com escrita direta
+
+As metas mudam poucas vezes por mês, mas `/metrics/goals` e `/admin/load-goals`
+consultavam o BigQuery a cada chamada. Agora a leitura passa por `goals_store`:
+
+- a primeira leitura de um cliente busca a linha no BigQuery e grava um arquivo JSON
+  por cliente em `GOALS_CACHE_DIR`;
+- as escritas (`/admin/save-monthly-goal`, `/admin/delete-goal`) gravam no BigQuery e
+  em seguida substituem o arquivo com as metas novas (write-through);
+- cada worker guarda as metas em memória junto com o mtime/inode do arquivo e só relê o
+  arquivo quando ele muda, então uma escrita num worker vale para todos os workers
+  do mesmo host sem consultar o BigQuery.
+
+Depois de `GOALS_CACHE_TTL_HOURS` a linha é buscada de novo no BigQuery, para
+refletir alterações feitas fora da API.
+"""
+
+import asyncio
+import copy
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from google.cloud import bigquery
+
+from utils import execute_bigquery_query_async
+
+GOALS_CACHE_DIR = os.getenv('GOALS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mymetric_goals'))
+GOALS_CACHE_TTL_HOURS = float(os.getenv('GOALS_CACHE_TTL_HOURS', '24'))
+
+# Metas aplicadas quando o cliente não tem metas configuradas
+DEFAULT_GOALS = {
+    "revenue_goal": 100000.0,
+    "orders_goal": 1000,
+    "conversion_rate_goal": 5.0,
+    "roas_goal": 8.0,
+    "new_customers_goal": 100
+}
+
+
+def parse_goals(goals: Any) -> Optional[Dict[str, Any]]:
+    """Converte a coluna `goals` (JSON em texto ou dict) em dict; None se vazia ou inválida"""
+    if isinstance(goals, str):
+        try:
+            goals = json.loads(goals)
+        except json.JSONDecodeError:
+            return None
+    return goals if isinstance(goals, dict) else None
+
+
+class GoalsStore:
+    """Metas por cliente: memória do worker + arquivo compartilhado + BigQuery"""
+
+    def __init__(self, directory: str = GOALS_CACHE_DIR):
+        self.directory = directory
+        # cliente -> ((mtime, inode) do arquivo, {'goals', 'stored_at'})
+        self.memory: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        self.loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, tablename: str) -> str:
+        return os.path.join(self.directory, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', tablename)}.json")
+
+    def _read(self, tablename: str) -> Optional[Dict[str, Any]]:
+        """Entrada do cliente, da memória ou do arquivo (se ele mudou); None se não houver"""
+        path = self._path(tablename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.memory.pop(tablename, None)
+            return None
+
+        version = (stat.st_mtime_ns, stat.st_ino)
+        cached = self.memory.get(tablename)
+        if cached and cached[0] == version:
+            return cached[1]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Erro ao ler metas em cache de {tablename}: {e}")
+            return None
+        self.memory[tablename] = (version, entry)
+        return entry
+
+    def _write(self, tablename: str, goals: Optional[Dict[str, Any]]) -> None:
+        """Grava as metas do cliente (arquivo temporário + rename, atômico entre workers)"""
+        entry = {'goals': goals, 'stored_at': time.time()}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            path = self._path(tablename)
+            os.replace(temp_path, path)
+            stat = os.stat(path)
+            self.memory[tablename] = ((stat.st_mtime_ns, stat.st_ino), entry)
+        except OSError as e:
+            # Sem o arquivo os outros workers não veem a escrita: descarta a cópia local
+            print(f"⚠️ Erro ao gravar metas em cache de {tablename}: {e}")
+            self.memory.pop(tablename, None)
+
+    async def _load(self, tablename: str) -> Optional[Dict[str, Any]]:
+        query = """
+        SELECT goals
+        FROM `mymetric-hub-shopify.dbt_config.user_goals`
+        WHERE username = @username
+        LIMIT 1
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("username", "STRING", tablename)]
+        )
+        started = time.time()
+        rows = await execute_bigquery_query_async(query, job_config)
+        # None: cliente sem linha de metas; {}: linha com metas vazias ou inválidas
+        goals = (parse_goals(rows[0].goals) or {}) if rows else None
+
+        # Uma escrita concluída durante a leitura tem precedência sobre a linha lida
+        entry = self._read(tablename)
+        if entry is not None and entry['stored_at'] >= started:
+            return entry['goals']
+        self._write(tablename, goals)
+        print(f"🎯 Metas de {tablename} carregadas do BigQuery")
+        return goals
+
+    async def get(self, tablename: str) -> Optional[Dict[str, Any]]:
+        """Metas do cliente (cópia, pode ser alterada); None se o cliente não tiver linha de metas"""
+        entry = self._read(tablename)
+        if entry is not None and time.time() - entry['stored_at'] < GOALS_CACHE_TTL_HOURS * 3600:
+            self.hits += 1
+            return copy.deepcopy(entry['goals'])
+
+        self.misses += 1
+        loading = self.loading.get(tablename)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(tablename))
+            self.loading[tablename] = loading
+            loading.add_done_callback(lambda _: self.loading.pop(tablename, None))
+        return copy.deepcopy(await asyncio.shield(loading))
+
+    def put(self, tablename: str, goals: Optional[Dict[str, Any]]) -> None:
+        """Atualiza o cache depois de uma escrita confirmada no BigQuery"""
+        self._write(tablename, copy.deepcopy(goals))
+        print(f"🎯 Metas de {tablename} atualizadas no cache")
+
+    def invalidate(self, tablename: str) -> None:
+        """Descarta as metas do cliente (a próxima leitura vai ao BigQuery)"""
+        self.memory.pop(tablename, None)
+        try:
+            os.remove(self._path(tablename))
+        except FileNotFoundError:
+            pass
+
+    def flush(self) -> Dict[str, Any]:
+        removed = 0
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+        self.memory.clear()
+        return {'action': 'flush', 'files_removed': removed}
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'directory': self.directory,
+            'ttl_hours': GOALS_CACHE_TTL_HOURS,
+            'tenants_in_memory': len(self.memory),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+goals_store = GoalsStore()
@@ -0,0 +1,101 @@
+"""
+Atualização incremental de resultados por dia
+
+Em intervalos que incluem hoje ("mês até hoje"), só os dias abertos mudam entre uma
+atualização e outra: hoje em America/Sao_Paulo mais uma janela de chegada tardia
+(`INCREMENTAL_LATE_ARRIVAL_DAYS`, padrão 1 dia). Os dias fechados ficam guardados
+por dia em um cache de histórico e são reaproveitados por qualquer intervalo que os
+contenha; cada atualização consulta apenas os dias abertos e os dias fechados que
+ainda não estão no histórico.
+"""
+
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from cache_manager import CacheManager, TIMEZONE
+
+LATE_ARRIVAL_DAYS = int(os.getenv('INCREMENTAL_LATE_ARRIVAL_DAYS', '1'))
+
+
+def first_open_day() -> date:
+    """Primeiro dia ainda sujeito a mudanças (hoje menos a janela de chegada tardia)"""
+    return datetime.now(TIMEZONE).date() - timedelta(days=LATE_ARRIVAL_DAYS)
+
+
+def days_between(start_date: str, end_date: str) -> List[str]:
+    """Dias do intervalo (inclusivo) no formato YYYY-MM-DD"""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+def split_days(start_date: str, end_date: str) -> Tuple[List[str], List[str]]:
+    """Separa os dias do intervalo em (fechados, abertos)"""
+    first_open = first_open_day().isoformat()
+    days = days_between(start_date, end_date)
+    return [day for day in days if day < first_open], [day for day in days if day >= first_open]
+
+
+def contiguous_ranges(days: List[str]) -> List[Tuple[str, str]]:
+    """Agrupa dias ordenados em intervalos contínuos (início, fim)"""
+    ranges: List[Tuple[str, str]] = []
+    previous = None
+    for day in days:
+        current = date.fromisoformat(day)
+        if previous is not None and current - previous == timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+        previous = current
+    return ranges
+
+
+async def load_by_day(
+    history_cache: CacheManager,
+    cache_params: Dict[str, Any],
+    start_date: str,
+    end_date: str,
+    fetch_range: Callable[[str, str], Awaitable[Dict[str, Any]]],
+    empty: Callable[[], Any],
+) -> List[Any]:
+    """Retorna a parte de cada dia do intervalo, em ordem cronológica
+
+    `fetch_range(start, end)` consulta um intervalo contínuo e devolve {dia: parte};
+    dias sem dados recebem `empty()`. Dias fechados consultados são gravados em
+    `history_cache` (chave: `cache_params` + dia); dias abertos nunca são gravados.
+    """
+    closed_days, open_days = split_days(start_date, end_date)
+
+    parts: Dict[str, Any] = {}
+    missing: List[str] = []
+    for day in closed_days:
+        part = history_cache.get(**cache_params, day=day)
+        if part is None:
+            missing.append(day)
+        else:
+            parts[day] = part
+
+    # Um intervalo por sequência contínua de dias fechados que faltam e outro para os
+    # abertos, em paralelo (dias já no histórico não são consultados de novo)
+    ranges = contiguous_ranges(missing)
+    if open_days:
+        ranges.append((open_days[0], open_days[-1]))
+
+    fetched: Dict[str, Any] = {}
+    for result in await asyncio.gather(*(fetch_range(start, end) for start, end in ranges)):
+        fetched.update(result)
+
+    # Só os dias que faltavam são gravados no histórico
+    for day in missing:
+        part = fetched.get(day)
+        parts[day] = part if part is not None else empty()
+        history_cache.set(parts[day], **cache_params, day=day)
+
+    for day in open_days:
+        part = fetched.get(day)
+        parts[day] = part if part is not None else empty()
+
+    print(f"📅 Atualização incremental: {len(closed_days) - len(missing)} dias do histórico, {len(missing)} dias fechados e {len(open_days)} abertos consultados em {len(ranges)} intervalos")
+    return [parts[day] for day in days_between(start_date, end_date)]
@@ -3,7 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import os
 from dotenv import load_dotenv
 from google.cloud import bigquery
@@ -13,9 +13,13 @@ from datetime import datetime, timedelta
 import hashlib
 
 # Importar utilitários e routers
-from utils import verify_token, TokenData, get_bigquery_client, create_access_token, create_refresh_token, verify_refresh_token, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, verify_admin_user, generate_secure_password
+from utils import verify_token, TokenData, get_bigquery_client, execute_bigquery_query_async, get_user_access, create_access_token, create_refresh_token, verify_refresh_token, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, verify_admin_user, invalidate_user_access, generate_secure_password, SECRET_KEY, ALGORITHM
 from email_service import email_service
 from metrics import metrics_router
+from tenant_catalog import tenant_catalog
+from cache_manager import experiments_cache
+from compact_rows import EncodedRows, compact_row_class, rows_to_dicts
+from experiment_stats import experiment_rollups
 from admin import admin_router
 from zapi_service import zapi_service
 
@@ -103,6 +107,42 @@ class ExperimentQuery(BaseModel):
     start_date: str
     end_date: str
 
+class ExperimentVariantSummary(BaseModel):
+    experiment_variant: str
+    is_control: bool
+    sessions: int
+    users: int
+    transactions: int
+    revenue: float
+    add_to_cart: int
+    begin_checkout: int
+    add_shipping_info: int
+    add_payment_info: int
+    conversion_rate: float  # %
+    add_to_cart_rate: float  # %
+    revenue_per_session: float
+    average_ticket: float
+    lift: Optional[float] = None  # % sobre a conversão do controle
+    z_score: Optional[float] = None
+    p_value: Optional[float] = None
+    significant: bool = False
+
+class ExperimentSummary(BaseModel):
+    experiment_id: str
+    experiment_name: str
+    control_variant: str
+    sessions: int
+    users: int
+    transactions: int
+    revenue: float
+    conversion_rate: float  # %
+    variants: List[ExperimentVariantSummary]
+
+class ExperimentsSummaryResponse(BaseModel):
+    experiments: List[ExperimentSummary]
+    total_rows: int  # Linhas diárias usadas no cálculo
+    cache_info: Optional[Dict[str, Any]] = None
+
 class CreateUserRequest(BaseModel):
     email: str
     table_name: str
@@ -122,6 +162,9 @@ async def root():
 
 @app.on_event("startup")
 async def on_startup_event():
+    # Catálogo de clientes (projetos, tabelas e colunas), recarregado em background
+    tenant_catalog.start()
+    
     # Envia um log simples de inicialização (silencioso se não configurado)
     log_to_better_stack(
         message="API started",
@@ -133,12 +176,57 @@ async def on_startup_event():
     )
 
 
+# Captura opcional das requisições /metrics/* em JSONL (entrada do replay_traffic.py)
+REQUEST_CAPTURE_FILE = os.getenv("REQUEST_CAPTURE_FILE")
+
+
+def capture_request(request, body_bytes: bytes, status_code: int, duration_ms: int):
+    """Anexa a requisição ao arquivo de captura (best-effort)"""
+    try:
+        user_email = None
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            user_email = payload.get("sub")
+
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "method": request.method,
+            "path": request.url.path,
+            "request_data": json.loads(body_bytes) if body_bytes else None,
+            "user_email": user_email,
+            "status": status_code,
+            "duration_ms": duration_ms,
+        }
+        with open(REQUEST_CAPTURE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"⚠️ Erro ao capturar request: {e}")
+
+
+# Respostas em stream (NDJSON, SSE, Arrow) e binárias (Parquet) passam sem ser lidas:
+# acumular o corpo atrasaria o envio até o fim e o corpo binário não serve para o log
+UNBUFFERED_MEDIA_TYPES = (
+    "application/x-ndjson",
+    "text/event-stream",
+    "application/vnd.apache.arrow.stream",
+    "application/vnd.apache.parquet",
+    "application/octet-stream",
+)
+
+
+def _is_unbuffered_response(response) -> bool:
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in UNBUFFERED_MEDIA_TYPES
+
+
 @app.middleware("http")
 async def better_stack_logging_middleware(request, call_next):
     start_time = time.time()
 
     # Skip body processing for GET/HEAD requests to improve performance
     request_body_text = None
+    body_bytes = b""
     if request.method.upper() == "POST":
         try:
             body_bytes = await request.body()
@@ -167,7 +255,10 @@ async def better_stack_logging_middleware(request, call_next):
     resp_body_bytes = b""
     response_text = None
     
-    if request.method.upper() == "POST" or status_code >= 400:
+    if _is_unbuffered_response(response):
+        # Repassa o stream como está (o log fica sem o corpo da resposta)
+        new_response = response
+    elif request.method.upper() == "POST" or status_code >= 400:
         try:
             async for chunk in response.body_iterator:
                 resp_body_bytes += chunk
@@ -189,6 +280,9 @@ async def better_stack_logging_middleware(request, call_next):
 
     duration_ms = int((time.time() - start_time) * 1000)
 
+    if REQUEST_CAPTURE_FILE and request.method.upper() == "POST" and request.url.path.startswith("/metrics/"):
+        capture_request(request, body_bytes, status_code, duration_ms)
+
     # Sanitize headers (only for POST or errors)
     req_headers = {k: v for k, v in request.headers.items() if k.lower() not in ("authorization", "cookie")}
 
@@ -493,6 +587,8 @@ async def delete_user(email: str, token: TokenData = Depends(verify_token)):
         
         query_job = client.query(query, job_config=job_config)
         query_job.result()  # Aguardar conclusão
+        # Acesso em cache deixaria o usuário removido consultar dados até expirar
+        invalidate_user_access(email)
         
         return {"message": f"Usuário {email} deletado com sucesso"}
         
@@ -548,6 +644,8 @@ async def create_user(
         # Executar query
         query_job = client.query(query)
         query_job.result()  # Aguardar conclusão
+        # Tabela, admin e access_control podem ter mudado
+        invalidate_user_access(user_data.email)
         
         # Enviar email com as credenciais
         email_sent = False
@@ -784,101 +882,163 @@ async def forgot_password(request: dict):
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+CompactExperimentData = compact_row_class(ExperimentData)
+EXPERIMENTS_DICTIONARY_FIELDS = ('event_date', 'experiment_id', 'experiment_name', 'experiment_variant', 'category')
+
+async def _load_experiments(query_params: ExperimentQuery, email: str):
+    """Linhas diárias dos experimentos do cliente no período, do cache ou do BigQuery
+
+    Retorna (dados em cache, origem). O cache é por cliente e período, compartilhado
+    pelas linhas diárias e pelas estatísticas por variante.
+    """
+    # Buscar informações do usuário para controle de acesso
+    user_access = await get_user_access(email)
+    if not user_access:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+
+    user_tablename, _ = user_access
+    if user_tablename != 'all' and query_params.table_name != user_tablename:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{query_params.table_name}'"
+        )
+
+    cache_params = {
+        'table_name': query_params.table_name,
+        'start_date': query_params.start_date,
+        'end_date': query_params.end_date
+    }
+    cached_data = experiments_cache.get(**cache_params)
+    if cached_data:
+        return cached_data, 'cache'
+
+    # Query para buscar dados de experimentos
+    # Constrói o nome da tabela usando o nome do cliente + sufixo fixo
+    experiments_table = f"{query_params.table_name}_experiment_impressions_results"
+    table_name = f"dbt_join.{experiments_table}"
+    
+    # Verificar no catálogo de clientes se a tabela existe (e em qual projeto); tabelas
+    # fora do catálogo são sondadas no INFORMATION_SCHEMA
+    experiments_info = await tenant_catalog.table(query_params.table_name, 'dbt_join', experiments_table)
+    if experiments_info:
+        table_name = f"{experiments_info[0]}.{table_name}"
+    else:
+        print(f"Tabela {table_name} não encontrada")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tabela {table_name} não encontrada ou não acessível"
+        )
+    
+    query = f"""
+    SELECT
+        event_date,
+        experiment_id,
+        experiment_name,
+        experiment_variant,
+        category,
+        COUNT(DISTINCT CONCAT(user_pseudo_id, ga_session_id)) as sessions,
+        COUNT(DISTINCT user_pseudo_id) as users,
+        SUM(transactions) as transactions,
+        ROUND(SUM(revenue), 2) as revenue,
+        SUM(add_to_cart) as add_to_cart,
+        SUM(begin_checkout) as begin_checkout,
+        SUM(add_shipping_info) as add_shipping_info,
+        SUM(add_payment_info) as add_payment_info
+    FROM `{table_name}`
+    WHERE event_date BETWEEN @start_date AND @end_date
+    GROUP BY 
+        event_date,
+        experiment_id,
+        experiment_name,
+        experiment_variant,
+        category
+    ORDER BY revenue DESC
+    """
+    
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("start_date", "STRING", query_params.start_date),
+            bigquery.ScalarQueryParameter("end_date", "STRING", query_params.end_date),
+        ]
+    )
+    
+    results = await execute_bigquery_query_async(query, job_config)
+    
+    # Converter resultados para linhas compactas
+    experiment_data = []
+    for row in results:
+        experiment_data.append(CompactExperimentData(
+            event_date=str(row.event_date) if row.event_date else "",
+            experiment_id=str(row.experiment_id) if row.experiment_id else "",
+            experiment_name=str(row.experiment_name) if row.experiment_name else "",
+            experiment_variant=str(row.experiment_variant) if row.experiment_variant else "",
+            category=str(row.category) if row.category else "",
+            sessions=int(row.sessions) if row.sessions is not None else 0,
+            users=int(row.users) if row.users is not None else 0,
+            transactions=int(row.transactions) if row.transactions is not None else 0,
+            revenue=float(row.revenue) if row.revenue is not None else 0.0,
+            add_to_cart=int(row.add_to_cart) if row.add_to_cart is not None else 0,
+            begin_checkout=int(row.begin_checkout) if row.begin_checkout is not None else 0,
+            add_shipping_info=int(row.add_shipping_info) if row.add_shipping_info is not None else 0,
+            add_payment_info=int(row.add_payment_info) if row.add_payment_info is not None else 0
+        ))
+    
+    cached_data = {
+        'data': EncodedRows(experiment_data, CompactExperimentData, EXPERIMENTS_DICTIONARY_FIELDS),
+        'cached_at': datetime.now().isoformat()
+    }
+    experiments_cache.set(cached_data, **cache_params)
+    return cached_data, 'database'
+
 @app.post("/metrics/experiments", response_model=List[ExperimentData])
 async def get_experiment_data(
     query_params: ExperimentQuery,
     token: TokenData = Depends(verify_token)
 ):
-    """Endpoint para buscar dados de experimentos"""
-    client = get_bigquery_client()
-    if not client:
+    """Endpoint para buscar dados de experimentos (linhas por dia, variante e categoria)"""
+    try:
+        cached_data, _ = await _load_experiments(query_params, token.email)
+        return rows_to_dicts(cached_data['data'])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro ao buscar dados de experimentos: {e}")
+        import traceback
+        traceback.print_exc()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
+            detail=f"Erro interno do servidor: {str(e)}"
         )
-    
+
+@app.post("/metrics/experiments/summary", response_model=ExperimentsSummaryResponse)
+async def get_experiments_summary(
+    query_params: ExperimentQuery,
+    token: TokenData = Depends(verify_token)
+):
+    """
+    Totais por experimento e por variante no período, com taxa de conversão, lift
+    sobre o controle e significância (teste z de duas proporções).
+    Usa o mesmo cache de /metrics/experiments.
+    """
     try:
-        # Query para buscar dados de experimentos
-        # Constrói o nome da tabela usando o nome do cliente + sufixo fixo
-        table_name = f"dbt_join.{query_params.table_name}_experiment_impressions_results"
-        
-        # Primeiro verificar se a tabela existe
-        check_table_query = f"""
-        SELECT COUNT(*) as table_exists
-        FROM `{table_name}`
-        LIMIT 1
-        """
-        
-        try:
-            check_job = client.query(check_table_query)
-            check_results = list(check_job.result())
-            print(f"Tabela {table_name} encontrada e acessível")
-        except Exception as e:
-            print(f"Erro ao acessar tabela {table_name}: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Tabela {table_name} não encontrada ou não acessível"
-            )
-        
-        query = f"""
-        SELECT
-            event_date,
-            experiment_id,
-            experiment_name,
-            experiment_variant,
-            category,
-            COUNT(DISTINCT CONCAT(user_pseudo_id, ga_session_id)) as sessions,
-            COUNT(DISTINCT user_pseudo_id) as users,
-            SUM(transactions) as transactions,
-            ROUND(SUM(revenue), 2) as revenue,
-            SUM(add_to_cart) as add_to_cart,
-            SUM(begin_checkout) as begin_checkout,
-            SUM(add_shipping_info) as add_shipping_info,
-            SUM(add_payment_info) as add_payment_info
-        FROM `{table_name}`
-        WHERE event_date BETWEEN @start_date AND @end_date
-        GROUP BY 
-            event_date,
-            experiment_id,
-            experiment_name,
-            experiment_variant,
-            category
-        ORDER BY revenue DESC
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("start_date", "STRING", query_params.start_date),
-                bigquery.ScalarQueryParameter("end_date", "STRING", query_params.end_date),
-            ]
+        cached_data, source = await _load_experiments(query_params, token.email)
+        if 'rollups' not in cached_data:
+            cached_data['rollups'] = experiment_rollups(cached_data['data'])
+        
+        return ExperimentsSummaryResponse(
+            experiments=cached_data['rollups'],
+            total_rows=len(cached_data['data']),
+            cache_info={
+                'source': source,
+                'cached_at': cached_data['cached_at']
+            }
         )
         
-        query_job = client.query(query, job_config=job_config)
-        results = list(query_job.result())
-        
-        # Converter resultados para o modelo Pydantic
-        experiment_data = []
-        for row in results:
-            experiment_data.append(ExperimentData(
-                event_date=str(row.event_date) if row.event_date else "",
-                experiment_id=str(row.experiment_id) if row.experiment_id else "",
-                experiment_name=str(row.experiment_name) if row.experiment_name else "",
-                experiment_variant=str(row.experiment_variant) if row.experiment_variant else "",
-                category=str(row.category) if row.category else "",
-                sessions=int(row.sessions) if row.sessions is not None else 0,
-                users=int(row.users) if row.users is not None else 0,
-                transactions=int(row.transactions) if row.transactions is not None else 0,
-                revenue=float(row.revenue) if row.revenue is not None else 0.0,
-                add_to_cart=int(row.add_to_cart) if row.add_to_cart is not None else 0,
-                begin_checkout=int(row.begin_checkout) if row.begin_checkout is not None else 0,
-                add_shipping_info=int(row.add_shipping_info) if row.add_shipping_info is not None else 0,
-                add_payment_info=int(row.add_payment_info) if row.add_payment_info is not None else 0
-            ))
-        
-        return experiment_data
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Erro ao buscar dados de experimentos: {e}")
+        print(f"Erro ao calcular o sumário de experimentos: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(
@@ -2,20 +2,35 @@
 Módulo de endpoints para métricas do dashboard
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 import asyncio
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+import json
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, Union
 from google.cloud import bigquery
 from datetime import datetime, timedelta
 import os
 import math
+import time
+from operator import attrgetter
 
-from utils import verify_token, TokenData, get_bigquery_client, execute_bigquery_query_async
-from cache_manager import basic_data_cache, daily_metrics_cache, orders_cache, detailed_data_cache, product_trend_cache, ads_campaigns_results_cache, realtime_cache, leads_orders_cache, shipping_calc_cache, last_request_manager
+from utils import verify_token, verify_stream_token, TokenData, get_bigquery_client, execute_bigquery_query_async, get_user_access, verify_admin_user, create_stream_ticket, STREAM_TICKET_EXPIRE_SECONDS
+from compact_rows import compact_row_class, rows_to_dicts, rows_to_columns, column_schema, EncodedRows
+from fast_response import TrustedResponseRoute, trusted_response
+from arrow_export import DOWNLOAD_FORMATS, encoded_rows_table, requested_download_format, rows_table, table_response
+from event_cube import EventCube, get_event_cube
+from incremental_refresh import load_by_day
+from realtime_stream import REALTIME_POLL_INTERVAL_SECONDS, event_stream, get_stream_stats
+from realtime_revenue import REALTIME_REVENUE_TTL_SECONDS, get_realtime_revenue as get_shared_realtime_revenue, get_realtime_revenue_stats
+from tenant_catalog import tenant_catalog
+from goals_store import DEFAULT_GOALS, goals_store
+from realtime_window import REALTIME_WINDOW_HOURS, RealtimeWindow, get_realtime_window, watermark_job_config
+from cache_manager import basic_data_cache, daily_metrics_cache, orders_cache, detailed_data_cache, product_trend_cache, ads_campaigns_results_cache, realtime_cache, leads_orders_cache, shipping_calc_cache, event_cube_cache, event_cube_history_cache, orders_history_cache, realtime_revenue_cache, user_lookup_cache, items_scoring_cache, experiments_cache, portfolio_cache, last_request_manager
 
 # Router para métricas
-metrics_router = APIRouter(prefix="/metrics", tags=["metrics"])
+metrics_router = APIRouter(prefix="/metrics", tags=["metrics"], route_class=TrustedResponseRoute)
 
 # Modelos Pydantic para métricas
 class MetricData(BaseModel):
@@ -38,6 +53,17 @@ class DashboardMetrics(BaseModel):
     top_products: List[Dict[str, Any]]
     recent_activity: List[Dict[str, Any]]
 
+# Formato colunar (format=columnar): um array por coluna em vez de um objeto por linha
+class ColumnarField(BaseModel):
+    name: str
+    type: str  # string, integer, number, boolean ou any
+    nullable: bool
+
+class ColumnarData(BaseModel):
+    fields: List[ColumnarField]
+    row_count: int
+    columns: Dict[str, List[Any]]
+
 # Novos modelos para dados básicos
 class BasicDataRequest(BaseModel):
     start_date: str
@@ -80,6 +106,27 @@ class BasicDataResponse(BaseModel):
     data: List[BasicDataRow]
     cache_info: Optional[Dict[str, Any]] = None
 
+# Modelos para o sumário de vários clientes (usuários com acesso total)
+class PortfolioSummaryRequest(BaseModel):
+    start_date: str
+    end_date: str
+    attribution_model: Optional[str] = "Último Clique Não Direto"
+    table_names: Optional[List[str]] = None  # Padrão: todos os clientes do catálogo
+
+class PortfolioTenantSummary(BaseModel):
+    table_name: str
+    summary: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class PortfolioSummaryResponse(BaseModel):
+    summary: Dict[str, Any]
+    tenants: List[PortfolioTenantSummary]
+    cached_at: Optional[str] = None
+    cache_info: Optional[Dict[str, Any]] = None
+
+PORTFOLIO_MAX_CONCURRENCY = int(os.getenv('PORTFOLIO_MAX_CONCURRENCY', '4'))
+PORTFOLIO_TIMEOUT_SECONDS = float(os.getenv('PORTFOLIO_TIMEOUT_SECONDS', '60'))
+
 # Novos modelos para dados diários de métricas
 class DailyMetricsRequest(BaseModel):
     start_date: str
@@ -111,6 +158,11 @@ class OrdersRequest(BaseModel):
     traffic_category: Optional[str] = None
     fs_traffic_category: Optional[str] = None
     fsm_traffic_category: Optional[str] = None
+    status: Optional[str] = None
+    source: Optional[str] = None
+    medium: Optional[str] = None
+    campaign: Optional[str] = None
+    format: Optional[str] = None  # rows (padrão), columnar, arrow ou parquet (também via ?format= ou Accept)
 
 class OrderRow(BaseModel):
     Horario: str
@@ -148,7 +200,7 @@ class OrderRow(BaseModel):
     Parametros_de_URL_Primeiro_Lead: str
 
 class OrdersResponse(BaseModel):
-    data: List[OrderRow]
+    data: Union[List[OrderRow], ColumnarData]
     total_rows: int
     summary: Dict[str, Any]
     pagination: Optional[Dict[str, Any]] = None
@@ -176,17 +228,20 @@ class DetailedDataRequest(BaseModel):
     limit: Optional[int] = 10000  # Limitar resultados
     offset: Optional[int] = 0    # Paginação
     order_by: Optional[str] = "Pedidos"  # Campo para ordenação
+    group_by: Optional[List[str]] = None  # Dimensões a manter (agrega as demais); None = todas
+    format: Optional[str] = "rows"  # rows ou columnar
 
+# Dimensões fora do group_by vêm como null
 class DetailedDataRow(BaseModel):
-    Data: str
-    Hora: int
-    Origem: str
-    Midia: str
-    Campanha: str
-    Pagina_de_Entrada: str
-    Conteudo: str
-    Cupom: str
-    Cluster: str
+    Data: Optional[str] = None
+    Hora: Optional[int] = None
+    Origem: Optional[str] = None
+    Midia: Optional[str] = None
+    Campanha: Optional[str] = None
+    Pagina_de_Entrada: Optional[str] = None
+    Conteudo: Optional[str] = None
+    Cupom: Optional[str] = None
+    Cluster: Optional[str] = None
     Sessoes: int
     Adicoes_ao_Carrinho: int
     Pedidos: int
@@ -197,7 +252,7 @@ class DetailedDataRow(BaseModel):
 class DetailedDataResponse(BaseModel):
     summary: Dict[str, Any]
     total_rows: int
-    data: List[DetailedDataRow]
+    data: Union[List[DetailedDataRow], ColumnarData]
     cache_info: Optional[Dict[str, Any]] = None
     pagination: Optional[Dict[str, Any]] = None
 
@@ -301,6 +356,7 @@ class AdsCreativesResultsRequest(BaseModel):
     table_name: Optional[str] = None
     last_cache: Optional[bool] = False
     force_refresh: Optional[bool] = False
+    format: Optional[str] = "rows"  # rows ou columnar
 
 class AdsCreativesResultsRow(BaseModel):
     platform: str
@@ -324,7 +380,7 @@ class AdsCreativesResultsRow(BaseModel):
     revenue_first_origin_stack: float
 
 class AdsCreativesResultsResponse(BaseModel):
-    data: List[AdsCreativesResultsRow]
+    data: Union[List[AdsCreativesResultsRow], ColumnarData]
     total_rows: int
     summary: Dict[str, Any]
     cache_info: Optional[Dict[str, Any]] = None
@@ -365,6 +421,51 @@ class RealtimeRevenueResponse(BaseModel):
     table_name: str
     cache_info: Optional[Dict[str, Any]] = None
 
+class StreamTicketResponse(BaseModel):
+    ticket: str
+    expires_in: int
+
+# Modelos para a série por minuto do realtime
+class RealtimeSeriesRequest(BaseModel):
+    table_name: Optional[str] = None
+    hours: float = 1
+
+class RealtimeSeriesPoint(BaseModel):
+    minute: str
+    revenue: float
+    orders: int
+    items: int
+
+class RealtimeSeriesResponse(BaseModel):
+    data: List[RealtimeSeriesPoint]
+    total_rows: int
+    summary: Dict[str, Any]
+    cache_info: Optional[Dict[str, Any]] = None
+
+# Modelos para o batch (várias consultas do dashboard numa requisição)
+class BatchSubRequest(BaseModel):
+    endpoint: str  # Ex.: "basic-data", "daily-metrics", "goals", "realtime-revenue"
+    params: Dict[str, Any] = {}  # Corpo que seria enviado ao endpoint
+    id: Optional[str] = None  # Identificador devolvido no resultado (padrão: endpoint)
+
+class BatchRequest(BaseModel):
+    table_name: Optional[str] = None  # Aplicado às sub-requisições sem table_name
+    requests: List[BatchSubRequest]
+    stream: Optional[bool] = False  # NDJSON, uma linha por sub-requisição concluída
+
+class BatchResult(BaseModel):
+    id: str
+    endpoint: str
+    status: int
+    data: Optional[Any] = None
+    error: Optional[str] = None
+    elapsed_ms: float
+
+class BatchResponse(BaseModel):
+    table_name: str
+    results: List[BatchResult]
+    elapsed_ms: float
+
 
 # -------------------------------
 # Shipping Calc Analytics (geral)
@@ -393,11 +494,19 @@ class ShippingCalcAnalyticsResponse(BaseModel):
     summary: ShippingCalcAnalyticsSummary
     data: List[ShippingCalcAnalyticsRow]
     total_rows: int
+    group_by: Optional[List[str]] = None
+    cache_info: Optional[Dict[str, Any]] = None
+    pagination: Optional[Dict[str, Any]] = None
 
 class ShippingCalcAnalyticsRequest(BaseModel):
     table_name: Optional[str] = None
     start_date: Optional[str] = None  # YYYY-MM-DD
     end_date: Optional[str] = None    # YYYY-MM-DD
+    group_by: Optional[List[str]] = None  # Ex.: ["zipcode_region"], ["item_id", "item_name"]
+    order_by: Optional[str] = None  # Métrica da ordenação decrescente (padrão com group_by: calculations)
+    top_n: Optional[int] = None
+    limit: Optional[int] = None
+    offset: Optional[int] = 0
 
 # Modelos para leads_orders
 class LeadsOrdersRequest(BaseModel):
@@ -408,6 +517,7 @@ class LeadsOrdersRequest(BaseModel):
     force_refresh: Optional[bool] = False
     limit: Optional[int] = 5000
     offset: Optional[int] = 0
+    format: Optional[str] = None  # rows (padrão), columnar, arrow ou parquet (também via ?format= ou Accept)
 
 class LeadsOrdersRow(BaseModel):
     subscribe_timestamp: Optional[str] = None
@@ -428,13 +538,76 @@ class LeadsOrdersRow(BaseModel):
 
 class LeadsOrdersResponse(BaseModel):
     summary: Dict[str, Any]
-    data: List[LeadsOrdersRow]
+    data: Union[List[LeadsOrdersRow], ColumnarData]
     total_rows: int
     total_records: int  # Total de registros antes da paginação
     cache_info: Optional[Dict[str, Any]] = None
     pagination: Optional[Dict[str, Any]] = None
 
-def _run_shipping_calc_query(client, project_name: str, tablename: str, start_date: Optional[str], end_date: Optional[str]) -> List[ShippingCalcAnalyticsRow]:
+# Linhas compactas (dataclasses com __slots__) usadas no processamento e no cache;
+# os modelos Pydantic acima ficam apenas na fronteira da API
+CompactShippingCalcAnalyticsRow = compact_row_class(ShippingCalcAnalyticsRow)
+CompactBasicDataRow = compact_row_class(BasicDataRow)
+CompactDailyMetricsRow = compact_row_class(DailyMetricsRow)
+CompactOrderRow = compact_row_class(OrderRow)
+CompactDetailedDataRow = compact_row_class(DetailedDataRow)
+CompactAdsCampaignsResultsRow = compact_row_class(AdsCampaignsResultsRow)
+CompactAdsCreativesResultsRow = compact_row_class(AdsCreativesResultsRow)
+CompactRealtimeRow = compact_row_class(RealtimeRow)
+CompactLeadsOrdersRow = compact_row_class(LeadsOrdersRow)
+
+# Dimensões repetitivas guardadas com codificação por dicionário nos datasets em cache
+ORDERS_DICTIONARY_FIELDS = tuple(
+    f"{field}{suffix}"
+    for field in ('Categoria_de_Trafico', 'Origem', 'Midia', 'Campanha', 'Conteudo', 'Pagina_de_Entrada')
+    for suffix in ('', '_Primeiro_Clique', '_Primeiro_Lead')
+) + ('Status', 'Canal')
+# Filtros do /orders aplicados sobre o dataset em cache: campo do request -> coluna
+ORDERS_FILTER_COLUMNS = {
+    'traffic_category': 'Categoria_de_Trafico',
+    'fs_traffic_category': 'Categoria_de_Trafico_Primeiro_Clique',
+    'fsm_traffic_category': 'Categoria_de_Trafico_Primeiro_Lead',
+    'status': 'Status',
+    'source': 'Origem',
+    'medium': 'Midia',
+    'campaign': 'Campanha',
+}
+RESPONSE_FORMATS = ('rows', 'columnar')
+SHIPPING_CALC_DICTIONARY_FIELDS = (
+    'event_date', 'zipcode', 'zipcode_region', 'item_id', 'item_name', 'item_brand', 'item_variant', 'item_category'
+)
+DETAILED_DATA_DICTIONARY_FIELDS = (
+    'Data', 'Origem', 'Midia', 'Campanha', 'Pagina_de_Entrada', 'Conteudo', 'Cupom', 'Cluster'
+)
+
+def _parse_response_format(response_format: Optional[str], formats: Tuple[str, ...] = RESPONSE_FORMATS) -> str:
+    """Formato da página de dados: 'rows' (padrão, um objeto por linha), 'columnar' ou,
+    nos endpoints de download, um dos `formats` binários"""
+    response_format = (response_format or 'rows').strip().lower()
+    if response_format not in formats:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formato inválido: {response_format}. Válidos: {', '.join(formats)}"
+        )
+    return response_format
+
+def _columnar_data(row_class: type, columns: Dict[str, List[Any]], row_count: int) -> Dict[str, Any]:
+    return {'fields': column_schema(row_class), 'row_count': row_count, 'columns': columns}
+
+def _page_data(rows: List[Any], row_class: type, response_format: str) -> Any:
+    """`data` da resposta para uma lista de linhas compactas, no formato pedido"""
+    if response_format == 'columnar':
+        return _columnar_data(row_class, rows_to_columns(rows, row_class), len(rows))
+    return rows_to_dicts(rows)
+
+def _encoded_page_data(encoded: EncodedRows, positions: Any, response_format: str) -> Any:
+    """`data` da resposta para posições de um EncodedRows; no formato colunar as colunas
+    são lidas direto do cache, sem materializar as linhas"""
+    if response_format == 'columnar':
+        return _columnar_data(encoded.row_class, encoded.take_columns(positions), len(positions))
+    return rows_to_dicts(encoded.take(positions))
+
+def _build_shipping_calc_query(project_name: str, tablename: str, start_date: Optional[str], end_date: Optional[str]) -> str:
     where_clause = ""
     if start_date and end_date:
         if start_date == end_date:
@@ -442,7 +615,7 @@ def _run_shipping_calc_query(client, project_name: str, tablename: str, start_da
         else:
             where_clause = f"\nWHERE event_date BETWEEN '{start_date}' AND '{end_date}'"
 
-    query = (
+    return (
         "SELECT\n"
         "  event_date,\n"
         "  zipcode,\n"
@@ -461,12 +634,10 @@ def _run_shipping_calc_query(client, project_name: str, tablename: str, start_da
         "\nORDER BY event_date DESC, zipcode"
     )
 
-    query_job = client.query(query)
-    results = list(query_job.result())
-
-    data: List[ShippingCalcAnalyticsRow] = []
-    for row in results:
-        data.append(ShippingCalcAnalyticsRow(
+def _convert_shipping_calc_rows(rows) -> List[CompactShippingCalcAnalyticsRow]:
+    data: List[CompactShippingCalcAnalyticsRow] = []
+    for row in rows:
+        data.append(CompactShippingCalcAnalyticsRow(
             event_date=str(row.event_date) if getattr(row, "event_date", None) is not None else None,
             zipcode=str(row.zipcode) if getattr(row, "zipcode", None) is not None else None,
             zipcode_region=str(row.zipcode_region) if getattr(row, "zipcode_region", None) is not None else None,
@@ -482,7 +653,12 @@ def _run_shipping_calc_query(client, project_name: str, tablename: str, start_da
         ))
     return data
 
-def _calculate_shipping_calc_summary(data: List[ShippingCalcAnalyticsRow]) -> ShippingCalcAnalyticsSummary:
+SHIPPING_CALC_DIMENSIONS = (
+    'event_date', 'zipcode', 'zipcode_region', 'item_id', 'item_name', 'item_brand', 'item_variant', 'item_category'
+)
+SHIPPING_CALC_MEASURES = ('calculations', 'calculations_freight_unavailable', 'transactions', 'revenue')
+
+def _calculate_shipping_calc_summary(data: List[CompactShippingCalcAnalyticsRow]) -> ShippingCalcAnalyticsSummary:
     """Calcula o sumário de totais dos dados de shipping calc analytics"""
     total_calculations = 0
     total_calculations_freight_unavailable = 0
@@ -506,60 +682,80 @@ def _calculate_shipping_calc_summary(data: List[ShippingCalcAnalyticsRow]) -> Sh
         total_revenue=total_revenue
     )
 
-@metrics_router.get("/shipping-calc-analytics", response_model=ShippingCalcAnalyticsResponse)
-async def shipping_calc_analytics(
-    token: TokenData = Depends(verify_token),
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    table_name: Optional[str] = None
-):
-    """
-    Retorna métricas de cálculo de frete a partir da tabela
-    `bq-mktbr.dbt_aggregated.havaianas_shipping_calc_analytics`.
-    Cache de 24 horas.
+def _parse_shipping_calc_group_by(group_by: Optional[Any]) -> Optional[Tuple[str, ...]]:
+    """Dimensões do group_by (lista ou texto separado por vírgula), em ordem canônica"""
+    if not group_by:
+        return None
+    fields = [field.strip() for field in group_by.split(',')] if isinstance(group_by, str) else list(group_by)
+    fields = [field for field in fields if field]
+    invalid = [field for field in fields if field not in SHIPPING_CALC_DIMENSIONS]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Dimensões inválidas em group_by: {', '.join(invalid)}. Válidas: {', '.join(SHIPPING_CALC_DIMENSIONS)}"
+        )
+    group_by = tuple(field for field in SHIPPING_CALC_DIMENSIONS if field in fields)
+    return group_by or None
+
+def _shipping_calc_page(
+    cached_data: Dict[str, Any],
+    group_by: Optional[Tuple[str, ...]],
+    order_by: Optional[str],
+    top_n: Optional[int],
+    offset: int,
+    limit: Optional[int]
+) -> Tuple[List[CompactShippingCalcAnalyticsRow], int]:
+    """Página do shipping calc em cache, no grão pedido, e o total de linhas (após o top_n)
+
+    Agregações são calculadas a partir do grão fino em cache e guardadas junto dele.
+    Com group_by (ou order_by), as linhas são ordenadas pela métrica de forma decrescente.
     """
-    # Parâmetros para o cache
-    cache_params = {
-        'email': token.email,
-        'start_date': start_date,
-        'end_date': end_date,
-        'table_name': table_name
-    }
-    
-    # Tentar buscar do cache primeiro
-    cached_data = shipping_calc_cache.get(**cache_params)
-    if cached_data:
-        return ShippingCalcAnalyticsResponse(
-            summary=cached_data['summary'],
-            data=cached_data['data'],
-            total_rows=cached_data['total_rows']
+    all_data = cached_data['all_data']
+    if group_by is not None:
+        rollups = cached_data.setdefault('rollups', {})
+        if group_by not in rollups:
+            rollups[group_by] = all_data.group_by(group_by, SHIPPING_CALC_MEASURES)
+        all_data = rollups[group_by]
+        order_by = order_by or 'calculations'
+
+    positions = all_data.order(((order_by, True),)) if order_by else range(len(all_data))
+    if top_n is not None:
+        positions = positions[:top_n]
+    end = offset + limit if limit is not None else None
+    return all_data.take(positions[offset:end]), len(positions)
+
+async def _shipping_calc_analytics(
+    email: str,
+    table_name: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    group_by: Optional[Any],
+    order_by: Optional[str],
+    top_n: Optional[int],
+    limit: Optional[int],
+    offset: Optional[int]
+) -> ShippingCalcAnalyticsResponse:
+    """Implementação compartilhada pelo GET e pelo POST (mesma entrada de cache)"""
+    group_by = _parse_shipping_calc_group_by(group_by)
+    if order_by is not None and order_by not in SHIPPING_CALC_MEASURES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"order_by inválido: {order_by}. Válidos: {', '.join(SHIPPING_CALC_MEASURES)}"
         )
-    
-    try:
-        client = get_bigquery_client()
-        if not client:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro de conexão com o banco de dados"
-            )
+    if (top_n is not None and top_n < 1) or (limit is not None and limit < 1):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="top_n e limit devem ser maiores que zero"
+        )
+    offset = max(offset or 0, 0)
 
+    try:
         # Buscar informações do usuário para determinar tablename permitido
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        user_data = await execute_bigquery_query_async(user_query, job_config)
-        if not user_data:
+        user_access = await get_user_access(email)
+        if not user_access:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
 
-        user_tablename = user_data[0].tablename
-
+        user_tablename, _ = user_access
         if user_tablename == 'all':
             effective_tablename = table_name or 'constance'
         else:
@@ -570,27 +766,48 @@ async def shipping_calc_analytics(
                 )
             effective_tablename = user_tablename
 
-        project_name = get_project_name(effective_tablename)
+        # Cache por cliente e período (o acesso já foi validado acima), sem agregação nem paginação
+        cache_params = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'table_name': effective_tablename
+        }
 
-        loop = asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: _run_shipping_calc_query(client, project_name, effective_tablename, start_date, end_date))
-        summary = _calculate_shipping_calc_summary(data)
+        cached_data = shipping_calc_cache.get(**cache_params)
+        source = 'cache'
+        if not cached_data:
+            source = 'database'
+            project_name = get_project_name(effective_tablename)
+            rows = await execute_bigquery_query_async(_build_shipping_calc_query(project_name, effective_tablename, start_date, end_date))
+            data = _convert_shipping_calc_rows(rows)
 
-        # Preparar dados para cache
-        response_data = {
-            'summary': summary,
-            'data': [row.dict() for row in data],
-            'total_rows': len(data),
-            'cached_at': datetime.now().isoformat()
-        }
-        
-        # Armazenar no cache
-        shipping_calc_cache.set(response_data, **cache_params)
+            # Preparar dados para cache
+            cached_data = {
+                'summary': _calculate_shipping_calc_summary(data),
+                'all_data': EncodedRows(data, CompactShippingCalcAnalyticsRow, SHIPPING_CALC_DICTIONARY_FIELDS),
+                'cached_at': datetime.now().isoformat()
+            }
+            
+            # Armazenar no cache
+            shipping_calc_cache.set(cached_data, **cache_params)
+
+        page, total_rows = _shipping_calc_page(cached_data, group_by, order_by, top_n, offset, limit)
 
         return ShippingCalcAnalyticsResponse(
-            summary=summary,
-            data=data,
-            total_rows=len(data)
+            summary=cached_data['summary'],
+            data=rows_to_dicts(page),
+            total_rows=total_rows,
+            group_by=list(group_by) if group_by else None,
+            cache_info={
+                'source': source,
+                'cached_at': cached_data['cached_at']
+            },
+            pagination={
+                'limit': limit,
+                'offset': offset,
+                'top_n': top_n,
+                'has_more': limit is not None and offset + limit < total_rows
+            }
         )
     except HTTPException:
         raise
@@ -603,6 +820,33 @@ async def shipping_calc_analytics(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+@metrics_router.get("/shipping-calc-analytics", response_model=ShippingCalcAnalyticsResponse)
+async def shipping_calc_analytics(
+    token: TokenData = Depends(verify_token),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    table_name: Optional[str] = None,
+    group_by: Optional[str] = None,
+    order_by: Optional[str] = None,
+    top_n: Optional[int] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = 0
+):
+    """
+    Retorna métricas de cálculo de frete a partir da tabela
+    `{projeto}.dbt_aggregated.{tablename}_shipping_calc_analytics`.
+
+    - group_by: dimensões separadas por vírgula (ex.: "zipcode_region,item_category");
+      as métricas são somadas e os grupos ordenados por `order_by` (padrão: calculations)
+    - top_n: mantém só os N primeiros grupos (ou linhas)
+    - limit/offset: paginação sobre o resultado (sem limit, retorna tudo)
+
+    Cache por cliente e período, compartilhado com a versão POST.
+    """
+    return await _shipping_calc_analytics(
+        token.email, table_name, start_date, end_date, group_by, order_by, top_n, limit, offset
+    )
+
 @metrics_router.post("/shipping-calc-analytics", response_model=ShippingCalcAnalyticsResponse)
 async def shipping_calc_analytics_post(
     request: ShippingCalcAnalyticsRequest,
@@ -610,104 +854,129 @@ async def shipping_calc_analytics_post(
 ):
     """
     Versão POST do endpoint para compatibilidade de chamadas via POST.
-    Cache de 24 horas.
+    Mesmos parâmetros e mesmo cache da versão GET.
     """
-    # Parâmetros para o cache
-    cache_params = {
-        'email': token.email,
-        'start_date': request.start_date,
-        'end_date': request.end_date,
-        'table_name': request.table_name
-    }
-    
-    # Tentar buscar do cache primeiro
-    cached_data = shipping_calc_cache.get(**cache_params)
-    if cached_data:
-        return ShippingCalcAnalyticsResponse(
-            summary=cached_data['summary'],
-            data=cached_data['data'],
-            total_rows=cached_data['total_rows']
-        )
+    return await _shipping_calc_analytics(
+        token.email, request.table_name, request.start_date, request.end_date,
+        request.group_by, request.order_by, request.top_n, request.limit, request.offset
+    )
+
+def get_project_name(tablename: str) -> str:
+    """Determina o nome do projeto baseado na tabela (catálogo de clientes)"""
+    project = tenant_catalog.project_for(tablename)
     
+    print(f"📊 Usando projeto: {project} para tabela: {tablename}")
+    return project
+
+def _safe_float(value) -> float:
+    """Converte para float tratando None/NaN como 0.0"""
+    if value is None:
+        return 0.0
     try:
-        client = get_bigquery_client()
-        if not client:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Erro de conexão com o banco de dados"
-            )
+        float_val = float(value)
+        return float_val if not math.isnan(float_val) else 0.0
+    except (ValueError, TypeError):
+        return 0.0
 
-        # Buscar informações do usuário para determinar tablename permitido
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        user_data = await execute_bigquery_query_async(user_query, job_config)
-        if not user_data:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+def _basic_data_rows_from_cube(cube: EventCube, tablename: str) -> List[CompactBasicDataRow]:
+    """Reagrupa o cubo de eventos no grão do basic-data (data/cluster/plataforma/localização)"""
+    keys, totals = cube.group_by(('event_date', 'traffic_category', 'platform', 'city', 'region', 'country'))
 
-        user_tablename = user_data[0].tablename
-        if user_tablename == 'all':
-            effective_tablename = request.table_name or 'constance'
-        else:
-            if request.table_name and request.table_name != user_tablename:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
-                )
-            effective_tablename = user_tablename
+    # endogen não soma frete/desconto na Receita_Paga
+    receita_paga = totals['Receita_Paga_Bruta'] if tablename == 'endogen' else totals['Receita_Paga']
 
-        project_name = get_project_name(effective_tablename)
+    data = []
+    for index, (event_date, cluster, platform, city, region, country) in enumerate(keys):
+        data.append(CompactBasicDataRow(
+            Data=event_date,
+            Cluster=str(cluster) if cluster else "Sem Categoria",
+            Plataforma=str(platform) if platform else "",
+            city=str(city) if city else "",
+            region=str(region) if region else "",
+            country=str(country) if country else "",
+            Investimento=totals['Investimento'][index],
+            Cliques=totals['Cliques'][index],
+            Sessoes=totals['Sessoes'][index],
+            Adicoes_ao_Carrinho=totals['Adicoes_ao_Carrinho'][index],
+            Leads=totals['Leads'][index],
+            Pedidos=totals['Pedidos'][index],
+            Receita=totals['Receita'][index],
+            Pedidos_Pagos=totals['Pedidos_Pagos'][index],
+            Receita_Paga=receita_paga[index],
+            Novos_Clientes=totals['Novos_Clientes'][index],
+            Receita_Novos_Clientes=totals['Receita_Novos_Clientes'][index],
+            # Campos de assinatura
+            Pedidos_Assinatura_Anual_Inicial=totals['Pedidos_Assinatura_Anual_Inicial'][index],
+            Receita_Assinatura_Anual_Inicial=totals['Receita_Assinatura_Anual_Inicial'][index],
+            Pedidos_Assinatura_Mensal_Inicial=totals['Pedidos_Assinatura_Mensal_Inicial'][index],
+            Receita_Assinatura_Mensal_Inicial=totals['Receita_Assinatura_Mensal_Inicial'][index],
+            Pedidos_Assinatura_Anual_Recorrente=totals['Pedidos_Assinatura_Anual_Recorrente'][index],
+            Receita_Assinatura_Anual_Recorrente=totals['Receita_Assinatura_Anual_Recorrente'][index],
+            Pedidos_Assinatura_Mensal_Recorrente=totals['Pedidos_Assinatura_Mensal_Recorrente'][index],
+            Receita_Assinatura_Mensal_Recorrente=totals['Receita_Assinatura_Mensal_Recorrente'][index]
+        ))
 
-        loop = asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: _run_shipping_calc_query(client, project_name, effective_tablename, request.start_date, request.end_date))
-        summary = _calculate_shipping_calc_summary(data)
-        
-        # Preparar dados para cache
-        response_data = {
-            'summary': summary,
-            'data': [row.dict() for row in data],
-            'total_rows': len(data),
-            'cached_at': datetime.now().isoformat()
-        }
-        
-        # Armazenar no cache
-        shipping_calc_cache.set(response_data, **cache_params)
-        
-        return ShippingCalcAnalyticsResponse(
-            summary=summary,
-            data=data,
-            total_rows=len(data)
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Erro no método shipping_calc_analytics_post: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro interno do servidor: {str(e)}"
-        )
+    # Mesma ordenação da query original (ORDER BY Pedidos DESC)
+    data.sort(key=attrgetter('Pedidos'), reverse=True)
+    return data
 
-def get_project_name(tablename: str) -> str:
-    """Determina o nome do projeto baseado na tabela"""
-    # Para tabelas específicas, usar projeto diferente
-    if tablename in ['coffeemais', 'endogen']:
-        project = 'mymetric-hub-shopify'
-    elif tablename == 'havaianas':
-        project = 'bq-mktbr'
-    else:
-        project = 'mymetric-hub-shopify'
+def _calculate_basic_data_summary(data: List[CompactBasicDataRow]) -> Dict[str, Any]:
+    """Calcula os totais e métricas derivadas do basic-data"""
+    total_investimento = 0
+    total_receita = 0
+    total_pedidos = 0
+    total_sessoes = 0
+    total_leads = 0
+    # Totais para pedidos de assinatura
+    total_pedidos_assinatura_anual_inicial = 0
+    total_pedidos_assinatura_mensal_inicial = 0
+    total_pedidos_assinatura_anual_recorrente = 0
+    total_pedidos_assinatura_mensal_recorrente = 0
+
+    for data_row in data:
+        total_investimento += data_row.Investimento
+        total_receita += data_row.Receita
+        total_pedidos += data_row.Pedidos
+        total_sessoes += data_row.Sessoes
+        total_leads += data_row.Leads
+        total_pedidos_assinatura_anual_inicial += data_row.Pedidos_Assinatura_Anual_Inicial
+        total_pedidos_assinatura_mensal_inicial += data_row.Pedidos_Assinatura_Mensal_Inicial
+        total_pedidos_assinatura_anual_recorrente += data_row.Pedidos_Assinatura_Anual_Recorrente
+        total_pedidos_assinatura_mensal_recorrente += data_row.Pedidos_Assinatura_Mensal_Recorrente
+
+    # Calcular total geral de pedidos de assinatura
+    total_pedidos_assinatura = (total_pedidos_assinatura_anual_inicial +
+                               total_pedidos_assinatura_mensal_inicial +
+                               total_pedidos_assinatura_anual_recorrente +
+                               total_pedidos_assinatura_mensal_recorrente)
+
+    return {
+        "total_investimento": total_investimento,
+        "total_receita": total_receita,
+        "total_pedidos": total_pedidos,
+        "total_sessoes": total_sessoes,
+        "total_leads": total_leads,
+        "total_pedidos_assinatura": total_pedidos_assinatura,
+        "total_pedidos_assinatura_anual_inicial": total_pedidos_assinatura_anual_inicial,
+        "total_pedidos_assinatura_mensal_inicial": total_pedidos_assinatura_mensal_inicial,
+        "total_pedidos_assinatura_anual_recorrente": total_pedidos_assinatura_anual_recorrente,
+        "total_pedidos_assinatura_mensal_recorrente": total_pedidos_assinatura_mensal_recorrente,
+        "roas": total_receita / total_investimento if total_investimento > 0 else 0,
+        "ticket_medio": total_receita / total_pedidos if total_pedidos > 0 else 0,
+        "taxa_conversao": (total_pedidos / total_sessoes * 100) if total_sessoes > 0 else 0,
+    }
+
+def _basic_data_attribution_model(attribution_model: Optional[str], tablename: str) -> str:
+    """Converte o modelo de atribuição do request no evento usado pelo cubo"""
+    attribution_model = attribution_model or 'Último Clique Não Direto'
     
-    print(f"📊 Usando projeto: {project} para tabela: {tablename}")
-    return project
+    if attribution_model == 'Último Clique Não Direto':
+        return 'purchase'
+    elif attribution_model == 'Primeiro Clique':
+        return 'fs_purchase'
+    elif attribution_model == 'Assinaturas' and tablename == 'coffeemais':
+        return 'purchase_subscription'
+    return attribution_model
 
 @metrics_router.post("/basic-data", response_model=BasicDataResponse)
 async def get_basic_data(
@@ -728,14 +997,15 @@ async def get_basic_data(
     # Tentar buscar do cache primeiro
     cached_data = basic_data_cache.get(**cache_params)
     if cached_data:
-        return BasicDataResponse(
-            data=cached_data['data'],
+        return trusted_response(
+            BasicDataResponse,
+            data=rows_to_dicts(cached_data['data']),
             total_rows=cached_data['total_rows'],
             summary=cached_data['summary'],
             cache_info={
                 'source': 'cache',
                 'cached_at': cached_data.get('cached_at'),
-                'ttl_hours': 1
+                'ttl_hours': basic_data_cache.ttl_hours_for(**cache_params)
             }
         )
     
@@ -748,30 +1018,16 @@ async def get_basic_data(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -795,198 +1051,21 @@ async def get_basic_data(
             print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
 
         # Processar modelo de atribuição
-        attribution_model = request.attribution_model or 'Último Clique Não Direto'
-        
-        if attribution_model == 'Último Clique Não Direto':
-            attribution_model = 'purchase'
-        elif attribution_model == 'Primeiro Clique':
-            attribution_model = 'fs_purchase'
-        elif attribution_model == 'Assinaturas' and tablename == 'coffeemais':
-            attribution_model = 'purchase_subscription'
+        attribution_model = _basic_data_attribution_model(request.attribution_model, tablename)
         
         # Determinar projeto
         project_name = get_project_name(tablename)
         
-        # Construir condição de data
         start_date = request.start_date
         end_date = request.end_date
         
-        if start_date == end_date:
-            date_condition = f"event_date = '{start_date}'"
-        else:
-            date_condition = f"event_date between '{start_date}' and '{end_date}'"
-        
-        # Construir query base
-        if tablename == 'endogen':
-            base_query = f"""
-                SELECT
-                    event_date AS Data,
-                    traffic_category AS Cluster,
-                    platform AS Plataforma,
-                    city,
-                    region,
-                    country,
-                    SUM(CASE WHEN event_name = 'paid_media' then value else 0 end) AS Investimento,
-                    SUM(CASE WHEN event_name = 'paid_media' then clicks else 0 end) AS Cliques,
-                    COUNTIF(event_name = 'session') AS Sessoes,
-                    COUNTIF(event_name = 'add_to_cart') AS Adicoes_ao_Carrinho,
-                    COUNTIF(event_name = 'lead') AS Leads,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' then transaction_id end) AS Pedidos,
-                    SUM(CASE WHEN event_name = '{attribution_model}' then value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) end) AS Receita,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') THEN transaction_id END) AS Pedidos_Pagos,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') THEN value ELSE 0 END) AS Receita_Paga,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') and transaction_no = 1 THEN transaction_id END) AS Novos_Clientes,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') and transaction_no = 1 THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Novos_Clientes,
-                    -- Métricas de assinatura
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'first annual subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Anual_Inicial,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'first annual subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Anual_Inicial,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'first montly subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Mensal_Inicial,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'first montly subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Mensal_Inicial,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring annual subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Anual_Recorrente,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring annual subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Anual_Recorrente,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring montly subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Mensal_Recorrente,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring montly subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Mensal_Recorrente"""
-        else:
-            base_query = f"""
-                SELECT
-                    event_date AS Data,
-                    traffic_category AS Cluster,
-                    platform AS Plataforma,
-                    city,
-                    region,
-                    country,
-                    SUM(CASE WHEN event_name = 'paid_media' then value else 0 end) AS Investimento,
-                    SUM(CASE WHEN event_name = 'paid_media' then clicks else 0 end) AS Cliques,
-                    COUNTIF(event_name = 'session') AS Sessoes,
-                    COUNTIF(event_name = 'add_to_cart') AS Adicoes_ao_Carrinho,
-                    COUNTIF(event_name = 'lead') AS Leads,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' then transaction_id end) AS Pedidos,
-                    SUM(CASE WHEN event_name = '{attribution_model}' then value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) end) AS Receita,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') THEN transaction_id END) AS Pedidos_Pagos,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Paga,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') and transaction_no = 1 THEN transaction_id END) AS Novos_Clientes,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and status in ('paid', 'authorized') and transaction_no = 1 THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Novos_Clientes,
-                    -- Métricas de assinatura
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'first annual subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Anual_Inicial,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'first annual subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Anual_Inicial,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'first montly subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Mensal_Inicial,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'first montly subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Mensal_Inicial,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring annual subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Anual_Recorrente,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring annual subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Anual_Recorrente,
-                    COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring montly subscription' and status = 'paid' THEN transaction_id END) AS Pedidos_Assinatura_Mensal_Recorrente,
-                    SUM(CASE WHEN event_name = '{attribution_model}' and order_type = 'recurring montly subscription' and status = 'paid' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) AS Receita_Assinatura_Mensal_Recorrente"""
-
-        # Query completa
-        query = f"""
-            {base_query}
-            FROM `{project_name}.dbt_join.{tablename}_events_long`
-            WHERE {date_condition}
-            GROUP BY ALL
-            ORDER BY Pedidos DESC
-        """
-        
-        print(f"Executando query: {query}")
-        
-        # Executar query (assíncrona)
-        rows = await execute_bigquery_query_async(query)
-        
-        # Converter para formato de resposta
-        data = []
-        total_investimento = 0
-        total_receita = 0
-        total_pedidos = 0
-        total_sessoes = 0
-        total_leads = 0
-        # Totais para pedidos de assinatura
-        total_pedidos_assinatura_anual_inicial = 0
-        total_pedidos_assinatura_mensal_inicial = 0
-        total_pedidos_assinatura_anual_recorrente = 0
-        total_pedidos_assinatura_mensal_recorrente = 0
+        # Reagrupar o cubo de eventos do cliente (compartilhado com o detailed-data)
+        cube = await get_event_cube(project_name, tablename, attribution_model, start_date, end_date)
+        data = _basic_data_rows_from_cube(cube, tablename)
         
-        for row in rows:
-            # Função auxiliar para tratar valores NaN
-            def safe_float(value):
-                if value is None:
-                    return 0.0
-                try:
-                    float_val = float(value)
-                    return float_val if not math.isnan(float_val) else 0.0
-                except (ValueError, TypeError):
-                    return 0.0
-            
-            data_row = BasicDataRow(
-                Data=str(row.Data),
-                Cluster=str(row.Cluster) if row.Cluster else "Sem Categoria",
-                Plataforma=str(row.Plataforma) if row.Plataforma else "",
-                city=str(row.city) if hasattr(row, 'city') and row.city else "",
-                region=str(row.region) if hasattr(row, 'region') and row.region else "",
-                country=str(row.country) if hasattr(row, 'country') and row.country else "",
-                Investimento=safe_float(row.Investimento),
-                Cliques=int(row.Cliques or 0),
-                Sessoes=int(row.Sessoes or 0),
-                Adicoes_ao_Carrinho=int(row.Adicoes_ao_Carrinho or 0),
-                Leads=int(row.Leads or 0),
-                Pedidos=int(row.Pedidos or 0),
-                Receita=safe_float(row.Receita),
-                Pedidos_Pagos=int(row.Pedidos_Pagos or 0),
-                Receita_Paga=safe_float(row.Receita_Paga),
-                Novos_Clientes=int(row.Novos_Clientes or 0),
-                Receita_Novos_Clientes=safe_float(row.Receita_Novos_Clientes),
-                # Novos campos de assinatura
-                Pedidos_Assinatura_Anual_Inicial=int(row.Pedidos_Assinatura_Anual_Inicial) if hasattr(row, 'Pedidos_Assinatura_Anual_Inicial') and row.Pedidos_Assinatura_Anual_Inicial else 0,
-                Receita_Assinatura_Anual_Inicial=safe_float(row.Receita_Assinatura_Anual_Inicial) if hasattr(row, 'Receita_Assinatura_Anual_Inicial') else 0.0,
-                Pedidos_Assinatura_Mensal_Inicial=int(row.Pedidos_Assinatura_Mensal_Inicial) if hasattr(row, 'Pedidos_Assinatura_Mensal_Inicial') and row.Pedidos_Assinatura_Mensal_Inicial else 0,
-                Receita_Assinatura_Mensal_Inicial=safe_float(row.Receita_Assinatura_Mensal_Inicial) if hasattr(row, 'Receita_Assinatura_Mensal_Inicial') else 0.0,
-                Pedidos_Assinatura_Anual_Recorrente=int(row.Pedidos_Assinatura_Anual_Recorrente) if hasattr(row, 'Pedidos_Assinatura_Anual_Recorrente') and row.Pedidos_Assinatura_Anual_Recorrente else 0,
-                Receita_Assinatura_Anual_Recorrente=safe_float(row.Receita_Assinatura_Anual_Recorrente) if hasattr(row, 'Receita_Assinatura_Anual_Recorrente') else 0.0,
-                Pedidos_Assinatura_Mensal_Recorrente=int(row.Pedidos_Assinatura_Mensal_Recorrente) if hasattr(row, 'Pedidos_Assinatura_Mensal_Recorrente') and row.Pedidos_Assinatura_Mensal_Recorrente else 0,
-                Receita_Assinatura_Mensal_Recorrente=safe_float(row.Receita_Assinatura_Mensal_Recorrente) if hasattr(row, 'Receita_Assinatura_Mensal_Recorrente') else 0.0
-            )
-            data.append(data_row)
-            
-            # Calcular totais
-            total_investimento += data_row.Investimento
-            total_receita += data_row.Receita
-            total_pedidos += data_row.Pedidos
-            total_sessoes += data_row.Sessoes
-            total_leads += data_row.Leads
-            # Calcular totais de assinatura
-            total_pedidos_assinatura_anual_inicial += data_row.Pedidos_Assinatura_Anual_Inicial
-            total_pedidos_assinatura_mensal_inicial += data_row.Pedidos_Assinatura_Mensal_Inicial
-            total_pedidos_assinatura_anual_recorrente += data_row.Pedidos_Assinatura_Anual_Recorrente
-            total_pedidos_assinatura_mensal_recorrente += data_row.Pedidos_Assinatura_Mensal_Recorrente
-        
-        # Calcular total geral de pedidos de assinatura
-        total_pedidos_assinatura = (total_pedidos_assinatura_anual_inicial + 
-                                   total_pedidos_assinatura_mensal_inicial + 
-                                   total_pedidos_assinatura_anual_recorrente + 
-                                   total_pedidos_assinatura_mensal_recorrente)
-        
-        # Recalcular total de sessões com uma query agregada direta, garantindo consistência com detailed-data
-        sessions_summary_query = f"""
-        SELECT COUNTIF(event_name = 'session') AS total_sessions
-        FROM `{project_name}.dbt_join.{tablename}_events_long`
-        WHERE {date_condition}
-        """
-        sessions_rows = await execute_bigquery_query_async(sessions_summary_query)
-        sessions_row = sessions_rows[0] if sessions_rows else None
-        total_sessoes = int(sessions_row.total_sessions) if sessions_row and sessions_row.total_sessions else 0
-
         # Criar resumo
         summary = {
-            "total_investimento": total_investimento,
-            "total_receita": total_receita,
-            "total_pedidos": total_pedidos,
-            "total_sessoes": total_sessoes,
-            "total_leads": total_leads,
-            "total_pedidos_assinatura": total_pedidos_assinatura,
-            "total_pedidos_assinatura_anual_inicial": total_pedidos_assinatura_anual_inicial,
-            "total_pedidos_assinatura_mensal_inicial": total_pedidos_assinatura_mensal_inicial,
-            "total_pedidos_assinatura_anual_recorrente": total_pedidos_assinatura_anual_recorrente,
-            "total_pedidos_assinatura_mensal_recorrente": total_pedidos_assinatura_mensal_recorrente,
-            "roas": total_receita / total_investimento if total_investimento > 0 else 0,
-            "ticket_medio": total_receita / total_pedidos if total_pedidos > 0 else 0,
-            "taxa_conversao": (total_pedidos / total_sessoes * 100) if total_sessoes > 0 else 0,
+            **_calculate_basic_data_summary(data),
             "periodo": f"{start_date} a {end_date}",
             "tablename": tablename,
             "user_access": "all" if user_tablename == 'all' else "limited",
@@ -997,7 +1076,7 @@ async def get_basic_data(
         response_data = {
             'total_rows': len(data),
             'summary': summary,
-            'data': [row.dict() for row in data],
+            'data': data,
             'cached_at': datetime.now().isoformat()
         }
         
@@ -1017,14 +1096,15 @@ async def get_basic_data(
         # Armazenar no cache
         basic_data_cache.set(response_data, **cache_params)
         
-        return BasicDataResponse(
-            data=data,
+        return trusted_response(
+            BasicDataResponse,
+            data=rows_to_dicts(data),
             total_rows=len(data),
             summary=summary,
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 1
+                'ttl_hours': basic_data_cache.ttl_hours_for(**cache_params)
             }
         )
         
@@ -1035,6 +1115,215 @@ async def get_basic_data(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+async def _portfolio_tenant_summary(tablename: str, request: PortfolioSummaryRequest, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    """Sumário do basic-data de um cliente, a partir do cubo de eventos compartilhado"""
+    async with semaphore:
+        attribution_model = _basic_data_attribution_model(request.attribution_model, tablename)
+        cube = await get_event_cube(get_project_name(tablename), tablename, attribution_model, request.start_date, request.end_date)
+        return _calculate_basic_data_summary(_basic_data_rows_from_cube(cube, tablename))
+
+def _merge_basic_data_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Soma os totais dos clientes e recalcula as métricas derivadas sobre a soma"""
+    merged: Dict[str, Any] = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if key.startswith('total_'):
+                merged[key] = merged.get(key, 0) + value
+
+    total_investimento = merged.get('total_investimento', 0)
+    total_receita = merged.get('total_receita', 0)
+    total_pedidos = merged.get('total_pedidos', 0)
+    total_sessoes = merged.get('total_sessoes', 0)
+    merged.update({
+        "roas": total_receita / total_investimento if total_investimento > 0 else 0,
+        "ticket_medio": total_receita / total_pedidos if total_pedidos > 0 else 0,
+        "taxa_conversao": (total_pedidos / total_sessoes * 100) if total_sessoes > 0 else 0,
+    })
+    return merged
+
+@metrics_router.post("/portfolio-summary", response_model=PortfolioSummaryResponse)
+async def get_portfolio_summary(
+    request: PortfolioSummaryRequest,
+    token: TokenData = Depends(verify_token)
+):
+    """
+    Sumário do basic-data de vários clientes no mesmo período (usuários com acesso total).
+
+    Os sumários de cada cliente são calculados em paralelo (no máximo
+    `PORTFOLIO_MAX_CONCURRENCY` por vez, dentro de `PORTFOLIO_TIMEOUT_SECONDS`) a partir
+    do cubo de eventos compartilhado com o basic-data, somados no servidor e guardados
+    em cache como um todo. Sem `table_names`, usa os clientes do catálogo que têm
+    `dbt_join.{cliente}_events_long`.
+    """
+    try:
+        user_access = await get_user_access(token.email)
+        if not user_access:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+        if user_access[0] != 'all':
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Sumário de portfólio disponível apenas para usuários com acesso a todas as tabelas"
+            )
+
+        if request.table_names:
+            tablenames = sorted(set(request.table_names))
+        else:
+            if not tenant_catalog.loaded_at:
+                try:
+                    await tenant_catalog.refresh()
+                except Exception as e:
+                    print(f"❌ Erro ao carregar o catálogo de clientes: {e}")
+            tablenames = sorted(
+                name for name, tenant in tenant_catalog.tenants.items()
+                if tenant.has_table('dbt_join', f"{name}_events_long")
+            )
+            if not tablenames:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Catálogo de clientes indisponível; informe table_names"
+                )
+
+        cache_params = {
+            'start_date': request.start_date,
+            'end_date': request.end_date,
+            'attribution_model': request.attribution_model,
+            'table_names': tablenames
+        }
+        cached_data = portfolio_cache.get(**cache_params)
+        if cached_data:
+            return PortfolioSummaryResponse(
+                **cached_data,
+                cache_info={
+                    'source': 'cache',
+                    'cached_at': cached_data['cached_at']
+                }
+            )
+
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(PORTFOLIO_MAX_CONCURRENCY)
+        tasks = {
+            tablename: asyncio.ensure_future(_portfolio_tenant_summary(tablename, request, semaphore))
+            for tablename in tablenames
+        }
+        await asyncio.wait(tasks.values(), timeout=PORTFOLIO_TIMEOUT_SECONDS)
+
+        tenants = []
+        for tablename, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                tenants.append(PortfolioTenantSummary(table_name=tablename, error=f"Tempo limite de {PORTFOLIO_TIMEOUT_SECONDS:g}s excedido"))
+            elif task.exception() is not None:
+                print(f"❌ Erro no sumário de portfólio de {tablename}: {task.exception()}")
+                tenants.append(PortfolioTenantSummary(table_name=tablename, error=str(task.exception())))
+            else:
+                tenants.append(PortfolioTenantSummary(table_name=tablename, summary=task.result()))
+
+        succeeded = [tenant.summary for tenant in tenants if tenant.summary is not None]
+        print(f"📊 Sumário de portfólio: {len(succeeded)}/{len(tenants)} clientes em {time.perf_counter() - started:.2f}s")
+
+        response_data = {
+            'summary': {
+                **_merge_basic_data_summaries(succeeded),
+                "periodo": f"{request.start_date} a {request.end_date}",
+                "attribution_model": request.attribution_model,
+                "clientes": len(succeeded),
+            },
+            'tenants': tenants,
+            'cached_at': datetime.now().isoformat()
+        }
+        # Resultados parciais não vão para o cache
+        if len(succeeded) == len(tenants):
+            portfolio_cache.set(response_data, **cache_params)
+
+        return PortfolioSummaryResponse(
+            **response_data,
+            cache_info={
+                'source': 'database',
+                'cached_at': response_data['cached_at']
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro no sumário de portfólio: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+
+def _build_daily_metrics_query(project_name: str, tablename: str, date_condition: str) -> str:
+    """Monta a query do funil diário (tabela agregada *_daily_metrics)"""
+    return f"""
+    SELECT 
+        event_date AS Data,
+        view_item AS Visualizacao_de_Item,
+        add_to_cart AS Adicionar_ao_Carrinho,
+        begin_checkout AS Iniciar_Checkout,
+        add_shipping_info AS Adicionar_Informacao_de_Frete,
+        add_payment_info AS Adicionar_Informacao_de_Pagamento,
+        purchase AS Pedido
+    FROM `{project_name}.dbt_aggregated.{tablename}_daily_metrics`
+    WHERE {date_condition}
+    ORDER BY event_date
+    """
+
+def _convert_daily_metrics_rows(rows) -> List[CompactDailyMetricsRow]:
+    """Converte as linhas do BigQuery em CompactDailyMetricsRow"""
+    data = []
+    for row in rows:
+        data.append(CompactDailyMetricsRow(
+            Data=str(row.Data),
+            Visualizacao_de_Item=int(row.Visualizacao_de_Item or 0),
+            Adicionar_ao_Carrinho=int(row.Adicionar_ao_Carrinho or 0),
+            Iniciar_Checkout=int(row.Iniciar_Checkout or 0),
+            Adicionar_Informacao_de_Frete=int(row.Adicionar_Informacao_de_Frete or 0),
+            Adicionar_Informacao_de_Pagamento=int(row.Adicionar_Informacao_de_Pagamento or 0),
+            Pedido=int(row.Pedido or 0)
+        ))
+    return data
+
+def _calculate_daily_metrics_summary(data: List[CompactDailyMetricsRow]) -> Dict[str, Any]:
+    """Calcula totais do funil e taxas de conversão entre as etapas"""
+    total_view_item = 0
+    total_add_to_cart = 0
+    total_begin_checkout = 0
+    total_add_shipping_info = 0
+    total_add_payment_info = 0
+    total_purchase = 0
+
+    for data_row in data:
+        total_view_item += data_row.Visualizacao_de_Item
+        total_add_to_cart += data_row.Adicionar_ao_Carrinho
+        total_begin_checkout += data_row.Iniciar_Checkout
+        total_add_shipping_info += data_row.Adicionar_Informacao_de_Frete
+        total_add_payment_info += data_row.Adicionar_Informacao_de_Pagamento
+        total_purchase += data_row.Pedido
+
+    # Calcular taxas de conversão
+    conversion_rates = {}
+    if total_view_item > 0:
+        conversion_rates['view_to_cart'] = (total_add_to_cart / total_view_item) * 100
+        conversion_rates['view_to_checkout'] = (total_begin_checkout / total_view_item) * 100
+        conversion_rates['view_to_purchase'] = (total_purchase / total_view_item) * 100
+
+    if total_add_to_cart > 0:
+        conversion_rates['cart_to_checkout'] = (total_begin_checkout / total_add_to_cart) * 100
+        conversion_rates['cart_to_purchase'] = (total_purchase / total_add_to_cart) * 100
+
+    if total_begin_checkout > 0:
+        conversion_rates['checkout_to_purchase'] = (total_purchase / total_begin_checkout) * 100
+
+    return {
+        "total_view_item": total_view_item,
+        "total_add_to_cart": total_add_to_cart,
+        "total_begin_checkout": total_begin_checkout,
+        "total_add_shipping_info": total_add_shipping_info,
+        "total_add_payment_info": total_add_payment_info,
+        "total_purchase": total_purchase,
+        "conversion_rates": conversion_rates,
+    }
+
 @metrics_router.post("/daily-metrics", response_model=DailyMetricsResponse)
 async def get_daily_metrics(
     request: DailyMetricsRequest,
@@ -1053,14 +1342,15 @@ async def get_daily_metrics(
     # Tentar buscar do cache primeiro
     cached_data = daily_metrics_cache.get(**cache_params)
     if cached_data:
-        return DailyMetricsResponse(
-            data=cached_data['data'],
+        return trusted_response(
+            DailyMetricsResponse,
+            data=rows_to_dicts(cached_data['data']),
             total_rows=cached_data['total_rows'],
             summary=cached_data['summary'],
             cache_info={
                 'source': 'cache',
                 'cached_at': cached_data.get('cached_at'),
-                'ttl_hours': 1
+                'ttl_hours': daily_metrics_cache.ttl_hours_for(**cache_params)
             }
         )
     
@@ -1073,30 +1363,16 @@ async def get_daily_metrics(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -1132,19 +1408,7 @@ async def get_daily_metrics(
             date_condition = f"event_date between '{start_date}' and '{end_date}'"
         
         # Query para dados diários de métricas
-        query = f"""
-        SELECT 
-            event_date AS Data,
-            view_item AS Visualizacao_de_Item,
-            add_to_cart AS Adicionar_ao_Carrinho,
-            begin_checkout AS Iniciar_Checkout,
-            add_shipping_info AS Adicionar_Informacao_de_Frete,
-            add_payment_info AS Adicionar_Informacao_de_Pagamento,
-            purchase AS Pedido
-        FROM `{project_name}.dbt_aggregated.{tablename}_daily_metrics`
-        WHERE {date_condition}
-        ORDER BY event_date
-        """
+        query = _build_daily_metrics_query(project_name, tablename, date_condition)
         
         print(f"Executando query daily-metrics: {query}")
         
@@ -1152,57 +1416,11 @@ async def get_daily_metrics(
         rows = await execute_bigquery_query_async(query)
         
         # Converter para formato de resposta
-        data = []
-        total_view_item = 0
-        total_add_to_cart = 0
-        total_begin_checkout = 0
-        total_add_shipping_info = 0
-        total_add_payment_info = 0
-        total_purchase = 0
-        
-        for row in rows:
-            data_row = DailyMetricsRow(
-                Data=str(row.Data),
-                Visualizacao_de_Item=int(row.Visualizacao_de_Item or 0),
-                Adicionar_ao_Carrinho=int(row.Adicionar_ao_Carrinho or 0),
-                Iniciar_Checkout=int(row.Iniciar_Checkout or 0),
-                Adicionar_Informacao_de_Frete=int(row.Adicionar_Informacao_de_Frete or 0),
-                Adicionar_Informacao_de_Pagamento=int(row.Adicionar_Informacao_de_Pagamento or 0),
-                Pedido=int(row.Pedido or 0)
-            )
-            data.append(data_row)
-            
-            # Calcular totais
-            total_view_item += data_row.Visualizacao_de_Item
-            total_add_to_cart += data_row.Adicionar_ao_Carrinho
-            total_begin_checkout += data_row.Iniciar_Checkout
-            total_add_shipping_info += data_row.Adicionar_Informacao_de_Frete
-            total_add_payment_info += data_row.Adicionar_Informacao_de_Pagamento
-            total_purchase += data_row.Pedido
-        
-        # Calcular taxas de conversão
-        conversion_rates = {}
-        if total_view_item > 0:
-            conversion_rates['view_to_cart'] = (total_add_to_cart / total_view_item) * 100
-            conversion_rates['view_to_checkout'] = (total_begin_checkout / total_view_item) * 100
-            conversion_rates['view_to_purchase'] = (total_purchase / total_view_item) * 100
-        
-        if total_add_to_cart > 0:
-            conversion_rates['cart_to_checkout'] = (total_begin_checkout / total_add_to_cart) * 100
-            conversion_rates['cart_to_purchase'] = (total_purchase / total_add_to_cart) * 100
-        
-        if total_begin_checkout > 0:
-            conversion_rates['checkout_to_purchase'] = (total_purchase / total_begin_checkout) * 100
+        data = _convert_daily_metrics_rows(rows)
         
         # Criar resumo
         summary = {
-            "total_view_item": total_view_item,
-            "total_add_to_cart": total_add_to_cart,
-            "total_begin_checkout": total_begin_checkout,
-            "total_add_shipping_info": total_add_shipping_info,
-            "total_add_payment_info": total_add_payment_info,
-            "total_purchase": total_purchase,
-            "conversion_rates": conversion_rates,
+            **_calculate_daily_metrics_summary(data),
             "periodo": f"{start_date} a {end_date}",
             "tablename": tablename,
             "user_access": "all" if user_tablename == 'all' else "limited"
@@ -1210,7 +1428,7 @@ async def get_daily_metrics(
         
         # Preparar resposta
         response_data = {
-            'data': [row.dict() for row in data],
+            'data': data,
             'total_rows': len(data),
             'summary': summary,
             'cached_at': datetime.now().isoformat()
@@ -1230,14 +1448,15 @@ async def get_daily_metrics(
         # Armazenar no cache
         daily_metrics_cache.set(response_data, **cache_params)
         
-        return DailyMetricsResponse(
-            data=data,
+        return trusted_response(
+            DailyMetricsResponse,
+            data=rows_to_dicts(data),
             total_rows=len(data),
             summary=summary,
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 1
+                'ttl_hours': daily_metrics_cache.ttl_hours_for(**cache_params)
             }
         )
         
@@ -1248,289 +1467,296 @@ async def get_daily_metrics(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+def _build_orders_query(project_name: str, tablename: str, start_date: str, end_date: str) -> str:
+    """Monta a query de orders (último clique, primeiro clique e primeiro lead)
+
+    Sem filtros de categoria: o período inteiro vai para o cache e os filtros do
+    request são aplicados sobre ele (ver get_orders).
+    """
+    where_clause = f"date(created_at) BETWEEN '{start_date}' AND '{end_date}'"
+    
+    # Construir query para orders - corrigida com base na estrutura real da tabela
+    return f"""
+    SELECT
+        created_at as Horario,
+        COALESCE(transaction_id, '') as ID_da_Transacao,
+        COALESCE(first_name, '') as Primeiro_Nome,
+        status as Status,
+        value as Receita,
+        source_name as Canal,
+        
+        COALESCE(traffic_category, '') as Categoria_de_Trafico,
+        source as Origem,
+        COALESCE(medium, '') as Midia,
+        campaign as Campanha,
+        COALESCE(content, '') as Conteudo,
+        COALESCE(page_location, '') as Pagina_de_Entrada,
+        COALESCE(page_params, '') as Parametros_de_URL,
+
+        COALESCE(fs_traffic_category, '') as Categoria_de_Trafico_Primeiro_Clique,
+        COALESCE(fs_source, '') as Origem_Primeiro_Clique,
+        COALESCE(fs_medium, '') as Midia_Primeiro_Clique,
+        COALESCE(fs_campaign, '') as Campanha_Primeiro_Clique,
+        COALESCE(fs_content, '') as Conteudo_Primeiro_Clique,
+        COALESCE(fs_page_location, '') as Pagina_de_Entrada_Primeiro_Clique,
+        COALESCE(fs_page_params, '') as Parametros_de_URL_Primeiro_Clique,
+        
+        COALESCE(fsm_traffic_category, '') as Categoria_de_Trafico_Primeiro_Lead,
+        COALESCE(fsm_source, '') as Origem_Primeiro_Lead,
+        COALESCE(fsm_medium, '') as Midia_Primeiro_Lead,
+        COALESCE(fsm_campaign, '') as Campanha_Primeiro_Lead,
+        COALESCE(fsm_content, '') as Conteudo_Primeiro_Lead,
+        COALESCE(fsm_page_location, '') as Pagina_de_Entrada_Primeiro_Lead,
+        COALESCE(fsm_page_params, '') as Parametros_de_URL_Primeiro_Lead
+        
+    FROM `{project_name}.dbt_join.{tablename}_orders_sessions`
+    WHERE {where_clause}
+    ORDER BY created_at DESC
+"""
+
+def _convert_orders_rows(rows) -> List[CompactOrderRow]:
+    """Converte as linhas do BigQuery em CompactOrderRow"""
+    data = []
+    for row in rows:
+        try:
+            # Usar getattr com valor padrão para evitar erros
+            horario_value = getattr(row, 'Horario', '')
+            # Converter datetime para string se necessário
+            if hasattr(horario_value, 'isoformat'):
+                horario_value = horario_value.isoformat()
+            elif horario_value is not None:
+                horario_value = str(horario_value)
+            else:
+                horario_value = ''
+            
+            order_row = CompactOrderRow(
+                Horario=horario_value,
+                ID_da_Transacao=str(getattr(row, 'ID_da_Transacao', '')),
+                Primeiro_Nome=str(getattr(row, 'Primeiro_Nome', '')),
+                Status=str(getattr(row, 'Status', '')),
+                Receita=float(getattr(row, 'Receita', 0) or 0),
+                Canal=str(getattr(row, 'Canal', '')),
+                
+                # Campos do último clique
+                Categoria_de_Trafico=str(getattr(row, 'Categoria_de_Trafico', '')),
+                Origem=str(getattr(row, 'Origem', '')),
+                Midia=str(getattr(row, 'Midia', '')),
+                Campanha=str(getattr(row, 'Campanha', '')),
+                Conteudo=str(getattr(row, 'Conteudo', '')),
+                Pagina_de_Entrada=str(getattr(row, 'Pagina_de_Entrada', '')),
+                Parametros_de_URL=str(getattr(row, 'Parametros_de_URL', '')),
+                
+                # Campos do primeiro clique
+                Categoria_de_Trafico_Primeiro_Clique=str(getattr(row, 'Categoria_de_Trafico_Primeiro_Clique', '')),
+                Origem_Primeiro_Clique=str(getattr(row, 'Origem_Primeiro_Clique', '')),
+                Midia_Primeiro_Clique=str(getattr(row, 'Midia_Primeiro_Clique', '')),
+                Campanha_Primeiro_Clique=str(getattr(row, 'Campanha_Primeiro_Clique', '')),
+                Conteudo_Primeiro_Clique=str(getattr(row, 'Conteudo_Primeiro_Clique', '')),
+                Pagina_de_Entrada_Primeiro_Clique=str(getattr(row, 'Pagina_de_Entrada_Primeiro_Clique', '')),
+                Parametros_de_URL_Primeiro_Clique=str(getattr(row, 'Parametros_de_URL_Primeiro_Clique', '')),
+                
+                # Campos do primeiro lead
+                Categoria_de_Trafico_Primeiro_Lead=str(getattr(row, 'Categoria_de_Trafico_Primeiro_Lead', '')),
+                Origem_Primeiro_Lead=str(getattr(row, 'Origem_Primeiro_Lead', '')),
+                Midia_Primeiro_Lead=str(getattr(row, 'Midia_Primeiro_Lead', '')),
+                Campanha_Primeiro_Lead=str(getattr(row, 'Campanha_Primeiro_Lead', '')),
+                Conteudo_Primeiro_Lead=str(getattr(row, 'Conteudo_Primeiro_Lead', '')),
+                Pagina_de_Entrada_Primeiro_Lead=str(getattr(row, 'Pagina_de_Entrada_Primeiro_Lead', '')),
+                Parametros_de_URL_Primeiro_Lead=str(getattr(row, 'Parametros_de_URL_Primeiro_Lead', ''))
+            )
+        except Exception as e:
+            print(f"Erro ao processar linha: {e}")
+            print(f"Tipo do objeto row: {type(row)}")
+            print(f"Atributos disponíveis: {dir(row)}")
+            if hasattr(row, '__dict__'):
+                print(f"Dict do objeto: {row.__dict__}")
+            print(f"Campos disponíveis na linha: {list(row.keys()) if hasattr(row, 'keys') else 'N/A'}")
+            raise
+        data.append(order_row)
+    return data
+
+def _calculate_orders_summary(data: List[CompactOrderRow]) -> Dict[str, Any]:
+    """Calcula total de pedidos, receita e ticket médio"""
+    total_receita = 0
+    total_orders = 0
+
+    for order_row in data:
+        total_receita += order_row.Receita
+        total_orders += 1
+
+    return {
+        "total_orders": total_orders,
+        "total_revenue": total_receita,
+        "average_order_value": total_receita / total_orders if total_orders > 0 else 0,
+    }
+
+async def _fetch_orders_days(project_name: str, tablename: str, start_date: str, end_date: str) -> Dict[str, EncodedRows]:
+    """Consulta os orders de um intervalo contínuo e os separa por dia (date(created_at))"""
+    query = _build_orders_query(project_name, tablename, start_date, end_date)
+    
+    print(f"Executando query de orders (assíncrona) de {start_date} a {end_date}: {query[:100]}...")
+    rows = await execute_bigquery_query_async(query)
+    print(f"Total de linhas retornadas: {len(rows)}")
+    
+    rows_by_day: Dict[str, List[CompactOrderRow]] = {}
+    for order_row in _convert_orders_rows(rows):
+        rows_by_day.setdefault(order_row.Horario[:10], []).append(order_row)
+    return {
+        day: EncodedRows(day_rows, CompactOrderRow, ORDERS_DICTIONARY_FIELDS)
+        for day, day_rows in rows_by_day.items()
+    }
+
 @metrics_router.post("/orders", response_model=OrdersResponse)
 async def get_orders(
     request: OrdersRequest,
-    token: TokenData = Depends(verify_token)
+    token: TokenData = Depends(verify_token),
+    http_request: Request = None
 ):
-    """Endpoint para buscar orders detalhados com cache de 6 horas e operações assíncronas"""
+    """Endpoint para buscar orders detalhados com cache de 6 horas e operações assíncronas
+
+    O cache guarda o período inteiro sem filtros; os filtros (categorias de tráfego,
+    status, origem, mídia e campanha) são respondidos pelos índices por coluna do
+    dataset em cache, sem nova consulta ao BigQuery.
+    """
     
-    # Parâmetros para o cache (sem paginação - armazena todos os dados)
+    # Parâmetros para o cache (sem paginação e sem filtros - armazena todos os dados do período)
     cache_params = {
         'email': token.email,
         'start_date': request.start_date,
         'end_date': request.end_date,
-        'table_name': request.table_name,
-        'traffic_category': request.traffic_category,
-        'fs_traffic_category': request.fs_traffic_category,
-        'fsm_traffic_category': request.fsm_traffic_category
+        'table_name': request.table_name
     }
     
-    # Tentar buscar do cache primeiro
-    cached_data = orders_cache.get(**cache_params)
-    if cached_data:
-        # Aplicar paginação aos dados do cache
-        all_cached_data = cached_data['all_data']
-        start_idx = request.offset
-        end_idx = start_idx + request.limit
-        paginated_data = all_cached_data[start_idx:end_idx]
-        
-        return OrdersResponse(
-            data=paginated_data,
-            total_rows=cached_data['total_rows'],
-            summary=cached_data['summary'],
-            pagination={
-                'limit': request.limit,
-                'offset': request.offset,
-                'has_more': request.offset + request.limit < cached_data['total_rows']
-            }
-        )
+    # Filtros preenchidos no request, por coluna
+    filters_applied = {field: getattr(request, field) for field in ORDERS_FILTER_COLUMNS}
+    filters = {ORDERS_FILTER_COLUMNS[field]: value for field, value in filters_applied.items() if value}
+    response_format = _parse_response_format(
+        request.format or requested_download_format(http_request), RESPONSE_FORMATS + DOWNLOAD_FORMATS
+    )
     
-    # Se não estiver no cache, buscar do BigQuery (assíncrono)
     try:
-        # Buscar informações do usuário (assíncrono)
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
+        # Tentar buscar do cache primeiro
+        cached_data = orders_cache.get(**cache_params)
+        source = 'cache'
         
-        user_data = await execute_bigquery_query_async(user_query, job_config)
-        
-        if not user_data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Usuário não encontrado"
-            )
-        
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
-        
-        # Determinar qual tabela usar
-        if user_tablename == 'all':
-            # Usuário tem acesso a todas as tabelas
-            if request.table_name:
-                # Usuário escolheu uma tabela específica
-                tablename = request.table_name
-                print(f"🔓 Usuário com acesso total escolheu tabela: {tablename}")
-            else:
-                # Usar tabela padrão (constance)
-                tablename = 'constance'
-                print(f"🔓 Usuário com acesso total usando tabela padrão: {tablename}")
-        else:
-            # Usuário tem acesso limitado a uma tabela específica
-            if request.table_name and request.table_name != user_tablename:
+        # Se não estiver no cache, buscar do BigQuery (assíncrono)
+        if not cached_data:
+            source = 'database'
+            
+            # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+            user_access = await get_user_access(token.email)
+            
+            if not user_access:
                 raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Usuário não encontrado"
                 )
-            tablename = user_tablename
-            print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
-        
-        # Determinar projeto
-        project_name = get_project_name(tablename)
-        
-        # (removido) Query de teste e logs de depuração
-        
-        # Construir condições de filtro para traffic_category
-        filter_conditions = [f"date(created_at) BETWEEN '{request.start_date}' AND '{request.end_date}'"]
-        
-        if request.traffic_category:
-            filter_conditions.append(f"traffic_category = '{request.traffic_category}'")
-        
-        if request.fs_traffic_category:
-            filter_conditions.append(f"fs_traffic_category = '{request.fs_traffic_category}'")
-        
-        if request.fsm_traffic_category:
-            filter_conditions.append(f"fsm_traffic_category = '{request.fsm_traffic_category}'")
-        
-        where_clause = " AND ".join(filter_conditions)
-        
-        # Construir query para orders - corrigida com base na estrutura real da tabela
-        query = f"""
-        SELECT
-            created_at as Horario,
-            COALESCE(transaction_id, '') as ID_da_Transacao,
-            COALESCE(first_name, '') as Primeiro_Nome,
-            status as Status,
-            value as Receita,
-            source_name as Canal,
-            
-            COALESCE(traffic_category, '') as Categoria_de_Trafico,
-            source as Origem,
-            COALESCE(medium, '') as Midia,
-            campaign as Campanha,
-            COALESCE(content, '') as Conteudo,
-            COALESCE(page_location, '') as Pagina_de_Entrada,
-            COALESCE(page_params, '') as Parametros_de_URL,
-
-            COALESCE(fs_traffic_category, '') as Categoria_de_Trafico_Primeiro_Clique,
-            COALESCE(fs_source, '') as Origem_Primeiro_Clique,
-            COALESCE(fs_medium, '') as Midia_Primeiro_Clique,
-            COALESCE(fs_campaign, '') as Campanha_Primeiro_Clique,
-            COALESCE(fs_content, '') as Conteudo_Primeiro_Clique,
-            COALESCE(fs_page_location, '') as Pagina_de_Entrada_Primeiro_Clique,
-            COALESCE(fs_page_params, '') as Parametros_de_URL_Primeiro_Clique,
             
-            COALESCE(fsm_traffic_category, '') as Categoria_de_Trafico_Primeiro_Lead,
-            COALESCE(fsm_source, '') as Origem_Primeiro_Lead,
-            COALESCE(fsm_medium, '') as Midia_Primeiro_Lead,
-            COALESCE(fsm_campaign, '') as Campanha_Primeiro_Lead,
-            COALESCE(fsm_content, '') as Conteudo_Primeiro_Lead,
-            COALESCE(fsm_page_location, '') as Pagina_de_Entrada_Primeiro_Lead,
-            COALESCE(fsm_page_params, '') as Parametros_de_URL_Primeiro_Lead
+            user_tablename, access_control = user_access
             
-        FROM `{project_name}.dbt_join.{tablename}_orders_sessions`
-        WHERE {where_clause}
-        ORDER BY created_at DESC
-    """
-        
-        print(f"=== QUERY PRINCIPAL ===")
-        print(f"Executando query principal (assíncrona): {query[:100]}...")
-        print(f"=== FIM QUERY PRINCIPAL ===")
-        
-        # Executar query de forma assíncrona
-        rows = await execute_bigquery_query_async(query)
-        
-        # Debug: mostrar campos disponíveis na primeira linha
-        if rows:
-            print(f"=== RESULTADOS DA QUERY PRINCIPAL ===")
-            print(f"Total de linhas retornadas: {len(rows)}")
-            if len(rows) > 0:
-                first_row = rows[0]
-                print(f"Campos disponíveis: {list(first_row.keys())}")
-                print(f"Primeira linha: {dict(first_row)}")
-            print(f"=== FIM RESULTADOS ===")
-        
-        # Converter para formato de resposta
-        data = []
-        total_receita = 0
-        total_orders = 0
-        
-        for row in rows:
-            try:
-                # Usar getattr com valor padrão para evitar erros
-                horario_value = getattr(row, 'Horario', '')
-                # Converter datetime para string se necessário
-                if hasattr(horario_value, 'isoformat'):
-                    horario_value = horario_value.isoformat()
-                elif horario_value is not None:
-                    horario_value = str(horario_value)
+            # Determinar qual tabela usar
+            if user_tablename == 'all':
+                # Usuário tem acesso a todas as tabelas
+                if request.table_name:
+                    # Usuário escolheu uma tabela específica
+                    tablename = request.table_name
+                    print(f"🔓 Usuário com acesso total escolheu tabela: {tablename}")
                 else:
-                    horario_value = ''
-                
-                order_row = OrderRow(
-                    Horario=horario_value,
-                    ID_da_Transacao=str(getattr(row, 'ID_da_Transacao', '')),
-                    Primeiro_Nome=str(getattr(row, 'Primeiro_Nome', '')),
-                    Status=str(getattr(row, 'Status', '')),
-                    Receita=float(getattr(row, 'Receita', 0) or 0),
-                    Canal=str(getattr(row, 'Canal', '')),
-                    
-                    # Campos do último clique
-                    Categoria_de_Trafico=str(getattr(row, 'Categoria_de_Trafico', '')),
-                    Origem=str(getattr(row, 'Origem', '')),
-                    Midia=str(getattr(row, 'Midia', '')),
-                    Campanha=str(getattr(row, 'Campanha', '')),
-                    Conteudo=str(getattr(row, 'Conteudo', '')),
-                    Pagina_de_Entrada=str(getattr(row, 'Pagina_de_Entrada', '')),
-                    Parametros_de_URL=str(getattr(row, 'Parametros_de_URL', '')),
-                    
-                    # Campos do primeiro clique
-                    Categoria_de_Trafico_Primeiro_Clique=str(getattr(row, 'Categoria_de_Trafico_Primeiro_Clique', '')),
-                    Origem_Primeiro_Clique=str(getattr(row, 'Origem_Primeiro_Clique', '')),
-                    Midia_Primeiro_Clique=str(getattr(row, 'Midia_Primeiro_Clique', '')),
-                    Campanha_Primeiro_Clique=str(getattr(row, 'Campanha_Primeiro_Clique', '')),
-                    Conteudo_Primeiro_Clique=str(getattr(row, 'Conteudo_Primeiro_Clique', '')),
-                    Pagina_de_Entrada_Primeiro_Clique=str(getattr(row, 'Pagina_de_Entrada_Primeiro_Clique', '')),
-                    Parametros_de_URL_Primeiro_Clique=str(getattr(row, 'Parametros_de_URL_Primeiro_Clique', '')),
-                    
-                    # Campos do primeiro lead
-                    Categoria_de_Trafico_Primeiro_Lead=str(getattr(row, 'Categoria_de_Trafico_Primeiro_Lead', '')),
-                    Origem_Primeiro_Lead=str(getattr(row, 'Origem_Primeiro_Lead', '')),
-                    Midia_Primeiro_Lead=str(getattr(row, 'Midia_Primeiro_Lead', '')),
-                    Campanha_Primeiro_Lead=str(getattr(row, 'Campanha_Primeiro_Lead', '')),
-                    Conteudo_Primeiro_Lead=str(getattr(row, 'Conteudo_Primeiro_Lead', '')),
-                    Pagina_de_Entrada_Primeiro_Lead=str(getattr(row, 'Pagina_de_Entrada_Primeiro_Lead', '')),
-                    Parametros_de_URL_Primeiro_Lead=str(getattr(row, 'Parametros_de_URL_Primeiro_Lead', ''))
-                )
-            except Exception as e:
-                print(f"Erro ao processar linha: {e}")
-                print(f"Tipo do objeto row: {type(row)}")
-                print(f"Atributos disponíveis: {dir(row)}")
-                if hasattr(row, '__dict__'):
-                    print(f"Dict do objeto: {row.__dict__}")
-                print(f"Campos disponíveis na linha: {list(row.keys()) if hasattr(row, 'keys') else 'N/A'}")
-                raise
-            data.append(order_row)
+                    # Usar tabela padrão (constance)
+                    tablename = 'constance'
+                    print(f"🔓 Usuário com acesso total usando tabela padrão: {tablename}")
+            else:
+                # Usuário tem acesso limitado a uma tabela específica
+                if request.table_name and request.table_name != user_tablename:
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
+                    )
+                tablename = user_tablename
+                print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
             
-            # Calcular totais
-            total_receita += order_row.Receita
-            total_orders += 1
+            # Determinar projeto
+            project_name = get_project_name(tablename)
+            
+            # Dias fechados vêm do histórico por dia; só os abertos (e os ainda não vistos) são consultados
+            day_rows = await load_by_day(
+                orders_history_cache,
+                {'table_name': tablename},
+                request.start_date,
+                request.end_date,
+                lambda start, end: _fetch_orders_days(project_name, tablename, start, end),
+                list
+            )
+            
+            # Dias do mais recente para o mais antigo (mesma ordem do ORDER BY created_at DESC)
+            data = [order_row for rows in reversed(day_rows) for order_row in rows]
+            
+            # Preparar dados para cache (armazenar TODOS os dados)
+            cached_data = {
+                'all_data': EncodedRows(data, CompactOrderRow, ORDERS_DICTIONARY_FIELDS),  # Todos os dados
+                'table_name': tablename,
+                'cached_at': datetime.now().isoformat()
+            }
+            
+            # Armazenar no cache
+            orders_cache.set(cached_data, **cache_params)
+        
+        # Aplicar os filtros sobre o dataset em cache
+        all_data = cached_data['all_data']
+        positions = all_data.where(filters)
+        total_rows = len(positions)
+        total_receita = all_data.sum('Receita', positions)
         
         # Criar resumo
         summary = {
-            "total_orders": total_orders,
+            "total_orders": total_rows,
             "total_revenue": total_receita,
-            "average_order_value": total_receita / total_orders if total_orders > 0 else 0,
+            "average_order_value": total_receita / total_rows if total_rows > 0 else 0,
             "period": f"{request.start_date} a {request.end_date}",
-            "table_name": tablename,
-            "filters_applied": {
-                "traffic_category": request.traffic_category,
-                "fs_traffic_category": request.fs_traffic_category,
-                "fsm_traffic_category": request.fsm_traffic_category
-            }
-        }
-        
-        # Preparar dados para cache (armazenar TODOS os dados)
-        response_data = {
-            'all_data': [row.dict() for row in data],  # Todos os dados
-            'total_rows': len(data),  # Total de registros
-            'summary': summary,
-            'cached_at': datetime.now().isoformat()
+            "table_name": cached_data['table_name'],
+            "filters_applied": filters_applied
         }
         
-        # Salvar último request
-        last_request_manager.save_last_request(
-            'orders',
-            {
-                'start_date': request.start_date,
-                'end_date': request.end_date,
-                'table_name': request.table_name,
-                'limit': request.limit,
-                'offset': request.offset,
-                'traffic_category': request.traffic_category,
-                'fs_traffic_category': request.fs_traffic_category,
-                'fsm_traffic_category': request.fsm_traffic_category
-            },
-            token.email
-        )
-        
-        # Armazenar no cache
-        orders_cache.set(response_data, **cache_params)
+        if source == 'database':
+            # Salvar último request
+            last_request_manager.save_last_request(
+                'orders',
+                {
+                    'start_date': request.start_date,
+                    'end_date': request.end_date,
+                    'table_name': request.table_name,
+                    'limit': request.limit,
+                    'offset': request.offset,
+                    **filters_applied
+                },
+                token.email
+            )
         
         # Aplicar paginação aos dados antes de retornar
         start_idx = request.offset
         end_idx = start_idx + request.limit
-        paginated_data = data[start_idx:end_idx]
-        
-        return OrdersResponse(
-            data=paginated_data,
-            total_rows=len(data),  # Total de todos os dados
+        page_positions = positions[start_idx:end_idx]
+        
+        if response_format in DOWNLOAD_FORMATS:
+            # Arrow/Parquet montado direto das colunas em cache
+            table = encoded_rows_table(all_data, page_positions, summary, total_rows)
+            filename = f"orders_{cached_data['table_name']}_{request.start_date}_{request.end_date}"
+            return table_response(table, response_format, filename)
+        
+        return trusted_response(
+            OrdersResponse,
+            data=_encoded_page_data(all_data, page_positions, response_format),
+            total_rows=total_rows,  # Total de todos os dados filtrados
             summary=summary,
             pagination={
                 'limit': request.limit,
                 'offset': request.offset,
-                'has_more': request.offset + request.limit < len(data)
+                'has_more': request.offset + request.limit < total_rows
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao buscar orders: {e}")
         raise HTTPException(
@@ -1546,39 +1772,19 @@ async def get_user_goals(
     request: UserGoalsRequest,
     token: TokenData = Depends(verify_token)
 ):
-    """Endpoint para buscar metas do usuário"""
-    
-    client = get_bigquery_client()
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
-        )
+    """Endpoint para buscar metas do usuário (cache de metas, atualizado pelas escritas do admin)"""
     
     try:
         # Buscar informações do usuário para verificar permissões
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
+        user_access = await get_user_access(token.email)
         
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
+        user_tablename, _ = user_access
         
         # Verificar permissões para acessar a tabela solicitada
         if user_tablename == 'all':
@@ -1595,65 +1801,7 @@ async def get_user_goals(
             tablename = request.table_name
             print(f"🔒 Usuário com acesso limitado acessando metas da tabela: {tablename}")
 
-        # Query para buscar metas do usuário
-        goals_query = f"""
-        SELECT goals
-        FROM `mymetric-hub-shopify.dbt_config.user_goals`
-        WHERE username = '{tablename}'
-        LIMIT 1
-        """
-        
-        print(f"Executando query de metas: {goals_query}")
-        
-        # Executar query
-        goals_result = client.query(goals_query)
-        goals_data = list(goals_result.result())
-        
-        if not goals_data:
-            # Se não encontrar metas, retornar metas padrão
-            default_goals = {
-                "revenue_goal": 100000.0,
-                "orders_goal": 1000,
-                "conversion_rate_goal": 5.0,
-                "roas_goal": 8.0,
-                "new_customers_goal": 100
-            }
-            
-            # Salvar último request
-            last_request_manager.save_last_request(
-                'goals',
-                {
-                    'table_name': request.table_name
-                },
-                token.email
-            )
-            
-            return UserGoalsResponse(
-                username=tablename,
-                goals=default_goals,
-                message="Metas padrão aplicadas (nenhuma meta configurada encontrada)"
-            )
-        
-        # Processar metas encontradas
-        goals = goals_data[0].goals
-        
-        # Se goals for string JSON, converter para dict
-        if isinstance(goals, str):
-            import json
-            try:
-                goals = json.loads(goals)
-            except json.JSONDecodeError:
-                goals = {}
-        
-        # Se goals for None ou vazio, usar metas padrão
-        if not goals:
-            goals = {
-                "revenue_goal": 100000.0,
-                "orders_goal": 1000,
-                "conversion_rate_goal": 5.0,
-                "roas_goal": 8.0,
-                "new_customers_goal": 100
-            }
+        goals = await goals_store.get(tablename)
         
         # Salvar último request
         last_request_manager.save_last_request(
@@ -1664,12 +1812,26 @@ async def get_user_goals(
             token.email
         )
         
+        if goals is None:
+            # Se não encontrar metas, retornar metas padrão
+            return UserGoalsResponse(
+                username=tablename,
+                goals=DEFAULT_GOALS.copy(),
+                message="Metas padrão aplicadas (nenhuma meta configurada encontrada)"
+            )
+        
+        # Se goals for vazio, usar metas padrão
+        if not goals:
+            goals = DEFAULT_GOALS.copy()
+        
         return UserGoalsResponse(
             username=tablename,
             goals=goals,
             message="Metas carregadas com sucesso"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao buscar metas do usuário: {e}")
         raise HTTPException(
@@ -1677,6 +1839,175 @@ async def get_user_goals(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+def _coalesce(default: str):
+    """Equivalente local de coalesce(dimensão, default)"""
+    return lambda value: default if value is None else value
+
+# Coalesce aplicado pelo detailed-data às dimensões antes de agrupar
+DETAILED_DATA_COALESCE = {
+    'source': _coalesce('(not set)'),
+    'medium': _coalesce('(not set)'),
+    'campaign': _coalesce('(not set)'),
+    'page_location': _coalesce('(not set)'),
+    'content': _coalesce('(not set)'),
+    'discount_code': _coalesce('Sem Cupom'),
+    'traffic_category': _coalesce('(not set)'),
+}
+
+def _detailed_data_rows_from_cube(cube: EventCube) -> List[CompactDetailedDataRow]:
+    """Reagrupa o cubo de eventos no grão do detailed-data, na ordenação da query original
+
+    ORDER BY Pedidos DESC, Receita DESC, Sessoes DESC, Adicoes_ao_Carrinho DESC,
+    Pedidos_Pagos DESC, Receita_Paga DESC, Data DESC, Hora DESC, Origem, Midia, Campanha, Cluster
+    """
+    keys, totals = cube.group_by(
+        ('event_date', 'hour', 'source', 'medium', 'campaign', 'page_location', 'content', 'discount_code', 'traffic_category'),
+        normalize=DETAILED_DATA_COALESCE,
+    )
+    sessoes = totals['Sessoes']
+    adicoes = totals['Adicoes_ao_Carrinho']
+    pedidos = totals['Pedidos']
+    receita = totals['Receita']
+    pedidos_pagos = totals['Pedidos_Pagos']
+    receita_paga = totals['Receita_Paga']
+
+    # Hora DESC com NULLs por último, como no BigQuery
+    def hour_key(index):
+        hour = keys[index][1]
+        return (hour is not None, hour or 0)
+
+    # Ordenações estáveis, do critério menos para o mais significativo
+    order = list(range(len(keys)))
+    order.sort(key=lambda index: (keys[index][2], keys[index][3], keys[index][4], keys[index][8]))
+    order.sort(key=lambda index: (keys[index][0], hour_key(index)), reverse=True)
+    order.sort(
+        key=lambda index: (
+            pedidos[index], receita[index], sessoes[index],
+            adicoes[index], pedidos_pagos[index], receita_paga[index]
+        ),
+        reverse=True,
+    )
+
+    data = []
+    for index in order:
+        event_date, hour, source, medium, campaign, page_location, content, discount_code, cluster = keys[index]
+        data.append(CompactDetailedDataRow(
+            Data=event_date,
+            Hora=int(hour) if hour else 0,
+            Origem=str(source) if source else '(not set)',
+            Midia=str(medium) if medium else '(not set)',
+            Campanha=str(campaign) if campaign else '(not set)',
+            Pagina_de_Entrada=str(page_location) if page_location else '(not set)',
+            Conteudo=str(content) if content else '(not set)',
+            Cupom=str(discount_code) if discount_code else 'Sem Cupom',
+            Cluster=str(cluster) if cluster else '(not set)',
+            Sessoes=sessoes[index],
+            Adicoes_ao_Carrinho=adicoes[index],
+            Pedidos=pedidos[index],
+            Receita=receita[index],
+            Pedidos_Pagos=pedidos_pagos[index],
+            Receita_Paga=receita_paga[index]
+        ))
+    return data
+
+DETAILED_DATA_DIMENSIONS = (
+    'Data', 'Hora', 'Origem', 'Midia', 'Campanha', 'Pagina_de_Entrada', 'Conteudo', 'Cupom', 'Cluster'
+)
+DETAILED_DATA_MEASURES = (
+    'Sessoes', 'Adicoes_ao_Carrinho', 'Pedidos', 'Receita', 'Pedidos_Pagos', 'Receita_Paga'
+)
+
+# Critérios de desempate da ordenação do detailed-data (mesmos do ORDER BY original)
+DETAILED_DATA_SORT_TIEBREAKERS = (
+    ('Pedidos', True), ('Receita', True), ('Sessoes', True), ('Adicoes_ao_Carrinho', True),
+    ('Pedidos_Pagos', True), ('Receita_Paga', True), ('Data', True), ('Hora', True),
+    ('Origem', False), ('Midia', False), ('Campanha', False), ('Cluster', False),
+)
+
+def _parse_detailed_data_order_by(order_by: Optional[str]) -> List[Tuple[str, bool]]:
+    """Interpreta `order_by` como lista de campos separados por vírgula: "Receita", "Data asc, Hora"
+
+    Sem direção, o campo é ordenado de forma decrescente (comportamento original).
+    Retorna [(campo, decrescente)]; valores inválidos caem para Pedidos.
+    """
+    keys = []
+    for item in (order_by or 'Pedidos').split(','):
+        parts = item.split()
+        if not parts:
+            continue
+        direction = parts[1].lower() if len(parts) > 1 else 'desc'
+        if len(parts) > 2 or parts[0] not in DetailedDataRow.model_fields or direction not in ('asc', 'desc'):
+            print(f"⚠️ Campo de ordenação '{order_by}' inválido, usando 'Pedidos'")
+            return [('Pedidos', True)]
+        keys.append((parts[0], direction == 'desc'))
+    return keys or [('Pedidos', True)]
+
+def _detailed_data_page(
+    cached_data: Dict[str, Any],
+    group_by: Optional[Tuple[str, ...]],
+    sort_keys: Tuple[Tuple[str, bool], ...],
+    offset: int,
+    limit: int,
+    response_format: str = 'rows'
+) -> Tuple[Any, int, int]:
+    """Página ordenada do detailed-data em cache, no grão pedido: (data, linhas da página, total)
+
+    Agregações por `group_by` são calculadas a partir do grão fino em cache e guardadas
+    junto dele; a ordenação ignora as dimensões agregadas.
+    """
+    all_data = cached_data['all_data']
+    if group_by is not None:
+        rollups = cached_data.setdefault('rollups', {})
+        if group_by not in rollups:
+            rollups[group_by] = all_data.group_by(group_by, DETAILED_DATA_MEASURES)
+        all_data = rollups[group_by]
+        sort_keys = tuple(key for key in sort_keys if key[0] in group_by or key[0] in DETAILED_DATA_MEASURES)
+
+    positions = all_data.order(sort_keys)[offset:offset + limit]
+    return _encoded_page_data(all_data, positions, response_format), len(positions), len(all_data)
+
+def _calculate_detailed_data_summary(data: List[CompactDetailedDataRow]) -> Dict[str, Any]:
+    """Monta o sumário do detailed-data somando todos os grupos (sem paginação)"""
+    total_sessions = 0
+    total_add_to_cart = 0
+    total_orders = 0
+    total_revenue = 0.0
+    total_paid_orders = 0
+    total_paid_revenue = 0.0
+
+    for data_row in data:
+        total_sessions += data_row.Sessoes
+        total_add_to_cart += data_row.Adicoes_ao_Carrinho
+        total_orders += data_row.Pedidos
+        total_revenue += data_row.Receita
+        total_paid_orders += data_row.Pedidos_Pagos
+        total_paid_revenue += data_row.Receita_Paga
+    
+    # Calcular métricas derivadas
+    conversion_rate = (total_orders / total_sessions * 100) if total_sessions > 0 else 0
+    add_to_cart_rate = (total_add_to_cart / total_sessions * 100) if total_sessions > 0 else 0
+    ticket_medio = total_revenue / total_orders if total_orders > 0 else 0
+    ticket_medio_pago = total_paid_revenue / total_paid_orders if total_paid_orders > 0 else 0
+    
+    return {
+        # Totais principais
+        "total_sessoes": total_sessions,
+        "total_adicoes_carrinho": total_add_to_cart,
+        "total_pedidos": total_orders,
+        "total_receita": round(total_revenue, 2),
+        "total_pedidos_pagos": total_paid_orders,
+        "total_receita_paga": round(total_paid_revenue, 2),
+
+        # Taxas de conversão
+        "taxa_conversao": round(conversion_rate, 2),
+        "taxa_adicao_carrinho": round(add_to_cart_rate, 2),
+        "taxa_checkout": round((total_orders / total_add_to_cart * 100) if total_add_to_cart > 0 else 0, 2),
+
+        # Ticket médio
+        "ticket_medio": round(ticket_medio, 2),
+        "ticket_medio_pago": round(ticket_medio_pago, 2),
+    }
+
 @metrics_router.post("/detailed-data", response_model=DetailedDataResponse)
 async def get_detailed_data(
     request: DetailedDataRequest,
@@ -1693,41 +2024,55 @@ async def get_detailed_data(
     if request.offset and request.offset < 0:
         print(f"⚠️ Offset negativo ({request.offset}), usando 0")
     
-    # Validar campo de ordenação
-    valid_order_fields = ['Pedidos', 'Receita', 'Sessoes', 'Adicoes_ao_Carrinho', 'Data', 'Hora']
-    order_by = request.order_by or 'Pedidos'
-    if order_by not in valid_order_fields:
-        order_by = 'Pedidos'
-        print(f"⚠️ Campo de ordenação '{request.order_by}' inválido, usando 'Pedidos'")
+    # Validar campos de ordenação (um ou mais, com direção opcional)
+    order_keys = _parse_detailed_data_order_by(request.order_by)
+    order_by = ', '.join(field if descending else f"{field} asc" for field, descending in order_keys)
+    sort_keys = tuple(order_keys) + tuple(
+        key for key in DETAILED_DATA_SORT_TIEBREAKERS if key[0] not in {field for field, _ in order_keys}
+    )
+    
+    response_format = _parse_response_format(request.format)
+    
+    # Validar dimensões do group_by (None ou todas as dimensões = grão completo)
+    group_by = None
+    if request.group_by is not None:
+        invalid = [field for field in request.group_by if field not in DETAILED_DATA_DIMENSIONS]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Dimensões inválidas em group_by: {', '.join(invalid)}. Válidas: {', '.join(DETAILED_DATA_DIMENSIONS)}"
+            )
+        # Ordem canônica e sem repetições, para reaproveitar a mesma agregação
+        group_by = tuple(field for field in DETAILED_DATA_DIMENSIONS if field in request.group_by)
+        if group_by == DETAILED_DATA_DIMENSIONS:
+            group_by = None
     
-    # Verificar cache primeiro (sem paginação - armazena todos os dados)
+    # Verificar cache primeiro (sem paginação nem ordenação - armazena todos os dados)
     cache_params = {
         'email': token.email, 
         'start_date': request.start_date, 
         'end_date': request.end_date, 
         'table_name': request.table_name,
-        'attribution_model': request.attribution_model,
-        'order_by': order_by
+        'attribution_model': request.attribution_model
     }
     
     cached_data = detailed_data_cache.get(**cache_params)
     if cached_data:
-        # Aplicar paginação aos dados do cache
-        all_cached_data = cached_data['all_data']
-        start_idx = offset
-        end_idx = start_idx + limit
-        paginated_data = all_cached_data[start_idx:end_idx]
-        
-        return DetailedDataResponse(
-            data=paginated_data,
-            total_rows=cached_data['total_rows'],
+        # Agregar, ordenar e paginar os dados do cache
+        page_data, page_rows, total_rows = _detailed_data_page(cached_data, group_by, sort_keys, offset, limit, response_format)
+        
+        return trusted_response(
+            DetailedDataResponse,
+            data=page_data,
+            total_rows=total_rows,
             summary=cached_data['summary'],
-            cache_info={'source': 'cache', 'cached_at': cached_data.get('cached_at'), 'ttl_hours': 4},
+            cache_info={'source': 'cache', 'cached_at': cached_data.get('cached_at'), 'ttl_hours': detailed_data_cache.ttl_hours_for(**cache_params)},
             pagination={
                 'limit': limit,
                 'offset': offset,
                 'order_by': order_by,
-                'has_more': len(paginated_data) == limit
+                'group_by': list(group_by) if group_by is not None else None,
+                'has_more': page_rows == limit
             }
         )
     
@@ -1739,29 +2084,16 @@ async def get_detailed_data(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -1798,107 +2130,12 @@ async def get_detailed_data(
         print(f"🔍 Modelo de atribuição convertido: {attribution_model}")
         print(f"🔍 Usando na query: event_name = '{attribution_model}'")
         
-        # Construir condição de data
-        date_condition = f"event_date BETWEEN '{request.start_date}' AND '{request.end_date}'"
-        
-        # Query que agrega TODAS as métricas juntas (não usa UNION ALL)
-        query = f"""
-        SELECT
-            event_date AS Data,
-            extract(hour from created_at) as Hora,
-            coalesce(source, '(not set)') as Origem,
-            coalesce(medium, '(not set)') as `Midia`, 
-            coalesce(campaign, '(not set)') as Campanha,
-            coalesce(page_location, '(not set)') as `Pagina_de_Entrada`,
-            coalesce(content, '(not set)') as `Conteudo`,
-            coalesce(discount_code, 'Sem Cupom') as `Cupom`,
-            coalesce(traffic_category, '(not set)') as `Cluster`,
-            COUNTIF(event_name = 'session') as `Sessoes`,
-            COUNTIF(event_name = 'add_to_cart') as `Adicoes_ao_Carrinho`,
-            COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' THEN transaction_id END) as `Pedidos`,
-            SUM(CASE WHEN event_name = '{attribution_model}' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) as `Receita`,
-            COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' AND status in ('paid', 'authorized') THEN transaction_id END) as `Pedidos_Pagos`,
-            SUM(CASE WHEN event_name = '{attribution_model}' AND status in ('paid', 'authorized') THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) as `Receita_Paga`
-        FROM `{project_name}.dbt_join.{tablename}_events_long`
-        WHERE {date_condition}
-        GROUP BY Data, Hora, Origem, Midia, Campanha, Pagina_de_Entrada, Conteudo, Cupom, Cluster
-        ORDER BY {order_by} DESC, Pedidos DESC, Receita DESC, Sessoes DESC, Adicoes_ao_Carrinho DESC, Pedidos_Pagos DESC, Receita_Paga DESC, Data DESC, Hora DESC, Origem, Midia, Campanha, Cluster
-        """
-        
-        print(f"Executando query de dados detalhados (sem paginação): order_by={order_by}")
-        
-        # Executar query (busca TODOS os dados) de forma assíncrona
-        rows = await execute_bigquery_query_async(query)
-        
-        # Calcular sumário com base nos mesmos grupos, SEM paginação
-        # IMPORTANTE: Usa EXATAMENTE a mesma lógica de GROUP BY e COALESCE da query paginada
-        summary_query = f"""
-        SELECT
-            SUM(Sessoes) as total_sessions,
-            SUM(Adicoes_ao_Carrinho) as total_add_to_cart,
-            SUM(Pedidos) as total_orders,
-            SUM(Receita) as total_revenue,
-            SUM(Pedidos_Pagos) as total_paid_orders,
-            SUM(Receita_Paga) as total_paid_revenue
-        FROM (
-            SELECT
-                COUNTIF(event_name = 'session') as Sessoes,
-                COUNTIF(event_name = 'add_to_cart') as Adicoes_ao_Carrinho,
-                COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' THEN transaction_id END) as Pedidos,
-                SUM(CASE WHEN event_name = '{attribution_model}' THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) as Receita,
-                COUNT(DISTINCT CASE WHEN event_name = '{attribution_model}' AND status in ('paid', 'authorized') THEN transaction_id END) as Pedidos_Pagos,
-                SUM(CASE WHEN event_name = '{attribution_model}' AND status in ('paid', 'authorized') THEN value - coalesce(total_discounts, 0) + coalesce(shipping_value, 0) ELSE 0 END) as Receita_Paga
-            FROM `{project_name}.dbt_join.{tablename}_events_long`
-            WHERE {date_condition}
-            GROUP BY 
-                event_date, 
-                extract(hour from created_at), 
-                coalesce(source, '(not set)'), 
-                coalesce(medium, '(not set)'), 
-                coalesce(campaign, '(not set)'), 
-                coalesce(page_location, '(not set)'), 
-                coalesce(content, '(not set)'), 
-                coalesce(discount_code, 'Sem Cupom'), 
-                coalesce(traffic_category, '(not set)')
-        )
-        """
+        # Reagrupar o cubo de eventos do cliente (compartilhado com o basic-data)
+        cube = await get_event_cube(project_name, tablename, attribution_model, request.start_date, request.end_date)
+        all_data = _detailed_data_rows_from_cube(cube)
         
-        print(f"🔍 Executando query de sumário...")
-        summary_rows = await execute_bigquery_query_async(summary_query)
-        summary_row = summary_rows[0] if summary_rows else None
-        
-        # Extrair valores do sumário
-        total_sessions = int(summary_row.total_sessions) if summary_row and summary_row.total_sessions else 0
-        total_add_to_cart = int(summary_row.total_add_to_cart) if summary_row and summary_row.total_add_to_cart else 0
-        total_orders = int(summary_row.total_orders) if summary_row and summary_row.total_orders else 0
-        total_revenue = float(summary_row.total_revenue) if summary_row and summary_row.total_revenue else 0.0
-        total_paid_orders = int(summary_row.total_paid_orders) if summary_row and summary_row.total_paid_orders else 0
-        total_paid_revenue = float(summary_row.total_paid_revenue) if summary_row and summary_row.total_paid_revenue else 0.0
-        
-        # Calcular métricas derivadas
-        conversion_rate = (total_orders / total_sessions * 100) if total_sessions > 0 else 0
-        add_to_cart_rate = (total_add_to_cart / total_sessions * 100) if total_sessions > 0 else 0
-        ticket_medio = total_revenue / total_orders if total_orders > 0 else 0
-        ticket_medio_pago = total_paid_revenue / total_paid_orders if total_paid_orders > 0 else 0
-        
-        # Criar sumário completo
         summary = {
-            # Totais principais
-            "total_sessoes": total_sessions,
-            "total_adicoes_carrinho": total_add_to_cart,
-            "total_pedidos": total_orders,
-            "total_receita": round(total_revenue, 2),
-            "total_pedidos_pagos": total_paid_orders,
-            "total_receita_paga": round(total_paid_revenue, 2),
-            
-            # Taxas de conversão
-            "taxa_conversao": round(conversion_rate, 2),
-            "taxa_adicao_carrinho": round(add_to_cart_rate, 2),
-            "taxa_checkout": round((total_orders / total_add_to_cart * 100) if total_add_to_cart > 0 else 0, 2),
-            
-            # Ticket médio
-            "ticket_medio": round(ticket_medio, 2),
-            "ticket_medio_pago": round(ticket_medio_pago, 2),
+            **_calculate_detailed_data_summary(all_data),
             
             # Informações contextuais
             "periodo": f"{request.start_date} a {request.end_date}",
@@ -1908,34 +2145,18 @@ async def get_detailed_data(
             "user_access": "all" if user_tablename == 'all' else "limited"
         }
         
-        print(f"✅ Sumário calculado: {total_sessions} sessões, {total_orders} pedidos, R$ {total_revenue:.2f} receita")
-        
-        # Processar TODOS os resultados primeiro
-        all_data = []
+        print(f"✅ Sumário calculado: {summary['total_sessoes']} sessões, {summary['total_pedidos']} pedidos, R$ {summary['total_receita']:.2f} receita")
         
-        for row in rows:
-            all_data.append(DetailedDataRow(
-                Data=str(row.Data),
-                Hora=int(row.Hora) if row.Hora else 0,
-                Origem=str(row.Origem) if row.Origem else '(not set)',
-                Midia=str(row.Midia) if row.Midia else '(not set)',
-                Campanha=str(row.Campanha) if row.Campanha else '(not set)',
-                Pagina_de_Entrada=str(row.Pagina_de_Entrada) if row.Pagina_de_Entrada else '(not set)',
-                Conteudo=str(row.Conteudo) if row.Conteudo else '(not set)',
-                Cupom=str(row.Cupom) if row.Cupom else 'Sem Cupom',
-                Cluster=str(row.Cluster) if row.Cluster else '(not set)',
-                Sessoes=int(row.Sessoes) if row.Sessoes else 0,
-                Adicoes_ao_Carrinho=int(row.Adicoes_ao_Carrinho) if row.Adicoes_ao_Carrinho else 0,
-                Pedidos=int(row.Pedidos) if row.Pedidos else 0,
-                Receita=float(row.Receita) if row.Receita else 0.0,
-                Pedidos_Pagos=int(row.Pedidos_Pagos) if row.Pedidos_Pagos else 0,
-                Receita_Paga=float(row.Receita_Paga) if row.Receita_Paga else 0.0
-            ))
+        # Preparar dados para cache (armazenar TODOS os dados, na ordenação padrão)
+        response_data = {
+            'all_data': EncodedRows(all_data, CompactDetailedDataRow, DETAILED_DATA_DICTIONARY_FIELDS),  # Todos os dados
+            'total_rows': len(all_data),  # Total de registros
+            'summary': summary,
+            'cached_at': datetime.now().isoformat()
+        }
         
-        # Aplicar paginação aos dados completos
-        start_idx = offset
-        end_idx = start_idx + limit
-        data = all_data[start_idx:end_idx]
+        # Aplicar agregação, ordenação e paginação aos dados completos
+        page_data, page_rows, total_rows = _detailed_data_page(response_data, group_by, sort_keys, offset, limit, response_format)
         
         # Salvar último request
         last_request_manager.save_last_request(
@@ -1947,32 +2168,27 @@ async def get_detailed_data(
                 'attribution_model': request.attribution_model,
                 'limit': limit,
                 'offset': offset,
-                'order_by': order_by
+                'order_by': order_by,
+                'group_by': request.group_by
             },
             token.email
         )
         
-        # Preparar dados para cache (armazenar TODOS os dados)
-        response_data = {
-            'all_data': [row.dict() for row in all_data],  # Todos os dados
-            'total_rows': len(all_data),  # Total de registros
-            'summary': summary,
-            'cached_at': datetime.now().isoformat()
-        }
-        
         # Salvar no cache
         detailed_data_cache.set(response_data, **cache_params)
         
-        return DetailedDataResponse(
-            data=data,
-            total_rows=len(all_data),  # Total de todos os dados
+        return trusted_response(
+            DetailedDataResponse,
+            data=page_data,
+            total_rows=total_rows,  # Total de todos os dados (no grão pedido)
             summary=summary,
-            cache_info={'source': 'database', 'cached_at': response_data['cached_at'], 'ttl_hours': 4},
+            cache_info={'source': 'database', 'cached_at': response_data['cached_at'], 'ttl_hours': detailed_data_cache.ttl_hours_for(**cache_params)},
             pagination={
                 'limit': limit,
                 'offset': offset,
                 'order_by': order_by,
-                'has_more': len(data) == limit
+                'group_by': list(group_by) if group_by is not None else None,
+                'has_more': page_rows == limit
             }
         )
         
@@ -2030,7 +2246,7 @@ async def get_product_trend(
             cache_info={
                 'source': 'cache',
                 'cached_at': cached_data.get('cached_at'),
-                'ttl_hours': 2
+                'ttl_hours': product_trend_cache.ttl_hours_for(**cache_params)
             },
             pagination={
                 'limit': limit,
@@ -2048,29 +2264,16 @@ async def get_product_trend(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -2090,31 +2293,14 @@ async def get_product_trend(
         # Determinar projeto
         project_name = get_project_name(tablename)
         
-        # Verificar quais campos benchmark e clicks existem na tabela
-        benchmark_fields = []
-        clicks_fields = []
-        fields_check_query = f"""
-        SELECT column_name
-        FROM `{project_name}.dbt_aggregated.INFORMATION_SCHEMA.COLUMNS`
-        WHERE table_name = '{tablename}_product_trend'
-        AND (column_name LIKE 'benchmark_week_%' OR column_name LIKE 'clicks_week_%')
-        ORDER BY column_name
-        """
-        
-        try:
-            fields_result = client.query(fields_check_query)
-            fields_rows = list(fields_result.result())
-            all_extra_fields = [row.column_name for row in fields_rows]
-            
-            benchmark_fields = [field for field in all_extra_fields if field.startswith('benchmark_week_')]
-            clicks_fields = [field for field in all_extra_fields if field.startswith('clicks_week_')]
-            
-            print(f"Campos benchmark encontrados para {tablename}: {benchmark_fields}")
-            print(f"Campos clicks encontrados para {tablename}: {clicks_fields}")
-        except Exception as e:
-            print(f"Aviso: Não foi possível verificar campos extras para {tablename}: {e}")
-            benchmark_fields = []
-            clicks_fields = []
+        # Campos benchmark e clicks existentes na tabela, segundo o catálogo de clientes
+        # (tabelas fora do catálogo são sondadas no INFORMATION_SCHEMA)
+        trend_table = await tenant_catalog.table(tablename, 'dbt_aggregated', f"{tablename}_product_trend")
+        trend_columns = trend_table[1] if trend_table else frozenset()
+        benchmark_fields = sorted(field for field in trend_columns if field.startswith('benchmark_week_'))
+        clicks_fields = sorted(field for field in trend_columns if field.startswith('clicks_week_'))
+        # Sem as colunas da tabela, mantém a regra antiga para os campos de tamanho
+        has_size_score = 'size_score_week_1' in trend_columns if trend_table else tablename == 'havaianas'
         
         # Query para buscar dados de tendência de produtos com paginação
         # Incluir campos específicos do Havaianas se necessário
@@ -2136,8 +2322,8 @@ async def get_product_trend(
         # Adicionar campos benchmark e clicks se existirem
         all_fields = base_fields + benchmark_fields + clicks_fields
         
-        # Adicionar campos específicos do Havaianas se for a tabela havaianas
-        if tablename == 'havaianas':
+        # Adicionar campos de tamanho (Havaianas) se existirem na tabela
+        if has_size_score:
             havaianas_fields = [
                 "size_score_week_1",
                 "size_score_week_2", 
@@ -2202,8 +2388,8 @@ async def get_product_trend(
                 if hasattr(row, field):
                     data_row_data[field] = int(getattr(row, field)) if getattr(row, field) is not None else None
             
-            # Adicionar campos específicos do Havaianas se disponíveis
-            if tablename == 'havaianas' and hasattr(row, 'size_score_week_1'):
+            # Adicionar campos de tamanho (Havaianas) se disponíveis
+            if has_size_score:
                 data_row_data.update({
                     'size_score_week_1': float(row.size_score_week_1) if row.size_score_week_1 is not None else None,
                     'size_score_week_2': float(row.size_score_week_2) if row.size_score_week_2 is not None else None,
@@ -2261,7 +2447,7 @@ async def get_product_trend(
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 2
+                'ttl_hours': product_trend_cache.ttl_hours_for(**cache_params)
             },
             pagination={
                 'limit': limit,
@@ -2278,6 +2464,203 @@ async def get_product_trend(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+def _build_ads_campaigns_results_query(project_name: str, tablename: str, start_date: str, end_date: str) -> str:
+    """Monta a query de resultados de campanhas (inclui métricas de assinatura)"""
+    return f"""
+    SELECT
+        platform,
+        campaign_name,
+        date,
+        sum(cost) cost,
+        sum(impressions) impressions,
+        sum(clicks) clicks,
+        sum(leads) Leads,
+        sum(transactions) transactions,
+        sum(revenue) revenue,
+        sum(pixel_transactions) pixel_transactions,
+        sum(pixel_revenue) pixel_revenue,
+        sum(first_transaction) transactions_first,
+        sum(first_revenue) revenue_first,
+        sum(fsm_transactions) transactions_origin_stack,
+        sum(fsm_revenue) revenue_origin_stack,
+        sum(fsm_first_transaction) transactions_first_origin_stack,
+        sum(fsm_first_revenue) revenue_first_origin_stack,
+        -- Novas métricas de assinatura
+        sum(first_montly_subscriptions) first_montly_subscriptions,
+        sum(first_annual_subscriptions) first_annual_subscriptions,
+        sum(recurring_montly_subscriptions) recurring_montly_subscriptions,
+        sum(recurring_annual_subscriptions) recurring_annual_subscriptions,
+        sum(first_montly_revenue) first_montly_revenue,
+        sum(first_annual_revenue) first_annual_revenue,
+        sum(recurring_montly_revenue) recurring_montly_revenue,
+        sum(recurring_annual_revenue) recurring_annual_revenue,
+        sum(fsm_first_montly_subscriptions) fsm_first_montly_subscriptions,
+        sum(fsm_first_annual_subscriptions) fsm_first_annual_subscriptions,
+        sum(fsm_recurring_montly_subscriptions) fsm_recurring_montly_subscriptions,
+        sum(fsm_recurring_annual_subscriptions) fsm_recurring_annual_subscriptions,
+        sum(fsm_first_montly_revenue) fsm_first_montly_revenue,
+        sum(fsm_first_annual_revenue) fsm_first_annual_revenue,
+        sum(fsm_recurring_montly_revenue) fsm_recurring_montly_revenue,
+        sum(fsm_recurring_annual_revenue) fsm_recurring_annual_revenue
+    FROM `{project_name}.dbt_join.{tablename}_ads_campaigns_results`
+    WHERE date BETWEEN '{start_date}' AND '{end_date}'
+    GROUP BY ALL
+    ORDER BY cost DESC
+    """
+
+def _convert_ads_campaigns_results_rows(rows) -> List[CompactAdsCampaignsResultsRow]:
+    """Converte as linhas do BigQuery em CompactAdsCampaignsResultsRow"""
+    data = []
+    for row in rows:
+        data_row = CompactAdsCampaignsResultsRow(
+            platform=str(row.platform) if row.platform else "",
+            campaign_name=str(row.campaign_name) if row.campaign_name else "",
+            date=str(row.date) if row.date else "",
+            cost=float(row.cost) if row.cost else 0.0,
+            impressions=int(row.impressions) if row.impressions else 0,
+            clicks=int(row.clicks) if row.clicks else 0,
+            leads=int(row.Leads) if row.Leads else 0,
+            transactions=int(row.transactions) if row.transactions else 0,
+            revenue=float(row.revenue) if row.revenue else 0.0,
+            pixel_transactions=int(row.pixel_transactions) if hasattr(row, 'pixel_transactions') and row.pixel_transactions else 0,
+            pixel_revenue=float(row.pixel_revenue) if hasattr(row, 'pixel_revenue') and row.pixel_revenue else 0.0,
+            transactions_first=int(row.transactions_first) if row.transactions_first else 0,
+            revenue_first=float(row.revenue_first) if row.revenue_first else 0.0,
+            transactions_origin_stack=int(row.transactions_origin_stack) if row.transactions_origin_stack else 0,
+            revenue_origin_stack=float(row.revenue_origin_stack) if row.revenue_origin_stack else 0.0,
+            transactions_first_origin_stack=int(row.transactions_first_origin_stack) if row.transactions_first_origin_stack else 0,
+            revenue_first_origin_stack=float(row.revenue_first_origin_stack) if row.revenue_first_origin_stack else 0.0,
+            # Novos campos de assinatura
+            first_montly_subscriptions=int(row.first_montly_subscriptions) if hasattr(row, 'first_montly_subscriptions') and row.first_montly_subscriptions else 0,
+            first_annual_subscriptions=int(row.first_annual_subscriptions) if hasattr(row, 'first_annual_subscriptions') and row.first_annual_subscriptions else 0,
+            recurring_montly_subscriptions=int(row.recurring_montly_subscriptions) if hasattr(row, 'recurring_montly_subscriptions') and row.recurring_montly_subscriptions else 0,
+            recurring_annual_subscriptions=int(row.recurring_annual_subscriptions) if hasattr(row, 'recurring_annual_subscriptions') and row.recurring_annual_subscriptions else 0,
+            first_montly_revenue=float(row.first_montly_revenue) if hasattr(row, 'first_montly_revenue') and row.first_montly_revenue else 0.0,
+            first_annual_revenue=float(row.first_annual_revenue) if hasattr(row, 'first_annual_revenue') and row.first_annual_revenue else 0.0,
+            recurring_montly_revenue=float(row.recurring_montly_revenue) if hasattr(row, 'recurring_montly_revenue') and row.recurring_montly_revenue else 0.0,
+            recurring_annual_revenue=float(row.recurring_annual_revenue) if hasattr(row, 'recurring_annual_revenue') and row.recurring_annual_revenue else 0.0,
+            fsm_first_montly_subscriptions=int(row.fsm_first_montly_subscriptions) if hasattr(row, 'fsm_first_montly_subscriptions') and row.fsm_first_montly_subscriptions else 0,
+            fsm_first_annual_subscriptions=int(row.fsm_first_annual_subscriptions) if hasattr(row, 'fsm_first_annual_subscriptions') and row.fsm_first_annual_subscriptions else 0,
+            fsm_recurring_montly_subscriptions=int(row.fsm_recurring_montly_subscriptions) if hasattr(row, 'fsm_recurring_montly_subscriptions') and row.fsm_recurring_montly_subscriptions else 0,
+            fsm_recurring_annual_subscriptions=int(row.fsm_recurring_annual_subscriptions) if hasattr(row, 'fsm_recurring_annual_subscriptions') and row.fsm_recurring_annual_subscriptions else 0,
+            fsm_first_montly_revenue=float(row.fsm_first_montly_revenue) if hasattr(row, 'fsm_first_montly_revenue') and row.fsm_first_montly_revenue else 0.0,
+            fsm_first_annual_revenue=float(row.fsm_first_annual_revenue) if hasattr(row, 'fsm_first_annual_revenue') and row.fsm_first_annual_revenue else 0.0,
+            fsm_recurring_montly_revenue=float(row.fsm_recurring_montly_revenue) if hasattr(row, 'fsm_recurring_montly_revenue') and row.fsm_recurring_montly_revenue else 0.0,
+            fsm_recurring_annual_revenue=float(row.fsm_recurring_annual_revenue) if hasattr(row, 'fsm_recurring_annual_revenue') and row.fsm_recurring_annual_revenue else 0.0
+        )
+        data.append(data_row)
+    return data
+
+def _calculate_ads_campaigns_results_summary(data: List[CompactAdsCampaignsResultsRow]) -> Dict[str, Any]:
+    """Calcula totais, métricas de mídia (CTR, CPM, CPC, ROAS) e totais de assinatura"""
+    total_cost = 0
+    total_revenue = 0
+    total_impressions = 0
+    total_clicks = 0
+    total_leads = 0
+    total_transactions = 0
+    total_pixel_transactions = 0
+    total_pixel_revenue = 0.0
+    # Totais para métricas de assinatura
+    total_first_montly_subscriptions = 0
+    total_first_annual_subscriptions = 0
+    total_recurring_montly_subscriptions = 0
+    total_recurring_annual_subscriptions = 0
+    total_first_montly_revenue = 0.0
+    total_first_annual_revenue = 0.0
+    total_recurring_montly_revenue = 0.0
+    total_recurring_annual_revenue = 0.0
+    total_fsm_first_montly_subscriptions = 0
+    total_fsm_first_annual_subscriptions = 0
+    total_fsm_recurring_montly_subscriptions = 0
+    total_fsm_recurring_annual_subscriptions = 0
+    total_fsm_first_montly_revenue = 0.0
+    total_fsm_first_annual_revenue = 0.0
+    total_fsm_recurring_montly_revenue = 0.0
+    total_fsm_recurring_annual_revenue = 0.0
+    
+    for data_row in data:
+        total_cost += data_row.cost
+        total_revenue += data_row.revenue
+        total_impressions += data_row.impressions
+        total_clicks += data_row.clicks
+        total_leads += data_row.leads
+        total_transactions += data_row.transactions
+        total_pixel_transactions += data_row.pixel_transactions
+        total_pixel_revenue += data_row.pixel_revenue
+        # Calcular totais de assinatura
+        total_first_montly_subscriptions += data_row.first_montly_subscriptions
+        total_first_annual_subscriptions += data_row.first_annual_subscriptions
+        total_recurring_montly_subscriptions += data_row.recurring_montly_subscriptions
+        total_recurring_annual_subscriptions += data_row.recurring_annual_subscriptions
+        total_first_montly_revenue += data_row.first_montly_revenue
+        total_first_annual_revenue += data_row.first_annual_revenue
+        total_recurring_montly_revenue += data_row.recurring_montly_revenue
+        total_recurring_annual_revenue += data_row.recurring_annual_revenue
+        total_fsm_first_montly_subscriptions += data_row.fsm_first_montly_subscriptions
+        total_fsm_first_annual_subscriptions += data_row.fsm_first_annual_subscriptions
+        total_fsm_recurring_montly_subscriptions += data_row.fsm_recurring_montly_subscriptions
+        total_fsm_recurring_annual_subscriptions += data_row.fsm_recurring_annual_subscriptions
+        total_fsm_first_montly_revenue += data_row.fsm_first_montly_revenue
+        total_fsm_first_annual_revenue += data_row.fsm_first_annual_revenue
+        total_fsm_recurring_montly_revenue += data_row.fsm_recurring_montly_revenue
+        total_fsm_recurring_annual_revenue += data_row.fsm_recurring_annual_revenue
+
+    # Calcular métricas
+    ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
+    cpm = (total_cost / total_impressions * 1000) if total_impressions > 0 else 0
+    cpc = (total_cost / total_clicks) if total_clicks > 0 else 0
+    conversion_rate = (total_transactions / total_clicks * 100) if total_clicks > 0 else 0
+    roas = (total_revenue / total_cost) if total_cost > 0 else 0
+    
+    # Calcular totais gerais de assinatura
+    total_subscriptions = (total_first_montly_subscriptions + total_first_annual_subscriptions + 
+                         total_recurring_montly_subscriptions + total_recurring_annual_subscriptions)
+    total_subscription_revenue = (total_first_montly_revenue + total_first_annual_revenue + 
+                                total_recurring_montly_revenue + total_recurring_annual_revenue)
+    total_fsm_subscriptions = (total_fsm_first_montly_subscriptions + total_fsm_first_annual_subscriptions + 
+                             total_fsm_recurring_montly_subscriptions + total_fsm_recurring_annual_subscriptions)
+    total_fsm_subscription_revenue = (total_fsm_first_montly_revenue + total_fsm_first_annual_revenue + 
+                                    total_fsm_recurring_montly_revenue + total_fsm_recurring_annual_revenue)
+
+    return {
+        "total_cost": total_cost,
+        "total_revenue": total_revenue,
+        "total_impressions": total_impressions,
+        "total_clicks": total_clicks,
+        "total_leads": total_leads,
+        "total_transactions": total_transactions,
+        "total_pixel_transactions": total_pixel_transactions,
+        "total_pixel_revenue": total_pixel_revenue,
+        "ctr": ctr,  # Click Through Rate
+        "cpm": cpm,  # Cost Per Mille (1000 impressions)
+        "cpc": cpc,  # Cost Per Click
+        "conversion_rate": conversion_rate,
+        "roas": roas,  # Return on Ad Spend
+        # Métricas de assinatura (último clique)
+        "total_subscriptions": total_subscriptions,
+        "total_subscription_revenue": total_subscription_revenue,
+        "total_first_montly_subscriptions": total_first_montly_subscriptions,
+        "total_first_annual_subscriptions": total_first_annual_subscriptions,
+        "total_recurring_montly_subscriptions": total_recurring_montly_subscriptions,
+        "total_recurring_annual_subscriptions": total_recurring_annual_subscriptions,
+        "total_first_montly_revenue": total_first_montly_revenue,
+        "total_first_annual_revenue": total_first_annual_revenue,
+        "total_recurring_montly_revenue": total_recurring_montly_revenue,
+        "total_recurring_annual_revenue": total_recurring_annual_revenue,
+        # Métricas de assinatura (primeiro clique - FSM)
+        "total_fsm_subscriptions": total_fsm_subscriptions,
+        "total_fsm_subscription_revenue": total_fsm_subscription_revenue,
+        "total_fsm_first_montly_subscriptions": total_fsm_first_montly_subscriptions,
+        "total_fsm_first_annual_subscriptions": total_fsm_first_annual_subscriptions,
+        "total_fsm_recurring_montly_subscriptions": total_fsm_recurring_montly_subscriptions,
+        "total_fsm_recurring_annual_subscriptions": total_fsm_recurring_annual_subscriptions,
+        "total_fsm_first_montly_revenue": total_fsm_first_montly_revenue,
+        "total_fsm_first_annual_revenue": total_fsm_first_annual_revenue,
+        "total_fsm_recurring_montly_revenue": total_fsm_recurring_montly_revenue,
+        "total_fsm_recurring_annual_revenue": total_fsm_recurring_annual_revenue,
+    }
+
 @metrics_router.post("/ads-campaigns-results", response_model=AdsCampaignsResultsResponse)
 async def get_ads_campaigns_results(
     request: AdsCampaignsResultsRequest,
@@ -2323,14 +2706,15 @@ async def get_ads_campaigns_results(
     if not request.force_refresh:
         cached_data = ads_campaigns_results_cache.get(**cache_params)
         if cached_data:
-            return AdsCampaignsResultsResponse(
-                data=cached_data['data'],
+            return trusted_response(
+                AdsCampaignsResultsResponse,
+                data=rows_to_dicts(cached_data['data']),
                 total_rows=cached_data['total_rows'],
                 summary=cached_data['summary'],
                 cache_info={
                     'source': 'cache',
                     'cached_at': cached_data.get('cached_at'),
-                    'ttl_hours': 168  # 7 dias
+                    'ttl_hours': ads_campaigns_results_cache.ttl_hours_for(**cache_params)
                 }
             )
     
@@ -2343,30 +2727,16 @@ async def get_ads_campaigns_results(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -2396,47 +2766,7 @@ async def get_ads_campaigns_results(
         start_date_str = request.start_date
         end_date_str = request.end_date
         
-        query = f"""
-        SELECT
-            platform,
-            campaign_name,
-            date,
-            sum(cost) cost,
-            sum(impressions) impressions,
-            sum(clicks) clicks,
-            sum(leads) Leads,
-            sum(transactions) transactions,
-            sum(revenue) revenue,
-            sum(pixel_transactions) pixel_transactions,
-            sum(pixel_revenue) pixel_revenue,
-            sum(first_transaction) transactions_first,
-            sum(first_revenue) revenue_first,
-            sum(fsm_transactions) transactions_origin_stack,
-            sum(fsm_revenue) revenue_origin_stack,
-            sum(fsm_first_transaction) transactions_first_origin_stack,
-            sum(fsm_first_revenue) revenue_first_origin_stack,
-            -- Novas métricas de assinatura
-            sum(first_montly_subscriptions) first_montly_subscriptions,
-            sum(first_annual_subscriptions) first_annual_subscriptions,
-            sum(recurring_montly_subscriptions) recurring_montly_subscriptions,
-            sum(recurring_annual_subscriptions) recurring_annual_subscriptions,
-            sum(first_montly_revenue) first_montly_revenue,
-            sum(first_annual_revenue) first_annual_revenue,
-            sum(recurring_montly_revenue) recurring_montly_revenue,
-            sum(recurring_annual_revenue) recurring_annual_revenue,
-            sum(fsm_first_montly_subscriptions) fsm_first_montly_subscriptions,
-            sum(fsm_first_annual_subscriptions) fsm_first_annual_subscriptions,
-            sum(fsm_recurring_montly_subscriptions) fsm_recurring_montly_subscriptions,
-            sum(fsm_recurring_annual_subscriptions) fsm_recurring_annual_subscriptions,
-            sum(fsm_first_montly_revenue) fsm_first_montly_revenue,
-            sum(fsm_first_annual_revenue) fsm_first_annual_revenue,
-            sum(fsm_recurring_montly_revenue) fsm_recurring_montly_revenue,
-            sum(fsm_recurring_annual_revenue) fsm_recurring_annual_revenue
-        FROM `{project_name}.dbt_join.{tablename}_ads_campaigns_results`
-        WHERE date BETWEEN '{start_date_str}' AND '{end_date_str}'
-        GROUP BY ALL
-        ORDER BY cost DESC
-        """
+        query = _build_ads_campaigns_results_query(project_name, tablename, start_date_str, end_date_str)
         
         print(f"Executando query ads-campaigns-results: {query}")
         
@@ -2444,153 +2774,11 @@ async def get_ads_campaigns_results(
         rows = await execute_bigquery_query_async(query)
         
         # Converter para formato de resposta
-        data = []
-        total_cost = 0
-        total_revenue = 0
-        total_impressions = 0
-        total_clicks = 0
-        total_leads = 0
-        total_transactions = 0
-        total_pixel_transactions = 0
-        total_pixel_revenue = 0.0
-        # Totais para métricas de assinatura
-        total_first_montly_subscriptions = 0
-        total_first_annual_subscriptions = 0
-        total_recurring_montly_subscriptions = 0
-        total_recurring_annual_subscriptions = 0
-        total_first_montly_revenue = 0.0
-        total_first_annual_revenue = 0.0
-        total_recurring_montly_revenue = 0.0
-        total_recurring_annual_revenue = 0.0
-        total_fsm_first_montly_subscriptions = 0
-        total_fsm_first_annual_subscriptions = 0
-        total_fsm_recurring_montly_subscriptions = 0
-        total_fsm_recurring_annual_subscriptions = 0
-        total_fsm_first_montly_revenue = 0.0
-        total_fsm_first_annual_revenue = 0.0
-        total_fsm_recurring_montly_revenue = 0.0
-        total_fsm_recurring_annual_revenue = 0.0
-        
-        for row in rows:
-            data_row = AdsCampaignsResultsRow(
-                platform=str(row.platform) if row.platform else "",
-                campaign_name=str(row.campaign_name) if row.campaign_name else "",
-                date=str(row.date) if row.date else "",
-                cost=float(row.cost) if row.cost else 0.0,
-                impressions=int(row.impressions) if row.impressions else 0,
-                clicks=int(row.clicks) if row.clicks else 0,
-                leads=int(row.Leads) if row.Leads else 0,
-                transactions=int(row.transactions) if row.transactions else 0,
-                revenue=float(row.revenue) if row.revenue else 0.0,
-                pixel_transactions=int(row.pixel_transactions) if hasattr(row, 'pixel_transactions') and row.pixel_transactions else 0,
-                pixel_revenue=float(row.pixel_revenue) if hasattr(row, 'pixel_revenue') and row.pixel_revenue else 0.0,
-                transactions_first=int(row.transactions_first) if row.transactions_first else 0,
-                revenue_first=float(row.revenue_first) if row.revenue_first else 0.0,
-                transactions_origin_stack=int(row.transactions_origin_stack) if row.transactions_origin_stack else 0,
-                revenue_origin_stack=float(row.revenue_origin_stack) if row.revenue_origin_stack else 0.0,
-                transactions_first_origin_stack=int(row.transactions_first_origin_stack) if row.transactions_first_origin_stack else 0,
-                revenue_first_origin_stack=float(row.revenue_first_origin_stack) if row.revenue_first_origin_stack else 0.0,
-                # Novos campos de assinatura
-                first_montly_subscriptions=int(row.first_montly_subscriptions) if hasattr(row, 'first_montly_subscriptions') and row.first_montly_subscriptions else 0,
-                first_annual_subscriptions=int(row.first_annual_subscriptions) if hasattr(row, 'first_annual_subscriptions') and row.first_annual_subscriptions else 0,
-                recurring_montly_subscriptions=int(row.recurring_montly_subscriptions) if hasattr(row, 'recurring_montly_subscriptions') and row.recurring_montly_subscriptions else 0,
-                recurring_annual_subscriptions=int(row.recurring_annual_subscriptions) if hasattr(row, 'recurring_annual_subscriptions') and row.recurring_annual_subscriptions else 0,
-                first_montly_revenue=float(row.first_montly_revenue) if hasattr(row, 'first_montly_revenue') and row.first_montly_revenue else 0.0,
-                first_annual_revenue=float(row.first_annual_revenue) if hasattr(row, 'first_annual_revenue') and row.first_annual_revenue else 0.0,
-                recurring_montly_revenue=float(row.recurring_montly_revenue) if hasattr(row, 'recurring_montly_revenue') and row.recurring_montly_revenue else 0.0,
-                recurring_annual_revenue=float(row.recurring_annual_revenue) if hasattr(row, 'recurring_annual_revenue') and row.recurring_annual_revenue else 0.0,
-                fsm_first_montly_subscriptions=int(row.fsm_first_montly_subscriptions) if hasattr(row, 'fsm_first_montly_subscriptions') and row.fsm_first_montly_subscriptions else 0,
-                fsm_first_annual_subscriptions=int(row.fsm_first_annual_subscriptions) if hasattr(row, 'fsm_first_annual_subscriptions') and row.fsm_first_annual_subscriptions else 0,
-                fsm_recurring_montly_subscriptions=int(row.fsm_recurring_montly_subscriptions) if hasattr(row, 'fsm_recurring_montly_subscriptions') and row.fsm_recurring_montly_subscriptions else 0,
-                fsm_recurring_annual_subscriptions=int(row.fsm_recurring_annual_subscriptions) if hasattr(row, 'fsm_recurring_annual_subscriptions') and row.fsm_recurring_annual_subscriptions else 0,
-                fsm_first_montly_revenue=float(row.fsm_first_montly_revenue) if hasattr(row, 'fsm_first_montly_revenue') and row.fsm_first_montly_revenue else 0.0,
-                fsm_first_annual_revenue=float(row.fsm_first_annual_revenue) if hasattr(row, 'fsm_first_annual_revenue') and row.fsm_first_annual_revenue else 0.0,
-                fsm_recurring_montly_revenue=float(row.fsm_recurring_montly_revenue) if hasattr(row, 'fsm_recurring_montly_revenue') and row.fsm_recurring_montly_revenue else 0.0,
-                fsm_recurring_annual_revenue=float(row.fsm_recurring_annual_revenue) if hasattr(row, 'fsm_recurring_annual_revenue') and row.fsm_recurring_annual_revenue else 0.0
-            )
-            data.append(data_row)
-            
-            # Calcular totais
-            total_cost += data_row.cost
-            total_revenue += data_row.revenue
-            total_impressions += data_row.impressions
-            total_clicks += data_row.clicks
-            total_leads += data_row.leads
-            total_transactions += data_row.transactions
-            total_pixel_transactions += data_row.pixel_transactions
-            total_pixel_revenue += data_row.pixel_revenue
-            # Calcular totais de assinatura
-            total_first_montly_subscriptions += data_row.first_montly_subscriptions
-            total_first_annual_subscriptions += data_row.first_annual_subscriptions
-            total_recurring_montly_subscriptions += data_row.recurring_montly_subscriptions
-            total_recurring_annual_subscriptions += data_row.recurring_annual_subscriptions
-            total_first_montly_revenue += data_row.first_montly_revenue
-            total_first_annual_revenue += data_row.first_annual_revenue
-            total_recurring_montly_revenue += data_row.recurring_montly_revenue
-            total_recurring_annual_revenue += data_row.recurring_annual_revenue
-            total_fsm_first_montly_subscriptions += data_row.fsm_first_montly_subscriptions
-            total_fsm_first_annual_subscriptions += data_row.fsm_first_annual_subscriptions
-            total_fsm_recurring_montly_subscriptions += data_row.fsm_recurring_montly_subscriptions
-            total_fsm_recurring_annual_subscriptions += data_row.fsm_recurring_annual_subscriptions
-            total_fsm_first_montly_revenue += data_row.fsm_first_montly_revenue
-            total_fsm_first_annual_revenue += data_row.fsm_first_annual_revenue
-            total_fsm_recurring_montly_revenue += data_row.fsm_recurring_montly_revenue
-            total_fsm_recurring_annual_revenue += data_row.fsm_recurring_annual_revenue
-        
-        # Calcular métricas
-        ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-        cpm = (total_cost / total_impressions * 1000) if total_impressions > 0 else 0
-        cpc = (total_cost / total_clicks) if total_clicks > 0 else 0
-        conversion_rate = (total_transactions / total_clicks * 100) if total_clicks > 0 else 0
-        roas = (total_revenue / total_cost) if total_cost > 0 else 0
-        
-        # Calcular totais gerais de assinatura
-        total_subscriptions = (total_first_montly_subscriptions + total_first_annual_subscriptions + 
-                             total_recurring_montly_subscriptions + total_recurring_annual_subscriptions)
-        total_subscription_revenue = (total_first_montly_revenue + total_first_annual_revenue + 
-                                    total_recurring_montly_revenue + total_recurring_annual_revenue)
-        total_fsm_subscriptions = (total_fsm_first_montly_subscriptions + total_fsm_first_annual_subscriptions + 
-                                 total_fsm_recurring_montly_subscriptions + total_fsm_recurring_annual_subscriptions)
-        total_fsm_subscription_revenue = (total_fsm_first_montly_revenue + total_fsm_first_annual_revenue + 
-                                        total_fsm_recurring_montly_revenue + total_fsm_recurring_annual_revenue)
+        data = _convert_ads_campaigns_results_rows(rows)
         
         # Criar resumo
         summary = {
-            "total_cost": total_cost,
-            "total_revenue": total_revenue,
-            "total_impressions": total_impressions,
-            "total_clicks": total_clicks,
-            "total_leads": total_leads,
-            "total_transactions": total_transactions,
-            "total_pixel_transactions": total_pixel_transactions,
-            "total_pixel_revenue": total_pixel_revenue,
-            "ctr": ctr,  # Click Through Rate
-            "cpm": cpm,  # Cost Per Mille (1000 impressions)
-            "cpc": cpc,  # Cost Per Click
-            "conversion_rate": conversion_rate,
-            "roas": roas,  # Return on Ad Spend
-            # Métricas de assinatura (último clique)
-            "total_subscriptions": total_subscriptions,
-            "total_subscription_revenue": total_subscription_revenue,
-            "total_first_montly_subscriptions": total_first_montly_subscriptions,
-            "total_first_annual_subscriptions": total_first_annual_subscriptions,
-            "total_recurring_montly_subscriptions": total_recurring_montly_subscriptions,
-            "total_recurring_annual_subscriptions": total_recurring_annual_subscriptions,
-            "total_first_montly_revenue": total_first_montly_revenue,
-            "total_first_annual_revenue": total_first_annual_revenue,
-            "total_recurring_montly_revenue": total_recurring_montly_revenue,
-            "total_recurring_annual_revenue": total_recurring_annual_revenue,
-            # Métricas de assinatura (primeiro clique - FSM)
-            "total_fsm_subscriptions": total_fsm_subscriptions,
-            "total_fsm_subscription_revenue": total_fsm_subscription_revenue,
-            "total_fsm_first_montly_subscriptions": total_fsm_first_montly_subscriptions,
-            "total_fsm_first_annual_subscriptions": total_fsm_first_annual_subscriptions,
-            "total_fsm_recurring_montly_subscriptions": total_fsm_recurring_montly_subscriptions,
-            "total_fsm_recurring_annual_subscriptions": total_fsm_recurring_annual_subscriptions,
-            "total_fsm_first_montly_revenue": total_fsm_first_montly_revenue,
-            "total_fsm_first_annual_revenue": total_fsm_first_annual_revenue,
-            "total_fsm_recurring_montly_revenue": total_fsm_recurring_montly_revenue,
-            "total_fsm_recurring_annual_revenue": total_fsm_recurring_annual_revenue,
+            **_calculate_ads_campaigns_results_summary(data),
             "periodo": f"{start_date_str} a {end_date_str}",
             "tablename": tablename,
             "user_access": "all" if user_tablename == 'all' else "limited"
@@ -2598,7 +2786,7 @@ async def get_ads_campaigns_results(
         
         # Preparar resposta
         response_data = {
-            'data': [row.dict() for row in data],
+            'data': data,
             'total_rows': len(data),
             'summary': summary,
             'cached_at': datetime.now().isoformat()
@@ -2618,14 +2806,15 @@ async def get_ads_campaigns_results(
         # Armazenar no cache
         ads_campaigns_results_cache.set(response_data, **cache_params)
         
-        return AdsCampaignsResultsResponse(
-            data=data,
+        return trusted_response(
+            AdsCampaignsResultsResponse,
+            data=rows_to_dicts(data),
             total_rows=len(data),
             summary=summary,
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 168  # 7 dias
+                'ttl_hours': ads_campaigns_results_cache.ttl_hours_for(**cache_params)
             }
         )
         
@@ -2636,6 +2825,101 @@ async def get_ads_campaigns_results(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+def _build_ads_creatives_results_query(project_name: str, tablename: str, start_date: str, end_date: str) -> str:
+    """Monta a query de resultados por criativo (campanha/conjunto/anúncio)"""
+    return f"""
+    SELECT
+        platform,
+        campaign_name,
+        adset_id,
+        adset_name,
+        ad_id,
+        ad_name,
+        date,
+        sum(cost) cost,
+        sum(impressions) impressions,
+        sum(clicks) clicks,
+        sum(leads) Leads,
+        sum(transactions) transactions,
+        sum(revenue) revenue,
+        sum(first_transaction) transactions_first,
+        sum(first_revenue) revenue_first,
+        sum(fsm_transactions) transactions_origin_stack,
+        sum(fsm_revenue) revenue_origin_stack,
+        sum(fsm_first_transaction) transactions_first_origin_stack,
+        sum(fsm_first_revenue) revenue_first_origin_stack
+    FROM `{project_name}.dbt_join.{tablename}_ads_creatives_results`
+    WHERE date BETWEEN '{start_date}' AND '{end_date}'
+    GROUP BY ALL
+    ORDER BY cost DESC
+    """
+
+def _convert_ads_creatives_results_rows(rows) -> List[CompactAdsCreativesResultsRow]:
+    """Converte as linhas do BigQuery em CompactAdsCreativesResultsRow"""
+    data = []
+    for row in rows:
+        data_row = CompactAdsCreativesResultsRow(
+            platform=row.platform or "",
+            campaign_name=row.campaign_name or "",
+            adset_id=int(row.adset_id) if row.adset_id else 0,
+            adset_name=row.adset_name or "",
+            ad_id=int(row.ad_id) if row.ad_id else 0,
+            ad_name=row.ad_name or "",
+            date=str(row.date) if row.date else "",
+            cost=float(row.cost) if row.cost is not None else 0.0,
+            impressions=int(row.impressions) if row.impressions is not None else 0,
+            clicks=int(row.clicks) if row.clicks is not None else 0,
+            leads=int(row.Leads) if row.Leads is not None else 0,
+            transactions=int(row.transactions) if row.transactions is not None else 0,
+            revenue=float(row.revenue) if row.revenue is not None else 0.0,
+            transactions_first=int(row.transactions_first) if row.transactions_first is not None else 0,
+            revenue_first=float(row.revenue_first) if row.revenue_first is not None else 0.0,
+            transactions_origin_stack=int(row.transactions_origin_stack) if row.transactions_origin_stack is not None else 0,
+            revenue_origin_stack=float(row.revenue_origin_stack) if row.revenue_origin_stack is not None else 0.0,
+            transactions_first_origin_stack=int(row.transactions_first_origin_stack) if row.transactions_first_origin_stack is not None else 0,
+            revenue_first_origin_stack=float(row.revenue_first_origin_stack) if row.revenue_first_origin_stack is not None else 0.0
+        )
+        data.append(data_row)
+    return data
+
+def _calculate_ads_creatives_results_summary(data: List[CompactAdsCreativesResultsRow]) -> Dict[str, Any]:
+    """Calcula totais e métricas de mídia (CTR, CPC, CPM, ROAS) dos criativos"""
+    total_cost = 0
+    total_revenue = 0
+    total_impressions = 0
+    total_clicks = 0
+    total_leads = 0
+    total_transactions = 0
+    
+    for data_row in data:
+        total_cost += data_row.cost
+        total_revenue += data_row.revenue
+        total_impressions += data_row.impressions
+        total_clicks += data_row.clicks
+        total_leads += data_row.leads
+        total_transactions += data_row.transactions
+
+    # Calcular métricas de resumo
+    ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
+    cpc = (total_cost / total_clicks) if total_clicks > 0 else 0
+    cpm = (total_cost / total_impressions * 1000) if total_impressions > 0 else 0
+    conversion_rate = (total_transactions / total_clicks * 100) if total_clicks > 0 else 0
+    roas = (total_revenue / total_cost) if total_cost > 0 else 0
+
+    return {
+        "total_cost": total_cost,
+        "total_revenue": total_revenue,
+        "total_impressions": total_impressions,
+        "total_clicks": total_clicks,
+        "total_leads": total_leads,
+        "total_transactions": total_transactions,
+        "ctr": round(ctr, 2),  # Click Through Rate
+        "cpc": round(cpc, 2),  # Cost Per Click
+        "cpm": round(cpm, 2),  # Cost Per Mille
+        "conversion_rate": round(conversion_rate, 2),
+        "roas": round(roas, 2),  # Return on Ad Spend
+    }
+
 @metrics_router.post("/ads-creatives-results", response_model=AdsCreativesResultsResponse)
 async def get_ads_creatives_results(
     request: AdsCreativesResultsRequest,
@@ -2654,7 +2938,7 @@ async def get_ads_creatives_results(
         last_request = last_request_manager.get_last_request('ads-creatives-results', request.table_name)
         if last_request:
             # Executar o último request salvo (se o usuário tem acesso à tabela, pode ver requests de qualquer usuário)
-            return await execute_last_request('ads-creatives-results', last_request['request_data'], token)
+            return await execute_last_request('ads-creatives-results', {**last_request['request_data'], 'format': request.format}, token)
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -2669,8 +2953,12 @@ async def get_ads_creatives_results(
                 detail="start_date e end_date são obrigatórios quando last_cache é false"
             )
     
-    # Parâmetros para o cache
+    response_format = _parse_response_format(request.format)
+    
+    # Parâmetros para o cache (o endpoint entra na chave porque o cache é compartilhado
+    # com o ads-campaigns-results, que usa os mesmos parâmetros)
     cache_params = {
+        'endpoint': 'ads-creatives-results',
         'email': token.email,
         'start_date': request.start_date,
         'end_date': request.end_date,
@@ -2682,7 +2970,17 @@ async def get_ads_creatives_results(
         cached_result = ads_campaigns_results_cache.get(**cache_params)
         if cached_result:
             print(f"Cache hit para ads-creatives-results: {cache_params}")
-            return AdsCreativesResultsResponse(**cached_result)
+            return trusted_response(
+                AdsCreativesResultsResponse,
+                data=_page_data(cached_result['data'], CompactAdsCreativesResultsRow, response_format),
+                total_rows=cached_result['total_rows'],
+                summary=cached_result['summary'],
+                cache_info={
+                    'source': 'cache',
+                    'cached_at': cached_result.get('cached_at'),
+                    'ttl_hours': ads_campaigns_results_cache.ttl_hours_for(**cache_params)
+                }
+            )
     
     # Se não estiver no cache, buscar do BigQuery
     client = get_bigquery_client()
@@ -2693,30 +2991,16 @@ async def get_ads_creatives_results(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -2746,32 +3030,7 @@ async def get_ads_creatives_results(
         start_date_str = request.start_date
         end_date_str = request.end_date
         
-        query = f"""
-        SELECT
-            platform,
-            campaign_name,
-            adset_id,
-            adset_name,
-            ad_id,
-            ad_name,
-            date,
-            sum(cost) cost,
-            sum(impressions) impressions,
-            sum(clicks) clicks,
-            sum(leads) Leads,
-            sum(transactions) transactions,
-            sum(revenue) revenue,
-            sum(first_transaction) transactions_first,
-            sum(first_revenue) revenue_first,
-            sum(fsm_transactions) transactions_origin_stack,
-            sum(fsm_revenue) revenue_origin_stack,
-            sum(fsm_first_transaction) transactions_first_origin_stack,
-            sum(fsm_first_revenue) revenue_first_origin_stack
-        FROM `{project_name}.dbt_join.{tablename}_ads_creatives_results`
-        WHERE date BETWEEN '{start_date_str}' AND '{end_date_str}'
-        GROUP BY ALL
-        ORDER BY cost DESC
-        """
+        query = _build_ads_creatives_results_query(project_name, tablename, start_date_str, end_date_str)
         
         print(f"Executando query ads-creatives-results: {query}")
         
@@ -2779,65 +3038,10 @@ async def get_ads_creatives_results(
         rows = await execute_bigquery_query_async(query)
         
         # Converter para formato de resposta
-        data = []
-        total_cost = 0
-        total_revenue = 0
-        total_impressions = 0
-        total_clicks = 0
-        total_leads = 0
-        total_transactions = 0
-        
-        for row in rows:
-            data_row = AdsCreativesResultsRow(
-                platform=row.platform or "",
-                campaign_name=row.campaign_name or "",
-                adset_id=row.adset_id or 0,
-                adset_name=row.adset_name or "",
-                ad_id=row.ad_id or 0,
-                ad_name=row.ad_name or "",
-                date=str(row.date) if row.date else "",
-                cost=float(row.cost) if row.cost is not None else 0.0,
-                impressions=int(row.impressions) if row.impressions is not None else 0,
-                clicks=int(row.clicks) if row.clicks is not None else 0,
-                leads=int(row.Leads) if row.Leads is not None else 0,
-                transactions=int(row.transactions) if row.transactions is not None else 0,
-                revenue=float(row.revenue) if row.revenue is not None else 0.0,
-                transactions_first=int(row.transactions_first) if row.transactions_first is not None else 0,
-                revenue_first=float(row.revenue_first) if row.revenue_first is not None else 0.0,
-                transactions_origin_stack=int(row.transactions_origin_stack) if row.transactions_origin_stack is not None else 0,
-                revenue_origin_stack=float(row.revenue_origin_stack) if row.revenue_origin_stack is not None else 0.0,
-                transactions_first_origin_stack=int(row.transactions_first_origin_stack) if row.transactions_first_origin_stack is not None else 0,
-                revenue_first_origin_stack=float(row.revenue_first_origin_stack) if row.revenue_first_origin_stack is not None else 0.0
-            )
-            data.append(data_row)
-            
-            # Acumular totais
-            total_cost += data_row.cost
-            total_revenue += data_row.revenue
-            total_impressions += data_row.impressions
-            total_clicks += data_row.clicks
-            total_leads += data_row.leads
-            total_transactions += data_row.transactions
-        
-        # Calcular métricas de resumo
-        ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-        cpc = (total_cost / total_clicks) if total_clicks > 0 else 0
-        cpm = (total_cost / total_impressions * 1000) if total_impressions > 0 else 0
-        conversion_rate = (total_transactions / total_clicks * 100) if total_clicks > 0 else 0
-        roas = (total_revenue / total_cost) if total_cost > 0 else 0
+        data = _convert_ads_creatives_results_rows(rows)
         
         summary = {
-            "total_cost": total_cost,
-            "total_revenue": total_revenue,
-            "total_impressions": total_impressions,
-            "total_clicks": total_clicks,
-            "total_leads": total_leads,
-            "total_transactions": total_transactions,
-            "ctr": round(ctr, 2),  # Click Through Rate
-            "cpc": round(cpc, 2),  # Cost Per Click
-            "cpm": round(cpm, 2),  # Cost Per Mille
-            "conversion_rate": round(conversion_rate, 2),
-            "roas": round(roas, 2),  # Return on Ad Spend
+            **_calculate_ads_creatives_results_summary(data),
             "periodo": f"{start_date_str} a {end_date_str}",
             "tablename": tablename,
             "user_access": "all" if user_tablename == 'all' else "limited"
@@ -2845,7 +3049,7 @@ async def get_ads_creatives_results(
         
         # Preparar resposta
         response_data = {
-            'data': [row.dict() for row in data],
+            'data': data,
             'total_rows': len(data),
             'summary': summary,
             'cached_at': datetime.now().isoformat()
@@ -2865,14 +3069,15 @@ async def get_ads_creatives_results(
         # Armazenar no cache (usando o mesmo cache do ads-campaigns-results)
         ads_campaigns_results_cache.set(response_data, **cache_params)
         
-        return AdsCreativesResultsResponse(
-            data=data,
+        return trusted_response(
+            AdsCreativesResultsResponse,
+            data=_page_data(data, CompactAdsCreativesResultsRow, response_format),
             total_rows=len(data),
             summary=summary,
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 168  # 7 dias
+                'ttl_hours': ads_campaigns_results_cache.ttl_hours_for(**cache_params)
             }
         )
         
@@ -2883,6 +3088,113 @@ async def get_ads_creatives_results(
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+def _build_realtime_query(project_name: str, tablename: str, limit: Optional[int] = None, since_watermark: bool = False) -> str:
+    """Monta a query de compras de itens em tempo real (mais recentes primeiro)
+
+    Com `since_watermark`, lê só as linhas com event_timestamp >= @watermark (delta da janela).
+    """
+    where_clause = "WHERE event_timestamp >= @watermark" if since_watermark else ""
+    limit_clause = f"LIMIT {limit}" if limit else ""
+    return f"""
+    SELECT
+        event_timestamp,
+        concat(ga_session_id, user_pseudo_id) session_id,
+        transaction_id,
+        item_category,
+        item_name,
+        quantity,
+        item_revenue,
+        source,
+        medium,
+        campaign,
+        content,
+        term,
+        page_location,
+        traffic_category
+    FROM
+        `{project_name}.dbt_join.{tablename}_purchases_items_sessions_realtime`
+    {where_clause}
+    ORDER BY event_timestamp DESC
+    {limit_clause}
+    """
+
+def _convert_realtime_rows(rows) -> List[CompactRealtimeRow]:
+    """Converte as linhas do BigQuery em CompactRealtimeRow"""
+    data = []
+    for row in rows:
+        # Converter timestamp se necessário
+        event_timestamp_str = str(row.event_timestamp) if row.event_timestamp else ""
+        if hasattr(row.event_timestamp, 'isoformat'):
+            event_timestamp_str = row.event_timestamp.isoformat()
+        
+        data_row = CompactRealtimeRow(
+            event_timestamp=event_timestamp_str,
+            session_id=str(row.session_id) if row.session_id else "",
+            transaction_id=str(row.transaction_id) if row.transaction_id else "",
+            item_category=str(row.item_category) if row.item_category else "",
+            item_name=str(row.item_name) if row.item_name else "",
+            quantity=int(row.quantity) if row.quantity else 0,
+            item_revenue=float(row.item_revenue) if row.item_revenue else 0.0,
+            source=str(row.source) if row.source else "",
+            medium=str(row.medium) if row.medium else "",
+            campaign=str(row.campaign) if row.campaign else "",
+            content=str(row.content) if row.content else "",
+            term=str(row.term) if row.term else "",
+            page_location=str(row.page_location) if row.page_location else "",
+            traffic_category=str(row.traffic_category) if row.traffic_category else ""
+        )
+        data.append(data_row)
+    return data
+
+def _calculate_realtime_summary(data: List[CompactRealtimeRow]) -> Dict[str, Any]:
+    """Calcula totais, transações/sessões únicas e médias dos itens realtime"""
+    total_revenue = 0
+    total_quantity = 0
+    unique_transactions = set()
+    unique_sessions = set()
+
+    for data_row in data:
+        total_revenue += data_row.item_revenue
+        total_quantity += data_row.quantity
+        if data_row.transaction_id:
+            unique_transactions.add(data_row.transaction_id)
+        if data_row.session_id:
+            unique_sessions.add(data_row.session_id)
+
+    # Calcular métricas
+    avg_item_value = total_revenue / len(data) if len(data) > 0 else 0
+    avg_quantity_per_item = total_quantity / len(data) if len(data) > 0 else 0
+
+    return {
+        "total_items": len(data),
+        "total_revenue": total_revenue,
+        "total_quantity": total_quantity,
+        "unique_transactions": len(unique_transactions),
+        "unique_sessions": len(unique_sessions),
+        "avg_item_value": avg_item_value,
+        "avg_quantity_per_item": avg_quantity_per_item,
+    }
+
+def _get_realtime_window(project_name: str, tablename: str) -> RealtimeWindow:
+    """Janela realtime do cliente, alimentada por queries delta a partir da watermark"""
+    async def fetch(watermark):
+        if watermark is None:
+            return await execute_bigquery_query_async(_build_realtime_query(project_name, tablename))
+        return await execute_bigquery_query_async(
+            _build_realtime_query(project_name, tablename, since_watermark=True),
+            watermark_job_config(watermark)
+        )
+    return get_realtime_window(tablename, fetch, _convert_realtime_rows)
+
+async def _realtime_window_data(project_name: str, tablename: str, limit: Optional[int]):
+    """Atualiza a janela do cliente e retorna (linhas mais recentes primeiro, sumário)"""
+    window = _get_realtime_window(project_name, tablename)
+    await window.refresh()
+    data = window.data(limit)
+    # Sem limite o sumário vem dos contadores incrementais; com limite, das linhas recortadas
+    summary = _calculate_realtime_summary(data) if limit else window.summary()
+    return data, summary
+
 @metrics_router.post("/realtime", response_model=RealtimeResponse)
 async def get_realtime_purchases(
     request: RealtimeRequest,
@@ -2903,14 +3215,15 @@ async def get_realtime_purchases(
     # Tentar buscar do cache primeiro
     cached_data = realtime_cache.get(**cache_params)
     if cached_data:
-        return RealtimeResponse(
-            data=cached_data['data'],
+        return trusted_response(
+            RealtimeResponse,
+            data=rows_to_dicts(cached_data['data']),
             total_rows=cached_data['total_rows'],
             summary=cached_data['summary'],
             cache_info={
                 'source': 'cache',
                 'cached_at': cached_data.get('cached_at'),
-                'ttl_hours': 0.25
+                'ttl_hours': realtime_cache.ttl_hours_for(**cache_params)
             }
         )
     
@@ -2923,30 +3236,16 @@ async def get_realtime_purchases(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
+        # Buscar informações do usuário (consulta em cache, sem bloquear o event loop)
+        user_access = await get_user_access(token.email)
         
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
@@ -2955,104 +3254,29 @@ async def get_realtime_purchases(
                 # Usuário escolheu uma tabela específica
                 tablename = request.table_name
                 print(f"🔓 Usuário com acesso total escolheu tabela: {tablename}")
-            else:
-                # Usar tabela padrão (constance)
-                tablename = 'constance'
-                print(f"🔓 Usuário com acesso total usando tabela padrão: {tablename}")
-        else:
-            # Usuário tem acesso limitado a uma tabela específica
-            if request.table_name and request.table_name != user_tablename:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
-                )
-            tablename = user_tablename
-            print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
-
-        # Determinar projeto
-        project_name = get_project_name(tablename)
-        
-        # Construir query realtime
-        limit_clause = f"LIMIT {limit}" if limit else ""
-        query = f"""
-        SELECT
-            event_timestamp,
-            concat(ga_session_id, user_pseudo_id) session_id,
-            transaction_id,
-            item_category,
-            item_name,
-            quantity,
-            item_revenue,
-            source,
-            medium,
-            campaign,
-            content,
-            term,
-            page_location,
-            traffic_category
-        FROM
-            `{project_name}.dbt_join.{tablename}_purchases_items_sessions_realtime`
-        ORDER BY event_timestamp DESC
-        {limit_clause}
-        """
-        
-        print(f"Executando query realtime: {query}")
-        
-        # Executar query de forma assíncrona
-        rows = await execute_bigquery_query_async(query)
-        
-        # Converter para formato de resposta
-        data = []
-        total_revenue = 0
-        total_quantity = 0
-        unique_transactions = set()
-        unique_sessions = set()
-        
-        for row in rows:
-            # Converter timestamp se necessário
-            event_timestamp_str = str(row.event_timestamp) if row.event_timestamp else ""
-            if hasattr(row.event_timestamp, 'isoformat'):
-                event_timestamp_str = row.event_timestamp.isoformat()
-            
-            data_row = RealtimeRow(
-                event_timestamp=event_timestamp_str,
-                session_id=str(row.session_id) if row.session_id else "",
-                transaction_id=str(row.transaction_id) if row.transaction_id else "",
-                item_category=str(row.item_category) if row.item_category else "",
-                item_name=str(row.item_name) if row.item_name else "",
-                quantity=int(row.quantity) if row.quantity else 0,
-                item_revenue=float(row.item_revenue) if row.item_revenue else 0.0,
-                source=str(row.source) if row.source else "",
-                medium=str(row.medium) if row.medium else "",
-                campaign=str(row.campaign) if row.campaign else "",
-                content=str(row.content) if row.content else "",
-                term=str(row.term) if row.term else "",
-                page_location=str(row.page_location) if row.page_location else "",
-                traffic_category=str(row.traffic_category) if row.traffic_category else ""
-            )
-            data.append(data_row)
-            
-            # Calcular totais
-            total_revenue += data_row.item_revenue
-            total_quantity += data_row.quantity
-            if data_row.transaction_id:
-                unique_transactions.add(data_row.transaction_id)
-            if data_row.session_id:
-                unique_sessions.add(data_row.session_id)
+            else:
+                # Usar tabela padrão (constance)
+                tablename = 'constance'
+                print(f"🔓 Usuário com acesso total usando tabela padrão: {tablename}")
+        else:
+            # Usuário tem acesso limitado a uma tabela específica
+            if request.table_name and request.table_name != user_tablename:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
+                )
+            tablename = user_tablename
+            print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
+
+        # Determinar projeto
+        project_name = get_project_name(tablename)
         
-        # Calcular métricas
-        avg_item_value = total_revenue / len(data) if len(data) > 0 else 0
-        avg_quantity_per_item = total_quantity / len(data) if len(data) > 0 else 0
+        # Atualizar a janela do cliente (só as linhas novas desde a última leitura)
+        data, window_summary = await _realtime_window_data(project_name, tablename, limit)
         
         # Criar resumo
         summary = {
-            "total_items": len(data),
-            "total_revenue": total_revenue,
-            "total_quantity": total_quantity,
-            "unique_transactions": len(unique_transactions),
-            "unique_sessions": len(unique_sessions),
-            "avg_item_value": avg_item_value,
-            "avg_quantity_per_item": avg_quantity_per_item,
+            **window_summary,
             "tablename": tablename,
             "user_access": "all" if user_tablename == 'all' else "limited",
             "limit_applied": limit,
@@ -3061,7 +3285,7 @@ async def get_realtime_purchases(
         
         # Preparar resposta
         response_data = {
-            'data': [row.dict() for row in data],
+            'data': data,
             'total_rows': len(data),
             'summary': summary,
             'cached_at': datetime.now().isoformat()
@@ -3080,14 +3304,15 @@ async def get_realtime_purchases(
         # Armazenar no cache
         realtime_cache.set(response_data, **cache_params)
         
-        return RealtimeResponse(
-            data=data,
+        return trusted_response(
+            RealtimeResponse,
+            data=rows_to_dicts(data),
             total_rows=len(data),
             summary=summary,
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 0.25
+                'ttl_hours': realtime_cache.ttl_hours_for(**cache_params)
             }
         )
         
@@ -3104,15 +3329,11 @@ async def get_realtime_revenue(
     request: RealtimeRevenueRequest,
     token: TokenData = Depends(verify_token)
 ):
-    """Endpoint para buscar receita realtime do dia atual"""
-    
-    # Se não estiver no cache, buscar do BigQuery
-    client = get_bigquery_client()
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro de conexão com o banco de dados"
-        )
+    """Endpoint para buscar receita realtime do dia atual
+
+    A receita é calculada uma vez por cliente e dia e compartilhada por todas as
+    chamadas até expirar (ver realtime_revenue.py).
+    """
     
     try:
         # Validar se table_name foi fornecido
@@ -3123,35 +3344,20 @@ async def get_realtime_revenue(
             )
         
         # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
+        user_access = await get_user_access(token.email)
         
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        access_control = user_data[0].access_control
+        user_tablename, access_control = user_access
         
         # Determinar qual tabela usar
         if user_tablename == 'all':
             # Usuário tem acesso a todas as tabelas
             tablename = request.table_name
-            print(f"🔓 Usuário com acesso total escolheu tabela: {tablename}")
         else:
             # Usuário tem acesso limitado a uma tabela específica
             if request.table_name and request.table_name != user_tablename:
@@ -3160,39 +3366,25 @@ async def get_realtime_revenue(
                     detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
                 )
             tablename = user_tablename
-            print(f"🔒 Usuário com acesso limitado usando tabela: {tablename}")
         
         # Determinar projeto
         project_name = get_project_name(tablename)
         
-        # Construir query para receita realtime do dia atual
-        query = f"""
-        SELECT
-            sum(value) as total_revenue
-        FROM `{project_name}.dbt_granular.{tablename}_orders_dedup`
-        WHERE date(created_at) = current_date("America/Sao_Paulo")
-        """
-        
-        print(f"Executando query realtime revenue: {query}")
-        
-        # Executar query de forma assíncrona
-        rows = await execute_bigquery_query_async(query)
-        
-        # Extrair valor
-        total_revenue = 0.0
-        if rows and len(rows) > 0:
-            total_revenue = float(rows[0].total_revenue) if rows[0].total_revenue else 0.0
+        # Receita do dia compartilhada por cliente (cache curto + consulta única em voo)
+        revenue = await get_shared_realtime_revenue(project_name, tablename)
         
         return RealtimeRevenueResponse(
-            total_revenue=total_revenue,
+            total_revenue=revenue['total_revenue'],
             table_name=tablename,
             cache_info={
-                'source': 'database',
-                'cached_at': datetime.now().isoformat(),
-                'ttl_hours': 0.25
+                'source': revenue['source'],
+                'cached_at': revenue['cached_at'],
+                'ttl_hours': REALTIME_REVENUE_TTL_SECONDS / 3600
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao buscar receita realtime: {e}")
         raise HTTPException(
@@ -3201,6 +3393,206 @@ async def get_realtime_revenue(
         )
 
 
+@metrics_router.post("/realtime/series", response_model=RealtimeSeriesResponse)
+async def get_realtime_series(
+    request: RealtimeSeriesRequest,
+    token: TokenData = Depends(verify_token)
+):
+    """Receita, pedidos e itens por minuto das últimas `hours` horas
+
+    Servido do buffer circular da janela realtime do cliente: cada chamada custa no
+    máximo uma query delta, em vez de o front montar a série com polling de /realtime-revenue.
+    """
+    if request.hours <= 0 or request.hours > REALTIME_WINDOW_HOURS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"O campo 'hours' deve estar entre 0 e {REALTIME_WINDOW_HOURS:g}"
+        )
+    
+    try:
+        # Buscar informações do usuário
+        user_access = await get_user_access(token.email)
+        
+        if not user_access:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuário não encontrado"
+            )
+        
+        user_tablename = user_access[0]
+        
+        # Determinar qual tabela usar
+        if user_tablename == 'all':
+            tablename = request.table_name or 'constance'
+        else:
+            if request.table_name and request.table_name != user_tablename:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
+                )
+            tablename = user_tablename
+        
+        # Determinar projeto
+        project_name = get_project_name(tablename)
+        
+        window = _get_realtime_window(project_name, tablename)
+        await window.refresh()
+        data = window.minute_series(request.hours)
+        
+        summary = {
+            "total_revenue": sum(point['revenue'] for point in data),
+            "total_orders": sum(point['orders'] for point in data),
+            "total_items": sum(point['items'] for point in data),
+            "hours": request.hours,
+            "tablename": tablename,
+            "user_access": "all" if user_tablename == 'all' else "limited",
+            "data_freshness": "realtime"
+        }
+        
+        return RealtimeSeriesResponse(
+            data=data,
+            total_rows=len(data),
+            summary=summary,
+            cache_info={
+                'source': 'realtime_window',
+                'cached_at': datetime.fromtimestamp(window.refreshed_at).isoformat()
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro ao buscar série realtime: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+
+
+async def _fetch_realtime_snapshot(project_name: str, tablename: str) -> Dict[str, Any]:
+    """Um ciclo do poller realtime: compras de itens e receita do dia, em paralelo"""
+    (data, summary), revenue = await asyncio.gather(
+        _realtime_window_data(project_name, tablename, None),
+        get_shared_realtime_revenue(project_name, tablename)
+    )
+    
+    return {
+        'data': data,
+        'summary': summary,
+        'total_revenue': revenue['total_revenue'],
+        'fetched_at': datetime.now().isoformat(),
+        'rendered': {}  # Eventos já serializados por (limit, user_access)
+    }
+
+def _render_realtime_event(snapshot: Dict[str, Any], tablename: str, limit: Optional[int], user_access: str) -> str:
+    """Serializa o snapshot no formato de /realtime e /realtime-revenue
+
+    A serialização é feita uma vez por combinação (limit, user_access) e reaproveitada
+    por todos os assinantes do cliente.
+    """
+    key = (limit, user_access)
+    rendered = snapshot['rendered'].get(key)
+    if rendered is None:
+        data = snapshot['data'][:limit] if limit else snapshot['data']
+        cache_info = {
+            'source': 'stream',
+            'cached_at': snapshot['fetched_at'],
+            'poll_interval_seconds': REALTIME_POLL_INTERVAL_SECONDS
+        }
+        rendered = json.dumps({
+            'realtime': {
+                'data': rows_to_dicts(data),
+                'total_rows': len(data),
+                'summary': {
+                    **(_calculate_realtime_summary(data) if limit else snapshot['summary']),
+                    "tablename": tablename,
+                    "user_access": user_access,
+                    "limit_applied": limit,
+                    "data_freshness": "realtime"
+                },
+                'cache_info': cache_info
+            },
+            'revenue': {
+                'total_revenue': snapshot['total_revenue'],
+                'table_name': tablename,
+                'cache_info': cache_info
+            }
+        }, ensure_ascii=False)
+        snapshot['rendered'][key] = rendered
+    return rendered
+
+@metrics_router.post("/realtime/stream-ticket", response_model=StreamTicketResponse)
+async def create_realtime_stream_ticket(token: TokenData = Depends(verify_token)):
+    """Ticket curto para abrir o stream SSE (`/realtime/stream?ticket=...`)
+
+    O EventSource não envia o header Authorization; o ticket evita colocar o token de
+    acesso na URL, onde ele ficaria em logs de proxy e no histórico do navegador.
+    """
+    return StreamTicketResponse(ticket=create_stream_ticket(token.email), expires_in=STREAM_TICKET_EXPIRE_SECONDS)
+
+@metrics_router.get("/realtime/stream")
+async def stream_realtime(
+    table_name: Optional[str] = None,
+    limit: Optional[int] = None,
+    token: TokenData = Depends(verify_stream_token)
+):
+    """Stream SSE com compras e receita realtime
+
+    Substitui o polling de /realtime e /realtime-revenue: um poller por cliente consulta
+    o BigQuery em intervalo fixo e envia um evento `realtime` a todas as conexões abertas.
+    Autenticação pelo header ou por `?ticket=` de /realtime/stream-ticket; o ticket só vale
+    na abertura, então uma reconexão após a expiração precisa de um ticket novo.
+    """
+    try:
+        # Buscar informações do usuário (uma vez por conexão, consulta em cache)
+        user_access = await get_user_access(token.email)
+        
+        if not user_access:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuário não encontrado"
+            )
+        
+        user_tablename, _ = user_access
+        
+        # Determinar qual tabela usar
+        if user_tablename == 'all':
+            tablename = table_name or 'constance'
+        else:
+            if table_name and table_name != user_tablename:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{table_name}'"
+                )
+            tablename = user_tablename
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro ao abrir stream realtime: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro interno do servidor: {str(e)}"
+        )
+    
+    project_name = get_project_name(tablename)
+    user_access = "all" if user_tablename == 'all' else "limited"
+    print(f"📡 Nova conexão no stream realtime: {tablename} ({token.email})")
+    
+    return StreamingResponse(
+        event_stream(
+            tablename,
+            lambda: _fetch_realtime_snapshot(project_name, tablename),
+            lambda snapshot: _render_realtime_event(snapshot, tablename, limit, user_access)
+        ),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Desliga o buffer do nginx para este stream
+            # Content-Encoding explícito faz o GZipMiddleware repassar os eventos sem bufferizar
+            'Content-Encoding': 'identity'
+        }
+    )
+
 async def execute_last_request(endpoint: str, request_data: Dict[str, Any], token: TokenData):
     """Função auxiliar para executar a consulta baseada no último request"""
     
@@ -3237,6 +3629,11 @@ async def execute_last_request(endpoint: str, request_data: Dict[str, Any], toke
             traffic_category: Optional[str] = None
             fs_traffic_category: Optional[str] = None
             fsm_traffic_category: Optional[str] = None
+            status: Optional[str] = None
+            source: Optional[str] = None
+            medium: Optional[str] = None
+            campaign: Optional[str] = None
+            format: Optional[str] = None
         
         temp_request = TempRequest(**request_data)
         return await get_orders(temp_request, token)
@@ -3259,6 +3656,8 @@ async def execute_last_request(endpoint: str, request_data: Dict[str, Any], toke
             limit: Optional[int] = 1000
             offset: Optional[int] = 0
             order_by: Optional[str] = "Pedidos"
+            group_by: Optional[List[str]] = None
+            format: Optional[str] = "rows"
         
         temp_request = TempRequest(**request_data)
         return await get_detailed_data(temp_request, token)
@@ -3296,6 +3695,7 @@ async def execute_last_request(endpoint: str, request_data: Dict[str, Any], toke
             table_name: Optional[str] = None
             last_cache: Optional[bool] = False
             force_refresh: Optional[bool] = False
+            format: Optional[str] = "rows"
         
         temp_request = TempRequest(**request_data)
         # Garantir que last_cache seja False para evitar loop infinito
@@ -3312,6 +3712,7 @@ async def execute_last_request(endpoint: str, request_data: Dict[str, Any], toke
             force_refresh: Optional[bool] = False
             limit: Optional[int] = 5000
             offset: Optional[int] = 0
+            format: Optional[str] = None
         
         temp_request = TempRequest(**request_data)
         # Garantir que last_cache seja False para evitar loop infinito
@@ -3449,24 +3850,8 @@ async def get_last_request(
 async def flush_cache(token: TokenData = Depends(verify_token)):
     """Endpoint para fazer flush completo do cache"""
     try:
-        # Verificar se o usuário é admin
-        user_query = f"""
-        SELECT admin
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        client = get_bigquery_client()
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data or not user_data[0].admin:
+        # Verificar se o usuário é admin (consulta em cache)
+        if not verify_admin_user(token.email):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Apenas administradores podem fazer flush do cache"
@@ -3480,6 +3865,16 @@ async def flush_cache(token: TokenData = Depends(verify_token)):
         product_trend_stats = product_trend_cache.flush()
         ads_campaigns_results_stats = ads_campaigns_results_cache.flush()
         realtime_stats = realtime_cache.flush()
+        leads_orders_stats = leads_orders_cache.flush()
+        shipping_calc_stats = shipping_calc_cache.flush()
+        event_cube_stats = event_cube_cache.flush()
+        event_cube_history_stats = event_cube_history_cache.flush()
+        orders_history_stats = orders_history_cache.flush()
+        items_scoring_stats = items_scoring_cache.flush()
+        experiments_stats = experiments_cache.flush()
+        portfolio_stats = portfolio_cache.flush()
+        realtime_revenue_stats = realtime_revenue_cache.flush()
+        user_lookup_stats = user_lookup_cache.flush()
         
         return {
             "message": "Todos os caches limpos com sucesso",
@@ -3490,7 +3885,18 @@ async def flush_cache(token: TokenData = Depends(verify_token)):
                 "detailed_data_cache": detailed_data_stats,
                 "product_trend_cache": product_trend_stats,
                 "ads_campaigns_results_cache": ads_campaigns_results_stats,
-                "realtime_cache": realtime_stats
+                "realtime_cache": realtime_stats,
+                "leads_orders_cache": leads_orders_stats,
+                "shipping_calc_cache": shipping_calc_stats,
+                "event_cube_cache": event_cube_stats,
+                "event_cube_history_cache": event_cube_history_stats,
+                "orders_history_cache": orders_history_stats,
+                "items_scoring_cache": items_scoring_stats,
+                "experiments_cache": experiments_stats,
+                "portfolio_cache": portfolio_stats,
+                "realtime_revenue_cache": realtime_revenue_stats,
+                "user_lookup_cache": user_lookup_stats,
+                "goals_store": goals_store.flush()
             }
         }
         
@@ -3505,24 +3911,8 @@ async def flush_cache(token: TokenData = Depends(verify_token)):
 async def flush_expired_cache(token: TokenData = Depends(verify_token)):
     """Endpoint para remover apenas entradas expiradas do cache"""
     try:
-        # Verificar se o usuário é admin
-        user_query = f"""
-        SELECT admin
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        client = get_bigquery_client()
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data or not user_data[0].admin:
+        # Verificar se o usuário é admin (consulta em cache)
+        if not verify_admin_user(token.email):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Apenas administradores podem gerenciar o cache"
@@ -3536,6 +3926,16 @@ async def flush_expired_cache(token: TokenData = Depends(verify_token)):
         product_trend_stats = product_trend_cache.flush_expired()
         ads_campaigns_results_stats = ads_campaigns_results_cache.flush_expired()
         realtime_stats = realtime_cache.flush_expired()
+        leads_orders_stats = leads_orders_cache.flush_expired()
+        shipping_calc_stats = shipping_calc_cache.flush_expired()
+        event_cube_stats = event_cube_cache.flush_expired()
+        event_cube_history_stats = event_cube_history_cache.flush_expired()
+        orders_history_stats = orders_history_cache.flush_expired()
+        items_scoring_stats = items_scoring_cache.flush_expired()
+        experiments_stats = experiments_cache.flush_expired()
+        portfolio_stats = portfolio_cache.flush_expired()
+        realtime_revenue_stats = realtime_revenue_cache.flush_expired()
+        user_lookup_stats = user_lookup_cache.flush_expired()
         
         return {
             "message": "Entradas expiradas removidas com sucesso de todos os caches",
@@ -3546,7 +3946,17 @@ async def flush_expired_cache(token: TokenData = Depends(verify_token)):
                 "detailed_data_cache": detailed_data_stats,
                 "product_trend_cache": product_trend_stats,
                 "ads_campaigns_results_cache": ads_campaigns_results_stats,
-                "realtime_cache": realtime_stats
+                "realtime_cache": realtime_stats,
+                "leads_orders_cache": leads_orders_stats,
+                "shipping_calc_cache": shipping_calc_stats,
+                "event_cube_cache": event_cube_stats,
+                "event_cube_history_cache": event_cube_history_stats,
+                "orders_history_cache": orders_history_stats,
+                "items_scoring_cache": items_scoring_stats,
+                "experiments_cache": experiments_stats,
+                "portfolio_cache": portfolio_stats,
+                "realtime_revenue_cache": realtime_revenue_stats,
+                "user_lookup_cache": user_lookup_stats
             }
         }
         
@@ -3561,24 +3971,8 @@ async def flush_expired_cache(token: TokenData = Depends(verify_token)):
 async def get_cache_stats(token: TokenData = Depends(verify_token)):
     """Endpoint para obter estatísticas do cache"""
     try:
-        # Verificar se o usuário é admin
-        user_query = f"""
-        SELECT admin
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
-        
-        client = get_bigquery_client()
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data or not user_data[0].admin:
+        # Verificar se o usuário é admin (consulta em cache)
+        if not verify_admin_user(token.email):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Apenas administradores podem ver estatísticas do cache"
@@ -3592,6 +3986,16 @@ async def get_cache_stats(token: TokenData = Depends(verify_token)):
         product_trend_stats = product_trend_cache.get_stats()
         ads_campaigns_results_stats = ads_campaigns_results_cache.get_stats()
         realtime_stats = realtime_cache.get_stats()
+        leads_orders_stats = leads_orders_cache.get_stats()
+        shipping_calc_stats = shipping_calc_cache.get_stats()
+        event_cube_stats = event_cube_cache.get_stats()
+        event_cube_history_stats = event_cube_history_cache.get_stats()
+        orders_history_stats = orders_history_cache.get_stats()
+        items_scoring_stats = items_scoring_cache.get_stats()
+        experiments_stats = experiments_cache.get_stats()
+        portfolio_stats = portfolio_cache.get_stats()
+        realtime_revenue_stats = realtime_revenue_cache.get_stats()
+        user_lookup_stats = user_lookup_cache.get_stats()
         
         return {
             "message": "Estatísticas de todos os caches",
@@ -3602,8 +4006,22 @@ async def get_cache_stats(token: TokenData = Depends(verify_token)):
                 "detailed_data_cache": detailed_data_stats,
                 "product_trend_cache": product_trend_stats,
                 "ads_campaigns_results_cache": ads_campaigns_results_stats,
-                "realtime_cache": realtime_stats
-            }
+                "realtime_cache": realtime_stats,
+                "leads_orders_cache": leads_orders_stats,
+                "shipping_calc_cache": shipping_calc_stats,
+                "event_cube_cache": event_cube_stats,
+                "event_cube_history_cache": event_cube_history_stats,
+                "orders_history_cache": orders_history_stats,
+                "items_scoring_cache": items_scoring_stats,
+                "experiments_cache": experiments_stats,
+                "portfolio_cache": portfolio_stats,
+                "realtime_revenue_cache": realtime_revenue_stats,
+                "user_lookup_cache": user_lookup_stats
+            },
+            "realtime_stream": get_stream_stats(),
+            "realtime_revenue": get_realtime_revenue_stats(),
+            "tenant_catalog": tenant_catalog.stats(),
+            "goals_store": goals_store.stats()
         }
         
     except Exception as e:
@@ -3613,13 +4031,104 @@ async def get_cache_stats(token: TokenData = Depends(verify_token)):
             detail=f"Erro interno do servidor: {str(e)}"
         )
 
+def _build_leads_orders_query(table_name: str) -> str:
+    """Monta a query de leads/orders (parâmetros @start_date e @end_date)"""
+    return f"""
+    SELECT
+        subscribe_timestamp,
+        name,
+        phone,
+        email,
+        fsm_source,
+        fsm_medium,
+        fsm_campaign,
+        transaction_id,
+        purchase_timestamp,
+        value,
+        source,
+        medium,
+        campaign,
+        days_between_subscribe_and_purchase,
+        minutes_between_subscribe_and_purchase
+    FROM `{table_name}`
+    WHERE DATE(subscribe_timestamp) BETWEEN @start_date AND @end_date
+       OR DATE(purchase_timestamp) BETWEEN @start_date AND @end_date
+    ORDER BY subscribe_timestamp DESC
+    """
+
+def _convert_leads_orders_rows(rows) -> List[CompactLeadsOrdersRow]:
+    """Converte as linhas do BigQuery em CompactLeadsOrdersRow"""
+    data = []
+    for row in rows:
+        leads_row = CompactLeadsOrdersRow(
+            subscribe_timestamp=str(row.subscribe_timestamp) if row.subscribe_timestamp else None,
+            name=str(row.name) if row.name else None,
+            phone=str(row.phone) if row.phone else None,
+            email=str(row.email) if row.email else None,
+            fsm_source=str(row.fsm_source) if row.fsm_source else None,
+            fsm_medium=str(row.fsm_medium) if row.fsm_medium else None,
+            fsm_campaign=str(row.fsm_campaign) if row.fsm_campaign else None,
+            transaction_id=str(row.transaction_id) if row.transaction_id else None,
+            purchase_timestamp=str(row.purchase_timestamp) if row.purchase_timestamp else None,
+            value=float(row.value) if row.value is not None else None,
+            source=str(row.source) if row.source else None,
+            medium=str(row.medium) if row.medium else None,
+            campaign=str(row.campaign) if row.campaign else None,
+            days_between_subscribe_and_purchase=int(row.days_between_subscribe_and_purchase) if row.days_between_subscribe_and_purchase is not None else None,
+            minutes_between_subscribe_and_purchase=int(row.minutes_between_subscribe_and_purchase) if row.minutes_between_subscribe_and_purchase is not None else None
+        )
+        data.append(leads_row)
+    return data
+
+def _calculate_leads_orders_summary(data: List[CompactLeadsOrdersRow]) -> Dict[str, Any]:
+    """Calcula totais de leads, pedidos, receita e emails distintos"""
+    total_leads = 0
+    total_orders = 0
+    total_revenue = 0.0
+    distinct_emails = set()
+    distinct_emails_with_purchase = set()
+    distinct_emails_with_purchase_no_lead = set()
+
+    for row in data:
+        if row.subscribe_timestamp:
+            total_leads += 1
+        if row.transaction_id:
+            total_orders += 1
+        if row.value is not None:
+            total_revenue += row.value
+
+        # Calcular emails distintos
+        if row.email:
+            distinct_emails.add(row.email)
+
+            # Email com compra (transaction_id)
+            if row.transaction_id:
+                distinct_emails_with_purchase.add(row.email)
+
+                # Email com compra mas SEM lead (sem subscribe_timestamp)
+                if not row.subscribe_timestamp:
+                    distinct_emails_with_purchase_no_lead.add(row.email)
+
+    return {
+        "total_leads": total_leads,
+        "total_orders": total_orders,
+        "total_revenue": round(total_revenue, 2),
+        "total_distinct_emails": len(distinct_emails),
+        "total_distinct_emails_with_purchase": len(distinct_emails_with_purchase),
+        "total_distinct_emails_with_purchase_no_lead": len(distinct_emails_with_purchase_no_lead),
+        "total_distinct_emails_without_purchase": len(distinct_emails) - len(distinct_emails_with_purchase),
+    }
+
 @metrics_router.post("/leads_orders", response_model=LeadsOrdersResponse)
 async def get_leads_orders(
     request: LeadsOrdersRequest,
-    token: TokenData = Depends(verify_token)
+    token: TokenData = Depends(verify_token),
+    http_request: Request = None
 ):
     """Endpoint para buscar dados de leads e orders com cache de 7 dias"""
     
+    requested_format = request.format or requested_download_format(http_request)
+    
     # Se last_cache for True, buscar o último request salvo específico por table_name
     if request.last_cache:
         if not request.table_name:
@@ -3634,6 +4143,7 @@ async def get_leads_orders(
             last_request_data = last_request['request_data'].copy()
             last_request_data['limit'] = request.limit
             last_request_data['offset'] = request.offset
+            last_request_data['format'] = requested_format
             
             # Executar o último request salvo com os novos parâmetros de paginação
             return await execute_last_request('leads_orders', last_request_data, token)
@@ -3651,6 +4161,8 @@ async def get_leads_orders(
                 detail="start_date e end_date são obrigatórios quando last_cache é false"
             )
     
+    response_format = _parse_response_format(requested_format, RESPONSE_FORMATS + DOWNLOAD_FORMATS)
+    
     # Parâmetros para o cache (sem paginação - armazena todos os dados)
     cache_params = {
         'email': token.email,
@@ -3669,15 +4181,21 @@ async def get_leads_orders(
             end_idx = start_idx + request.limit
             paginated_data = all_cached_data[start_idx:end_idx]
             
-            return LeadsOrdersResponse(
+            if response_format in DOWNLOAD_FORMATS:
+                table = rows_table(paginated_data, CompactLeadsOrdersRow, cached_data['summary'], cached_data['total_rows'])
+                filename = f"leads_orders_{request.table_name}_{request.start_date}_{request.end_date}"
+                return table_response(table, response_format, filename)
+            
+            return trusted_response(
+                LeadsOrdersResponse,
                 summary=cached_data['summary'],
-                data=paginated_data,
+                data=_page_data(paginated_data, CompactLeadsOrdersRow, response_format),
                 total_rows=len(paginated_data),  # Registros nesta página
                 total_records=cached_data['total_rows'],  # Total de registros da query completa
                 cache_info={
                     'source': 'cache',
                     'cached_at': cached_data.get('cached_at'),
-                    'ttl_hours': 168  # 7 dias
+                    'ttl_hours': leads_orders_cache.ttl_hours_for(**cache_params)
                 },
                 pagination={
                     'limit': request.limit,
@@ -3695,35 +4213,19 @@ async def get_leads_orders(
         )
     
     try:
-        # Buscar informações do usuário
-        user_query = f"""
-        SELECT tablename, admin, access_control
-        FROM `mymetric-hub-shopify.dbt_config.users`
-        WHERE email = @email
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("email", "STRING", token.email),
-            ]
-        )
+        # Buscar informações do usuário (consulta em cache)
+        user_access = await get_user_access(token.email)
         
-        user_result = client.query(user_query, job_config=job_config)
-        user_data = list(user_result.result())
-        
-        if not user_data:
+        if not user_access:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuário não encontrado"
             )
         
-        user_tablename = user_data[0].tablename
-        is_admin = user_data[0].admin
+        user_tablename, _ = user_access
         
-        # Determinar qual tabela usar
-        if is_admin and request.table_name:
-            tablename = request.table_name
-        elif user_tablename == 'all':
+        # Determinar qual tabela usar (admins podem escolher qualquer tabela)
+        if user_tablename == 'all' or (request.table_name and verify_admin_user(token.email)):
             tablename = request.table_name
         else:
             tablename = user_tablename
@@ -3735,28 +4237,7 @@ async def get_leads_orders(
         table_name = f"{project_name}.dbt_join.{tablename}_leads_orders_"
         
         # Query para buscar dados de leads_orders (sem LIMIT/OFFSET)
-        query = f"""
-        SELECT
-            subscribe_timestamp,
-            name,
-            phone,
-            email,
-            fsm_source,
-            fsm_medium,
-            fsm_campaign,
-            transaction_id,
-            purchase_timestamp,
-            value,
-            source,
-            medium,
-            campaign,
-            days_between_subscribe_and_purchase,
-            minutes_between_subscribe_and_purchase
-        FROM `{table_name}`
-        WHERE DATE(subscribe_timestamp) BETWEEN @start_date AND @end_date
-           OR DATE(purchase_timestamp) BETWEEN @start_date AND @end_date
-        ORDER BY subscribe_timestamp DESC
-        """
+        query = _build_leads_orders_query(table_name)
         
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
@@ -3769,53 +4250,7 @@ async def get_leads_orders(
         results = list(query_job.result())
         
         # Converter TODOS os resultados para o modelo
-        all_data = []
-        total_leads = 0
-        total_orders = 0
-        total_revenue = 0.0
-        distinct_emails = set()
-        distinct_emails_with_purchase = set()
-        distinct_emails_with_purchase_no_lead = set()
-        
-        for row in results:
-            leads_row = LeadsOrdersRow(
-                subscribe_timestamp=str(row.subscribe_timestamp) if row.subscribe_timestamp else None,
-                name=str(row.name) if row.name else None,
-                phone=str(row.phone) if row.phone else None,
-                email=str(row.email) if row.email else None,
-                fsm_source=str(row.fsm_source) if row.fsm_source else None,
-                fsm_medium=str(row.fsm_medium) if row.fsm_medium else None,
-                fsm_campaign=str(row.fsm_campaign) if row.fsm_campaign else None,
-                transaction_id=str(row.transaction_id) if row.transaction_id else None,
-                purchase_timestamp=str(row.purchase_timestamp) if row.purchase_timestamp else None,
-                value=float(row.value) if row.value is not None else None,
-                source=str(row.source) if row.source else None,
-                medium=str(row.medium) if row.medium else None,
-                campaign=str(row.campaign) if row.campaign else None,
-                days_between_subscribe_and_purchase=int(row.days_between_subscribe_and_purchase) if row.days_between_subscribe_and_purchase is not None else None,
-                minutes_between_subscribe_and_purchase=int(row.minutes_between_subscribe_and_purchase) if row.minutes_between_subscribe_and_purchase is not None else None
-            )
-            all_data.append(leads_row)
-            
-            # Calcular métricas
-            if row.subscribe_timestamp:
-                total_leads += 1
-            if row.transaction_id:
-                total_orders += 1
-            if row.value is not None:
-                total_revenue += float(row.value)
-            
-            # Calcular emails distintos
-            if row.email:
-                distinct_emails.add(row.email)
-                
-                # Email com compra (transaction_id)
-                if row.transaction_id:
-                    distinct_emails_with_purchase.add(row.email)
-                    
-                    # Email com compra mas SEM lead (sem subscribe_timestamp)
-                    if not row.subscribe_timestamp:
-                        distinct_emails_with_purchase_no_lead.add(row.email)
+        all_data = _convert_leads_orders_rows(results)
         
         # Aplicar paginação aos dados completos
         start_idx = request.offset
@@ -3824,13 +4259,7 @@ async def get_leads_orders(
         
         # Criar resumo
         summary = {
-            "total_leads": total_leads,
-            "total_orders": total_orders,
-            "total_revenue": round(total_revenue, 2),
-            "total_distinct_emails": len(distinct_emails),
-            "total_distinct_emails_with_purchase": len(distinct_emails_with_purchase),
-            "total_distinct_emails_with_purchase_no_lead": len(distinct_emails_with_purchase_no_lead),
-            "total_distinct_emails_without_purchase": len(distinct_emails) - len(distinct_emails_with_purchase),
+            **_calculate_leads_orders_summary(all_data),
             "periodo": f"{request.start_date} a {request.end_date}",
             "tablename": tablename,
             "user_access": "all" if user_tablename == 'all' else "limited"
@@ -3838,7 +4267,7 @@ async def get_leads_orders(
         
         # Preparar resposta (armazenar TODOS os dados no cache)
         response_data = {
-            'all_data': [row.dict() for row in all_data],  # Todos os dados
+            'all_data': all_data,  # Todos os dados
             'total_rows': len(all_data),  # Total de registros
             'summary': summary,
             'cached_at': datetime.now().isoformat()
@@ -3860,15 +4289,21 @@ async def get_leads_orders(
         # Armazenar no cache
         leads_orders_cache.set(response_data, **cache_params)
         
-        return LeadsOrdersResponse(
+        if response_format in DOWNLOAD_FORMATS:
+            table = rows_table(data, CompactLeadsOrdersRow, summary, len(all_data))
+            filename = f"leads_orders_{tablename}_{request.start_date}_{request.end_date}"
+            return table_response(table, response_format, filename)
+        
+        return trusted_response(
+            LeadsOrdersResponse,
             summary=summary,
-            data=data,
+            data=_page_data(data, CompactLeadsOrdersRow, response_format),
             total_rows=len(data),  # Registros nesta página
             total_records=len(all_data),  # Total de registros da query completa
             cache_info={
                 'source': 'database',
                 'cached_at': response_data['cached_at'],
-                'ttl_hours': 168  # 7 dias
+                'ttl_hours': leads_orders_cache.ttl_hours_for(**cache_params)
             },
             pagination={
                 'limit': request.limit,
@@ -3877,9 +4312,158 @@ async def get_leads_orders(
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro ao buscar dados de leads_orders: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro interno do servidor: {str(e)}"
         )
+
+# Endpoints aceitos pelo /metrics/batch: nome -> (modelo do corpo, handler)
+BATCH_ENDPOINTS = {
+    'basic-data': (BasicDataRequest, get_basic_data),
+    'daily-metrics': (DailyMetricsRequest, get_daily_metrics),
+    'goals': (UserGoalsRequest, get_user_goals),
+    'realtime-revenue': (RealtimeRevenueRequest, get_realtime_revenue),
+    'realtime': (RealtimeRequest, get_realtime_purchases),
+    'realtime/series': (RealtimeSeriesRequest, get_realtime_series),
+    'ads-campaigns-results': (AdsCampaignsResultsRequest, get_ads_campaigns_results),
+    'ads-creatives-results': (AdsCreativesResultsRequest, get_ads_creatives_results),
+    'orders': (OrdersRequest, get_orders),
+    'detailed-data': (DetailedDataRequest, get_detailed_data),
+    'product-trend': (ProductTrendRequest, get_product_trend),
+}
+BATCH_MAX_REQUESTS = 20
+
+async def _run_batch_request(sub_request: BatchSubRequest, tablename: str, token: TokenData) -> BatchResult:
+    """Executa uma sub-requisição do batch; erros viram status/error no resultado"""
+    started = time.perf_counter()
+    result_id = sub_request.id or sub_request.endpoint
+    status_code = status.HTTP_200_OK
+    data = None
+    error = None
+    try:
+        model, handler = BATCH_ENDPOINTS[sub_request.endpoint]
+        params = {'table_name': tablename, **sub_request.params}
+        try:
+            body = model(**params)
+        except ValidationError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        result = await handler(body, token)
+        if isinstance(result, Response):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Downloads em arrow/parquet não são suportados no batch"
+            )
+        data = jsonable_encoder(result)
+    except HTTPException as e:
+        status_code = e.status_code
+        error = str(e.detail)
+    except Exception as e:
+        print(f"Erro na sub-requisição {result_id} do batch: {e}")
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        error = f"Erro interno do servidor: {str(e)}"
+
+    return BatchResult(
+        id=result_id,
+        endpoint=sub_request.endpoint,
+        status=status_code,
+        data=data,
+        error=error,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+    )
+
+@metrics_router.post("/batch", response_model=BatchResponse)
+async def batch_metrics(
+    request: BatchRequest,
+    token: TokenData = Depends(verify_token)
+):
+    """
+    Executa várias consultas do dashboard numa única requisição.
+
+    O usuário e a tabela são resolvidos uma vez (as sub-requisições reaproveitam a
+    consulta de usuário em cache) e as sub-requisições rodam em paralelo. Cada
+    resultado traz o status HTTP que o endpoint teria retornado; o erro de uma
+    sub-requisição não afeta as demais.
+
+    Com `stream`, a resposta é NDJSON: uma linha por sub-requisição, na ordem em que
+    terminam, e uma última linha com `{"done": true, ...}`.
+    """
+    started = time.perf_counter()
+
+    if not request.requests:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="requests não pode ser vazio")
+    if len(request.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {BATCH_MAX_REQUESTS} sub-requisições por batch"
+        )
+    invalid = sorted({sub_request.endpoint for sub_request in request.requests if sub_request.endpoint not in BATCH_ENDPOINTS})
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Endpoints inválidos no batch: {', '.join(invalid)}. Válidos: {', '.join(BATCH_ENDPOINTS)}"
+        )
+    ids = [sub_request.id or sub_request.endpoint for sub_request in request.requests]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sub-requisições repetidas para o mesmo endpoint precisam de um id único"
+        )
+
+    # Resolver o usuário e a tabela uma vez para todo o batch
+    user_access = await get_user_access(token.email)
+    if not user_access:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+
+    user_tablename, _ = user_access
+    if user_tablename == 'all':
+        tablename = request.table_name or 'constance'
+    else:
+        if request.table_name and request.table_name != user_tablename:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Usuário só tem acesso à tabela '{user_tablename}', não pode acessar '{request.table_name}'"
+            )
+        tablename = user_tablename
+
+    print(f"📦 Batch com {len(request.requests)} sub-requisições para {tablename}")
+    tasks = [
+        asyncio.ensure_future(_run_batch_request(sub_request, tablename, token))
+        for sub_request in request.requests
+    ]
+
+    if request.stream:
+        async def stream_results():
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    yield json.dumps(jsonable_encoder(result), ensure_ascii=False) + "\n"
+                yield json.dumps({
+                    'done': True,
+                    'table_name': tablename,
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+                }) + "\n"
+            finally:
+                # Cliente desconectou: cancela o que ainda estiver rodando
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(
+            stream_results(),
+            media_type="application/x-ndjson",
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+                'Content-Encoding': 'identity'
+            }
+        )
+
+    results = await asyncio.gather(*tasks)
+    return BatchResponse(
+        table_name=tablename,
+        results=results,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+    )
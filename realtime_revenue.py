@@ -0,0 +1,104 @@
+"""
+Receita realtime do dia, calculada uma vez por cliente e compartilhada
+
+`/metrics/realtime-revenue` é chamado a cada poucos segundos pelos wallboards. O
+`SUM(value)` do dia fica em cache por cliente e dia (`REALTIME_REVENUE_TTL_SECONDS`),
+chamadas simultâneas com o cache vazio compartilham uma única query, e o mesmo valor
+alimenta o stream SSE. Com `REALTIME_REVENUE_REFRESH_SECONDS` > 0, um loop em
+background recalcula a receita dos clientes consultados recentemente antes de o cache
+expirar, e as requisições nunca esperam pelo BigQuery.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from cache_manager import TIMEZONE, realtime_revenue_cache
+from utils import execute_bigquery_query_async
+
+REALTIME_REVENUE_TTL_SECONDS = realtime_revenue_cache.ttl_seconds
+REALTIME_REVENUE_REFRESH_SECONDS = float(os.getenv('REALTIME_REVENUE_REFRESH_SECONDS', '0'))
+# O loop de um cliente para depois desse tempo sem leituras
+REALTIME_REVENUE_IDLE_SECONDS = 600
+
+
+def build_realtime_revenue_query(project_name: str, tablename: str) -> str:
+    """Monta a query de receita do dia atual (America/Sao_Paulo)"""
+    return f"""
+        SELECT
+            sum(value) as total_revenue
+        FROM `{project_name}.dbt_granular.{tablename}_orders_dedup`
+        WHERE date(created_at) = current_date("America/Sao_Paulo")
+        """
+
+
+# Consultas em andamento por (cliente, dia), compartilhadas pelas requisições simultâneas
+_loading: Dict[Tuple[str, str], asyncio.Future] = {}
+# Loops de atualização em background e última leitura de cada cliente
+_refreshers: Dict[str, asyncio.Task] = {}
+_last_access: Dict[str, float] = {}
+
+
+def _today() -> str:
+    return datetime.now(TIMEZONE).date().isoformat()
+
+
+async def _load_realtime_revenue(project_name: str, tablename: str, day: str) -> Dict[str, Any]:
+    rows = await execute_bigquery_query_async(build_realtime_revenue_query(project_name, tablename))
+    total_revenue = float(rows[0].total_revenue) if rows and rows[0].total_revenue else 0.0
+    revenue = {'total_revenue': total_revenue, 'cached_at': datetime.now().isoformat()}
+    realtime_revenue_cache.set(revenue, table_name=tablename, day=day)
+    return revenue
+
+
+async def _single_flight(project_name: str, tablename: str, day: str) -> Dict[str, Any]:
+    key = (tablename, day)
+    loading = _loading.get(key)
+    if loading is None:
+        loading = asyncio.ensure_future(_load_realtime_revenue(project_name, tablename, day))
+        _loading[key] = loading
+        loading.add_done_callback(lambda _: _loading.pop(key, None))
+    # shield: o cancelamento de uma requisição não interrompe a consulta compartilhada
+    return await asyncio.shield(loading)
+
+
+async def _refresh_loop(project_name: str, tablename: str) -> None:
+    print(f"🔄 Atualização da receita realtime iniciada: {tablename}")
+    try:
+        while time.time() - _last_access.get(tablename, 0) < REALTIME_REVENUE_IDLE_SECONDS:
+            try:
+                await _single_flight(project_name, tablename, _today())
+            except Exception as e:
+                print(f"❌ Erro ao atualizar receita realtime de {tablename}: {e}")
+            await asyncio.sleep(REALTIME_REVENUE_REFRESH_SECONDS)
+    finally:
+        _refreshers.pop(tablename, None)
+        print(f"🔄 Atualização da receita realtime encerrada: {tablename}")
+
+
+async def get_realtime_revenue(project_name: str, tablename: str) -> Dict[str, Any]:
+    """Receita do dia do cliente: {'total_revenue', 'cached_at', 'source'}
+
+    O acesso à tabela deve ser validado pelo endpoint antes da chamada: o valor é
+    compartilhado entre todos os usuários do cliente.
+    """
+    _last_access[tablename] = time.time()
+    if REALTIME_REVENUE_REFRESH_SECONDS > 0 and tablename not in _refreshers:
+        _refreshers[tablename] = asyncio.create_task(_refresh_loop(project_name, tablename))
+
+    day = _today()
+    revenue = realtime_revenue_cache.get(table_name=tablename, day=day)
+    if revenue is not None:
+        return {**revenue, 'source': 'cache'}
+    return {**await _single_flight(project_name, tablename, day), 'source': 'database'}
+
+
+def get_realtime_revenue_stats() -> Dict[str, Any]:
+    return {
+        'ttl_seconds': REALTIME_REVENUE_TTL_SECONDS,
+        'refresh_seconds': REALTIME_REVENUE_REFRESH_SECONDS,
+        'active_refreshers': sorted(_refreshers),
+        'in_flight': len(_loading),
+    }
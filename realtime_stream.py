@@ -0,0 +1,119 @@
+"""
+Canal de push do dashboard realtime (Server-Sent Events)
+
+Em vez de cada aba do navegador fazer polling em `/metrics/realtime` e
+`/metrics/realtime-revenue`, o dashboard abre um stream SSE. Um único poller em
+background por cliente consulta o BigQuery a cada `REALTIME_POLL_INTERVAL_SECONDS`
+e distribui o snapshot a todos os assinantes daquele cliente. A carga no BigQuery
+passa a depender do número de clientes com o dashboard aberto, não do número de abas.
+
+O poller começa com o primeiro assinante e para quando o último se desconecta.
+Assinantes lentos não acumulam fila: recebem sempre o snapshot mais recente.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+REALTIME_POLL_INTERVAL_SECONDS = float(os.getenv('REALTIME_POLL_INTERVAL_SECONDS', '30'))
+# Comentário SSE periódico para manter a conexão aberta em proxies (nginx: proxy_read_timeout 60s)
+REALTIME_HEARTBEAT_SECONDS = 15
+
+
+class TenantPoller:
+    """Poller em background de um cliente, com fan-out para os assinantes"""
+
+    def __init__(self, tablename: str, fetch: Callable[[], Awaitable[Any]], interval: float):
+        self.tablename = tablename
+        self.fetch = fetch
+        self.interval = interval
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.latest: Optional[Any] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.subscribers.add(queue)
+        if self.latest is not None:
+            # Novo assinante recebe o último snapshot sem esperar o próximo ciclo
+            queue.put_nowait(self.latest)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def _publish(self, snapshot: Any) -> None:
+        for queue in self.subscribers:
+            if queue.full():
+                # Descarta o snapshot não lido: só o mais recente interessa
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    async def _run(self) -> None:
+        print(f"📡 Poller realtime iniciado: {self.tablename}")
+        try:
+            while self.subscribers:
+                try:
+                    self.latest = await self.fetch()
+                    self._publish(self.latest)
+                except Exception as e:
+                    print(f"❌ Erro no poller realtime de {self.tablename}: {e}")
+                    self._publish({'error': str(e)})
+                await asyncio.sleep(self.interval)
+        finally:
+            print(f"📡 Poller realtime encerrado: {self.tablename}")
+
+
+_pollers: Dict[str, TenantPoller] = {}
+
+
+def subscribe(tablename: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Queue:
+    """Inscreve no poller do cliente (criado se ainda não existir)"""
+    poller = _pollers.get(tablename)
+    if poller is None:
+        poller = _pollers[tablename] = TenantPoller(tablename, fetch, REALTIME_POLL_INTERVAL_SECONDS)
+    return poller.subscribe()
+
+
+def unsubscribe(tablename: str, queue: asyncio.Queue) -> None:
+    poller = _pollers.get(tablename)
+    if poller is None:
+        return
+    poller.unsubscribe(queue)
+    if not poller.subscribers:
+        del _pollers[tablename]
+
+
+def get_stream_stats() -> Dict[str, Any]:
+    """Pollers ativos e número de assinantes por cliente"""
+    return {
+        'poll_interval_seconds': REALTIME_POLL_INTERVAL_SECONDS,
+        'active_pollers': len(_pollers),
+        'subscribers': {tablename: len(poller.subscribers) for tablename, poller in _pollers.items()},
+    }
+
+
+async def event_stream(tablename: str, fetch: Callable[[], Awaitable[Any]], render: Callable[[Any], str]):
+    """Gerador SSE de um assinante: um evento por snapshot e heartbeats entre eles"""
+    queue = subscribe(tablename, fetch)
+    try:
+        # Reconexão do EventSource após 5s se a conexão cair
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                snapshot = await asyncio.wait_for(queue.get(), timeout=REALTIME_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if isinstance(snapshot, dict) and 'error' in snapshot:
+                yield f"event: error\ndata: {json.dumps({'detail': snapshot['error']}, ensure_ascii=False)}\n\n"
+                continue
+            yield f"event: realtime\ndata: {render(snapshot)}\n\n"
+    finally:
+        unsubscribe(tablename, queue)
@@ -0,0 +1,255 @@
+"""
+Janela em memória das compras realtime, atualizada por watermark
+
+`{tablename}_purchases_items_sessions_realtime` era lido inteiro a cada cache miss.
+Agora cada cliente tem uma `RealtimeWindow` com as linhas recentes. Cada atualização
+busca só as linhas com `event_timestamp` a partir do último visto (a watermark),
+descarta as que saíram da janela (`REALTIME_WINDOW_HOURS`) e atualiza os contadores
+do sumário de forma incremental. A cada `REALTIME_FULL_REFRESH_MINUTES` a janela é
+recarregada por completo para refletir correções e remoções na tabela.
+
+A janela também mantém um buffer circular por minuto (receita, pedidos e itens),
+servido por `/metrics/realtime/series` para os gráficos de tendência.
+"""
+
+import asyncio
+import math
+import os
+import time
+from array import array
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from google.cloud import bigquery
+
+REALTIME_WINDOW_HOURS = float(os.getenv('REALTIME_WINDOW_HOURS', '24'))
+REALTIME_FULL_REFRESH_MINUTES = float(os.getenv('REALTIME_FULL_REFRESH_MINUTES', '60'))
+# Atualizações mais próximas que isso reaproveitam a última (requisições simultâneas)
+REALTIME_MIN_REFRESH_SECONDS = 5
+
+
+def watermark_job_config(watermark: Any) -> bigquery.QueryJobConfig:
+    """Parâmetro @watermark com o tipo do event_timestamp (TIMESTAMP ou INT64 em micros)"""
+    if isinstance(watermark, datetime):
+        parameter = bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", watermark)
+    elif isinstance(watermark, int):
+        parameter = bigquery.ScalarQueryParameter("watermark", "INT64", watermark)
+    else:
+        parameter = bigquery.ScalarQueryParameter("watermark", "STRING", str(watermark))
+    return bigquery.QueryJobConfig(query_parameters=[parameter])
+
+
+def _window_cutoff(timestamp: Any) -> Any:
+    """Limite inferior da janela no mesmo tipo do event_timestamp (None = sem descarte)"""
+    if isinstance(timestamp, datetime):
+        return datetime.now(timestamp.tzinfo) - timedelta(hours=REALTIME_WINDOW_HOURS)
+    if isinstance(timestamp, int):
+        return int((time.time() - REALTIME_WINDOW_HOURS * 3600) * 1_000_000)
+    return None
+
+
+def _minute_of(timestamp: Any) -> Optional[int]:
+    """Minuto (desde a época) de um event_timestamp TIMESTAMP ou INT64 em micros"""
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp() // 60)
+    if isinstance(timestamp, int):
+        return timestamp // 60_000_000
+    return None
+
+
+class MinuteRing:
+    """Buffer circular com receita, pedidos e itens por minuto
+
+    Cada posição guarda o minuto a que pertence; posições de minutos que já saíram
+    do buffer são sobrescritas ao receber um minuto novo e lidas como zero.
+    """
+
+    __slots__ = ('size', 'minutes', 'revenue', 'orders', 'items')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.minutes = array('q', [-1]) * size
+        self.revenue = array('d', [0.0]) * size
+        self.orders = array('q', [0]) * size
+        self.items = array('q', [0]) * size
+
+    def add(self, minute: int, revenue: float, items: int, orders: int) -> None:
+        slot = minute % self.size
+        if self.minutes[slot] != minute:
+            if self.minutes[slot] > minute:
+                return  # Minuto mais antigo que o buffer
+            self.minutes[slot] = minute
+            self.revenue[slot] = 0.0
+            self.orders[slot] = 0
+            self.items[slot] = 0
+        self.revenue[slot] += revenue
+        self.orders[slot] += orders
+        self.items[slot] += items
+
+    def series(self, last_minute: int, count: int) -> List[Tuple[int, float, int, int]]:
+        """(minuto, receita, pedidos, itens) dos `count` minutos até `last_minute`, em ordem"""
+        points = []
+        for minute in range(last_minute - min(count, self.size) + 1, last_minute + 1):
+            slot = minute % self.size
+            if self.minutes[slot] == minute:
+                points.append((minute, self.revenue[slot], self.orders[slot], self.items[slot]))
+            else:
+                points.append((minute, 0.0, 0, 0))
+        return points
+
+
+def _row_key(row: Any) -> Tuple[Any, ...]:
+    return (row.event_timestamp, row.session_id, row.transaction_id, row.item_name, row.quantity, row.item_revenue)
+
+
+class RealtimeWindow:
+    """Linhas realtime recentes de um cliente, com sumário mantido incrementalmente"""
+
+    def __init__(
+        self,
+        tablename: str,
+        fetch: Callable[[Optional[Any]], Awaitable[List[Any]]],
+        convert: Callable[[List[Any]], List[Any]],
+    ):
+        # fetch(watermark) retorna as linhas do BigQuery (todas se watermark for None)
+        self.tablename = tablename
+        self.fetch = fetch
+        self.convert = convert
+        self.lock = asyncio.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # (event_timestamp bruto, linha compacta) em ordem crescente de event_timestamp
+        self.rows: Deque[Tuple[Any, Any]] = deque()
+        self.watermark: Optional[Any] = None
+        self.boundary_keys = set()  # Linhas já vistas com event_timestamp == watermark
+        self.total_revenue = 0.0
+        self.total_quantity = 0
+        self.transactions: Counter = Counter()
+        self.sessions: Counter = Counter()
+        self.minutes = MinuteRing(math.ceil(REALTIME_WINDOW_HOURS * 60))
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    def _add(self, timestamp: Any, row: Any) -> None:
+        self.rows.append((timestamp, row))
+        self.total_revenue += row.item_revenue
+        self.total_quantity += row.quantity
+        # Pedido conta no minuto do primeiro item visto da transação
+        new_order = bool(row.transaction_id) and row.transaction_id not in self.transactions
+        minute = _minute_of(timestamp)
+        if minute is not None:
+            self.minutes.add(minute, row.item_revenue, 1, 1 if new_order else 0)
+        if row.transaction_id:
+            self.transactions[row.transaction_id] += 1
+        if row.session_id:
+            self.sessions[row.session_id] += 1
+
+    def _evict(self) -> int:
+        if not self.rows:
+            return 0
+        cutoff = _window_cutoff(self.rows[-1][0])
+        evicted = 0
+        while self.rows and cutoff is not None and self.rows[0][0] < cutoff:
+            _, row = self.rows.popleft()
+            self.total_revenue -= row.item_revenue
+            self.total_quantity -= row.quantity
+            if row.transaction_id:
+                self.transactions[row.transaction_id] -= 1
+                if not self.transactions[row.transaction_id]:
+                    del self.transactions[row.transaction_id]
+            if row.session_id:
+                self.sessions[row.session_id] -= 1
+                if not self.sessions[row.session_id]:
+                    del self.sessions[row.session_id]
+            evicted += 1
+        return evicted
+
+    async def refresh(self) -> None:
+        """Busca as linhas novas desde a watermark (ou recarrega tudo, periodicamente)"""
+        async with self.lock:
+            now = time.time()
+            if now - self.refreshed_at < REALTIME_MIN_REFRESH_SECONDS:
+                return
+
+            full_refresh = self.watermark is None or now - self.loaded_at >= REALTIME_FULL_REFRESH_MINUTES * 60
+            rows = await self.fetch(None if full_refresh else self.watermark)
+            if full_refresh:
+                self._reset()
+                self.loaded_at = now
+
+            # Linhas chegam em ordem decrescente; a janela guarda em ordem crescente
+            raw_timestamps = [row.event_timestamp for row in reversed(rows)]
+            added = 0
+            for timestamp, row in zip(raw_timestamps, self.convert(list(reversed(rows)))):
+                if timestamp is None:
+                    continue
+                if timestamp == self.watermark and _row_key(row) in self.boundary_keys:
+                    continue
+                if self.watermark is not None and timestamp < self.watermark:
+                    continue
+                if timestamp != self.watermark:
+                    self.watermark = timestamp
+                    self.boundary_keys = set()
+                self.boundary_keys.add(_row_key(row))
+                self._add(timestamp, row)
+                added += 1
+
+            evicted = self._evict()
+            self.refreshed_at = time.time()
+            print(f"⏱️ Janela realtime {self.tablename}: {'carga completa' if full_refresh else 'delta'} com {added} linhas novas, {evicted} descartadas, {len(self.rows)} na janela")
+
+    def data(self, limit: Optional[int] = None) -> List[Any]:
+        """Linhas da janela, mais recentes primeiro"""
+        count = min(limit, len(self.rows)) if limit else len(self.rows)
+        rows = self.rows
+        return [rows[-1 - index][1] for index in range(count)]
+
+    def summary(self) -> Dict[str, Any]:
+        """Sumário da janela inteira, a partir dos contadores incrementais"""
+        total_items = len(self.rows)
+        return {
+            "total_items": total_items,
+            "total_revenue": self.total_revenue if total_items else 0,
+            "total_quantity": self.total_quantity,
+            "unique_transactions": len(self.transactions),
+            "unique_sessions": len(self.sessions),
+            "avg_item_value": self.total_revenue / total_items if total_items > 0 else 0,
+            "avg_quantity_per_item": self.total_quantity / total_items if total_items > 0 else 0,
+        }
+
+    def minute_series(self, hours: float) -> List[Dict[str, Any]]:
+        """Receita, pedidos e itens por minuto das últimas `hours` horas (mais antigos primeiro)"""
+        sample = self.rows[-1][0] if self.rows else None
+        if isinstance(sample, int):
+            now = datetime.now(timezone.utc)
+        else:
+            now = datetime.now(sample.tzinfo if isinstance(sample, datetime) else None)
+        last_minute = int(now.timestamp() // 60)
+        tzinfo = timezone.utc if isinstance(sample, int) else now.tzinfo
+
+        return [
+            {
+                'minute': datetime.fromtimestamp(minute * 60, tzinfo).isoformat(),
+                'revenue': revenue,
+                'orders': orders,
+                'items': items,
+            }
+            for minute, revenue, orders, items in self.minutes.series(last_minute, math.ceil(hours * 60))
+        ]
+
+
+_windows: Dict[str, RealtimeWindow] = {}
+
+
+def get_realtime_window(
+    tablename: str,
+    fetch: Callable[[Optional[Any]], Awaitable[List[Any]]],
+    convert: Callable[[List[Any]], List[Any]],
+) -> RealtimeWindow:
+    """Janela do cliente (criada na primeira chamada)"""
+    window = _windows.get(tablename)
+    if window is None:
+        window = _windows[tablename] = RealtimeWindow(tablename, fetch, convert)
+    return window
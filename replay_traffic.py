@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Replay de tráfego real dos endpoints /metrics/* contra o BigQuery falso
+
+Lê capturas de requisições e as reexecuta contra a aplicação, reportando vazão,
+percentis de latência por endpoint, taxa de acerto dos caches, profundidade da
+fila do executor do BigQuery e atraso do event loop.
+
+Formatos de captura aceitos:
+
+- JSONL gravado pela API com `REQUEST_CAPTURE_FILE=requests_capture.jsonl`
+  (uma linha por requisição: path, request_data, user_email, timestamp)
+- `last_requests.json` (último request de cada endpoint por cliente)
+
+Modos:
+
+    # Em processo (padrão): sobe a app com o FakeBigQueryClient (DuckDB)
+    python replay_traffic.py requests_capture.jsonl --concurrency 20 --latency-ms 800
+
+    # Respeitando os intervalos originais, 10x mais rápido
+    python replay_traffic.py requests_capture.jsonl --speed 10
+
+    # Contra um servidor já rodando (ex.: uvicorn --workers 4 com BIGQUERY_BACKEND=duckdb)
+    python replay_traffic.py requests_capture.jsonl --url http://localhost:8000
+
+As datas das capturas são deslocadas para que o período mais recente termine hoje
+(o banco falso só tem os últimos FAKE_BIGQUERY_DAYS dias); use --no-shift-dates
+para manter as datas originais.
+
+Requer os pacotes `httpx` e `duckdb`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ADMIN_EMAIL = 'admin@mymetric.com.br'
+DATE_FIELDS = ('start_date', 'end_date')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_capture(paths: List[str]) -> List[Dict[str, Any]]:
+    """Carrega as requisições capturadas, ordenadas por timestamp"""
+    entries = []
+    skipped = 0
+
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                raw_entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    # Formato do last_requests.json: {"endpoint:cliente": {...}}
+                    raw_entries = [
+                        {**value, 'path': f"/metrics/{key.split(':', 1)[0]}"}
+                        for key, value in data.items()
+                    ]
+                else:
+                    raw_entries = data
+
+        for raw in raw_entries:
+            path_value = raw.get('path') or (f"/metrics/{raw['endpoint']}" if raw.get('endpoint') else None)
+            if not path_value or not isinstance(raw.get('request_data'), dict):
+                skipped += 1
+                continue
+            entries.append({
+                'path': path_value,
+                'request_data': raw['request_data'],
+                'user_email': raw.get('user_email'),
+                'timestamp': raw.get('timestamp'),
+            })
+
+    if skipped:
+        print(f"⚠️ {skipped} linhas ignoradas (sem path/request_data)")
+
+    entries.sort(key=lambda entry: entry['timestamp'] or '')
+    return entries
+
+
+def shift_dates(entries: List[Dict[str, Any]]) -> int:
+    """Desloca start_date/end_date para que a data mais recente capturada seja hoje"""
+    end_dates = []
+    for entry in entries:
+        try:
+            end_dates.append(date.fromisoformat(entry['request_data']['end_date']))
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    if not end_dates:
+        return 0
+
+    offset = date.today() - max(end_dates)
+    for entry in entries:
+        for field in DATE_FIELDS:
+            value = entry['request_data'].get(field)
+            try:
+                entry['request_data'][field] = (date.fromisoformat(value) + offset).isoformat()
+            except (TypeError, ValueError):
+                continue
+
+    return offset.days
+
+
+def _percentile(sorted_values: List[float], percentile: int) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(percentile / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class ReplayStats:
+    """Acumula latências, status e amostras do executor durante o replay"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: List[str] = []
+        self.queue_depth: List[int] = []
+        self.executor_threads: List[int] = []
+        self.loop_lag: List[float] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def record(self, path: str, status_code: int, seconds: float) -> None:
+        self.latencies[path].append(seconds)
+        self.statuses[path][status_code] += 1
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        endpoints = {}
+        for path, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            endpoints[path] = {
+                'requests': len(values),
+                'statuses': {str(code): count for code, count in sorted(self.statuses[path].items())},
+                'mean_ms': round(statistics.mean(values) * 1000, 2),
+                **{f'p{p}_ms': round(_percentile(ordered, p) * 1000, 2) for p in PERCENTILES},
+                'max_ms': round(ordered[-1] * 1000, 2),
+            }
+
+        all_values = sorted(value for values in self.latencies.values() for value in values)
+        total = len(all_values)
+        return {
+            'total_requests': total,
+            'wall_seconds': round(wall_seconds, 3),
+            'throughput_rps': round(total / wall_seconds, 2) if wall_seconds else 0.0,
+            'errors': sum(
+                count for statuses in self.statuses.values() for code, count in statuses.items() if code >= 400 or code == 0
+            ),
+            'max_in_flight': self.max_in_flight,
+            'latency': {f'p{p}_ms': round(_percentile(all_values, p) * 1000, 2) for p in PERCENTILES},
+            'endpoints': endpoints,
+            'executor': {
+                'max_queue_depth': max(self.queue_depth, default=0),
+                'mean_queue_depth': round(statistics.mean(self.queue_depth), 2) if self.queue_depth else 0.0,
+                'max_threads': max(self.executor_threads, default=0),
+            },
+            'event_loop_lag': {
+                'max_ms': round(max(self.loop_lag, default=0.0) * 1000, 2),
+                'p95_ms': round(_percentile(sorted(self.loop_lag), 95) * 1000, 2),
+            },
+        }
+
+
+class InProcessTarget:
+    """Executa a app FastAPI no próprio processo, com o FakeBigQueryClient"""
+
+    def __init__(self, entries: List[Dict[str, Any]], args):
+        # Importações tardias: a app precisa do cliente falso antes de atender requisições
+        from bigquery_fake import FakeBigQueryClient, tenants_with
+        from utils import set_bigquery_client, bigquery_executor, create_access_token
+        import cache_manager
+        import main
+
+        tenants = {entry['request_data'].get('table_name') for entry in entries}
+        self.client = FakeBigQueryClient(
+            scale=args.scale,
+            tenants=tenants_with(tenants),
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+        )
+        set_bigquery_client(self.client)
+
+        # Usuários das capturas passam a existir no banco falso (chaves de cache por email)
+        for email in {entry['user_email'] for entry in entries if entry['user_email']}:
+            if email != ADMIN_EMAIL:
+                self.client.add_user(email, tablename='all')
+
+        # Não sobrescrever o last_requests.json do projeto durante o replay
+        cache_manager.last_request_manager.storage_file = os.path.join(tempfile.gettempdir(), 'replay_last_requests.json')
+
+        self.executor = bigquery_executor
+        self.caches = {
+            name: value for name, value in vars(cache_manager).items()
+            if isinstance(value, cache_manager.CacheManager)
+        }
+        self.create_access_token = create_access_token
+        self.http = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url='http://replay', timeout=None
+        )
+
+    def token_for(self, email: Optional[str]) -> str:
+        return self.create_access_token({'sub': email or ADMIN_EMAIL}, timedelta(hours=12))
+
+    def sample_executor(self, stats: ReplayStats) -> None:
+        stats.queue_depth.append(self.executor._work_queue.qsize())
+        stats.executor_threads.append(len(self.executor._threads))
+
+    async def cache_snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {'hits': cache.hits, 'misses': cache.misses, 'entries': len(cache.cache)}
+            for name, cache in self.caches.items()
+        }
+
+    async def close(self) -> None:
+        await self.http.aclose()
+
+
+class RemoteTarget:
+    """Envia as requisições para um servidor já rodando"""
+
+    def __init__(self, entries: List[Dict[str, Any]], args):
+        from utils import create_access_token
+
+        self.create_access_token = create_access_token
+        self.http = httpx.AsyncClient(base_url=args.url, timeout=httpx.Timeout(120.0))
+        print("⚠️ Modo remoto: requisições enviadas como admin (usuários das capturas não existem no servidor)")
+        print("⚠️ Modo remoto: fila do executor indisponível; caches refletem apenas o worker que responder /metrics/cache/stats")
+
+    def token_for(self, email: Optional[str]) -> str:
+        return self.create_access_token({'sub': ADMIN_EMAIL}, timedelta(hours=12))
+
+    def sample_executor(self, stats: ReplayStats) -> None:
+        return None
+
+    async def cache_snapshot(self) -> Dict[str, Dict[str, int]]:
+        try:
+            response = await self.http.get(
+                '/metrics/cache/stats', headers={'Authorization': f'Bearer {self.token_for(None)}'}
+            )
+            response.raise_for_status()
+            return {
+                name: {'hits': stats.get('hits', 0), 'misses': stats.get('misses', 0), 'entries': stats.get('total_entries', 0)}
+                for name, stats in response.json()['stats'].items()
+            }
+        except Exception as e:
+            print(f"⚠️ Erro ao obter estatísticas do cache: {e}")
+            return {}
+
+    async def close(self) -> None:
+        await self.http.aclose()
+
+
+async def send(target, entry: Dict[str, Any], stats: ReplayStats) -> None:
+    headers = {'Authorization': f"Bearer {target.token_for(entry['user_email'])}"}
+    stats.in_flight += 1
+    stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+    started = time.perf_counter()
+    try:
+        response = await target.http.post(entry['path'], json=entry['request_data'], headers=headers)
+        status_code = response.status_code
+        if status_code >= 400 and len(stats.errors) < 10:
+            stats.errors.append(f"{entry['path']} {status_code}: {response.text[:200]}")
+    except Exception as e:
+        status_code = 0
+        if len(stats.errors) < 10:
+            stats.errors.append(f"{entry['path']}: {e}")
+    finally:
+        stats.in_flight -= 1
+    stats.record(entry['path'], status_code, time.perf_counter() - started)
+
+
+async def monitor(target, stats: ReplayStats, interval: float, stop: asyncio.Event) -> None:
+    """Amostra a fila do executor e o atraso do event loop"""
+    while not stop.is_set():
+        target.sample_executor(stats)
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(time.perf_counter() - started - interval, 0.0))
+
+
+async def run_concurrency(target, entries: List[Dict[str, Any]], concurrency: int, stats: ReplayStats) -> None:
+    """Closed loop: `concurrency` clientes consumindo a fila de requisições"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for entry in entries:
+        queue.put_nowait(entry)
+
+    async def worker():
+        while not queue.empty():
+            await send(target, queue.get_nowait(), stats)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_speed(target, entries: List[Dict[str, Any]], speed: float, stats: ReplayStats) -> None:
+    """Open loop: respeita os intervalos originais entre requisições, acelerados por `speed`"""
+    first = datetime.fromisoformat(entries[0]['timestamp'])
+    started = time.perf_counter()
+    tasks = []
+
+    for entry in entries:
+        offset = (datetime.fromisoformat(entry['timestamp']) - first).total_seconds() / speed
+        delay = offset - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(target, entry, stats)))
+
+    await asyncio.gather(*tasks)
+
+
+def cache_report(before: Dict[str, Dict[str, int]], after: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    report = {}
+    for name, values in after.items():
+        hits = values['hits'] - before.get(name, {}).get('hits', 0)
+        misses = values['misses'] - before.get(name, {}).get('misses', 0)
+        if hits or misses:
+            report[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4),
+                'entries': values['entries'],
+            }
+    return report
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\n📊 {result['total_requests']} requisições em {result['wall_seconds']:.2f}s "
+          f"({result['throughput_rps']:.2f} req/s), {result['errors']} erros, "
+          f"até {result['max_in_flight']} simultâneas")
+    latency = result['latency']
+    print(f"⏱️  Latência geral: p50 {latency['p50_ms']:.0f}ms | p90 {latency['p90_ms']:.0f}ms | "
+          f"p95 {latency['p95_ms']:.0f}ms | p99 {latency['p99_ms']:.0f}ms")
+
+    print("\n📈 Por endpoint:")
+    for path, values in result['endpoints'].items():
+        print(f"   {path:<36} {values['requests']:>5} req | p50 {values['p50_ms']:>8.0f}ms | "
+              f"p95 {values['p95_ms']:>8.0f}ms | p99 {values['p99_ms']:>8.0f}ms | status {values['statuses']}")
+
+    if result['cache']:
+        print("\n📦 Caches:")
+        for name, values in result['cache'].items():
+            print(f"   {name:<32} hit ratio {values['hit_ratio'] * 100:5.1f}% "
+                  f"({values['hits']} hits / {values['misses']} misses, {values['entries']} entradas)")
+
+    executor = result['executor']
+    lag = result['event_loop_lag']
+    print(f"\n🧵 Executor BigQuery: fila máx {executor['max_queue_depth']} | fila média {executor['mean_queue_depth']} | "
+          f"threads {executor['max_threads']}")
+    print(f"🐢 Atraso do event loop: p95 {lag['p95_ms']:.0f}ms | máx {lag['max_ms']:.0f}ms")
+
+
+async def replay(args) -> Dict[str, Any]:
+    entries = load_capture(args.capture)
+    if args.endpoints:
+        entries = [entry for entry in entries if entry['path'].rsplit('/', 1)[-1] in args.endpoints]
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print("❌ Nenhuma requisição para reexecutar")
+        sys.exit(1)
+
+    if not args.no_shift_dates:
+        offset_days = shift_dates(entries)
+        print(f"📅 Datas deslocadas em {offset_days} dias")
+
+    if args.speed and not all(entry['timestamp'] for entry in entries):
+        print("❌ --speed exige timestamps em todas as requisições capturadas")
+        sys.exit(1)
+
+    target = RemoteTarget(entries, args) if args.url else InProcessTarget(entries, args)
+    stats = ReplayStats()
+    mode = f"velocidade {args.speed}x" if args.speed else f"concorrência {args.concurrency}"
+    print(f"🚀 Replay de {len(entries)} requisições x {args.loops} ({mode})")
+
+    cache_before = await target.cache_snapshot()
+    stop = asyncio.Event()
+    monitor_task = asyncio.create_task(monitor(target, stats, args.sample_interval, stop))
+
+    started = time.perf_counter()
+    try:
+        for _ in range(args.loops):
+            if args.speed:
+                await run_speed(target, entries, args.speed, stats)
+            else:
+                await run_concurrency(target, entries, args.concurrency, stats)
+    finally:
+        wall_seconds = time.perf_counter() - started
+        stop.set()
+        await monitor_task
+
+    cache_after = await target.cache_snapshot()
+    await target.close()
+
+    result = stats.summary(wall_seconds)
+    result['cache'] = cache_report(cache_before, cache_after)
+    result['metadata'] = {
+        'timestamp': datetime.now().isoformat(),
+        'capture': args.capture,
+        'mode': 'speed' if args.speed else 'concurrency',
+        'speed': args.speed,
+        'concurrency': args.concurrency,
+        'loops': args.loops,
+        'target': args.url or 'in-process',
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'scale': args.scale,
+    }
+
+    print_report(result)
+    if stats.errors:
+        print("\n❌ Primeiros erros:")
+        for error in stats.errors:
+            print(f"   • {error}")
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de tráfego capturado dos endpoints /metrics/*")
+    parser.add_argument('capture', nargs='+', help="Arquivos de captura (.jsonl ou last_requests.json)")
+    parser.add_argument('--concurrency', type=int, default=10, help="Clientes simultâneos (closed loop)")
+    parser.add_argument('--speed', type=float, help="Reproduz os intervalos originais acelerados por este fator")
+    parser.add_argument('--loops', type=int, default=1, help="Quantas vezes reexecutar a captura")
+    parser.add_argument('--limit', type=int, help="Número máximo de requisições por loop")
+    parser.add_argument('--endpoints', nargs='+', help="Filtrar endpoints (ex.: basic-data orders)")
+    parser.add_argument('--url', help="URL de um servidor já rodando (padrão: app em processo)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latência injetada no BigQuery falso")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Variação aleatória da latência")
+    parser.add_argument('--scale', type=float, default=1.0, help="Escala dos dados do banco falso")
+    parser.add_argument('--sample-interval', type=float, default=0.05, help="Intervalo de amostragem do executor (s)")
+    parser.add_argument('--no-shift-dates', action='store_true', help="Não deslocar as datas para terminar hoje")
+    parser.add_argument('--output', help="Salvar o relatório em JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(replay(args))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Relatório salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Catálogo de clientes: projeto, tabelas e colunas de cada cliente
+
+Substitui as sondagens feitas a cada requisição (mapeamento fixo de projeto,
+`INFORMATION_SCHEMA.COLUMNS` no product-trend, `SELECT COUNT(*)` nos experimentos).
+O catálogo lê uma vez o `INFORMATION_SCHEMA.COLUMNS` de cada dataset dos projetos em
+`CATALOG_PROJECTS` e os clientes da tabela de usuários; as tabelas `{cliente}_*`
+ficam associadas ao cliente, e o projeto do cliente é aquele onde estão suas tabelas.
+
+É carregado na inicialização (ou na primeira consulta) e recarregado em background a
+cada `CATALOG_REFRESH_MINUTES`. Um cliente desconhecido provoca uma recarga antecipada,
+no máximo uma vez por minuto. Uma tabela fora do catálogo (carga parcial, ou tabela
+criada depois da última recarga) não é tratada como inexistente: `table` a procura
+direto no `INFORMATION_SCHEMA`, no máximo uma vez por minuto por tabela.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from google.cloud import bigquery
+
+from utils import execute_bigquery_query_async
+
+CATALOG_PROJECTS = [
+    project.strip()
+    for project in os.getenv('CATALOG_PROJECTS', 'mymetric-hub-shopify,bq-mktbr').split(',')
+    if project.strip()
+]
+CATALOG_DATASETS = ('dbt_join', 'dbt_aggregated', 'dbt_granular')
+CATALOG_REFRESH_MINUTES = float(os.getenv('CATALOG_REFRESH_MINUTES', '60'))
+# Intervalo mínimo entre recargas provocadas por clientes desconhecidos
+CATALOG_MISS_REFRESH_SECONDS = 60
+
+DEFAULT_PROJECT = 'mymetric-hub-shopify'
+# Projeto dos clientes enquanto o catálogo não carregou (ou se ele não encontrar o cliente)
+FALLBACK_PROJECTS = {'havaianas': 'bq-mktbr'}
+
+
+class TenantInfo:
+    """Projeto e tabelas de um cliente
+
+    `tables`: "dataset.tabela" -> (projeto onde a tabela está, colunas).
+    """
+
+    __slots__ = ('name', 'project', 'tables')
+
+    def __init__(self, name: str, project: str, tables: Dict[str, Tuple[str, FrozenSet[str]]]):
+        self.name = name
+        self.project = project
+        self.tables = tables
+
+    def has_table(self, dataset: str, table: str) -> bool:
+        return f"{dataset}.{table}" in self.tables
+
+    def table_project(self, dataset: str, table: str) -> Optional[str]:
+        entry = self.tables.get(f"{dataset}.{table}")
+        return entry[0] if entry else None
+
+    def columns(self, dataset: str, table: str) -> FrozenSet[str]:
+        entry = self.tables.get(f"{dataset}.{table}")
+        return entry[1] if entry else frozenset()
+
+    def dict(self) -> Dict[str, object]:
+        return {
+            'project': self.project,
+            'tables': {
+                table: {'project': project, 'columns': sorted(columns)}
+                for table, (project, columns) in sorted(self.tables.items())
+            },
+        }
+
+
+class TenantCatalog:
+    """Catálogo em memória, recarregado por inteiro a cada atualização"""
+
+    def __init__(self):
+        self.tenants: Dict[str, TenantInfo] = {}
+        self.loaded_at = 0.0
+        self.attempted_at = 0.0
+        self.loading: Optional[asyncio.Future] = None
+        self.task: Optional[asyncio.Task] = None
+        # (cliente, "dataset.tabela") -> (momento da sondagem, (projeto, colunas) ou None)
+        self.probed: Dict[Tuple[str, str], Tuple[float, Optional[Tuple[str, FrozenSet[str]]]]] = {}
+
+    async def _load_columns(self, project: str, dataset: str) -> Optional[List[Tuple[str, str]]]:
+        query = f"""
+        SELECT table_name, column_name
+        FROM `{project}.{dataset}.INFORMATION_SCHEMA.COLUMNS`
+        """
+        try:
+            rows = await execute_bigquery_query_async(query)
+        except Exception as e:
+            print(f"⚠️ Catálogo: não foi possível ler {project}.{dataset}: {e}")
+            return None
+        return [(row.table_name, row.column_name) for row in rows]
+
+    async def _load_tenant_names(self) -> Set[str]:
+        query = """
+        SELECT DISTINCT tablename
+        FROM `mymetric-hub-shopify.dbt_config.users`
+        WHERE tablename IS NOT NULL AND tablename != 'all'
+        """
+        try:
+            rows = await execute_bigquery_query_async(query)
+        except Exception as e:
+            print(f"⚠️ Catálogo: não foi possível ler os clientes da tabela de usuários: {e}")
+            return set()
+        return {row.tablename for row in rows}
+
+    async def _load(self) -> None:
+        started = time.perf_counter()
+        locations = [(project, dataset) for project in CATALOG_PROJECTS for dataset in CATALOG_DATASETS]
+        tenant_names, *columns = await asyncio.gather(
+            self._load_tenant_names(),
+            *(self._load_columns(project, dataset) for project, dataset in locations)
+        )
+
+        if all(rows is None for rows in columns):
+            # Sem acesso ao INFORMATION_SCHEMA: mantém o catálogo anterior
+            raise RuntimeError("nenhum dataset do catálogo pôde ser lido")
+
+        # (projeto, "dataset.tabela") -> colunas
+        tables: Dict[Tuple[str, str], Set[str]] = {}
+        for (project, dataset), rows in zip(locations, columns):
+            for table_name, column_name in rows or []:
+                tables.setdefault((project, f"{dataset}.{table_name}"), set()).add(column_name)
+
+        # Clientes sem usuário próprio (acessados por usuários "all") são reconhecidos pelo events_long
+        tenant_names |= {
+            table.split('.', 1)[1][:-len('_events_long')]
+            for _, table in tables
+            if table.startswith('dbt_join.') and table.endswith('_events_long')
+        }
+        # Prefixo mais longo primeiro, para que "loja_br_*" não caia em "loja"
+        prefixes = sorted(tenant_names, key=len, reverse=True)
+
+        # Cliente -> projeto -> {"dataset.tabela": colunas}
+        tenant_tables: Dict[str, Dict[str, Dict[str, FrozenSet[str]]]] = {}
+        for (project, table), table_columns in tables.items():
+            table_name = table.split('.', 1)[1]
+            for tenant in prefixes:
+                if table_name.startswith(f"{tenant}_"):
+                    tenant_tables.setdefault(tenant, {}).setdefault(project, {})[table] = frozenset(table_columns)
+                    break
+
+        tenants = {}
+        for tenant in tenant_names:
+            fallback = FALLBACK_PROJECTS.get(tenant, DEFAULT_PROJECT)
+            by_project = tenant_tables.get(tenant, {})
+            # Projeto com mais tabelas do cliente; em empate, o fallback/padrão
+            project = max(by_project, key=lambda candidate: (len(by_project[candidate]), candidate == fallback), default=fallback)
+            merged: Dict[str, Tuple[str, FrozenSet[str]]] = {}
+            # Tabelas do projeto do cliente têm precedência sobre as de outros projetos
+            for candidate in sorted(by_project, key=lambda candidate: candidate == project):
+                merged.update((table, (candidate, table_columns)) for table, table_columns in by_project[candidate].items())
+            tenants[tenant] = TenantInfo(tenant, project, merged)
+
+        self.tenants = tenants
+        self.probed = {}
+        self.loaded_at = time.time()
+        print(f"🗂️ Catálogo de clientes carregado: {len(tenants)} clientes, {len(tables)} tabelas ({time.perf_counter() - started:.2f}s)")
+
+    async def refresh(self) -> None:
+        """Recarrega o catálogo (recargas simultâneas compartilham a mesma leitura)"""
+        if self.loading is None:
+            self.attempted_at = time.time()
+            self.loading = asyncio.ensure_future(self._load())
+            self.loading.add_done_callback(lambda _: setattr(self, 'loading', None))
+        await asyncio.shield(self.loading)
+
+    async def get(self, tablename: str) -> Optional[TenantInfo]:
+        """Informações do cliente (carrega o catálogo na primeira chamada)
+
+        Retorna None se o cliente não existir ou se o catálogo não pôde ser carregado
+        (ver `loaded_at`).
+        """
+        tenant = self.tenants.get(tablename)
+        if tenant is None and time.time() - self.attempted_at >= CATALOG_MISS_REFRESH_SECONDS:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"❌ Erro ao carregar o catálogo de clientes: {e}")
+            tenant = self.tenants.get(tablename)
+        return tenant
+
+    async def _probe_table(self, project: str, dataset: str, table: str) -> FrozenSet[str]:
+        """Colunas da tabela lidas direto do INFORMATION_SCHEMA (vazio se não existir)"""
+        query = f"""
+        SELECT column_name
+        FROM `{project}.{dataset}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE table_name = @table_name
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("table_name", "STRING", table)]
+        )
+        try:
+            rows = await execute_bigquery_query_async(query, job_config)
+        except Exception as e:
+            print(f"⚠️ Catálogo: não foi possível sondar {project}.{dataset}.{table}: {e}")
+            return frozenset()
+        return frozenset(row.column_name for row in rows)
+
+    async def table(self, tablename: str, dataset: str, table: str) -> Optional[Tuple[str, FrozenSet[str]]]:
+        """(projeto, colunas) de uma tabela do cliente; None se ela não existir
+
+        Tabelas ausentes do catálogo são sondadas nos projetos do catálogo (o do cliente
+        primeiro). O resultado vale até a próxima recarga; uma ausência é sondada de novo
+        após `CATALOG_MISS_REFRESH_SECONDS`.
+        """
+        tenant = await self.get(tablename)
+        key = f"{dataset}.{table}"
+        if tenant is not None and key in tenant.tables:
+            return tenant.tables[key]
+
+        probed_at, found = self.probed.get((tablename, key), (0.0, None))
+        if found is not None or time.time() - probed_at < CATALOG_MISS_REFRESH_SECONDS:
+            return found
+
+        project = self.project_for(tablename)
+        found = None
+        for candidate in [project] + [other for other in CATALOG_PROJECTS if other != project]:
+            columns = await self._probe_table(candidate, dataset, table)
+            if columns:
+                found = (candidate, columns)
+                break
+        print(f"🔎 Catálogo: {dataset}.{table} fora do catálogo, {'encontrada em ' + found[0] if found else 'não encontrada'}")
+        self.probed[(tablename, key)] = (time.time(), found)
+        return found
+
+    def project_for(self, tablename: str) -> str:
+        """Projeto do cliente (sem esperar pelo catálogo)"""
+        tenant = self.tenants.get(tablename)
+        if tenant is not None:
+            return tenant.project
+        return FALLBACK_PROJECTS.get(tablename, DEFAULT_PROJECT)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"❌ Erro ao recarregar o catálogo de clientes: {e}")
+            await asyncio.sleep(CATALOG_REFRESH_MINUTES * 60)
+
+    def start(self) -> None:
+        """Inicia a carga e a recarga periódica em background"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'tenants': len(self.tenants),
+            'projects': sorted({tenant.project for tenant in self.tenants.values()}),
+            'loaded_at': self.loaded_at,
+            'refresh_minutes': CATALOG_REFRESH_MINUTES,
+        }
+
+
+tenant_catalog = TenantCatalog()
@@ -0,0 +1,35 @@
+"""
+Fixtures dos testes offline
+
+Os testes rodam contra o cliente BigQuery falso (DuckDB, ver `bigquery_fake.py`):
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+"""
+
+import pytest
+
+import cache_manager
+from utils import set_bigquery_client
+
+
+@pytest.fixture
+def fake_client():
+    """Banco sintético pequeno e novo a cada teste (os testes podem alterar as tabelas)"""
+    pytest.importorskip('duckdb')
+    from bigquery_fake import FakeBigQueryClient
+
+    client = FakeBigQueryClient(scale=0.05)
+    set_bigquery_client(client)
+    yield client
+    set_bigquery_client(None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path):
+    """Caches vazios e last_requests.json temporário em cada teste"""
+    cache_manager.last_request_manager.storage_file = str(tmp_path / 'last_requests.json')
+    for cache in vars(cache_manager).values():
+        if isinstance(cache, cache_manager.CacheManager):
+            cache.flush()
+    yield
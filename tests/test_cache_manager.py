@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from cache_manager import (
+    CACHE_FRESHNESS_HORIZON_DAYS, CACHE_HISTORICAL_TTL_HOURS, CACHE_LIVE_TTL_HOURS, TIMEZONE, CacheManager
+)
+
+
+def _day(days_ago):
+    return (datetime.now(TIMEZONE).date() - timedelta(days=days_ago)).isoformat()
+
+
+def test_ttl_follows_end_of_period():
+    cache = CacheManager(ttl_hours=6)
+    assert cache._ttl_for(start_date=_day(7), end_date=_day(0)) == min(6, CACHE_LIVE_TTL_HOURS) * 3600
+    assert cache._ttl_for(day=_day(0)) == min(6, CACHE_LIVE_TTL_HOURS) * 3600
+    assert cache._ttl_for(end_date=_day(1)) == 6 * 3600
+    assert cache._ttl_for(end_date=_day(CACHE_FRESHNESS_HORIZON_DAYS + 1)) == max(6, CACHE_HISTORICAL_TTL_HOURS) * 3600
+    # Sem data (ou data inválida): TTL padrão do cache
+    assert cache._ttl_for(table_name='constance') == 6 * 3600
+    assert cache._ttl_for(end_date='ontem') == 6 * 3600
+
+
+def test_ttl_hours_for_reports_ttl_of_stored_entry():
+    cache = CacheManager(ttl_hours=6)
+    params = {'table_name': 'constance', 'end_date': _day(CACHE_FRESHNESS_HORIZON_DAYS + 1)}
+    assert cache.ttl_hours_for(**params) == max(6, CACHE_HISTORICAL_TTL_HOURS)
+
+    cache.set({'data': []}, **params)
+    cache.cache[cache._generate_cache_key(**params)]['ttl_seconds'] = 1800
+    assert cache.ttl_hours_for(**params) == 0.5
+    assert cache.get(**params) == {'data': []}
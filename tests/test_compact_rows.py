@@ -0,0 +1,92 @@
+from array import array
+
+from compact_rows import EncodedRows, dictionary_encode, rows_to_dicts
+from metrics import (
+    CompactShippingCalcAnalyticsRow, SHIPPING_CALC_DICTIONARY_FIELDS, ShippingCalcAnalyticsRow, _shipping_calc_page
+)
+
+
+def _rows():
+    return [
+        CompactShippingCalcAnalyticsRow(event_date='2024-01-01', zipcode_region='SP', item_id='A', calculations=5, transactions=1, revenue=10.0),
+        CompactShippingCalcAnalyticsRow(event_date='2024-01-01', zipcode_region=None, item_id='B', calculations=None, transactions=2, revenue=None),
+        CompactShippingCalcAnalyticsRow(event_date='2024-01-02', zipcode_region='RJ', item_id='A', calculations=9, transactions=None, revenue=5.5),
+        CompactShippingCalcAnalyticsRow(event_date='2024-01-02', zipcode_region='SP', item_id='C', calculations=1, transactions=4, revenue=2.0),
+    ]
+
+
+def _encoded():
+    return EncodedRows(_rows(), CompactShippingCalcAnalyticsRow, SHIPPING_CALC_DICTIONARY_FIELDS)
+
+
+def test_where_intersects_filters_in_row_order():
+    encoded = _encoded()
+    assert list(encoded.where({})) == [0, 1, 2, 3]
+    assert list(encoded.where({'zipcode_region': 'SP'})) == [0, 3]
+    assert list(encoded.where({'zipcode_region': 'SP', 'item_id': 'C'})) == [3]
+    assert list(encoded.where({'zipcode_region': None})) == [1]
+    assert list(encoded.where({'zipcode_region': 'MG'})) == []
+
+
+def test_order_puts_nulls_last_in_both_directions():
+    encoded = _encoded()
+    assert list(encoded.order((('calculations', True),))) == [2, 0, 3, 1]
+    assert list(encoded.order((('calculations', False),))) == [3, 0, 2, 1]
+    # Coluna codificada por dicionário com None
+    assert list(encoded.order((('zipcode_region', False),))) == [2, 0, 3, 1]
+    assert list(encoded.order((('zipcode_region', True),))) == [0, 3, 2, 1]
+
+
+def test_order_multiple_keys_is_stable():
+    encoded = _encoded()
+    assert list(encoded.order((('event_date', True), ('revenue', False)))) == [3, 2, 0, 1]
+    assert list(encoded.order((('item_id', False),))) == [0, 2, 1, 3]
+    # Permutação guardada por chave
+    assert isinstance(encoded.orders[(('item_id', False),)], array)
+
+
+def test_group_by_skips_null_measures():
+    grouped = _encoded().group_by(('zipcode_region',), ('calculations', 'transactions', 'revenue'))
+    totals = {row.zipcode_region: (row.calculations, row.transactions, row.revenue) for row in grouped}
+    assert totals == {'SP': (6, 5, 12.0), None: (0, 2, 0), 'RJ': (9, 0, 5.5)}
+    assert [row.zipcode_region for row in grouped] == ['SP', None, 'RJ']
+
+
+def test_shipping_calc_page_orders_nullable_measures():
+    cached = {'all_data': _encoded()}
+    page, total = _shipping_calc_page(cached, None, 'calculations', None, 0, None)
+    assert total == 4
+    assert [row.item_id for row in page] == ['A', 'A', 'C', 'B']
+
+    page, total = _shipping_calc_page(cached, ('item_id',), 'revenue', 2, 0, 10)
+    assert total == 2
+    assert [(row.item_id, row.revenue) for row in page] == [('A', 15.5), ('C', 2.0)]
+
+
+def test_compact_row_class_matches_model():
+    row = CompactShippingCalcAnalyticsRow(item_id='A', revenue=1.5)
+    assert not hasattr(row, '__dict__')
+    assert row.model is ShippingCalcAnalyticsRow
+    assert row.dict() == ShippingCalcAnalyticsRow(item_id='A', revenue=1.5).model_dump()
+    assert list(row.dict()) == list(ShippingCalcAnalyticsRow.model_fields)
+    assert rows_to_dicts(_rows()[:2]) == [item.dict() for item in _rows()[:2]]
+
+
+def test_dictionary_encoding_round_trips_rows():
+    rows = _rows()
+    encoded = _encoded()
+
+    codes, dictionary = dictionary_encode([row.zipcode_region for row in rows])
+    assert (list(codes), dictionary) == ([0, 1, 2, 0], ['SP', None, 'RJ'])
+    assert list(encoded.columns['zipcode_region']) == [0, 1, 2, 0]
+    # Colunas numéricas sem nulos viram arrays tipados; com nulos ficam em lista
+    without_nulls = EncodedRows(rows[::3], CompactShippingCalcAnalyticsRow, SHIPPING_CALC_DICTIONARY_FIELDS)
+    assert (without_nulls.columns['calculations'].typecode, without_nulls.columns['revenue'].typecode) == ('q', 'd')
+    assert isinstance(encoded.columns['calculations'], list)
+
+    assert len(encoded) == 4
+    assert list(encoded) == rows
+    assert encoded[1:3] == rows[1:3]
+    assert encoded[-1] == rows[-1]
+    assert encoded.take([3, 0]) == [rows[3], rows[0]]
+    assert encoded.column('zipcode_region') == ['SP', None, 'RJ', 'SP']
@@ -0,0 +1,68 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+import utils
+
+MEASURES = ('Sessoes', 'Adicoes_ao_Carrinho', 'Pedidos', 'Receita', 'Pedidos_Pagos', 'Receita_Paga')
+
+
+def _post_all(fake_client, requests):
+    import main
+    from bigquery_fake import ADMIN_EMAIL
+
+    headers = {'Authorization': f"Bearer {utils.create_access_token({'sub': ADMIN_EMAIL})}"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://t', headers=headers) as api:
+            responses = []
+            for body in requests:
+                response = await api.post('/metrics/detailed-data', json=body)
+                assert response.status_code == 200, response.text
+                responses.append(response.json())
+            return responses
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def period():
+    end = date.today()
+    return {'start_date': (end - timedelta(days=14)).isoformat(), 'end_date': end.isoformat(), 'table_name': 'constance', 'limit': 100000}
+
+
+def test_sort_and_rollups_come_from_the_cached_grain(fake_client, period):
+    fine, = _post_all(fake_client, [period])
+    fake_client.reset_query_log()
+
+    by_revenue, by_origin, by_origin_page = _post_all(fake_client, [
+        {**period, 'order_by': 'Receita asc, Data desc'},
+        {**period, 'group_by': ['Origem', 'Midia'], 'order_by': 'Sessoes'},
+        {**period, 'group_by': ['Origem', 'Midia'], 'order_by': 'Sessoes', 'offset': 1, 'limit': 2},
+    ])
+
+    assert fake_client.query_count == 0
+
+    revenues = [row['Receita'] for row in by_revenue['data']]
+    assert revenues == sorted(revenues)
+    assert by_revenue['total_rows'] == fine['total_rows']
+
+    expected = defaultdict(lambda: dict.fromkeys(MEASURES, 0))
+    for row in fine['data']:
+        for name in MEASURES:
+            expected[(row['Origem'], row['Midia'])][name] += row[name]
+    rollup = {(row['Origem'], row['Midia']): row for row in by_origin['data']}
+    assert len(rollup) > 3 and rollup.keys() == expected.keys()
+    for key, row in rollup.items():
+        assert row['Data'] is None and row['Campanha'] is None
+        assert row['Sessoes'] == expected[key]['Sessoes']
+        assert row['Pedidos'] == expected[key]['Pedidos']
+        assert row['Receita'] == pytest.approx(expected[key]['Receita'])
+
+    sessions = [row['Sessoes'] for row in by_origin['data']]
+    assert sessions == sorted(sessions, reverse=True)
+    assert by_origin_page['data'] == by_origin['data'][1:3]
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import date, timedelta
+
+from event_cube import CUBE_DIMENSIONS, CUBE_MEASURES, EventCube, get_event_cube
+
+PROJECT = 'mymetric-hub-shopify'
+EVENTS = '"mymetric-hub-shopify".dbt_join.constance_events_long'
+BASIC_DATA_DIMENSIONS = ('event_date', 'traffic_category', 'platform', 'city', 'region', 'country')
+
+
+def _period(client):
+    end = date.today()
+    return (end - timedelta(days=client.days)).isoformat(), end.isoformat()
+
+
+def _duplicate_purchases(client):
+    """Repete linhas de compra da mesma transação em outra hora e outra página (mesmo dia)"""
+    client.execute(f"""
+        INSERT INTO {EVENTS}
+        SELECT * REPLACE (
+            created_at + INTERVAL 1 HOUR AS created_at,
+            page_location || '?dup' AS page_location
+        )
+        FROM {EVENTS}
+        WHERE event_name = 'purchase' AND extract(hour FROM created_at) < 22
+    """)
+
+
+def _direct_orders(client, start, end):
+    """COUNT(DISTINCT transaction_id) direto no grão do basic-data"""
+    rows = client.execute(f"""
+        SELECT
+            CAST(event_date AS VARCHAR), traffic_category, platform, city, region, country,
+            count(DISTINCT CASE WHEN event_name = 'purchase' THEN transaction_id END),
+            count(DISTINCT CASE WHEN event_name = 'purchase' AND status IN ('paid', 'authorized') THEN transaction_id END),
+            count(DISTINCT CASE WHEN event_name = 'purchase' AND status IN ('paid', 'authorized') AND transaction_no = 1 THEN transaction_id END)
+        FROM {EVENTS}
+        WHERE event_date BETWEEN '{start}' AND '{end}'
+        GROUP BY ALL
+    """)
+    return {tuple(row[:6]): row[6:] for row in rows if any(row[6:])}
+
+
+def _cube_orders(cube):
+    keys, totals = cube.group_by(BASIC_DATA_DIMENSIONS)
+    return {
+        key: (totals['Pedidos'][index], totals['Pedidos_Pagos'][index], totals['Novos_Clientes'][index])
+        for index, key in enumerate(keys)
+        if totals['Pedidos'][index] or totals['Pedidos_Pagos'][index] or totals['Novos_Clientes'][index]
+    }
+
+
+def test_transactions_spanning_cells_are_counted_once(fake_client):
+    start, end = _period(fake_client)
+    _duplicate_purchases(fake_client)
+
+    cube = asyncio.run(get_event_cube(PROJECT, 'constance', 'purchase', start, end))
+
+    direct = _direct_orders(fake_client, start, end)
+    assert _cube_orders(cube) == direct
+    assert cube.total('Pedidos') == sum(orders for orders, _, _ in direct.values())
+
+
+def test_history_days_and_full_range_agree(fake_client):
+    start, end = _period(fake_client)
+    _duplicate_purchases(fake_client)
+    middle = (date.fromisoformat(end) - timedelta(days=10)).isoformat()
+
+    # Parte do período entra no histórico por dia antes da consulta completa
+    asyncio.run(get_event_cube(PROJECT, 'constance', 'purchase', start, middle))
+    cube = asyncio.run(get_event_cube(PROJECT, 'constance', 'purchase', start, end))
+
+    assert _cube_orders(cube) == _direct_orders(fake_client, start, end)
+
+
+class _Row(dict):
+    """Linha no formato de google.cloud.bigquery Row (acesso por posição e keys())"""
+
+    def __getitem__(self, index):
+        return list(self.values())[index]
+
+
+def _cube_row(event_date, traffic_category, **measures):
+    row = {name: None for name in CUBE_DIMENSIONS}
+    row.update(event_date=event_date, traffic_category=traffic_category)
+    row.update({name: measures.get(name, 0) for name in CUBE_MEASURES})
+    return _Row(row)
+
+
+def test_concat_keeps_cells_and_group_by_sums_measures():
+    first = EventCube([_cube_row('2024-01-01', 'Pago', Sessoes=3, Pedidos=1, Receita=10.0)])
+    second = EventCube([
+        _cube_row('2024-01-02', 'Pago', Sessoes=2, Pedidos=2, Receita=5.5),
+        _cube_row('2024-01-02', None, Sessoes=1),
+    ])
+
+    cube = EventCube.concat([first, second])
+    keys, totals = cube.group_by(('traffic_category',), {'traffic_category': lambda value: value or 'Não Identificado'})
+
+    assert len(cube) == 3
+    assert dict(zip(keys, totals['Sessoes'])) == {('Pago',): 5, ('Não Identificado',): 1}
+    assert dict(zip(keys, totals['Pedidos'])) == {('Pago',): 3, ('Não Identificado',): 0}
+    assert cube.total('Receita') == 15.5
+
+
+def test_detailed_data_rows_follow_orders_ordering():
+    from metrics import _detailed_data_rows_from_cube
+
+    cube = EventCube([
+        _cube_row('2024-01-01', 'Pago', Sessoes=3, Pedidos=1, Receita=10.0),
+        _cube_row('2024-01-02', 'Pago', Sessoes=2, Pedidos=2, Receita=5.5),
+        _cube_row('2024-01-02', None, Sessoes=9),
+    ])
+
+    rows = _detailed_data_rows_from_cube(cube)
+
+    assert [(row.Data, row.Pedidos, row.Sessoes) for row in rows] == [
+        ('2024-01-02', 2, 2), ('2024-01-01', 1, 3), ('2024-01-02', 0, 9)
+    ]
@@ -0,0 +1,65 @@
+import pytest
+
+from compact_rows import EncodedRows
+from experiment_stats import experiment_rollups, two_proportion_z_test
+from main import EXPERIMENTS_DICTIONARY_FIELDS, CompactExperimentData
+
+
+def test_two_proportion_z_test():
+    z, p_value = two_proportion_z_test(100, 1000, 130, 1000)
+    assert z == pytest.approx(2.1027, abs=1e-4)
+    assert p_value == pytest.approx(0.0355, abs=1e-4)
+
+    z, p_value_reversed = two_proportion_z_test(130, 1000, 100, 1000)
+    assert z == pytest.approx(-2.1027, abs=1e-4)
+    assert p_value_reversed == pytest.approx(p_value)
+
+    # Sem amostra ou sem variância
+    assert two_proportion_z_test(1, 0, 1, 10) == (None, None)
+    assert two_proportion_z_test(0, 10, 0, 10) == (None, None)
+    # Mais transações que sessões (proporção acima de 1)
+    assert two_proportion_z_test(120, 100, 110, 100) == (None, None)
+    assert two_proportion_z_test(10, 100, 110, 100) == (None, None)
+
+
+def _row(event_date, experiment_id, variant, sessions, transactions, revenue, category='home'):
+    return CompactExperimentData(
+        event_date=event_date, experiment_id=experiment_id, experiment_name=f'Teste {experiment_id}',
+        experiment_variant=variant, category=category, sessions=sessions, users=sessions,
+        transactions=transactions, revenue=revenue, add_to_cart=0, begin_checkout=0,
+        add_shipping_info=0, add_payment_info=0
+    )
+
+
+def test_experiment_rollups_compare_variants_with_control():
+    rows = EncodedRows([
+        _row('2024-01-01', 'E1', 'B', 600, 80, 800.0),
+        _row('2024-01-01', 'E1', 'Control', 500, 50, 500.0),
+        _row('2024-01-02', 'E1', 'B', 400, 50, 500.0, category='pdp'),
+        _row('2024-01-02', 'E1', 'Control', 500, 50, 400.0),
+        _row('2024-01-01', 'E2', 'y', 10, 1, 10.0),
+        _row('2024-01-01', 'E2', 'x', 20, 0, 0.0),
+        _row('2024-01-01', 'E3', 'control', 5, 6, 60.0),
+        _row('2024-01-01', 'E3', 'b', 4, 7, 70.0),
+    ], CompactExperimentData, EXPERIMENTS_DICTIONARY_FIELDS)
+
+    first, second, third = experiment_rollups(rows)
+
+    assert (first['experiment_id'], first['sessions'], first['transactions'], first['revenue']) == ('E1', 2000, 230, 2200.0)
+    assert first['control_variant'] == 'Control'
+    control, variant = first['variants']
+    assert (control['experiment_variant'], control['is_control'], control['lift']) == ('Control', True, None)
+    assert (variant['sessions'], variant['transactions']) == (1000, 130)
+    assert variant['conversion_rate'] == 13.0
+    assert variant['lift'] == 30.0
+    assert variant['z_score'] == pytest.approx(2.1027, abs=1e-4)
+    assert variant['significant'] is True
+
+    # Sem variante com nome de controle: a primeira em ordem alfabética
+    assert second['control_variant'] == 'x'
+    assert second['variants'][1]['lift'] is None  # Controle sem conversões
+
+    # Transações acima das sessões: sem teste z, sem erro
+    variant = third['variants'][1]
+    assert (variant['z_score'], variant['p_value'], variant['significant']) == (None, None, False)
+    assert variant['lift'] == pytest.approx((7 / 4) / (6 / 5) * 100 - 100, abs=1e-3)
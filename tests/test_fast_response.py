@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+import fast_response
+from compact_rows import compact_row_class
+from metrics import ShippingCalcAnalyticsRow
+
+CompactRow = compact_row_class(ShippingCalcAnalyticsRow)
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_non_finite_floats_are_encoded_as_null(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(fast_response, 'orjson', None)
+
+    content = {
+        'summary': {'ratio': float('nan'), 'total': 1.5},
+        'data': [CompactRow(item_id='A', revenue=float('inf')), CompactRow(item_id='B', revenue=2.0)],
+        'columns': {'revenue': [float('-inf'), 3.0]},
+    }
+    decoded = json.loads(fast_response.encode_json(content))
+
+    assert decoded['summary'] == {'ratio': None, 'total': 1.5}
+    assert [row['revenue'] for row in decoded['data']] == [None, 2.0]
+    assert decoded['columns'] == {'revenue': [None, 3.0]}
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import timedelta
+
+from cache_manager import CacheManager
+from incremental_refresh import contiguous_ranges, days_between, first_open_day, load_by_day, split_days
+
+PARAMS = {'table_name': 'constance'}
+
+
+def _load(history, start, end, calls):
+    async def fetch_range(range_start, range_end):
+        calls.append((range_start, range_end))
+        return {day: f'parte {day}' for day in days_between(range_start, range_end)}
+
+    return asyncio.run(load_by_day(history, PARAMS, start, end, fetch_range, lambda: 'vazio'))
+
+
+def test_contiguous_ranges():
+    assert contiguous_ranges([]) == []
+    assert contiguous_ranges(['2024-01-30', '2024-01-31', '2024-02-01', '2024-02-03', '2024-02-05', '2024-02-06']) == [
+        ('2024-01-30', '2024-02-01'), ('2024-02-03', '2024-02-03'), ('2024-02-05', '2024-02-06')
+    ]
+
+
+def test_closed_days_come_from_history_and_open_days_are_always_fetched():
+    first_open = first_open_day()
+    start = (first_open - timedelta(days=10)).isoformat()
+    end = (first_open + timedelta(days=1)).isoformat()
+    closed_days, open_days = split_days(start, end)
+    assert len(closed_days) == 10 and open_days == [first_open.isoformat(), end]
+
+    history = CacheManager(ttl_hours=24)
+    # Dias já no histórico no meio do intervalo
+    for day in closed_days[3:5] + closed_days[7:8]:
+        history.set(f'histórico {day}', **PARAMS, day=day)
+
+    calls = []
+    parts = _load(history, start, end, calls)
+
+    assert sorted(calls) == [
+        (closed_days[0], closed_days[2]), (closed_days[5], closed_days[6]),
+        (closed_days[8], closed_days[9]), (open_days[0], open_days[-1]),
+    ]
+    assert parts == [
+        f'histórico {day}' if day in closed_days[3:5] + closed_days[7:8] else f'parte {day}'
+        for day in days_between(start, end)
+    ]
+    # Dias fechados consultados são gravados; os abertos nunca
+    assert all(history.get(**PARAMS, day=day) is not None for day in closed_days)
+    assert all(history.get(**PARAMS, day=day) is None for day in open_days)
+
+    calls.clear()
+    _load(history, start, end, calls)
+    assert calls == [(open_days[0], open_days[-1])]
+
+
+def test_days_without_data_are_empty():
+    day = (first_open_day() - timedelta(days=2)).isoformat()
+    history = CacheManager(ttl_hours=24)
+
+    async def fetch_range(range_start, range_end):
+        return {}
+
+    parts = asyncio.run(load_by_day(history, PARAMS, day, day, fetch_range, lambda: 'vazio'))
+    assert parts == ['vazio']
+    assert history.get(**PARAMS, day=day) == 'vazio'
@@ -0,0 +1,44 @@
+import asyncio
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+
+import utils
+
+
+def test_filters_are_answered_from_the_cached_period(fake_client):
+    import main
+    from bigquery_fake import ADMIN_EMAIL
+
+    end = date.today()
+    period = {'start_date': (end - timedelta(days=20)).isoformat(), 'end_date': end.isoformat(), 'table_name': 'constance'}
+    headers = {'Authorization': f"Bearer {utils.create_access_token({'sub': ADMIN_EMAIL})}"}
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://t', headers=headers) as api:
+            response = await api.post('/metrics/orders', json={**period, 'limit': 100000})
+            assert response.status_code == 200, response.text
+            everything = response.json()['data']
+
+            fake_client.reset_query_log()
+            category, _ = Counter(row['Categoria_de_Trafico'] for row in everything).most_common(1)[0]
+            status, _ = Counter(row['Status'] for row in everything).most_common(1)[0]
+            filtered = []
+            for filters in ({'traffic_category': category}, {'traffic_category': category, 'status': status}):
+                response = await api.post('/metrics/orders', json={**period, **filters, 'limit': 100000})
+                assert response.status_code == 200, response.text
+                filtered.append(response.json())
+            return everything, category, status, filtered
+
+    everything, category, status, (by_category, by_both) = asyncio.run(run())
+
+    assert fake_client.query_count == 0
+    assert 0 < len(by_category['data']) < len(everything)
+    expected = [row for row in everything if row['Categoria_de_Trafico'] == category]
+    assert by_category['data'] == expected
+    assert by_category['total_rows'] == len(expected)
+    assert by_category['summary']['total_revenue'] == sum(row['Receita'] for row in expected)
+    assert by_both['data'] == [row for row in expected if row['Status'] == status]
+    assert by_both['summary']['filters_applied']['status'] == status
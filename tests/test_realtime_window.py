@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from realtime_window import REALTIME_WINDOW_HOURS, MinuteRing, RealtimeWindow
+
+
+def _row(timestamp, transaction_id, session_id, revenue, item_name='item'):
+    return SimpleNamespace(
+        event_timestamp=timestamp, transaction_id=transaction_id, session_id=session_id,
+        item_name=item_name, quantity=1, item_revenue=revenue
+    )
+
+
+class _Table:
+    """Tabela realtime: fetch(watermark) devolve as linhas >= watermark, mais recentes primeiro"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.watermarks = []
+
+    async def fetch(self, watermark):
+        self.watermarks.append(watermark)
+        rows = [row for row in self.rows if watermark is None or row.event_timestamp >= watermark]
+        return sorted(rows, key=lambda row: row.event_timestamp, reverse=True)
+
+
+def _refresh(window):
+    window.refreshed_at = 0.0  # Ignora o intervalo mínimo entre atualizações
+    asyncio.run(window.refresh())
+
+
+def test_delta_refresh_skips_rows_already_seen_at_the_watermark():
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    table = _Table([
+        _row(now - timedelta(minutes=5), 'T1', 'S1', 10.0),
+        _row(now - timedelta(minutes=1), 'T2', 'S2', 20.0, 'a'),
+        _row(now - timedelta(minutes=1), 'T2', 'S2', 5.0, 'b'),
+    ])
+    window = RealtimeWindow('constance', table.fetch, list)
+
+    _refresh(window)
+    assert window.watermark == now - timedelta(minutes=1)
+
+    # Nova linha no mesmo event_timestamp da watermark e outra depois dela
+    table.rows.append(_row(now - timedelta(minutes=1), 'T3', 'S3', 7.0))
+    table.rows.append(_row(now, 'T2', 'S2', 1.0, 'c'))
+    _refresh(window)
+
+    assert table.watermarks == [None, now - timedelta(minutes=1)]
+    assert window.summary() == {
+        'total_items': 5, 'total_revenue': 43.0, 'total_quantity': 5,
+        'unique_transactions': 3, 'unique_sessions': 3,
+        'avg_item_value': 43.0 / 5, 'avg_quantity_per_item': 1.0,
+    }
+    assert [row.item_revenue for row in window.data(limit=2)] == [1.0, 7.0]
+
+
+def test_rows_leaving_the_window_are_evicted_from_the_counters():
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(hours=REALTIME_WINDOW_HOURS, minutes=1)
+    table = _Table([
+        _row(old, 'T1', 'S1', 10.0),
+        _row(old, 'T2', 'S1', 3.0),
+        _row(now - timedelta(minutes=2), 'T2', 'S2', 5.0),
+    ])
+    window = RealtimeWindow('constance', table.fetch, list)
+
+    _refresh(window)
+
+    summary = window.summary()
+    assert (summary['total_items'], summary['total_revenue']) == (1, 5.0)
+    assert dict(window.transactions) == {'T2': 1}
+    assert dict(window.sessions) == {'S2': 1}
+
+
+def test_minute_series_counts_each_order_once():
+    now = datetime.now(timezone.utc)
+    minute = now.replace(second=0, microsecond=0)
+    table = _Table([
+        _row(minute - timedelta(minutes=2), 'T1', 'S1', 10.0, 'a'),
+        _row(minute - timedelta(minutes=2), 'T1', 'S1', 4.0, 'b'),
+        _row(minute, 'T2', 'S2', 6.0),
+    ])
+    window = RealtimeWindow('constance', table.fetch, list)
+    _refresh(window)
+
+    points = {point['minute']: (point['revenue'], point['orders'], point['items']) for point in window.minute_series(hours=5 / 60)}
+    assert [points[(minute - timedelta(minutes=offset)).isoformat()] for offset in (2, 1, 0)] == [
+        (14.0, 1, 2), (0.0, 0, 0), (6.0, 1, 1)
+    ]
+
+
+def test_minute_ring_overwrites_old_slots_and_ignores_older_minutes():
+    ring = MinuteRing(3)
+    ring.add(10, 5.0, 2, 1)
+    ring.add(10, 1.0, 1, 0)
+    ring.add(12, 3.0, 1, 1)
+    assert ring.series(12, 3) == [(10, 6.0, 1, 3), (11, 0.0, 0, 0), (12, 3.0, 1, 1)]
+
+    # Minuto 13 ocupa a posição do 10; o 10 passa a ser mais antigo que o buffer
+    ring.add(13, 2.0, 1, 1)
+    ring.add(10, 9.0, 1, 1)
+    assert ring.series(13, 5) == [(11, 0.0, 0, 0), (12, 3.0, 1, 1), (13, 2.0, 1, 1)]
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import timedelta
+
+import httpx
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import utils
+
+
+def _bearer(token):
+    return HTTPAuthorizationCredentials(scheme='Bearer', credentials=token)
+
+
+def test_stream_accepts_ticket_in_query_and_access_token_in_header():
+    ticket = utils.create_stream_ticket('user@constance.com.br')
+    access_token = utils.create_access_token({'sub': 'user@constance.com.br'})
+
+    assert utils.verify_stream_token(ticket=ticket, credentials=None).email == 'user@constance.com.br'
+    assert utils.verify_stream_token(ticket=None, credentials=_bearer(access_token)).email == 'user@constance.com.br'
+
+
+@pytest.mark.parametrize('kind', ['access_in_query', 'ticket_in_header', 'expired', 'missing'])
+def test_stream_rejects_other_credentials(kind):
+    email = 'user@constance.com.br'
+    ticket, credentials = None, None
+    if kind == 'access_in_query':
+        ticket = utils.create_access_token({'sub': email})
+    elif kind == 'ticket_in_header':
+        credentials = _bearer(utils.create_stream_ticket(email))
+    elif kind == 'expired':
+        ticket = jwt.encode(
+            {'sub': email, 'type': 'stream', 'exp': utils.datetime.utcnow() - timedelta(seconds=1)},
+            utils.SECRET_KEY, algorithm=utils.ALGORITHM
+        )
+
+    with pytest.raises(HTTPException) as error:
+        utils.verify_stream_token(ticket=ticket, credentials=credentials)
+    assert error.value.status_code == 401
+
+
+def test_ticket_endpoint_requires_access_token():
+    import main
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://t') as api:
+            assert (await api.post('/metrics/realtime/stream-ticket')).status_code == 403
+            headers = {'Authorization': f"Bearer {utils.create_access_token({'sub': 'user@constance.com.br'})}"}
+            response = await api.post('/metrics/realtime/stream-ticket', headers=headers)
+            assert response.status_code == 200, response.text
+            return response.json()
+
+    body = asyncio.run(run())
+    assert body['expires_in'] == utils.STREAM_TICKET_EXPIRE_SECONDS
+    assert utils.verify_stream_token(ticket=body['ticket'], credentials=None).email == 'user@constance.com.br'
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import utils
+
+
+async def _asgi_post(app, path, body, query=b''):
+    """POST direto no app ASGI; retorna (status, headers, corpos de cada mensagem http.response.body)"""
+    from bigquery_fake import ADMIN_EMAIL
+
+    payload = json.dumps(body).encode()
+    token = utils.create_access_token({'sub': ADMIN_EMAIL})
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query,
+        'root_path': '', 'server': ('t', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [
+            (b'host', b't'), (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode()),
+            (b'authorization', f'Bearer {token}'.encode()),
+        ],
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': payload, 'more_body': False}
+        await asyncio.Event().wait()  # Cliente conectado até o fim da resposta
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    headers = {key.decode(): value.decode() for key, value in start['headers']}
+    return start['status'], headers, [message.get('body', b'') for message in messages[1:]]
+
+
+def _period():
+    end = date.today()
+    return {'start_date': (end - timedelta(days=7)).isoformat(), 'end_date': end.isoformat()}
+
+
+def test_batch_stream_sends_one_chunk_per_result(fake_client):
+    import main
+
+    body = {
+        'table_name': 'constance', 'stream': True,
+        'requests': [{'endpoint': 'basic-data', 'params': _period()}, {'endpoint': 'daily-metrics', 'params': _period()}],
+    }
+    status, headers, bodies = asyncio.run(_asgi_post(main.app, '/metrics/batch', body))
+
+    assert status == 200
+    assert headers['content-type'].startswith('application/x-ndjson')
+    chunks = [chunk for chunk in bodies if chunk]
+    assert len(chunks) == 3
+    lines = [json.loads(chunk) for chunk in chunks]
+    assert lines[-1]['done'] is True
+    assert {line['id'] for line in lines[:-1]} == {'basic-data', 'daily-metrics'}
+
+
+def test_arrow_download_is_streamed_in_batches(fake_client):
+    pytest.importorskip('pyarrow')
+    import main
+
+    body = {**_period(), 'table_name': 'constance', 'limit': 100000}
+    status, headers, bodies = asyncio.run(_asgi_post(main.app, '/metrics/orders', body, b'format=arrow'))
+
+    assert status == 200
+    assert headers['content-type'] == 'application/vnd.apache.arrow.stream'
+    assert len([chunk for chunk in bodies if chunk]) > 1
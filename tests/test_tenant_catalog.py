@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+
+import utils
+from tenant_catalog import TenantCatalog, tenant_catalog
+
+CATALOG_ATTRIBUTES = ('tenants', 'loaded_at', 'attempted_at', 'probed')
+
+
+@pytest.fixture
+def partial_catalog(fake_client, monkeypatch):
+    """Catálogo global carregado sem o dataset dbt_aggregated (leitura com erro)"""
+    saved = {name: getattr(tenant_catalog, name) for name in CATALOG_ATTRIBUTES}
+    load_columns = TenantCatalog._load_columns
+
+    async def without_aggregated(self, project, dataset):
+        if dataset == 'dbt_aggregated':
+            return None
+        return await load_columns(self, project, dataset)
+
+    monkeypatch.setattr(TenantCatalog, '_load_columns', without_aggregated)
+    tenant_catalog.tenants, tenant_catalog.probed = {}, {}
+    asyncio.run(tenant_catalog.refresh())
+    yield tenant_catalog
+    for name, value in saved.items():
+        setattr(tenant_catalog, name, value)
+
+
+def _information_schema_queries(client):
+    return [entry for entry in client.query_log if 'INFORMATION_SCHEMA' in entry['query']]
+
+
+def test_tables_missing_from_a_partial_load_are_probed(fake_client, partial_catalog):
+    assert 'constance' in partial_catalog.tenants
+    assert not partial_catalog.tenants['constance'].has_table('dbt_aggregated', 'constance_product_trend')
+
+    fake_client.reset_query_log()
+    project, columns = asyncio.run(partial_catalog.table('constance', 'dbt_aggregated', 'constance_product_trend'))
+    assert project == 'mymetric-hub-shopify'
+    assert {'benchmark_week_1', 'clicks_week_1'} <= columns
+
+    project, _ = asyncio.run(partial_catalog.table('havaianas', 'dbt_aggregated', 'havaianas_product_trend'))
+    assert project == 'bq-mktbr'
+
+    # Resultado guardado até a próxima recarga; ausência sondada no máximo uma vez por minuto
+    assert asyncio.run(partial_catalog.table('constance', 'dbt_join', 'constance_nao_existe')) is None
+    probes = len(_information_schema_queries(fake_client))
+    asyncio.run(partial_catalog.table('constance', 'dbt_aggregated', 'constance_product_trend'))
+    assert asyncio.run(partial_catalog.table('constance', 'dbt_join', 'constance_nao_existe')) is None
+    assert len(_information_schema_queries(fake_client)) == probes
+
+
+def test_endpoints_probe_tables_missing_from_the_catalog(fake_client, partial_catalog):
+    import main
+    from bigquery_fake import ADMIN_EMAIL
+
+    headers = {'Authorization': f"Bearer {utils.create_access_token({'sub': ADMIN_EMAIL})}"}
+    # Tabela de experimentos criada depois da última recarga do catálogo
+    del partial_catalog.tenants['constance'].tables['dbt_join.constance_experiment_impressions_results']
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://t', headers=headers) as api:
+            trend = await api.post('/metrics/product-trend', json={'table_name': 'havaianas', 'limit': 5})
+            experiments = await api.post('/metrics/experiments', json={
+                'table_name': 'constance', 'start_date': '2000-01-01', 'end_date': '2100-01-01'
+            })
+            return trend, experiments
+
+    trend, experiments = asyncio.run(run())
+
+    assert trend.status_code == 200, trend.text
+    row = trend.json()['data'][0]
+    assert row['benchmark_week_1'] is not None
+    assert row['clicks_week_1'] is not None
+    assert row['size_score_week_1'] is not None
+    assert experiments.status_code == 200, experiments.text
+    assert experiments.json()
@@ -0,0 +1,72 @@
+import asyncio
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+import utils
+
+
+def _users_queries(client):
+    return [entry for entry in client.query_log if 'dbt_config.users' in entry['query']]
+
+
+@pytest.fixture
+def api(fake_client):
+    import main
+    from bigquery_fake import ADMIN_EMAIL
+
+    utils._admin_cache.clear()
+    headers = {'Authorization': f"Bearer {utils.create_access_token({'sub': ADMIN_EMAIL})}"}
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://t', headers=headers)
+    utils._admin_cache.clear()
+
+
+def test_handlers_reuse_cached_user_lookup(fake_client, api):
+    end = date.today()
+
+    async def run():
+        async with api:
+            for days in (7, 14):
+                start = (end - timedelta(days=days)).isoformat()
+                response = await api.post('/metrics/orders', json={
+                    'start_date': start, 'end_date': end.isoformat(), 'table_name': 'constance', 'limit': 5
+                })
+                assert response.status_code == 200, response.text
+                response = await api.post('/metrics/leads_orders', json={
+                    'start_date': start, 'end_date': end.isoformat(), 'table_name': 'constance',
+                    'force_refresh': True, 'limit': 5
+                })
+                assert response.status_code == 200, response.text
+            for _ in range(2):
+                response = await api.get('/metrics/cache/stats')
+                assert response.status_code == 200, response.text
+
+    fake_client.reset_query_log()
+    asyncio.run(run())
+    # Uma consulta de acesso (get_user_access) e uma de admin (verify_admin_user), ambas em cache
+    assert len(_users_queries(fake_client)) == 2
+
+
+def test_user_changes_invalidate_cached_access(fake_client, api, monkeypatch):
+    import main
+
+    email = 'user@constance.com.br'
+    monkeypatch.setattr(main.email_service, 'send_user_creation_email', lambda **kwargs: False)
+
+    async def run():
+        async with api:
+            assert (await utils.get_user_access(email))[0] == 'constance'
+
+            # Mesma tabela com outro access_control: o MERGE atualiza a linha do usuário
+            response = await api.post('/create-user', json={
+                'email': email, 'table_name': 'constance', 'admin': False, 'access_control': 'write'
+            })
+            assert response.status_code == 200, response.text
+            assert await utils.get_user_access(email) == ('constance', 'write')
+
+            response = await api.delete(f'/users/{email}')
+            assert response.status_code == 200, response.text
+            assert await utils.get_user_access(email) is None
+
+    asyncio.run(run())
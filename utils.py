@@ -17,11 +17,14 @@ import string
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
+from cache_manager import user_lookup_cache
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
 # Configurar autenticação
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Modelos Pydantic
 class TokenData(BaseModel):
@@ -41,6 +44,13 @@ def get_bigquery_client():
     global _bigquery_client
     
     if _bigquery_client is None:
+        # Backend local (DuckDB) para testes e benchmarks offline
+        if os.getenv("BIGQUERY_BACKEND", "").lower() == "duckdb":
+            from bigquery_fake import FakeBigQueryClient
+            _bigquery_client = FakeBigQueryClient.from_env()
+            print("🦆 Usando cliente BigQuery falso (DuckDB)")
+            return _bigquery_client
+
         try:
             # Se tiver arquivo de credenciais
             if os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
@@ -58,6 +68,11 @@ def get_bigquery_client():
     
     return _bigquery_client
 
+def set_bigquery_client(client):
+    """Substitui o cliente BigQuery global (ex.: FakeBigQueryClient em testes)"""
+    global _bigquery_client
+    _bigquery_client = client
+
 # Thread pool para operações BigQuery assíncronas
 # Otimizado para melhor concorrência e performance
 # Usar min(cores * 2, 30) para balancear concorrência sem sobrecarregar
@@ -105,12 +120,40 @@ async def execute_bigquery_query_simple_async(query: str):
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(bigquery_executor, _run_query)
 
+async def get_user_access(email: str):
+    """(tablename, access_control) do usuário, com cache curto (None se não existir)"""
+    cached = user_lookup_cache.get(email=email)
+    if cached is not None:
+        return cached
+    
+    user_query = f"""
+    SELECT tablename, access_control
+    FROM `mymetric-hub-shopify.dbt_config.users`
+    WHERE email = @email
+    """
+    
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("email", "STRING", email),
+        ]
+    )
+    
+    user_data = await execute_bigquery_query_async(user_query, job_config)
+    if not user_data:
+        return None
+    
+    user_access = (user_data[0].tablename, user_data[0].access_control)
+    user_lookup_cache.set(user_access, email=email)
+    return user_access
+
 # Configurações JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "sua_chave_secreta_aqui")
 REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY", "sua_chave_refresh_secreta_aqui")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+# Ticket de uso exclusivo do stream SSE (vai na URL, então vive poucos segundos)
+STREAM_TICKET_EXPIRE_SECONDS = int(os.getenv("STREAM_TICKET_EXPIRE_SECONDS", "60"))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Cria token JWT de acesso"""
@@ -134,14 +177,19 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verifica token JWT de acesso"""
+def create_stream_ticket(email: str) -> str:
+    """Cria ticket JWT curto que só autentica a abertura do stream SSE"""
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TICKET_EXPIRE_SECONDS)
+    return jwt.encode({"sub": email, "exp": expire, "type": "stream"}, SECRET_KEY, algorithm=ALGORITHM)
+
+def _decode_access_token(token: str, expected_type: str = "access") -> TokenData:
+    """Decodifica e valida um token JWT de acesso (ou de outro tipo, como o ticket do stream)"""
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         token_type: str = payload.get("type")
         
-        if email is None or token_type != "access":
+        if email is None or token_type != expected_type:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token inválido",
@@ -156,6 +204,29 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verifica token JWT de acesso"""
+    return _decode_access_token(credentials.credentials)
+
+def verify_stream_token(
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Verifica o token de acesso do header ou o ticket do stream da query string (?ticket=)
+
+    O EventSource do navegador não envia headers, então o stream SSE aceita na URL
+    apenas o ticket curto de `POST /metrics/realtime/stream-ticket`, nunca o token de acesso.
+    """
+    if credentials:
+        return _decode_access_token(credentials.credentials)
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token não fornecido",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return _decode_access_token(ticket, expected_type="stream")
+
 def verify_refresh_token(refresh_token: str):
     """Verifica token JWT de refresh"""
     try:
@@ -202,6 +273,11 @@ def generate_secure_password(length: int = 12) -> str:
 _admin_cache: Dict[str, tuple] = {}  # {email: (is_admin, timestamp)}
 _admin_cache_ttl = 300  # 5 minutos
 
+def invalidate_user_access(email: str) -> None:
+    """Descarta o acesso e o status de admin em cache do usuário (após criar, alterar ou remover)"""
+    user_lookup_cache.invalidate(email=email)
+    _admin_cache.pop(email, None)
+
 def verify_admin_user(email: str) -> bool:
     """Verifica se o usuário é admin (com cache)"""
     import time